@@ -0,0 +1,47 @@
+"""Add ingest_jobs table for asynchronous document processing
+
+Revision ID: 20261018_add_ingest_jobs
+Revises: 20251226_change_question_content_to_json
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_ingest_jobs'
+down_revision = '20251226_change_question_content_to_json'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'ingest_jobs',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('document_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('documents.id', ondelete='CASCADE'), nullable=False, comment='关联文档ID'),
+        sa.Column('created_by', postgresql.UUID(as_uuid=True), sa.ForeignKey('users.id'), nullable=False, comment='提交用户ID'),
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending', comment='任务状态:pending, running, completed, failed'),
+        sa.Column('payload', sa.JSON(), nullable=False, comment='任务参数: image_paths, max_concurrency 等'),
+        sa.Column('pages_total', sa.Integer(), server_default='0', comment='总页数'),
+        sa.Column('pages_done', sa.Integer(), server_default='0', comment='已完成页数'),
+        sa.Column('completed_pages', sa.JSON(), comment='已完成并入库的页索引列表，重试时跳过'),
+        sa.Column('attempts', sa.Integer(), server_default='0', comment='已尝试次数'),
+        sa.Column('error', sa.Text(), comment='失败原因'),
+        sa.Column('worker_id', sa.String(100), comment='领取任务的worker标识'),
+        sa.Column('heartbeat_at', sa.DateTime(), comment='最近一次心跳时间'),
+        sa.Column('created_at', sa.DateTime(), comment='创建时间'),
+        sa.Column('started_at', sa.DateTime(), comment='开始执行时间'),
+        sa.Column('finished_at', sa.DateTime(), comment='完成时间'),
+        sa.Column('updated_at', sa.DateTime(), comment='更新时间'),
+    )
+    op.create_index('ix_ingest_jobs_status_created_at', 'ingest_jobs', ['status', 'created_at'])
+    op.create_index('ix_ingest_jobs_document_id', 'ingest_jobs', ['document_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ingest_jobs_document_id', table_name='ingest_jobs')
+    op.drop_index('ix_ingest_jobs_status_created_at', table_name='ingest_jobs')
+    op.drop_table('ingest_jobs')
@@ -0,0 +1,48 @@
+"""Add near-duplicate detection: question fingerprints, LSH buckets and duplicate links
+
+Revision ID: 20261018_add_question_duplicate_detection
+Revises: 20261018_add_question_search_index
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_question_duplicate_detection'
+down_revision = '20261018_add_question_search_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('questions', sa.Column('duplicate_of_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('questions.id'), nullable=True, comment='疑似重复的原题ID'))
+    op.add_column('questions', sa.Column('duplicate_similarity', sa.Float(), nullable=True, comment='与原题的估计相似度(Jaccard)'))
+    op.create_index('ix_questions_duplicate_of_id', 'questions', ['duplicate_of_id'])
+
+    op.create_table(
+        'question_fingerprints',
+        sa.Column('question_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('questions.id', ondelete='CASCADE'), primary_key=True, comment='题目ID'),
+        sa.Column('created_by', postgresql.UUID(as_uuid=True), sa.ForeignKey('users.id'), nullable=False, comment='题目所属用户ID'),
+        sa.Column('signature', sa.LargeBinary(), nullable=False, comment='MinHash签名(uint32数组)'),
+        sa.Column('created_at', sa.DateTime(), comment='创建时间'),
+    )
+    op.create_table(
+        'question_lsh_buckets',
+        sa.Column('question_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('questions.id', ondelete='CASCADE'), primary_key=True, comment='题目ID'),
+        sa.Column('band', sa.Integer(), primary_key=True, comment='band序号'),
+        sa.Column('created_by', postgresql.UUID(as_uuid=True), sa.ForeignKey('users.id'), nullable=False, comment='题目所属用户ID'),
+        sa.Column('bucket', sa.BigInteger(), nullable=False, comment='band哈希(含band序号)'),
+    )
+    op.create_index('ix_question_lsh_buckets_user_bucket', 'question_lsh_buckets', ['created_by', 'bucket'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_question_lsh_buckets_user_bucket', table_name='question_lsh_buckets')
+    op.drop_table('question_lsh_buckets')
+    op.drop_table('question_fingerprints')
+    op.drop_index('ix_questions_duplicate_of_id', table_name='questions')
+    op.drop_column('questions', 'duplicate_similarity')
+    op.drop_column('questions', 'duplicate_of_id')
@@ -0,0 +1,26 @@
+"""Add composite indexes for keyset pagination of questions
+
+Revision ID: 20261018_add_question_keyset_indexes
+Revises: 20261018_add_ingest_jobs
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_question_keyset_indexes'
+down_revision = '20261018_add_ingest_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 列表 / 文档题目按 (created_at, id) 倒序游标分页，过滤列在前，排序键在后
+    op.create_index('ix_questions_created_by_created_at_id', 'questions', ['created_by', 'created_at', 'id'])
+    op.create_index('ix_questions_document_created_at_id', 'questions', ['source_document_id', 'created_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_questions_document_created_at_id', table_name='questions')
+    op.drop_index('ix_questions_created_by_created_at_id', table_name='questions')
@@ -0,0 +1,51 @@
+"""Add full-text search index for questions
+
+Revision ID: 20261018_add_question_search_index
+Revises: 20261018_add_question_keyset_indexes
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261018_add_question_search_index'
+down_revision = '20261018_add_question_keyset_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 索引内容由应用写入（切词在 Python 中完成）；表为空时应用启动会全量构建
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute(
+            """
+            CREATE TABLE IF NOT EXISTS question_search (
+                question_id UUID PRIMARY KEY REFERENCES questions(id) ON DELETE CASCADE,
+                created_by UUID NOT NULL,
+                document TSVECTOR NOT NULL
+            )
+            """
+        )
+        op.execute("CREATE INDEX IF NOT EXISTS ix_question_search_document ON question_search USING GIN (document)")
+        op.execute("CREATE INDEX IF NOT EXISTS ix_question_search_created_by ON question_search (created_by)")
+    else:
+        op.execute(
+            "CREATE TABLE IF NOT EXISTS question_search_rows "
+            "(rowid INTEGER PRIMARY KEY, question_id TEXT NOT NULL UNIQUE)"
+        )
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS question_search USING fts5("
+            "question_id UNINDEXED, created_by, primary_text, secondary_text)"
+        )
+    op.execute(
+        "CREATE TABLE IF NOT EXISTS question_search_meta "
+        "(key VARCHAR(50) PRIMARY KEY, value VARCHAR(200) NOT NULL)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS question_search_meta")
+    op.execute("DROP TABLE IF EXISTS question_search")
+    op.execute("DROP TABLE IF EXISTS question_search_rows")
@@ -16,6 +16,8 @@ from app.schemas.collection import (
     QuestionInCollectionUpdate,
     CollectionStatsResponse
 )
+from app.services.image_derivatives import derivative_urls
+from app.services.question_crops import crop_image_urls
 from app.utils.auth import get_current_user
 
 logger = logging.getLogger(__name__)
@@ -249,6 +251,8 @@ async def get_collection(
         result.questions = [
             {
                 **q.to_dict(),
+                'source_image_derivatives': derivative_urls(q.source_image_path),
+                'crop_image_urls': crop_image_urls(q.question_images),
                 'added_at': added_at.isoformat() if added_at else None,
                 'notes': notes,
                 'mastery_level': mastery_level,
@@ -572,6 +576,8 @@ async def get_collections_with_questions(
             result.questions = [
                 {
                     **q.to_dict(),
+                    'source_image_derivatives': derivative_urls(q.source_image_path),
+                    'crop_image_urls': crop_image_urls(q.question_images),
                     'added_at': added_at.isoformat() if added_at else None,
                     'notes': notes,
                     'mastery_level': mastery_level,
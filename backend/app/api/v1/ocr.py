@@ -1,16 +1,23 @@
 """
 OCR相关API端点
 """
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
-from typing import List, Dict, Optional
+from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import AsyncIterator, Callable, Iterator, List, Dict, Optional
+import asyncio
+import json
 import os
+import threading
+import time
 import uuid
-import aiofiles
-from pathlib import Path
 import logging
 
-from app.services.qwen_ocr import get_ocr_service
+from app.services.ocr_backends import OCRBackend, UnknownOCRBackendError, available_ocr_backends, get_ocr_backend
+from app.services.ocr_cache import get_ocr_cache
+from app.services.ocr_hedging import backend_health_stats
+from app.services.rate_limiter import get_model_rate_limiter
+from app.services.upload_registry import UploadStorageFullError, get_upload_registry
+from app.services.upload_sink import SavedUpload, UploadRejectedError, save_upload
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -29,65 +36,53 @@ SUPPORTED_IMAGE_TYPES = {
 # 最大文件大小 (10MB)
 MAX_FILE_SIZE = 10 * 1024 * 1024
 
+
+def get_max_batch_files() -> int:
+    """单次批量上传的文件数上限，随OCR并发度伸缩"""
+    return settings.OCR_BATCH_CONCURRENCY * settings.OCR_BATCH_FILES_PER_SLOT
+
+def _get_ocr_backend(name: Optional[str]) -> OCRBackend:
+    """按请求参数选择识别后端，未知后端返回 400"""
+    try:
+        return get_ocr_backend(name)
+    except UnknownOCRBackendError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.post("/upload", summary="上传图片进行OCR识别")
 async def upload_image_for_ocr(
     background_tasks: BackgroundTasks,
-    file: UploadFile = File(..., description="上传的图片文件")
+    file: UploadFile = File(..., description="上传的图片文件"),
+    backend: Optional[str] = Query(None, description="题目识别后端: qwen / paddle / replay / hedged，默认使用服务端配置")
 ):
     """
     上传图片文件,进行OCR文字识别和题目解析
     
     Args:
         file: 上传的图片文件
+        backend: 题目识别后端，默认使用 OCR_BACKEND 配置
         
     Returns:
         OCR识别结果,包括识别的题目信息
     """
     try:
-        # 验证文件类型
-        if file.content_type not in SUPPORTED_IMAGE_TYPES:
-            raise HTTPException(
-                status_code=400,
-                detail=f"不支持的文件类型: {file.content_type}。支持的格式: {', '.join(SUPPORTED_IMAGE_TYPES)}"
-            )
-        
-        # 验证文件大小
-        file_content = await file.read()
-        if len(file_content) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"文件大小超过限制 ({MAX_FILE_SIZE // (1024*1024)}MB)"
-            )
-        
-        # 生成唯一文件名
-        file_id = str(uuid.uuid4())
-        file_extension = Path(file.filename).suffix or '.jpg'
-        filename = f"{file_id}{file_extension}"
+        ocr_service = _get_ocr_backend(backend)
         
-        # 确保上传目录存在
-        upload_dir = Path("data/uploads/ocr")
-        upload_dir.mkdir(parents=True, exist_ok=True)
-        
-        # 保存文件
-        file_path = upload_dir / filename
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(file_content)
-        
-        logger.info(f"File saved: {file_path}")
+        # 分块保存文件，按文件头验证类型、超过大小限制立即中止
+        upload = await _save_ocr_upload(file)
         
         # 添加后台任务：处理完成后清理临时文件
-        background_tasks.add_task(cleanup_temp_file, file_path)
+        background_tasks.add_task(cleanup_ocr_upload, upload.file_id)
         
-        # 进行OCR识别
-        ocr_service = get_ocr_service()
-        questions = ocr_service.extract_questions(str(file_path))
+        # 进行OCR识别（规范化和模型调用均为阻塞操作，放到线程中执行）
+        questions = await asyncio.to_thread(ocr_service.extract_questions, upload.path)
         
         return {
             "success": True,
             "message": "OCR识别完成",
             "data": {
-                "file_id": file_id,
+                "file_id": upload.file_id,
                 "filename": file.filename,
+                "sha256": upload.sha256,
                 "questions": questions,
                 "total_questions": len(questions)
             }
@@ -102,72 +97,152 @@ async def upload_image_for_ocr(
             detail=f"OCR处理失败: {str(e)}"
         )
 
+@router.post("/upload/stream", summary="上传图片并流式返回识别出的题目")
+async def stream_upload_image_for_ocr(
+    file: UploadFile = File(..., description="上传的图片文件"),
+    stream_format: str = Query("sse", alias="format", pattern="^(sse|ndjson)$", description="输出格式: sse 或 ndjson"),
+    backend: Optional[str] = Query(None, description="题目识别后端: qwen / paddle / replay / hedged，默认使用服务端配置")
+):
+    """
+    上传单张图片，模型每生成完一道题就推送一道，无需等待整页识别完成
+    
+    事件依次为: start（文件信息）、question（每道题一条）、done（汇总，含首题耗时）；
+    识别失败时推送 error。客户端断开后停止读取模型输出并关闭模型流。
+    
+    Args:
+        file: 上传的图片文件
+        stream_format: sse (text/event-stream) 或 ndjson (application/x-ndjson)
+        backend: 题目识别后端，默认使用 OCR_BACKEND 配置
+        
+    Returns:
+        流式响应
+    """
+    ocr_service = _get_ocr_backend(backend)
+    upload = await _save_ocr_upload(file)
+    file_id, file_path = upload.file_id, upload.path
+    
+    async def event_stream() -> AsyncIterator[str]:
+        started = time.perf_counter()
+        first_question_ms = None
+        total_questions = 0
+        try:
+            yield _format_stream_event("start", {"file_id": file_id, "filename": file.filename}, stream_format)
+            async for question in _iterate_in_thread(lambda: ocr_service.extract_questions_stream(file_path)):
+                elapsed_ms = int((time.perf_counter() - started) * 1000)
+                if first_question_ms is None:
+                    first_question_ms = elapsed_ms
+                yield _format_stream_event("question", {
+                    "index": total_questions,
+                    "question": question,
+                    "elapsed_ms": elapsed_ms
+                }, stream_format)
+                total_questions += 1
+            yield _format_stream_event("done", {
+                "file_id": file_id,
+                "total_questions": total_questions,
+                "first_question_ms": first_question_ms,
+                "elapsed_ms": int((time.perf_counter() - started) * 1000)
+            }, stream_format)
+        except Exception as e:
+            logger.error(f"Streaming OCR failed for {file.filename}: {e}")
+            yield _format_stream_event("error", {"file_id": file_id, "error": f"OCR处理失败: {str(e)}"}, stream_format)
+        finally:
+            await cleanup_ocr_upload(file_id)
+    
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        event_stream(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _iterate_in_thread(make_iterator: Callable[[], Iterator]) -> AsyncIterator:
+    """
+    在工作线程中消费阻塞的迭代器，逐项转交给事件循环
+    
+    异步迭代提前结束（如客户端断开）时通知工作线程停止，并关闭底层迭代器。
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    
+    def produce():
+        iterator = make_iterator()
+        try:
+            for item in iterator:
+                loop.call_soon_threadsafe(queue.put_nowait, ("item", item))
+                if stop.is_set():
+                    break
+            loop.call_soon_threadsafe(queue.put_nowait, ("end", None))
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, ("error", e))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+    
+    loop.run_in_executor(None, produce)
+    try:
+        while True:
+            kind, value = await queue.get()
+            if kind == "end":
+                break
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        stop.set()
+
 @router.post("/batch-upload", summary="批量上传图片进行OCR识别")
 async def batch_upload_images_for_ocr(
     background_tasks: BackgroundTasks,
-    files: List[UploadFile] = File(..., description="上传的图片文件列表")
+    files: List[UploadFile] = File(..., description="上传的图片文件列表"),
+    backend: Optional[str] = Query(None, description="题目识别后端: qwen / paddle / replay / hedged，默认使用服务端配置")
 ):
     """
     批量上传图片文件,进行OCR文字识别和题目解析
     
     Args:
         files: 上传的图片文件列表
+        backend: 题目识别后端，默认使用 OCR_BACKEND 配置
         
     Returns:
         所有图片的OCR识别结果
     """
     try:
-        if len(files) > 10:  # 限制最多10个文件
+        ocr_service = _get_ocr_backend(backend)
+        max_files = get_max_batch_files()
+        if len(files) > max_files:
             raise HTTPException(
                 status_code=400,
-                detail="批量上传最多支持10个文件"
+                detail=f"批量上传最多支持{max_files}个文件"
             )
         
         results = []
-        file_paths = []
+        file_ids = []
         
         for file in files:
-            # 验证文件类型
-            if file.content_type not in SUPPORTED_IMAGE_TYPES:
-                results.append({
-                    "filename": file.filename,
-                    "success": False,
-                    "error": f"不支持的文件类型: {file.content_type}"
-                })
-                continue
-            
-            # 验证文件大小
-            file_content = await file.read()
-            if len(file_content) > MAX_FILE_SIZE:
+            # 分块保存文件，类型不受支持或超过大小限制的文件记为失败
+            try:
+                upload = await _store_ocr_upload(file)
+            except UploadRejectedError as e:
                 results.append({
                     "filename": file.filename,
                     "success": False,
-                    "error": f"文件大小超过限制"
+                    "error": str(e)
                 })
                 continue
             
-            # 保存文件
-            file_id = str(uuid.uuid4())
-            file_extension = Path(file.filename).suffix or '.jpg'
-            filename = f"{file_id}{file_extension}"
-            
-            upload_dir = Path("data/uploads/ocr")
-            upload_dir.mkdir(parents=True, exist_ok=True)
-            
-            file_path = upload_dir / filename
-            async with aiofiles.open(file_path, 'wb') as f:
-                await f.write(file_content)
-            
-            file_paths.append(str(file_path))
+            file_ids.append(upload.file_id)
             
             # 进行OCR识别
             try:
-                ocr_service = get_ocr_service()
-                questions = ocr_service.extract_questions(str(file_path))
+                questions = await asyncio.to_thread(ocr_service.extract_questions, upload.path)
                 
                 results.append({
                     "filename": file.filename,
-                    "file_id": file_id,
+                    "file_id": upload.file_id,
+                    "sha256": upload.sha256,
                     "success": True,
                     "questions": questions,
                     "total_questions": len(questions)
@@ -182,8 +257,8 @@ async def batch_upload_images_for_ocr(
                 })
         
         # 添加清理任务
-        for file_path in file_paths:
-            background_tasks.add_task(cleanup_temp_file, file_path)
+        for file_id in file_ids:
+            background_tasks.add_task(cleanup_ocr_upload, file_id)
         
         # 统计结果
         successful_files = sum(1 for r in results if r["success"])
@@ -209,41 +284,182 @@ async def batch_upload_images_for_ocr(
             detail=f"批量OCR处理失败: {str(e)}"
         )
 
+@router.post("/batch-upload/stream", summary="批量上传图片并流式返回OCR结果")
+async def stream_batch_upload_images_for_ocr(
+    files: List[UploadFile] = File(..., description="上传的图片文件列表"),
+    stream_format: str = Query("sse", alias="format", pattern="^(sse|ndjson)$", description="输出格式: sse 或 ndjson"),
+    backend: Optional[str] = Query(None, description="题目识别后端: qwen / paddle / replay / hedged，默认使用服务端配置")
+):
+    """
+    批量上传图片文件，每个文件保存后立即开始OCR，按完成顺序流式推送结果
+    
+    同时进行OCR的文件数由 OCR_BATCH_CONCURRENCY 控制，其余文件排队等待。
+    事件依次为: start（文件总数）、result（每个文件一条，按完成顺序）、done（汇总）。
+    
+    Args:
+        files: 上传的图片文件列表
+        stream_format: sse (text/event-stream) 或 ndjson (application/x-ndjson)
+        backend: 题目识别后端，默认使用 OCR_BACKEND 配置
+        
+    Returns:
+        流式响应
+    """
+    ocr_service = _get_ocr_backend(backend)
+    max_files = get_max_batch_files()
+    if len(files) > max_files:
+        raise HTTPException(
+            status_code=400,
+            detail=f"批量上传最多支持{max_files}个文件"
+        )
+    
+    results: asyncio.Queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(settings.OCR_BATCH_CONCURRENCY)
+    tasks: List[asyncio.Task] = []
+    
+    for index, file in enumerate(files):
+        try:
+            upload = await _store_ocr_upload(file)
+        except UploadRejectedError as e:
+            results.put_nowait({
+                "index": index,
+                "filename": file.filename,
+                "success": False,
+                "error": str(e)
+            })
+            continue
+        
+        # 文件保存后立即开始OCR，不等待其余文件
+        tasks.append(asyncio.create_task(
+            _ocr_file_to_queue(ocr_service, index, file.filename, upload.file_id, upload.path, semaphore, results)
+        ))
+    
+    async def event_stream() -> AsyncIterator[str]:
+        successful_files = 0
+        total_questions = 0
+        try:
+            yield _format_stream_event("start", {"total_files": len(files)}, stream_format)
+            for _ in range(len(files)):
+                result = await results.get()
+                if result["success"]:
+                    successful_files += 1
+                    total_questions += result["total_questions"]
+                yield _format_stream_event("result", result, stream_format)
+            yield _format_stream_event("done", {
+                "total_files": len(files),
+                "successful_files": successful_files,
+                "total_questions": total_questions
+            }, stream_format)
+        finally:
+            # 客户端断开时取消尚未完成的OCR任务
+            for task in tasks:
+                task.cancel()
+    
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        event_stream(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _store_ocr_upload(file: UploadFile) -> SavedUpload:
+    """
+    分块保存上传的图片到 file_id 对应的分片目录并登记
+    
+    Raises:
+        UploadRejectedError: 类型不受支持、超过大小限制或临时存储已满
+    """
+    registry = get_upload_registry()
+    file_id = str(uuid.uuid4())
+    upload = await save_upload(
+        file, registry.shard_dir(file_id), MAX_FILE_SIZE, SUPPORTED_IMAGE_TYPES, file_id=file_id
+    )
+    await asyncio.to_thread(registry.register, upload)
+    return upload
+
+async def _save_ocr_upload(file: UploadFile) -> SavedUpload:
+    """保存并登记上传的图片；类型不受支持或超过大小限制时返回 400，临时存储已满时返回 503"""
+    try:
+        return await _store_ocr_upload(file)
+    except UploadStorageFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def _ocr_file_to_queue(
+    ocr_service: OCRBackend,
+    index: int,
+    filename: str,
+    file_id: str,
+    file_path: str,
+    semaphore: asyncio.Semaphore,
+    results: asyncio.Queue
+):
+    """在并发槽位内对单个文件进行OCR，结果放入队列；结束后清理临时文件"""
+    try:
+        async with semaphore:
+            started = time.perf_counter()
+            questions = await asyncio.to_thread(ocr_service.extract_questions, file_path)
+        await results.put({
+            "index": index,
+            "filename": filename,
+            "file_id": file_id,
+            "success": True,
+            "questions": questions,
+            "total_questions": len(questions),
+            "elapsed_ms": int((time.perf_counter() - started) * 1000)
+        })
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"OCR failed for {filename}: {e}")
+        await results.put({
+            "index": index,
+            "filename": filename,
+            "file_id": file_id,
+            "success": False,
+            "error": f"OCR处理失败: {str(e)}"
+        })
+    finally:
+        await cleanup_ocr_upload(file_id)
+
+def _format_stream_event(event: str, data: Dict, stream_format: str) -> str:
+    """编码为 SSE 事件或 NDJSON 行"""
+    if stream_format == "ndjson":
+        return json.dumps({"event": event, **data}, ensure_ascii=False) + "\n"
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @router.get("/text-extract/{file_id}", summary="提取图片文字内容")
 async def extract_text_from_image(
     file_id: str,
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    backend: Optional[str] = Query(None, description="题目识别后端: qwen / paddle / replay / hedged，默认使用服务端配置")
 ):
     """
     从已上传的图片中提取纯文字内容（不进行题目解析）
     
     Args:
         file_id: 文件ID
+        backend: 题目识别后端，默认使用 OCR_BACKEND 配置
         
     Returns:
         提取的文字内容
     """
     try:
-        # 查找文件
-        upload_dir = Path("data/uploads/ocr")
-        file_path = None
-        
-        for file in upload_dir.glob(f"{file_id}.*"):
-            file_path = file
-            break
+        ocr_service = _get_ocr_backend(backend)
         
-        if not file_path or not file_path.exists():
+        # 按 file_id 查找登记的上传文件
+        entry = await asyncio.to_thread(get_upload_registry().get, file_id)
+        if entry is None:
             raise HTTPException(
                 status_code=404,
                 detail="文件不存在"
             )
         
         # 进行文字提取
-        ocr_service = get_ocr_service()
-        text_results = ocr_service.extract_text_from_image(str(file_path))
+        text_results = await asyncio.to_thread(ocr_service.extract_text_from_image, entry["path"])
         
         # 添加清理任务
-        background_tasks.add_task(cleanup_temp_file, str(file_path))
+        background_tasks.add_task(cleanup_ocr_upload, file_id)
         
         return {
             "success": True,
@@ -279,21 +495,87 @@ async def get_supported_formats():
             "supported_types": list(SUPPORTED_IMAGE_TYPES),
             "max_file_size": MAX_FILE_SIZE,
             "max_file_size_mb": MAX_FILE_SIZE // (1024 * 1024),
-            "max_batch_files": 10
+            "max_batch_files": get_max_batch_files(),
+            "batch_concurrency": settings.OCR_BATCH_CONCURRENCY,
+            "ocr_backends": available_ocr_backends(),
+            "default_ocr_backend": settings.OCR_BACKEND
         }
     }
 
-async def cleanup_temp_file(file_path: str):
+@router.get("/cache/stats", summary="获取OCR结果缓存统计")
+async def get_ocr_cache_stats():
+    """
+    获取OCR结果缓存的命中/未命中计数和占用情况
+    
+    Returns:
+        缓存统计信息
+    """
+    return {
+        "success": True,
+        "data": {
+            "enabled": settings.OCR_CACHE_ENABLED,
+            **get_ocr_cache().stats(),
+        }
+    }
+
+
+@router.get("/rate-limit/stats", summary="获取模型调用限流统计")
+async def get_rate_limit_stats():
     """
-    清理临时文件
+    获取模型调用的限流状态：当前并发上限、在途调用、排队耗时、重试和限流次数
+    
+    Returns:
+        限流统计信息（所有 worker 进程共享）
+    """
+    if not settings.OCR_RATE_LIMIT_ENABLED:
+        return {"success": True, "data": {"enabled": False}}
+    return {
+        "success": True,
+        "data": {
+            "enabled": True,
+            **get_model_rate_limiter().stats(),
+        }
+    }
+
+
+@router.get("/backends/stats", summary="获取OCR后端延迟与熔断状态")
+async def get_ocr_backend_stats():
+    """
+    获取各识别后端的延迟分位数（p50/p95/p99）、熔断状态和对冲计数
+    
+    Returns:
+        后端健康统计（当前进程）
+    """
+    return {
+        "success": True,
+        "data": {
+            "default_backend": settings.OCR_BACKEND,
+            **backend_health_stats(),
+        }
+    }
+
+@router.get("/uploads/stats", summary="获取OCR上传临时文件统计")
+async def get_ocr_upload_stats():
+    """
+    获取OCR上传临时文件的数量、占用字节数以及清扫回收计数
+    
+    Returns:
+        临时文件统计信息
+    """
+    return {
+        "success": True,
+        "data": await asyncio.to_thread(get_upload_registry().stats)
+    }
+
+async def cleanup_ocr_upload(file_id: str):
+    """
+    清理OCR上传的临时文件及其登记（失败时由清扫线程在过期后回收）
     
     Args:
-        file_path: 文件路径
+        file_id: 文件ID
     """
     try:
-        path = Path(file_path)
-        if path.exists():
-            path.unlink()
-            logger.info(f"Cleaned up temporary file: {file_path}")
+        await asyncio.to_thread(get_upload_registry().release, file_id)
+        logger.info(f"Cleaned up temporary upload: {file_id}")
     except Exception as e:
-        logger.warning(f"Failed to cleanup file {file_path}: {e}")
+        logger.warning(f"Failed to cleanup upload {file_id}: {e}")
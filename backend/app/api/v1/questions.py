@@ -1,22 +1,40 @@
 """
 题目相关的API路由
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
+import asyncio
 import logging
+import mimetypes
 import os
-import uuid
 from datetime import datetime
 
+from app.config import settings
 from app.database import get_db
+from app.services.blob_store import (
+    BlobNotFoundError,
+    get_blob_store,
+    parse_blob_ref,
+    to_blob_ref,
+    validate_blob_key,
+)
+from app.services.image_derivatives import ORIGINAL_RENDITION, get_image_derivative_service
+from app.services.docx_parser import is_docx_file
+from app.services.ocr_backends import UnknownOCRBackendError, resolve_ocr_backend_name
 from app.services.ocr_integration import get_ocr_integration_service
+from app.services.pagination import InvalidCursorError, Page
 from app.services.question_service import get_question_service
+from app.services.ingest_jobs import get_ingest_job_service, get_ingest_worker_pool
+from app.services.upload_sink import UploadRejectedError, save_upload
 from app.schemas.question import (
     QuestionResponse, QuestionUpdate, QuestionSearchRequest, QuestionListResponse,
-    DocumentResponse, OCRProcessRequest, OCRProcessResponse,
+    DocumentResponse, DocumentProgressResponse, OCRProcessRequest, OCRProcessResponse,
         ProcessingStatistics, QuestionVerificationRequest, APIResponse,
-        QuestionBulkCreateRequest, QuestionBulkCreateResponse, QuestionCreate
+        QuestionBulkCreateRequest, QuestionBulkCreateResponse, QuestionCreate,
+        DuplicateClusterResponse, DuplicateClusterListResponse,
+        QuestionBulkPatchRequest, QuestionBulkPatchResponse
 )
 from app.utils.auth import get_current_user
 from app.models.user import User
@@ -28,17 +46,73 @@ logger = logging.getLogger(__name__)
 router = APIRouter(tags=["questions"])
 
 
+def _enqueue_document_job(
+    db: Session,
+    image_paths: List[str],
+    document_title: str,
+    filename: str,
+    uploaded_by: str,
+    file_path: str = None,
+    file_url: str = None,
+    file_size: int = None,
+    file_type: str = None,
+    max_concurrency: int = None,
+    document_path: str = None,
+    ocr_backend: str = None,
+) -> OCRProcessResponse:
+    """创建文档和异步导入任务，由后台worker处理OCR"""
+    question_service = get_question_service(db)
+    document = question_service.create_document(
+        title=document_title,
+        filename=filename,
+        file_path=file_path,
+        file_url=file_url,
+        file_size=file_size,
+        file_type=file_type,
+        uploaded_by=uploaded_by,
+    )
+    job = get_ingest_job_service(db).enqueue(
+        document_id=str(document.id),
+        image_paths=image_paths,
+        created_by=uploaded_by,
+        max_concurrency=max_concurrency,
+        document_path=document_path,
+        ocr_backend=ocr_backend,
+    )
+    get_ingest_worker_pool().notify()
+
+    return OCRProcessResponse(
+        success=True,
+        document_id=str(document.id),
+        job_id=str(job.id),
+        status_url=f"/api/v1/questions/document/{document.id}/status",
+        message="Document accepted for processing",
+    )
+
+
+def _resolve_ocr_backend(name: Optional[str]) -> str:
+    """校验请求指定的识别后端，未知后端返回 400"""
+    try:
+        return resolve_ocr_backend_name(name)
+    except UnknownOCRBackendError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
 @router.post("/process-ocr", response_model=OCRProcessResponse)
 async def process_ocr_document(
     request: OCRProcessRequest,
+    response: Response,
+    async_mode: bool = Query(False, description="异步模式：立即返回202和文档ID，后台处理OCR"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     处理OCR文档 - 识别图片中的题目并保存到数据库
+
+    async_mode=true 时立即返回 202，通过 /document/{document_id}/status 查询进度
     """
     try:
-        ocr_service = get_ocr_integration_service(db)
+        ocr_backend = _resolve_ocr_backend(request.ocr_backend)
         
         # 验证图片文件是否存在
         existing_image_paths = []
@@ -54,7 +128,24 @@ async def process_ocr_document(
                 detail="No valid image files found"
             )
         
+        if async_mode:
+            response.status_code = status.HTTP_202_ACCEPTED
+            return _enqueue_document_job(
+                db,
+                image_paths=existing_image_paths,
+                document_title=request.document_title,
+                filename=request.filename,
+                uploaded_by=str(current_user.id),
+                file_path=request.file_path,
+                file_url=request.file_url,
+                file_size=request.file_size,
+                file_type=request.file_type,
+                max_concurrency=request.max_concurrency,
+                ocr_backend=ocr_backend,
+            )
+        
         # 处理文档
+        ocr_service = get_ocr_integration_service(db, ocr_backend=ocr_backend)
         result = ocr_service.process_document_images(
             image_paths=existing_image_paths,
             document_title=request.document_title,
@@ -63,7 +154,8 @@ async def process_ocr_document(
             file_path=request.file_path,
             file_url=request.file_url,
             file_size=request.file_size,
-            file_type=request.file_type
+            file_type=request.file_type,
+            max_concurrency=request.max_concurrency
         )
         
         return OCRProcessResponse(**result)
@@ -80,43 +172,64 @@ async def process_ocr_document(
 
 @router.post("/upload-and-process", response_model=OCRProcessResponse)
 async def upload_and_process(
+    response: Response,
     title: str = Form(...),
     file: UploadFile = File(...),
+    async_mode: bool = Query(False, description="异步模式：立即返回202和文档ID，后台处理OCR"),
+    backend: Optional[str] = Query(None, description="题目识别后端: qwen / paddle / replay / hedged，默认使用服务端配置"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     上传文件并处理OCR - 一体化的文件上传和OCR处理接口
+
+    async_mode=true 时立即返回 202，通过 /document/{document_id}/status 查询进度
     """
     try:
-        # 创建上传目录
-        upload_dir = "data/uploads"
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # 生成唯一文件名
-        file_extension = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = os.path.join(upload_dir, unique_filename)
-        
-        # 保存文件
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # TODO: 根据文件类型处理（PDF转图片等）
-        # 目前假设上传的是图片文件
-        image_paths = [file_path]
+        ocr_backend = _resolve_ocr_backend(backend)
+        
+        # 分块保存文件（内存占用与文件大小无关），超过 MAX_UPLOAD_SIZE 立即中止
+        try:
+            upload = await save_upload(file, "data/uploads", settings.MAX_UPLOAD_SIZE)
+        except UploadRejectedError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        # 存入内容寻址存储（相同内容只存一份），文档记录保存 blob 引用而不是本节点的路径
+        blob_key = get_blob_store().put_file(upload.path, sha256=upload.sha256, move=True)
+        file_path = to_blob_ref(blob_key)
+        # 按文件头识别的类型优先于客户端声明的类型
+        file_type = upload.content_type or file.content_type
+        
+        # PDF 按页处理（文本层页本地切分，扫描页栅格化后OCR），Word 本地解析；其他文件视为图片
+        is_pdf = file_path.lower().endswith(".pdf") or file_type == "application/pdf"
+        document_path = file_path if is_pdf or is_docx_file(file_path) else None
+        image_paths = [] if document_path else [file_path]
+        
+        if async_mode:
+            response.status_code = status.HTTP_202_ACCEPTED
+            return _enqueue_document_job(
+                db,
+                image_paths=image_paths,
+                document_title=title,
+                filename=file.filename,
+                uploaded_by=str(current_user.id),
+                file_path=file_path,
+                file_size=upload.size,
+                file_type=file_type,
+                document_path=document_path,
+                ocr_backend=ocr_backend,
+            )
         
         # 处理OCR
-        ocr_service = get_ocr_integration_service(db)
+        ocr_service = get_ocr_integration_service(db, ocr_backend=ocr_backend)
         result = ocr_service.process_document_images(
             image_paths=image_paths,
             document_title=title,
             filename=file.filename,
             uploaded_by=str(current_user.id),
             file_path=file_path,
-            file_size=len(content),
-            file_type=file.content_type
+            file_size=upload.size,
+            file_type=file_type,
+            document_path=document_path
         )
         
         return OCRProcessResponse(**result)
@@ -131,37 +244,54 @@ async def upload_and_process(
         )
 
 
+def _question_list_response(page: Page, skip: int, limit: int) -> QuestionListResponse:
+    """分页结果 -> 列表响应"""
+    questions = [QuestionResponse.from_orm(q) for q in page.items]
+    for question in questions:
+        hit = page.hits.get(question.id)
+        if hit is not None:
+            question.score = hit.score
+            question.snippet = hit.snippet
+    return QuestionListResponse(
+        questions=questions,
+        total=page.total,
+        skip=skip,
+        limit=limit,
+        next_cursor=page.next_cursor,
+        has_more=page.next_cursor is not None,
+    )
+
+
+def _invalid_cursor(e: InvalidCursorError) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
 @router.get("/document/{document_id}/questions", response_model=QuestionListResponse)
 async def get_questions_by_document(
     document_id: str,
     skip: int = 0,
     limit: int = 50,
     question_type: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor（游标分页，传入时忽略 skip）"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    根据文档ID获取题目列表
+    根据文档ID获取题目列表（按创建时间倒序，游标分页）
     """
     try:
         question_service = get_question_service(db)
-        questions = question_service.get_questions_by_document(
+        page = question_service.get_questions_by_document(
             document_id=document_id,
             skip=skip,
             limit=limit,
-            question_type=question_type
-        )
-        
-        # 获取总数
-        total_questions = len(questions)
-        
-        return QuestionListResponse(
-            questions=[QuestionResponse.from_orm(q) for q in questions],
-            total=total_questions,
-            skip=skip,
-            limit=limit
+            question_type=question_type,
+            cursor=cursor,
         )
+        return _question_list_response(page, skip, limit)
         
+    except InvalidCursorError as e:
+        raise _invalid_cursor(e)
     except Exception as e:
         logger.error(f"Failed to get questions by document: {e}")
         raise HTTPException(
@@ -170,34 +300,135 @@ async def get_questions_by_document(
         )
 
 
-@router.get("/{question_id}", response_model=QuestionResponse)
-async def get_question(
+def _legacy_local_file(path: Optional[str]) -> Optional[str]:
+    """
+    旧数据中的本地路径 -> 可读取的文件路径
+
+    Document.file_path 等字段可能直接来自客户端请求，只有解析（包括符号链接）后位于
+    LEGACY_FILE_ROOT 内的已有文件才允许读取，其余返回 None。
+    """
+    if not path:
+        return None
+    root = os.path.realpath(settings.LEGACY_FILE_ROOT)
+    real_path = os.path.realpath(path)
+    if os.path.commonpath([root, real_path]) != root or not os.path.isfile(real_path):
+        return None
+    return real_path
+
+
+def _stream_stored_file(path_or_ref: Optional[str], media_type: Optional[str] = None) -> Response:
+    """按块返回 blob 引用对应的文件；旧数据中的本地路径只在位于上传根目录内时返回"""
+    try:
+        key = parse_blob_ref(path_or_ref)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    media_type = media_type or mimetypes.guess_type(key or path_or_ref or "")[0] or "application/octet-stream"
+    if key:
+        store = get_blob_store()
+        if not store.exists(key):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+        return StreamingResponse(store.iter_chunks(key), media_type=media_type)
+    local_path = _legacy_local_file(path_or_ref)
+    if local_path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    return FileResponse(local_path, media_type=media_type)
+
+
+@router.get("/images/{source_key}/{rendition}")
+async def get_question_image(
+    source_key: str,
+    rendition: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    获取题目源图的原图或 WebP 衍生版本（thumb / medium，尚未生成时当场生成）
+    """
+    try:
+        validate_blob_key(source_key)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    if rendition == ORIGINAL_RENDITION:
+        return _stream_stored_file(to_blob_ref(source_key))
+    try:
+        derivative_key = await asyncio.to_thread(get_image_derivative_service().get, source_key, rendition)
+    except BlobNotFoundError:
+        derivative_key = None
+    if not derivative_key:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    response = _stream_stored_file(to_blob_ref(derivative_key), "image/webp")
+    # 同一地址的内容只在尺寸配置变更时变化
+    response.headers["Cache-Control"] = "private, max-age=86400"
+    return response
+
+
+@router.get("/{question_id}/source-image")
+async def get_question_source_image(
     question_id: str,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    根据ID获取题目详情
+    获取题目的源图（流式返回）
+    """
+    question = get_question_service(db).get_question_by_id(question_id)
+    if not question:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Question not found")
+    return _stream_stored_file(question.source_image_path)
+
+
+@router.get("/document/{document_id}/file")
+async def get_document_file(
+    document_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
     """
+    下载文档原文件（流式返回）
+    """
+    document = get_question_service(db).get_document_by_id(document_id)
+    if not document:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+    return _stream_stored_file(document.file_path, document.file_type)
+
+
+@router.patch("/bulk", response_model=QuestionBulkPatchResponse)
+async def bulk_patch_questions(
+    patch_request: QuestionBulkPatchRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    批量修改题目元数据（学科、难度、知识点标签、题型、验证状态）
+
+    修改内容相同的题目合并为一条 UPDATE，全部修改在一个事务内完成；只修改当前用户的题目。
+    """
+    patches = []
+    if patch_request.patch is not None and patch_request.question_ids:
+        patches.append((patch_request.question_ids, patch_request.patch.dict(exclude_unset=True)))
+    for item in patch_request.items:
+        patches.append(([item.id], item.dict(exclude_unset=True, exclude={"id"})))
+    if not patches:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Either question_ids with patch, or items, must be provided"
+        )
+
     try:
         question_service = get_question_service(db)
-        question = question_service.get_question_by_id(question_id)
-        
-        if not question:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Question not found"
-            )
-        
-        return QuestionResponse.from_orm(question)
-        
-    except HTTPException:
-        raise
+        result = question_service.bulk_patch_questions(str(current_user.id), patches)
+        return QuestionBulkPatchResponse(
+            success=True,
+            updated_count=len(result["question_ids"]),
+            question_ids=result["question_ids"],
+            not_found=result["not_found"],
+            message=f"Updated {len(result['question_ids'])} questions"
+        )
+
     except Exception as e:
-        logger.error(f"Failed to get question: {e}")
+        logger.error(f"Failed to bulk patch questions: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to get question: {str(e)}"
+            detail=f"Failed to bulk patch questions: {str(e)}"
         )
 
 
@@ -281,24 +512,19 @@ async def search_questions(
     """
     try:
         question_service = get_question_service(db)
-        questions = question_service.search_questions(
+        page = question_service.search_questions(
             keyword=search_request.keyword,
             skip=search_request.skip,
             limit=search_request.limit,
             question_type=search_request.question_type,
-            subject=search_request.subject
-        )
-        
-        # 获取总数（简化版本，实际应该用COUNT查询）
-        total_questions = len(questions)
-        
-        return QuestionListResponse(
-            questions=[QuestionResponse.from_orm(q) for q in questions],
-            total=total_questions,
-            skip=search_request.skip,
-            limit=search_request.limit
+            subject=search_request.subject,
+            cursor=search_request.cursor,
+            created_by=str(current_user.id),
         )
+        return _question_list_response(page, search_request.skip, search_request.limit)
         
+    except InvalidCursorError as e:
+        raise _invalid_cursor(e)
     except Exception as e:
         logger.error(f"Failed to search questions: {e}")
         raise HTTPException(
@@ -307,6 +533,40 @@ async def search_questions(
         )
 
 
+@router.get("/duplicates", response_model=DuplicateClusterListResponse)
+async def get_duplicate_clusters(
+    skip: int = Query(0, ge=0, description="跳过的簇数"),
+    limit: int = Query(20, ge=1, le=100, description="返回的簇数"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    获取当前用户的近似重复题簇（导入时检测），用于批量清理
+    """
+    try:
+        question_service = get_question_service(db)
+        result = question_service.get_duplicate_clusters(str(current_user.id), skip=skip, limit=limit)
+        return DuplicateClusterListResponse(
+            clusters=[
+                DuplicateClusterResponse(
+                    canonical=QuestionResponse.from_orm(cluster["canonical"]),
+                    duplicates=[QuestionResponse.from_orm(q) for q in cluster["duplicates"]],
+                )
+                for cluster in result["clusters"]
+            ],
+            total=result["total"],
+            skip=skip,
+            limit=limit,
+        )
+
+    except Exception as e:
+        logger.error(f"Failed to get duplicate clusters: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get duplicate clusters: {str(e)}"
+        )
+
+
 @router.post("/verify", response_model=APIResponse)
 async def verify_question(
     verification_request: QuestionVerificationRequest,
@@ -389,6 +649,37 @@ async def get_document_statistics(
             detail=f"Failed to get statistics: {str(e)}"
         )
 
+@router.get("/document/{document_id}/status", response_model=DocumentProgressResponse)
+async def get_document_status(
+    document_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    获取文档处理进度（异步导入轮询用）: 状态、已完成页数、题目数和预计剩余时间
+    """
+    try:
+        question_service = get_question_service(db)
+        document = question_service.get_document_by_id(document_id)
+        
+        if not document or document.uploaded_by != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Document not found"
+            )
+        
+        progress = get_ingest_job_service(db).get_document_progress(document)
+        return DocumentProgressResponse(**progress)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to get document status: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get document status: {str(e)}"
+        )
+
 @router.post("/bulk-create", response_model=QuestionBulkCreateResponse)
 async def bulk_create_questions(
     request: QuestionBulkCreateRequest,
@@ -432,17 +723,20 @@ async def bulk_create_questions(
         created_questions = question_service.create_questions_from_ocr(
             ocr_questions=ocr_style_questions,
             document_id=str(document.id) if document else None,
-            created_by=str(current_user.id)
+            created_by=str(current_user.id),
+            commit=False,
         )
 
-        # 更新文档状态
+        # 更新文档状态（与题目写入在同一事务中提交）
         if document:
             question_service.update_document_status(
                 document_id=str(document.id),
                 status='completed',
                 total_questions=len(created_questions),
-                processed_questions=len(created_questions)
+                processed_questions=len(created_questions),
+                commit=False,
             )
+        question_service.commit()
 
         return QuestionBulkCreateResponse(
             success=True,
@@ -468,37 +762,70 @@ async def list_questions(
     skip: int = 0,
     limit: int = 50,
     search: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor（游标分页，传入时忽略 skip）"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Get all questions for the current user (optionally filtered by keyword)."""
+    """Get all questions for the current user, newest first with keyset pagination; with a keyword, ranked full-text matches."""
     try:
         question_service = get_question_service(db)
 
         if search and search.strip():
-            questions = question_service.search_questions(
+            page = question_service.search_questions(
                 keyword=search.strip(),
                 skip=skip,
                 limit=limit,
+                cursor=cursor,
+                created_by=str(current_user.id),
             )
         else:
             # If no search keyword is provided, return latest questions for current user.
-            questions = question_service.get_all_questions(
+            page = question_service.get_all_questions(
                 created_by=str(current_user.id),
                 skip=skip,
                 limit=limit,
+                cursor=cursor,
             )
 
-        return QuestionListResponse(
-            questions=[QuestionResponse.from_orm(q) for q in questions],
-            total=len(questions),
-            skip=skip,
-            limit=limit,
-        )
+        return _question_list_response(page, skip, limit)
 
+    except InvalidCursorError as e:
+        raise _invalid_cursor(e)
     except Exception as e:
         logger.error(f"Failed to list questions: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get questions: {str(e)}",
         )
+
+
+# 放在所有静态 GET 路由（/duplicates、/document/... 等）之后注册，避免被 /{question_id} 抢先匹配
+@router.get("/{question_id}", response_model=QuestionResponse)
+async def get_question(
+    question_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    根据ID获取题目详情
+    """
+    try:
+        question_service = get_question_service(db)
+        question = question_service.get_question_by_id(question_id)
+        
+        if not question:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Question not found"
+            )
+        
+        return QuestionResponse.from_orm(question)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to get question: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get question: {str(e)}"
+        )
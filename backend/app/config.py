@@ -34,6 +34,7 @@ class Settings:
     MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 52428800))  # 50MB
     ALLOWED_EXTENSIONS = set(os.getenv("ALLOWED_EXTENSIONS", ".docx,.pdf,.txt").split(","))
     UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1048576))  # 上传分块落盘的块大小 1MB
 
     # ===== Supabase Configuration (Storage) =====
     SUPABASE_URL = os.getenv("SUPABASE_URL", "https://zjxmeozlbjcirvbrakui.supabase.co")
@@ -49,8 +50,145 @@ class Settings:
     PADDLE_OCR_FILE_TYPE = int(os.getenv("PADDLE_OCR_FILE_TYPE", 1))
     PADDLE_OCR_TIMEOUT = int(os.getenv("PADDLE_OCR_TIMEOUT", 60))
 
+    # 题目识别后端: qwen / paddle / replay / hedged（接口可按请求通过 backend 参数覆盖）
+    OCR_BACKEND = os.getenv("OCR_BACKEND", "qwen")
+
+    # 回放后端（离线压测 / 基准测试）：录制文件目录、合成延迟、缺少录制时的处理方式
+    OCR_REPLAY_DIR = os.getenv("OCR_REPLAY_DIR", "data/replay")
+    OCR_REPLAY_LATENCY_MS = float(os.getenv("OCR_REPLAY_LATENCY_MS", 0))
+    OCR_REPLAY_JITTER_MS = float(os.getenv("OCR_REPLAY_JITTER_MS", 0))
+    OCR_REPLAY_USE_RECORDED_LATENCY = os.getenv("OCR_REPLAY_USE_RECORDED_LATENCY", "False").lower() == "true"
+    OCR_REPLAY_MISSING = os.getenv("OCR_REPLAY_MISSING", "synthetic")  # synthetic / empty / error
+    OCR_REPLAY_SEED = int(os.getenv("OCR_REPLAY_SEED", 0))
+
+    # 对冲组合后端（OCR_BACKEND=hedged）：主后端超过其延迟分位数仍未返回时并发请求备用后端
+    OCR_HEDGE_PRIMARY = os.getenv("OCR_HEDGE_PRIMARY", "qwen")
+    OCR_HEDGE_SECONDARY = os.getenv("OCR_HEDGE_SECONDARY", "paddle")
+    OCR_HEDGE_PERCENTILE = float(os.getenv("OCR_HEDGE_PERCENTILE", 0.95))
+    OCR_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("OCR_HEDGE_MIN_DELAY_SECONDS", 2))
+    OCR_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("OCR_HEDGE_DEFAULT_DELAY_SECONDS", 20))  # 延迟样本不足时
+    OCR_HEDGE_MIN_SAMPLES = int(os.getenv("OCR_HEDGE_MIN_SAMPLES", 20))
+    OCR_HEDGE_TIMEOUT_SECONDS = float(os.getenv("OCR_HEDGE_TIMEOUT_SECONDS", 90))
+    OCR_HEDGE_WORKERS = int(os.getenv("OCR_HEDGE_WORKERS", 16))
+    OCR_LATENCY_WINDOW = int(os.getenv("OCR_LATENCY_WINDOW", 500))  # 每个后端保留的延迟样本数
+    # 熔断：连续失败（含超时）次数阈值，熔断后的冷却时间
+    OCR_BREAKER_FAILURE_THRESHOLD = int(os.getenv("OCR_BREAKER_FAILURE_THRESHOLD", 5))
+    OCR_BREAKER_RESET_SECONDS = float(os.getenv("OCR_BREAKER_RESET_SECONDS", 30))
+
     # Qwen OCR Configuration (Alibaba Cloud DashScope)
     DASHSCOPE_API_KEY = os.getenv("DASHSCOPE_API_KEY", "sk-cf7028f008864ce3b4605704f51f7726")
     QWEN_MODEL = os.getenv("QWEN_MODEL", "qwen-vl-max")
+    # 多页文档合并为一次模型调用的最大页数（共享一份指令；1 表示逐页调用）
+    QWEN_BATCH_PAGES = int(os.getenv("QWEN_BATCH_PAGES", 1))
+
+    # OCR Pipeline
+    # 多页文档同时进行OCR识别的最大页数（1 表示逐页串行处理）
+    OCR_MAX_CONCURRENT_PAGES = int(os.getenv("OCR_MAX_CONCURRENT_PAGES", 4))
+    # 批量上传时同时进行OCR的文件数，以及每个并发槽位允许排队的文件数
+    # 单次批量上传的文件数上限 = OCR_BATCH_CONCURRENCY * OCR_BATCH_FILES_PER_SLOT
+    OCR_BATCH_CONCURRENCY = int(os.getenv("OCR_BATCH_CONCURRENCY", 4))
+    OCR_BATCH_FILES_PER_SLOT = int(os.getenv("OCR_BATCH_FILES_PER_SLOT", 5))
+
+    # 导入流水线共用的 CPU 进程池大小（图片规范化、PDF 渲染、题目裁剪），见 process_pool
+    INGEST_PROCESS_WORKERS = int(os.getenv("INGEST_PROCESS_WORKERS", 4))
+
+    # OCR前图片规范化（EXIF方向纠正、缩放、灰度、JPEG重压缩）
+    OCR_NORMALIZE_ENABLED = os.getenv("OCR_NORMALIZE_ENABLED", "True").lower() == "true"
+    OCR_NORMALIZE_MAX_LONG_EDGE = int(os.getenv("OCR_NORMALIZE_MAX_LONG_EDGE", 2048))
+    OCR_NORMALIZE_GRAYSCALE = os.getenv("OCR_NORMALIZE_GRAYSCALE", "False").lower() == "true"
+    OCR_NORMALIZE_JPEG_QUALITY = int(os.getenv("OCR_NORMALIZE_JPEG_QUALITY", 85))
+    OCR_NORMALIZE_DIR = os.getenv("OCR_NORMALIZE_DIR", "data/uploads/normalized")
+
+    # 超长图片分块识别（长截图 / 拼接扫描件）：切成重叠的横向条带并行识别后合并
+    OCR_TILING_ENABLED = os.getenv("OCR_TILING_ENABLED", "False").lower() == "true"
+    OCR_TILING_MIN_ASPECT = float(os.getenv("OCR_TILING_MIN_ASPECT", 2.5))  # 高宽比超过该值才分块
+    OCR_TILE_ASPECT = float(os.getenv("OCR_TILE_ASPECT", 1.41))  # 条带高宽比，约为 A4 纵向
+    OCR_TILE_OVERLAP = float(os.getenv("OCR_TILE_OVERLAP", 0.2))  # 相邻条带重叠高度占条带高度的比例
+    OCR_TILE_WORKERS = int(os.getenv("OCR_TILE_WORKERS", 4))
+    OCR_TILE_DIR = os.getenv("OCR_TILE_DIR", "data/uploads/tiles")
+
+    # OCR上传临时文件：按 file_id 分片存放，登记表记录路径/大小/哈希/过期时间，清扫线程回收过期和孤儿文件
+    OCR_UPLOAD_DIR = os.getenv("OCR_UPLOAD_DIR", "data/uploads/ocr")
+    OCR_UPLOAD_REGISTRY_PATH = os.getenv("OCR_UPLOAD_REGISTRY_PATH", "data/cache/ocr_uploads.sqlite3")
+    OCR_UPLOAD_TTL_SECONDS = int(os.getenv("OCR_UPLOAD_TTL_SECONDS", 3600))
+    OCR_UPLOAD_MAX_BYTES = int(os.getenv("OCR_UPLOAD_MAX_BYTES", 2147483648))  # 2GB
+    OCR_UPLOAD_SWEEP_INTERVAL_SECONDS = float(os.getenv("OCR_UPLOAD_SWEEP_INTERVAL_SECONDS", 300))
+
+    # 文档 / 题目图片的内容寻址存储：local（按哈希前缀分片的本地目录）或 supabase（Supabase Storage / S3 兼容对象存储）
+    BLOB_STORE_BACKEND = os.getenv("BLOB_STORE_BACKEND", "local")
+    BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "data/blobs")
+    BLOB_STORE_BUCKET = os.getenv("BLOB_STORE_BUCKET", SUPABASE_BUCKET)
+    BLOB_STORE_PREFIX = os.getenv("BLOB_STORE_PREFIX", "blobs")  # 对象存储中的键前缀
+    BLOB_CACHE_DIR = os.getenv("BLOB_CACHE_DIR", "data/cache/blobs")  # 远程对象的本地副本，可随时删除
+    BLOB_STREAM_CHUNK_SIZE = int(os.getenv("BLOB_STREAM_CHUNK_SIZE", 1048576))  # 1MB
+    # 旧数据中以本地路径保存的文件只允许从该目录下读取（路径可能来自客户端请求）
+    LEGACY_FILE_ROOT = os.getenv("LEGACY_FILE_ROOT", "data/uploads")
+
+    # 题目源图的 WebP 衍生版本（缩略图 / 中等尺寸），导入时在进程池中预生成，按源图哈希 + 尺寸索引
+    IMAGE_DERIVATIVES_ENABLED = os.getenv("IMAGE_DERIVATIVES_ENABLED", "True").lower() == "true"
+    IMAGE_DERIVATIVE_SIZES = os.getenv("IMAGE_DERIVATIVE_SIZES", "thumb:320,medium:1024")  # 版本名:最长边像素
+    IMAGE_DERIVATIVE_WEBP_QUALITY = int(os.getenv("IMAGE_DERIVATIVE_WEBP_QUALITY", 80))
+    IMAGE_DERIVATIVE_WORKERS = int(os.getenv("IMAGE_DERIVATIVE_WORKERS", 2))  # 独立的后台进程池
+    IMAGE_DERIVATIVE_INDEX_PATH = os.getenv("IMAGE_DERIVATIVE_INDEX_PATH", "data/cache/image_derivatives.sqlite3")
+    IMAGE_DERIVATIVE_DIR = os.getenv("IMAGE_DERIVATIVE_DIR", "data/uploads/derivatives")
+
+    # 按题目坐标（PaddleOCR position）从整页裁出题目区域图，存入 blob 存储并由 question_images["crop"] 引用
+    QUESTION_CROPS_ENABLED = os.getenv("QUESTION_CROPS_ENABLED", "True").lower() == "true"
+    QUESTION_CROP_PADDING = int(os.getenv("QUESTION_CROP_PADDING", 16))  # 裁剪框四周额外保留的像素
+    QUESTION_CROP_WEBP_QUALITY = int(os.getenv("QUESTION_CROP_WEBP_QUALITY", 85))
+    QUESTION_CROP_DIR = os.getenv("QUESTION_CROP_DIR", "data/uploads/crops")
+
+    # 题目列表游标分页：翻页时复用第一页 COUNT 结果的时间
+    QUESTION_COUNT_CACHE_SECONDS = float(os.getenv("QUESTION_COUNT_CACHE_SECONDS", 60))
+
+    # 题目批量写入：每条多行 INSERT ... RETURNING 的最大行数
+    QUESTION_INSERT_BATCH_SIZE = int(os.getenv("QUESTION_INSERT_BATCH_SIZE", 500))
+
+    # 导入时的近似重复检测（MinHash/LSH）：估计相似度不低于阈值的新题关联到已有的原题
+    QUESTION_DEDUP_ENABLED = os.getenv("QUESTION_DEDUP_ENABLED", "True").lower() == "true"
+    QUESTION_DEDUP_THRESHOLD = float(os.getenv("QUESTION_DEDUP_THRESHOLD", 0.8))
+
+    # OCR结果缓存（按图片内容哈希 + 模型 + Prompt版本）
+    OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "True").lower() == "true"
+    OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "data/cache/ocr_cache.sqlite3")
+    OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", 20000))
+    OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", 268435456))  # 256MB
+    OCR_CACHE_TTL_SECONDS = int(os.getenv("OCR_CACHE_TTL_SECONDS", 30 * 24 * 3600))  # 30天
+
+    # 解析失败/部分恢复的模型原始输出（用于离线重新解析，不再调用模型）
+    OCR_RAW_OUTPUT_ENABLED = os.getenv("OCR_RAW_OUTPUT_ENABLED", "True").lower() == "true"
+    OCR_RAW_OUTPUT_PATH = os.getenv("OCR_RAW_OUTPUT_PATH", "data/cache/ocr_raw_outputs.sqlite3")
+
+    # DashScope 调用准入控制（多个 worker 进程通过本地 SQLite 共享状态）
+    OCR_RATE_LIMIT_ENABLED = os.getenv("OCR_RATE_LIMIT_ENABLED", "True").lower() == "true"
+    OCR_RATE_LIMIT_PATH = os.getenv("OCR_RATE_LIMIT_PATH", "data/cache/ocr_rate_limit.sqlite3")
+    OCR_RATE_LIMIT_RPS = float(os.getenv("OCR_RATE_LIMIT_RPS", 2.0))
+    OCR_RATE_LIMIT_BURST = int(os.getenv("OCR_RATE_LIMIT_BURST", 5))
+    OCR_RATE_LIMIT_LEASE_SECONDS = float(os.getenv("OCR_RATE_LIMIT_LEASE_SECONDS", 300))
+    OCR_CONCURRENCY_MIN = int(os.getenv("OCR_CONCURRENCY_MIN", 1))
+    OCR_CONCURRENCY_MAX = int(os.getenv("OCR_CONCURRENCY_MAX", 8))
+    OCR_CONCURRENCY_INITIAL = int(os.getenv("OCR_CONCURRENCY_INITIAL", 4))
+    OCR_LATENCY_TARGET_SECONDS = float(os.getenv("OCR_LATENCY_TARGET_SECONDS", 20))
+    OCR_RETRY_MAX_ATTEMPTS = int(os.getenv("OCR_RETRY_MAX_ATTEMPTS", 5))
+    OCR_RETRY_BASE_DELAY = float(os.getenv("OCR_RETRY_BASE_DELAY", 1.0))
+    OCR_RETRY_MAX_DELAY = float(os.getenv("OCR_RETRY_MAX_DELAY", 20.0))
+    OCR_CALL_DEADLINE_SECONDS = float(os.getenv("OCR_CALL_DEADLINE_SECONDS", 120))
+
+    # 异步导入任务（队列存储在数据库 ingest_jobs 表中，无需外部消息中间件）
+    INGEST_WORKER_ENABLED = os.getenv("INGEST_WORKER_ENABLED", "True").lower() == "true"
+    INGEST_WORKER_COUNT = int(os.getenv("INGEST_WORKER_COUNT", 2))
+    INGEST_POLL_INTERVAL_SECONDS = float(os.getenv("INGEST_POLL_INTERVAL_SECONDS", 1.0))
+    INGEST_JOB_STALE_SECONDS = int(os.getenv("INGEST_JOB_STALE_SECONDS", 300))
+    INGEST_JOB_MAX_ATTEMPTS = int(os.getenv("INGEST_JOB_MAX_ATTEMPTS", 3))
+
+    # PDF导入：文本层快速路径 + 扫描页栅格化
+    PDF_TEXT_LAYER_MIN_CHARS = int(os.getenv("PDF_TEXT_LAYER_MIN_CHARS", 20))
+    PDF_RENDER_DPI = int(os.getenv("PDF_RENDER_DPI", 200))
+    # 已提交渲染但尚未交给 OCR 的最大页数，避免大文件的渲染远远领先于识别
+    PDF_RENDER_WINDOW = int(os.getenv("PDF_RENDER_WINDOW", 4))
+    PDF_PAGE_DIR = os.getenv("PDF_PAGE_DIR", "data/uploads/pdf_pages")
+
+    # Word导入：内嵌图片保存目录
+    DOCX_IMAGE_DIR = os.getenv("DOCX_IMAGE_DIR", "data/uploads/docx_images")
 
 settings = Settings()
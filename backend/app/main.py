@@ -11,6 +11,12 @@ from app.api.v1.questions import router as questions_router
 from app.api.v1.collections import router as collections_router
 from app.database import engine, Base
 from app.models import User
+from app.services.ingest_jobs import get_ingest_worker_pool
+from app.services.image_tiling import shutdown_image_tiler
+from app.services.process_pool import shutdown_process_pools
+from app.services.question_search import init_question_search
+from app.services.ocr_hedging import shutdown_hedged_ocr_service
+from app.services.upload_registry import get_upload_registry
 
 logger = logging.getLogger(__name__)
 
@@ -25,10 +31,22 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"Could not create database tables: {e}")
         logger.warning("Continuing without table creation...")
+
+    init_question_search(engine)
+
+    if settings.INGEST_WORKER_ENABLED:
+        get_ingest_worker_pool().start()
+    get_upload_registry().start_sweeper(settings.OCR_UPLOAD_SWEEP_INTERVAL_SECONDS)
     
     yield
     
     # Shutdown (if needed)
+    if settings.INGEST_WORKER_ENABLED:
+        get_ingest_worker_pool().stop()
+    get_upload_registry().stop_sweeper()
+    shutdown_image_tiler()
+    shutdown_process_pools()
+    shutdown_hedged_ocr_service()
     logger.info("Application shutdown")
 
 
@@ -1,5 +1,7 @@
 from app.models.user import User
 from app.models.question import Question, Document
 from app.models.collection import Collection, Category, question_collection
+from app.models.ingest_job import IngestJob
+from app.models.question_fingerprint import QuestionFingerprint, QuestionLSHBucket
 
-__all__ = ["User", "Question", "Document", "Collection", "Category", "question_collection"]
+__all__ = ["User", "Question", "Document", "Collection", "Category", "question_collection", "IngestJob", "QuestionFingerprint", "QuestionLSHBucket"]
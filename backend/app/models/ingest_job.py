@@ -0,0 +1,61 @@
+from sqlalchemy import Column, String, DateTime, Integer, Text, ForeignKey, JSON, Index
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
+import uuid
+from datetime import datetime
+from app.database import Base
+
+
+class IngestJob(Base):
+    """文档异步导入任务 - 持久化的OCR任务队列（API重启后可恢复）"""
+    __tablename__ = "ingest_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    document_id = Column(UUID(as_uuid=True), ForeignKey('documents.id', ondelete='CASCADE'), nullable=False, comment="关联文档ID")
+    created_by = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False, comment="提交用户ID")
+
+    # 任务状态
+    status = Column(String(20), nullable=False, default='pending', comment="任务状态:pending, running, completed, failed")
+    payload = Column(JSON, nullable=False, comment="任务参数: image_paths, max_concurrency 等")
+    pages_total = Column(Integer, default=0, comment="总页数")
+    pages_done = Column(Integer, default=0, comment="已完成页数")
+    completed_pages = Column(JSON, comment="已完成并入库的页索引列表，重试时跳过")
+    attempts = Column(Integer, default=0, comment="已尝试次数")
+    error = Column(Text, comment="失败原因")
+
+    # 执行信息
+    worker_id = Column(String(100), comment="领取任务的worker标识")
+    heartbeat_at = Column(DateTime, comment="最近一次心跳时间")
+
+    # 时间戳
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    started_at = Column(DateTime, comment="开始执行时间")
+    finished_at = Column(DateTime, comment="完成时间")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
+
+    # 关系
+    document = relationship("Document")
+
+    __table_args__ = (
+        Index('ix_ingest_jobs_status_created_at', 'status', 'created_at'),
+        Index('ix_ingest_jobs_document_id', 'document_id'),
+    )
+
+    def __repr__(self):
+        return f"<IngestJob(id={self.id}, document_id={self.document_id}, status={self.status})>"
+
+    def to_dict(self):
+        """转换为字典格式"""
+        return {
+            'id': str(self.id),
+            'document_id': str(self.document_id),
+            'created_by': str(self.created_by),
+            'status': self.status,
+            'pages_total': self.pages_total,
+            'pages_done': self.pages_done,
+            'attempts': self.attempts,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Boolean, Text, Integer, ForeignKey, JSON
+from sqlalchemy import Column, String, DateTime, Boolean, Text, Integer, Float, ForeignKey, JSON, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import uuid
@@ -44,6 +44,10 @@ class Question(Base):
     is_verified = Column(Boolean, default=False, comment="是否已人工验证")
     is_active = Column(Boolean, default=True, comment="是否启用")
     processing_status = Column(String(20), default='pending', comment="处理状态:pending, processing, completed, failed")
+
+    # 近似重复检测（导入时按 MinHash 相似度关联到同一用户已有的题目）
+    duplicate_of_id = Column(UUID(as_uuid=True), ForeignKey('questions.id'), comment="疑似重复的原题ID")
+    duplicate_similarity = Column(Float, comment="与原题的估计相似度(Jaccard)")
     
     # 用户关联
     created_by = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False, comment="创建用户ID")
@@ -58,6 +62,13 @@ class Question(Base):
     creator = relationship("User", foreign_keys=[created_by], back_populates="created_questions")
     verifier = relationship("User", foreign_keys=[verified_by], back_populates="verified_questions")
     source_document = relationship("Document", back_populates="questions")
+
+    # 游标分页按 (created_at, id) 倒序，过滤列在前
+    __table_args__ = (
+        Index('ix_questions_created_by_created_at_id', 'created_by', 'created_at', 'id'),
+        Index('ix_questions_document_created_at_id', 'source_document_id', 'created_at', 'id'),
+        Index('ix_questions_duplicate_of_id', 'duplicate_of_id'),
+    )
     
     def __repr__(self):
         return f"<Question(id={self.id}, number={self.number}, type={self.question_type})>"
@@ -89,6 +100,8 @@ class Question(Base):
             'is_verified': self.is_verified,
             'is_active': self.is_active,
             'processing_status': self.processing_status,
+            'duplicate_of_id': str(self.duplicate_of_id) if self.duplicate_of_id else None,
+            'duplicate_similarity': self.duplicate_similarity,
             'created_by': str(self.created_by),
             'verified_by': str(self.verified_by) if self.verified_by else None,
             'created_at': self.created_at.isoformat() if self.created_at else None,
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, DateTime, Integer, BigInteger, LargeBinary, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+from app.database import Base
+
+
+class QuestionFingerprint(Base):
+    """题目指纹 - 归一化文本 shingle 的 MinHash 签名，用于导入时查找近似重复题"""
+    __tablename__ = "question_fingerprints"
+
+    question_id = Column(UUID(as_uuid=True), ForeignKey('questions.id', ondelete='CASCADE'), primary_key=True, comment="题目ID")
+    created_by = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False, comment="题目所属用户ID")
+    signature = Column(LargeBinary, nullable=False, comment="MinHash签名(uint32数组)")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+
+    def __repr__(self):
+        return f"<QuestionFingerprint(question_id={self.question_id})>"
+
+
+class QuestionLSHBucket(Base):
+    """LSH 分桶 - 签名按 band 切分后的桶哈希，同桶的题目互为候选"""
+    __tablename__ = "question_lsh_buckets"
+
+    question_id = Column(UUID(as_uuid=True), ForeignKey('questions.id', ondelete='CASCADE'), primary_key=True, comment="题目ID")
+    band = Column(Integer, primary_key=True, comment="band序号")
+    created_by = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False, comment="题目所属用户ID")
+    bucket = Column(BigInteger, nullable=False, comment="band哈希(含band序号)")
+
+    # 按用户 + 桶哈希查找候选
+    __table_args__ = (
+        Index('ix_question_lsh_buckets_user_bucket', 'created_by', 'bucket'),
+    )
+
+    def __repr__(self):
+        return f"<QuestionLSHBucket(question_id={self.question_id}, band={self.band})>"
@@ -14,6 +14,7 @@ from app.schemas.question import (
     DocumentBase,
     DocumentCreate,
     DocumentResponse,
+    DocumentProgressResponse,
     OCRProcessRequest,
     OCRProcessResponse,
     QuestionSearchRequest,
@@ -53,6 +54,7 @@ __all__ = [
     "DocumentBase",
     "DocumentCreate",
     "DocumentResponse",
+    "DocumentProgressResponse",
     "OCRProcessRequest",
     "OCRProcessResponse",
     "QuestionSearchRequest",
@@ -4,7 +4,10 @@
 from typing import List, Optional, Dict, Any, Union
 from datetime import datetime
 import uuid
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, computed_field, validator
+
+from app.services.image_derivatives import derivative_urls
+from app.services.question_crops import crop_image_urls
 
 
 class QuestionOption(BaseModel):
@@ -31,7 +34,10 @@ class QuestionBase(BaseModel):
 
     @validator('question_type')
     def validate_question_type(cls, v):
-        allowed_types = ['multiple_choice', 'fill_blank', 'true_false', 'essay', 'other']
+        allowed_types = [
+            'single_choice', 'multiple_choice', 'fill_blank', 'true_false',
+            'essay', 'short_answer', 'other'
+        ]
         if v not in allowed_types:
             raise ValueError(f'Question type must be one of: {allowed_types}')
         return v
@@ -85,10 +91,39 @@ class QuestionResponse(QuestionBase):
     created_at: datetime = Field(..., description="创建时间")
     updated_at: datetime = Field(..., description="更新时间")
     verified_at: Optional[datetime] = Field(None, description="验证时间")
+    duplicate_of_id: Optional[uuid.UUID] = Field(None, description="疑似重复的原题ID")
+    duplicate_similarity: Optional[float] = Field(None, description="与原题的估计相似度")
+    score: Optional[float] = Field(None, description="全文检索相关度（越大越相关），仅搜索结果返回")
+    snippet: Optional[str] = Field(None, description="全文检索命中片段，命中词以 <mark> 标记，仅搜索结果返回")
+
+    question_images: Optional[Any] = Field(None, exclude=True, description="题目相关的图片/附件信息（不直接返回）")
+    @computed_field(description="来源图片原图及缩略图 / 中等尺寸 WebP 版本的地址，如 {original, thumb, medium}")
+    @property
+    def source_image_derivatives(self) -> Optional[Dict[str, str]]:
+        return derivative_urls(self.source_image_path)
+
+    @computed_field(description="题目区域裁剪图的地址（原图及缩略图版本），没有坐标的题目为空")
+    @property
+    def crop_image_urls(self) -> Optional[Dict[str, str]]:
+        return crop_image_urls(self.question_images)
 
     model_config = {"from_attributes": True}
 
 
+class DuplicateClusterResponse(BaseModel):
+    """近似重复题簇"""
+    canonical: QuestionResponse = Field(..., description="原题（簇中最早导入的题目）")
+    duplicates: List[QuestionResponse] = Field(..., description="关联到原题的重复题，按相似度倒序")
+
+
+class DuplicateClusterListResponse(BaseModel):
+    """近似重复题簇列表响应"""
+    clusters: List[DuplicateClusterResponse] = Field(..., description="重复题簇，按簇大小倒序")
+    total: int = Field(..., description="簇总数")
+    skip: int = Field(..., description="跳过的簇数")
+    limit: int = Field(..., description="返回的簇数限制")
+
+
 class DocumentBase(BaseModel):
     """文档基础模型"""
     title: str = Field(..., description="文档标题")
@@ -131,6 +166,8 @@ class OCRProcessRequest(BaseModel):
     file_size: Optional[int] = Field(None, description="文件大小")
     file_type: Optional[str] = Field(None, description="文件类型")
     image_paths: List[str] = Field(..., description="图片路径列表")
+    max_concurrency: Optional[int] = Field(None, ge=1, le=16, description="同时识别的最大页数，默认使用服务端配置")
+    ocr_backend: Optional[str] = Field(None, description="题目识别后端: qwen / paddle / replay / hedged，默认使用服务端配置")
 
 
 class OCRProcessResponse(BaseModel):
@@ -144,6 +181,26 @@ class OCRProcessResponse(BaseModel):
     questions: Optional[List[QuestionResponse]] = Field(None, description="创建的题目列表")
     message: Optional[str] = Field(None, description="处理消息")
     error: Optional[str] = Field(None, description="错误信息")
+    page_timings: Optional[List[Dict[str, Any]]] = Field(None, description="逐页OCR耗时: image_index, elapsed_ms, questions, success, lost_questions, failed_tiles")
+    elapsed_ms: Optional[int] = Field(None, description="整体处理耗时（毫秒）")
+    job_id: Optional[str] = Field(None, description="异步导入任务ID（异步模式）")
+    status_url: Optional[str] = Field(None, description="查询处理进度的地址（异步模式）")
+
+
+class DocumentProgressResponse(BaseModel):
+    """文档处理进度响应模型"""
+    document_id: str = Field(..., description="文档ID")
+    processing_status: str = Field(..., description="处理状态")
+    total_questions: int = Field(0, description="已识别的题目数")
+    processed_questions: int = Field(0, description="已入库的题目数")
+    job_id: Optional[str] = Field(None, description="导入任务ID")
+    job_status: Optional[str] = Field(None, description="任务状态:pending, running, completed, failed")
+    pages_total: int = Field(0, description="总页数")
+    pages_done: int = Field(0, description="已完成页数")
+    progress: float = Field(0.0, description="完成进度 0-1")
+    eta_seconds: Optional[float] = Field(None, description="预计剩余秒数")
+    error: Optional[str] = Field(None, description="失败原因")
+    updated_at: Optional[datetime] = Field(None, description="最近更新时间")
 
 
 class QuestionSearchRequest(BaseModel):
@@ -151,8 +208,9 @@ class QuestionSearchRequest(BaseModel):
     keyword: Optional[str] = Field(None, description="搜索关键词")
     question_type: Optional[str] = Field(None, description="题目类型过滤")
     subject: Optional[str] = Field(None, description="学科过滤")
-    skip: int = Field(0, ge=0, description="跳过的记录数")
+    skip: int = Field(0, ge=0, description="跳过的记录数（传入 cursor 时忽略）")
     limit: int = Field(50, ge=1, le=100, description="返回记录数限制")
+    cursor: Optional[str] = Field(None, description="上一页返回的 next_cursor")
 
 
 class QuestionListResponse(BaseModel):
@@ -161,6 +219,8 @@ class QuestionListResponse(BaseModel):
     total: int = Field(..., description="总记录数")
     skip: int = Field(..., description="跳过的记录数")
     limit: int = Field(..., description="返回记录数限制")
+    next_cursor: Optional[str] = Field(None, description="下一页游标，没有更多记录时为空")
+    has_more: bool = Field(False, description="是否还有下一页")
 
 
 class ProcessingStatistics(BaseModel):
@@ -192,6 +252,62 @@ class QuestionBatchUpdate(BaseModel):
     updates: QuestionUpdate = Field(..., description="更新数据")
 
 
+class QuestionMetadataPatch(BaseModel):
+    """题目元数据修改（批量修改只允许这些字段，未传入的字段保持不变）"""
+    subject: Optional[str] = Field(None, description="学科分类")
+    difficulty_level: Optional[str] = Field(None, description="难度级别")
+    topic_tags: Optional[List[str]] = Field(None, description="知识点标签")
+    question_type: Optional[str] = Field(None, description="题目类型")
+    is_verified: Optional[bool] = Field(None, description="是否已人工验证")
+
+    @validator('question_type')
+    def validate_question_type(cls, v):
+        allowed_types = [
+            'single_choice', 'multiple_choice', 'fill_blank', 'true_false',
+            'essay', 'short_answer', 'other'
+        ]
+        # 未传入时不会进入校验；显式传入 null 时拒绝（数据库列不可为空）
+        if v not in allowed_types:
+            raise ValueError(f'Question type must be one of: {allowed_types}')
+        return v
+
+    @validator('difficulty_level')
+    def validate_difficulty_level(cls, v):
+        allowed_levels = ['easy', 'medium', 'hard']
+        if v is not None and v not in allowed_levels:
+            raise ValueError(f'Difficulty level must be one of: {allowed_levels}')
+        return v
+
+    @validator('is_verified')
+    def validate_is_verified(cls, v):
+        if v is None:
+            raise ValueError('is_verified must be true or false')
+        return v
+
+    model_config = {"extra": "forbid"}
+
+
+class QuestionPatchItem(QuestionMetadataPatch):
+    """单道题目的元数据修改"""
+    id: str = Field(..., description="题目ID")
+
+
+class QuestionBulkPatchRequest(BaseModel):
+    """批量修改题目元数据请求：question_ids + patch（统一修改），或 items（逐题修改），可同时使用"""
+    question_ids: List[str] = Field(default_factory=list, max_length=1000, description="统一修改的题目ID列表")
+    patch: Optional[QuestionMetadataPatch] = Field(None, description="应用到 question_ids 的修改")
+    items: List[QuestionPatchItem] = Field(default_factory=list, max_length=1000, description="逐题修改，晚于 patch 生效")
+
+
+class QuestionBulkPatchResponse(BaseModel):
+    """批量修改题目元数据响应"""
+    success: bool = Field(..., description="是否成功")
+    updated_count: int = Field(..., description="修改的题目数量")
+    question_ids: List[str] = Field(default_factory=list, description="修改的题目ID列表")
+    not_found: List[str] = Field(default_factory=list, description="不存在或无权修改的题目ID")
+    message: Optional[str] = Field(None, description="操作信息")
+
+
 class QuestionBulkCreateRequest(BaseModel):
     """批量创建题目请求模型（前端用户选择并纠正后提交）"""
     document_title: str = Field(..., description="文档标题")
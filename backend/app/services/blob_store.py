@@ -0,0 +1,424 @@
+"""
+内容寻址的文件存储 - 上传文档和题目图片按 SHA-256 存放，相同内容只存一份
+
+数据库中保存 blob://<sha256><扩展名> 形式的引用而不是某个节点的本地路径：
+- local 后端按哈希前缀分片存放（ab/cd/<key>），单个目录不会无限增长
+- supabase 后端写入 Supabase Storage（S3 兼容对象存储），多个 API 节点共享；
+  需要本地文件的处理流程（PDF 渲染、OCR）按需下载到本地缓存目录
+读写都按块流式进行，内存占用与文件大小无关。
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import requests
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+BLOB_REF_PREFIX = "blob://"
+
+# <sha256><扩展名>，扩展名保留给按后缀判断文件类型的处理流程（PDF / Word）
+_KEY_PATTERN = re.compile(r"^[0-9a-f]{64}(\.[0-9a-z]{1,10})?$")
+
+
+class BlobNotFoundError(FileNotFoundError):
+    """引用的文件不存在"""
+
+
+def make_blob_key(sha256: str, filename: Optional[str] = None) -> str:
+    """由内容哈希和原始文件名（取扩展名）生成存储键"""
+    extension = Path(filename or "").suffix.lower()
+    if not re.fullmatch(r"\.[0-9a-z]{1,10}", extension):
+        extension = ""
+    return f"{sha256.lower()}{extension}"
+
+
+def validate_blob_key(key: str) -> str:
+    """校验存储键格式，防止拼出根目录之外的路径"""
+    if not _KEY_PATTERN.match(key or ""):
+        raise ValueError(f"Invalid blob key: {key!r}")
+    return key
+
+
+def to_blob_ref(key: str) -> str:
+    """存储键 -> 数据库中保存的引用"""
+    return f"{BLOB_REF_PREFIX}{key}"
+
+
+def parse_blob_ref(value: Optional[str]) -> Optional[str]:
+    """引用 -> 存储键；不是 blob 引用（旧数据中的本地路径）时返回 None"""
+    if value and value.startswith(BLOB_REF_PREFIX):
+        return validate_blob_key(value[len(BLOB_REF_PREFIX):])
+    return None
+
+
+def shard_path(root: Path, key: str) -> Path:
+    """存储键对应的分片路径：<root>/<前两位>/<三四位>/<key>"""
+    return root / key[:2] / key[2:4] / key
+
+
+def _remove_quietly(path: Path) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class BlobStore(ABC):
+    """内容寻址存储的公共接口，子类实现各抽象方法"""
+
+    def __init__(self, chunk_size: int):
+        self.chunk_size = max(1, chunk_size)
+
+    @abstractmethod
+    def put_file(
+        self, path: str, sha256: Optional[str] = None, move: bool = False, filename: Optional[str] = None
+    ) -> str:
+        """
+        存入本地文件，内容已存在时不重复存储
+
+        Args:
+            path: 本地文件路径
+            sha256: 已知的内容哈希（例如上传落盘时边写边算的结果），为空时读取文件计算
+            move: 为 True 时源文件交给存储处理（移动或删除），调用方不应再使用
+            filename: 取扩展名的文件名，默认取 path（扩展名会保留在存储键中）
+
+        Returns:
+            存储键
+        """
+
+    @abstractmethod
+    def iter_chunks(self, key: str) -> Iterator[bytes]:
+        """
+        按块读取内容
+
+        Raises:
+            BlobNotFoundError: 键不存在
+        """
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """内容是否存在"""
+
+    @abstractmethod
+    def local_path(self, key: str) -> str:
+        """
+        返回内容的本地文件路径（远程后端下载到本地缓存），调用方只读使用
+
+        Raises:
+            BlobNotFoundError: 键不存在
+        """
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """删除内容（调用方需确认没有其他记录引用同一内容）"""
+
+    @abstractmethod
+    def _staging_dir(self) -> Path:
+        """put_stream 写入临时文件的目录（与存储位于同一文件系统，写完后重命名）"""
+
+    def put_stream(self, chunks: Iterable[bytes], filename: Optional[str] = None) -> str:
+        """
+        把字节块流式写入存储，边写边计算哈希
+
+        Args:
+            chunks: 字节块序列
+            filename: 原始文件名（取扩展名）
+
+        Returns:
+            存储键
+        """
+        staging = self._staging_dir()
+        staging.mkdir(parents=True, exist_ok=True)
+        part_path = staging / f"{uuid.uuid4().hex}.part"
+        digest = hashlib.sha256()
+        try:
+            with open(part_path, "wb") as out:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    out.write(chunk)
+            return self.put_file(str(part_path), sha256=digest.hexdigest(), move=True, filename=filename)
+        finally:
+            _remove_quietly(part_path)
+
+    def resolve(self, path_or_ref: str) -> str:
+        """blob 引用 -> 本地路径；普通路径（旧数据）原样返回"""
+        key = parse_blob_ref(path_or_ref)
+        return self.local_path(key) if key else path_or_ref
+
+    def ref_for(self, path_or_ref: str) -> str:
+        """
+        本地文件 -> blob 引用；已经是引用或已在存储中的文件不重复计算哈希
+
+        用于把处理过程中产生的本地路径（渲染的 PDF 页面、题目图片）转换为持久引用。
+        """
+        if parse_blob_ref(path_or_ref):
+            return path_or_ref
+        key = self._key_for_local_path(path_or_ref)
+        return to_blob_ref(key or self.put_file(path_or_ref))
+
+    def _key_for_local_path(self, path: str) -> Optional[str]:
+        """path 若是本存储管理的文件（local_path 的返回值）则返回其存储键"""
+        return None
+
+    @staticmethod
+    def _hash_file(path: str, chunk_size: int) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+
+class LocalBlobStore(BlobStore):
+    """本地目录后端，按哈希前缀两级分片"""
+
+    def __init__(self, root_dir: str, chunk_size: int):
+        super().__init__(chunk_size)
+        self.root_dir = Path(root_dir).resolve()
+
+    def _staging_dir(self) -> Path:
+        return self.root_dir / "tmp"
+
+    def _path(self, key: str) -> Path:
+        return shard_path(self.root_dir, validate_blob_key(key))
+
+    def put_file(
+        self, path: str, sha256: Optional[str] = None, move: bool = False, filename: Optional[str] = None
+    ) -> str:
+        key = make_blob_key(sha256 or self._hash_file(path, self.chunk_size), filename or path)
+        target = self._path(key)
+        if target.exists():
+            if move:
+                _remove_quietly(Path(path))
+            return key
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if move:
+            try:
+                # 同一文件系统内重命名，不复制内容
+                os.replace(path, target)
+                return key
+            except OSError:
+                pass
+        part_path = target.with_name(f"{target.name}.{uuid.uuid4().hex}.part")
+        try:
+            shutil.copyfile(path, part_path)
+            os.replace(part_path, target)
+        except BaseException:
+            _remove_quietly(part_path)
+            raise
+        if move:
+            _remove_quietly(Path(path))
+        return key
+
+    def iter_chunks(self, key: str) -> Iterator[bytes]:
+        path = self._path(key)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            raise BlobNotFoundError(key)
+        with f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                yield chunk
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def local_path(self, key: str) -> str:
+        path = self._path(key)
+        if not path.exists():
+            raise BlobNotFoundError(key)
+        return str(path)
+
+    def delete(self, key: str) -> None:
+        _remove_quietly(self._path(key))
+
+    def _key_for_local_path(self, path: str) -> Optional[str]:
+        resolved = Path(path).resolve()
+        if resolved.parent.parent.parent == self.root_dir and _KEY_PATTERN.match(resolved.name):
+            return resolved.name
+        return None
+
+
+class SupabaseStorageClient:
+    """Supabase Storage REST 接口的最小封装（上传 / 下载 / 查询 / 删除对象）"""
+
+    def __init__(self, base_url: str, api_key: str, bucket: str, timeout: float = 60.0):
+        self.base_url = base_url.rstrip("/")
+        self.bucket = bucket
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._session.headers.update({"Authorization": f"Bearer {api_key}", "apikey": api_key})
+
+    def _object_url(self, name: str) -> str:
+        return f"{self.base_url}/storage/v1/object/{self.bucket}/{name}"
+
+    def exists(self, name: str) -> bool:
+        response = self._session.head(self._object_url(name), timeout=self.timeout)
+        if response.status_code in (400, 404):
+            return False
+        response.raise_for_status()
+        return True
+
+    def upload(self, name: str, path: str, content_type: str = "application/octet-stream") -> None:
+        """流式上传本地文件；对象已存在（并发上传同一内容）视为成功"""
+        with open(path, "rb") as f:
+            response = self._session.post(
+                self._object_url(name),
+                data=f,
+                headers={"Content-Type": content_type, "x-upsert": "false"},
+                timeout=self.timeout,
+            )
+        if response.status_code == 409 or (response.status_code == 400 and "Duplicate" in response.text):
+            return
+        response.raise_for_status()
+
+    def iter_download(self, name: str, chunk_size: int) -> Iterator[bytes]:
+        response = self._session.get(self._object_url(name), stream=True, timeout=self.timeout)
+        with response:
+            if response.status_code in (400, 404):
+                raise FileNotFoundError(name)
+            response.raise_for_status()
+            yield from response.iter_content(chunk_size=chunk_size)
+
+    def delete(self, name: str) -> None:
+        response = self._session.delete(
+            f"{self.base_url}/storage/v1/object/{self.bucket}",
+            json={"prefixes": [name]},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+
+
+class LocalObjectStorageClient:
+    """
+    用本地目录模拟对象存储，接口与 SupabaseStorageClient 相同
+
+    用于测试和单机开发：RemoteBlobStore 的下载缓存、去重逻辑不依赖网络即可验证。
+    """
+
+    def __init__(self, root_dir: str):
+        self.root_dir = Path(root_dir)
+
+    def _path(self, name: str) -> Path:
+        path = (self.root_dir / name).resolve()
+        if self.root_dir.resolve() not in path.parents:
+            raise ValueError(f"Invalid object name: {name!r}")
+        return path
+
+    def exists(self, name: str) -> bool:
+        return self._path(name).exists()
+
+    def upload(self, name: str, path: str, content_type: str = "application/octet-stream") -> None:
+        target = self._path(name)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        part_path = target.with_name(f"{target.name}.{uuid.uuid4().hex}.part")
+        shutil.copyfile(path, part_path)
+        os.replace(part_path, target)
+
+    def iter_download(self, name: str, chunk_size: int) -> Iterator[bytes]:
+        with open(self._path(name), "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                yield chunk
+
+    def delete(self, name: str) -> None:
+        _remove_quietly(self._path(name))
+
+
+class RemoteBlobStore(BlobStore):
+    """对象存储后端，本地缓存目录保存下载过（或本节点上传）的副本"""
+
+    def __init__(self, client, cache_dir: str, prefix: str, chunk_size: int):
+        """
+        Args:
+            client: 对象存储客户端（SupabaseStorageClient 或 LocalObjectStorageClient）
+            cache_dir: 本地缓存目录，结构与 LocalBlobStore 相同
+            prefix: 对象名前缀
+            chunk_size: 流式读写的块大小
+        """
+        super().__init__(chunk_size)
+        self.client = client
+        self.cache = LocalBlobStore(cache_dir, chunk_size)
+        self.prefix = prefix.strip("/")
+
+    def _staging_dir(self) -> Path:
+        return self.cache._staging_dir()
+
+    def _object_name(self, key: str) -> str:
+        key = validate_blob_key(key)
+        name = f"{key[:2]}/{key[2:4]}/{key}"
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def put_file(
+        self, path: str, sha256: Optional[str] = None, move: bool = False, filename: Optional[str] = None
+    ) -> str:
+        key = make_blob_key(sha256 or self._hash_file(path, self.chunk_size), filename or path)
+        name = self._object_name(key)
+        if not self.client.exists(name):
+            self.client.upload(name, path)
+        # 本节点后续处理（OCR、渲染）直接读取缓存副本，无需再下载
+        self.cache.put_file(path, sha256=key[:64], move=move, filename=key)
+        return key
+
+    def iter_chunks(self, key: str) -> Iterator[bytes]:
+        if self.cache.exists(key):
+            return self.cache.iter_chunks(key)
+        return self._iter_remote(key)
+
+    def _iter_remote(self, key: str) -> Iterator[bytes]:
+        try:
+            yield from self.client.iter_download(self._object_name(key), self.chunk_size)
+        except FileNotFoundError:
+            raise BlobNotFoundError(key)
+
+    def exists(self, key: str) -> bool:
+        return self.cache.exists(key) or self.client.exists(self._object_name(key))
+
+    def local_path(self, key: str) -> str:
+        if not self.cache.exists(key):
+            self.cache.put_stream(self._iter_remote(key), filename=key)
+        return self.cache.local_path(key)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self._object_name(key))
+        self.cache.delete(key)
+
+    def _key_for_local_path(self, path: str) -> Optional[str]:
+        return self.cache._key_for_local_path(path)
+
+
+# 全局单例
+_store_instance: Optional[BlobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    """按 BLOB_STORE_BACKEND 配置获取存储单例"""
+    global _store_instance
+    if _store_instance is None:
+        with _store_lock:
+            if _store_instance is None:
+                backend = settings.BLOB_STORE_BACKEND.lower()
+                if backend == "local":
+                    _store_instance = LocalBlobStore(settings.BLOB_STORE_DIR, settings.BLOB_STREAM_CHUNK_SIZE)
+                elif backend == "supabase":
+                    client = SupabaseStorageClient(
+                        settings.SUPABASE_URL, settings.SUPABASE_KEY, settings.BLOB_STORE_BUCKET
+                    )
+                    _store_instance = RemoteBlobStore(
+                        client, settings.BLOB_CACHE_DIR, settings.BLOB_STORE_PREFIX, settings.BLOB_STREAM_CHUNK_SIZE
+                    )
+                else:
+                    raise ValueError(f"Unknown BLOB_STORE_BACKEND: {settings.BLOB_STORE_BACKEND}")
+                logger.info(f"Blob store initialized: {backend}")
+    return _store_instance
@@ -0,0 +1,212 @@
+"""
+Word 文档题目解析 - 本地解析 .docx，不调用视觉模型
+
+按文档顺序读取段落（含表格单元格），还原 Word 自动编号的题号/选项字母，
+复用 paddle_parser 的题号、选项和题型规则切分题目，并把内嵌图片保存到本地、
+归属到所在位置的题目。
+"""
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from docx import Document
+from docx.oxml.ns import qn
+
+from app.config import settings
+from app.services.paddle_parser import parse_questions_from_lines
+
+logger = logging.getLogger(__name__)
+
+# 自动编号格式 -> 题号/选项前缀；项目符号等其他格式不生成前缀
+_NUMBER_FORMATS = {
+    "decimal": lambda n: f"{n}.",
+    "decimalEnclosedParen": lambda n: f"{n})",
+    "upperLetter": lambda n: f"{chr(ord('A') + (n - 1) % 26)}.",
+    "lowerLetter": lambda n: f"{chr(ord('A') + (n - 1) % 26)}.",
+}
+
+# paddle_parser 的题型 -> OCR Prompt 使用的题型（计算/证明归入解答题）
+_TYPE_ALIASES = {"calculation": "essay"}
+
+_BLIP = qn("a:blip")
+_EMBED = qn("r:embed")
+_VML_IMAGEDATA = "{urn:schemas-microsoft-com:vml}imagedata"
+_RELATION_ID = qn("r:id")
+
+
+class _ListNumbering:
+    """根据 numbering.xml 还原段落的自动编号（python-docx 的 paragraph.text 不包含编号）"""
+
+    def __init__(self, document):
+        self._formats: Dict[Tuple[str, str], Tuple[str, int]] = {}
+        self._counters: Dict[str, Dict[int, int]] = {}
+        # 样式自带的编号（如 "List Number" 样式）: style_id -> (numId, ilvl)
+        self._style_numbering: Dict[str, Tuple[str, int]] = {}
+        for style in document.styles.element.iterchildren(qn("w:style")):
+            style_num_pr = style.find(qn("w:pPr") + "/" + qn("w:numPr"))
+            if style_num_pr is None:
+                continue
+            num_id = style_num_pr.find(qn("w:numId"))
+            ilvl = style_num_pr.find(qn("w:ilvl"))
+            if num_id is not None:
+                self._style_numbering[style.get(qn("w:styleId"))] = (
+                    num_id.get(qn("w:val")),
+                    int(ilvl.get(qn("w:val"))) if ilvl is not None else 0,
+                )
+
+        try:
+            numbering = document.part.numbering_part.element
+        except (KeyError, NotImplementedError):
+            return
+
+        abstract_levels: Dict[str, Dict[str, Tuple[str, int]]] = {}
+        for abstract in numbering.iterchildren(qn("w:abstractNum")):
+            levels = {}
+            for lvl in abstract.iterchildren(qn("w:lvl")):
+                fmt = lvl.find(qn("w:numFmt"))
+                start = lvl.find(qn("w:start"))
+                levels[lvl.get(qn("w:ilvl"))] = (
+                    fmt.get(qn("w:val")) if fmt is not None else "decimal",
+                    int(start.get(qn("w:val"))) if start is not None else 1,
+                )
+            abstract_levels[abstract.get(qn("w:abstractNumId"))] = levels
+
+        for num in numbering.iterchildren(qn("w:num")):
+            abstract_id = num.find(qn("w:abstractNumId"))
+            if abstract_id is None:
+                continue
+            levels = abstract_levels.get(abstract_id.get(qn("w:val")), {})
+            for ilvl, level in levels.items():
+                self._formats[(num.get(qn("w:numId")), ilvl)] = level
+
+    def prefix(self, paragraph_element) -> Optional[str]:
+        """返回段落的编号前缀（如 "3." / "B."），非编号段落返回 None"""
+        p_pr = paragraph_element.pPr
+        if p_pr is None:
+            return None
+        num_pr = p_pr.numPr
+        if num_pr is not None and num_pr.numId is not None:
+            num_id = str(num_pr.numId.val)
+            ilvl = num_pr.ilvl.val if num_pr.ilvl is not None else 0
+        elif p_pr.pStyle is not None and p_pr.pStyle.val in self._style_numbering:
+            num_id, ilvl = self._style_numbering[p_pr.pStyle.val]
+        else:
+            return None
+        fmt, start = self._formats.get((num_id, str(ilvl)), (None, 1))
+        render = _NUMBER_FORMATS.get(fmt)
+        if render is None:
+            return None
+
+        counters = self._counters.setdefault(num_id, {})
+        counters[ilvl] = counters.get(ilvl, start - 1) + 1
+        # 上级编号递增时，下级编号重新开始（每道题的选项从 A 开始）
+        for deeper in [level for level in counters if level > ilvl]:
+            del counters[deeper]
+        return render(counters[ilvl])
+
+
+def is_docx_file(path: str) -> bool:
+    """按扩展名判断是否为 Word (.docx) 文件"""
+    return os.path.splitext(path)[1].lower() == ".docx"
+
+
+def _iter_paragraph_elements(body) -> Iterator[Any]:
+    """按文档顺序遍历正文段落，表格按行、单元格展开"""
+    for child in body.iterchildren():
+        if child.tag == qn("w:p"):
+            yield child
+        elif child.tag == qn("w:tbl"):
+            for cell_paragraph in child.iter(qn("w:p")):
+                yield cell_paragraph
+
+
+def _paragraph_text(paragraph_element) -> str:
+    return "".join(node.text or "" for node in paragraph_element.iter(qn("w:t")))
+
+
+def _paragraph_image_ids(paragraph_element) -> List[str]:
+    ids = [blip.get(_EMBED) for blip in paragraph_element.iter(_BLIP)]
+    ids += [data.get(_RELATION_ID) for data in paragraph_element.iter(_VML_IMAGEDATA)]
+    return [rel_id for rel_id in ids if rel_id]
+
+
+def parse_docx_questions(docx_path: str, image_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    解析 Word 文档中的题目
+
+    Args:
+        docx_path: .docx 文件路径
+        image_dir: 内嵌图片的保存目录，默认 settings.DOCX_IMAGE_DIR 下按文档新建子目录
+
+    Returns:
+        题目列表，结构与 create_questions_from_ocr 的输入一致；
+        内嵌图片以 {"image_0": 图片路径, ...} 写入 images
+    """
+    document = Document(docx_path)
+    numbering = _ListNumbering(document)
+
+    lines: List[str] = []
+    line_numbers: List[int] = []
+    image_refs: List[Tuple[int, str]] = []
+    for ordinal, element in enumerate(_iter_paragraph_elements(document.element.body)):
+        text = _paragraph_text(element).strip()
+        prefix = numbering.prefix(element)
+        if text:
+            lines.append(f"{prefix} {text}" if prefix else text)
+            line_numbers.append(ordinal)
+        for rel_id in _paragraph_image_ids(element):
+            image_refs.append((ordinal, rel_id))
+
+    questions = parse_questions_from_lines(lines, line_numbers)
+    saved_images = _save_images(document, image_refs, image_dir) if questions else {}
+
+    # position 中的 y_min 是题目首段的序号，图片归属于其前面最近的一道题
+    starts = [question["position"]["y_min"] for question in questions]
+    for question in questions:
+        question["images"] = {}
+    for ordinal, rel_id in image_refs:
+        path = saved_images.get(rel_id)
+        if not path:
+            continue
+        owner = 0
+        for index, start in enumerate(starts):
+            if start <= ordinal:
+                owner = index
+        images = questions[owner]["images"]
+        images[f"image_{len(images)}"] = path
+
+    for question in questions:
+        question.pop("position", None)
+        question["type"] = _TYPE_ALIASES.get(question["type"], question["type"])
+        question["confidence"] = 1.0
+        question["source"] = "docx"
+
+    logger.info(
+        "Parsed %d questions and %d images from %s", len(questions), len(saved_images), docx_path
+    )
+    return questions
+
+
+def _save_images(document, image_refs: List[Tuple[int, str]], image_dir: Optional[str]) -> Dict[str, str]:
+    """把引用到的内嵌图片写入磁盘，同一图片只写一次，返回 rel_id -> 路径"""
+    if not image_refs:
+        return {}
+    out_dir = Path(image_dir or os.path.join(settings.DOCX_IMAGE_DIR, uuid.uuid4().hex))
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    saved: Dict[str, str] = {}
+    related_parts = document.part.related_parts
+    for _, rel_id in image_refs:
+        if rel_id in saved:
+            continue
+        part = related_parts.get(rel_id)
+        if part is None or not hasattr(part, "blob"):
+            logger.warning(f"Embedded image {rel_id} not found in document")
+            continue
+        ext = os.path.splitext(str(part.partname))[1] or ".bin"
+        path = out_dir / f"image_{len(saved)}{ext}"
+        path.write_bytes(part.blob)
+        saved[rel_id] = str(path)
+    return saved
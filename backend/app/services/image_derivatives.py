@@ -0,0 +1,277 @@
+"""
+图片衍生版本 - 为题目源图生成缩略图 / 中等尺寸的 WebP 版本
+
+列表和结果页只需要小尺寸预览，直接加载整页原图会传输和解码大量无用像素。
+导入时在独立进程池中预先生成各尺寸的 WebP，存入内容寻址存储；
+(源图哈希, 版本名, 最长边) -> 衍生图存储键 的映射记录在本地 SQLite 索引中，
+未命中时（其他节点导入、尺寸配置变更）在请求时补生成。
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+
+from PIL import Image, ImageOps
+
+from app.config import settings
+from app.services.blob_store import BlobStore, get_blob_store, parse_blob_ref
+from app.services.process_pool import DERIVATIVES_POOL, LazyProcessPool, get_process_pool
+
+logger = logging.getLogger(__name__)
+
+# 可以生成衍生版本的源图扩展名（PDF / Word 等文档引用不处理）
+_IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tif", ".tiff", ".webp"}
+
+ORIGINAL_RENDITION = "original"
+DERIVATIVE_URL_PREFIX = "/api/v1/questions/images"
+
+
+def parse_rendition_sizes(spec: str) -> Dict[str, int]:
+    """解析 "thumb:256,medium:1024" 形式的配置"""
+    sizes: Dict[str, int] = {}
+    for item in spec.split(","):
+        name, _, edge = item.strip().partition(":")
+        if name and edge.strip().isdigit():
+            sizes[name.strip()] = int(edge)
+    return sizes
+
+
+def is_derivable(source_key: Optional[str]) -> bool:
+    """存储键是否指向可以生成衍生版本的图片"""
+    return bool(source_key) and os.path.splitext(source_key)[1].lower() in _IMAGE_EXTENSIONS
+
+
+def derivative_urls(source_image_ref: Optional[str]) -> Optional[Dict[str, str]]:
+    """
+    源图引用 -> 原图及各衍生版本的访问地址
+
+    地址只依赖源图存储键和版本名，不查询索引；衍生图尚未生成时由接口补生成。
+
+    Returns:
+        {"original": url, "thumb": url, ...}；源图不是 blob 引用的图片（旧数据）时返回 None
+    """
+    try:
+        source_key = parse_blob_ref(source_image_ref)
+    except ValueError:
+        return None
+    if not is_derivable(source_key):
+        return None
+    names = [ORIGINAL_RENDITION, *parse_rendition_sizes(settings.IMAGE_DERIVATIVE_SIZES)]
+    return {name: f"{DERIVATIVE_URL_PREFIX}/{source_key}/{name}" for name in names}
+
+
+def render_derivatives(src_path: str, output_dir: str, sizes: Dict[str, int], quality: int) -> Dict[str, str]:
+    """
+    生成各尺寸的 WebP 文件（在子进程中执行）
+
+    源图只解码一次：JPEG 按最大尺寸以 draft 模式缩小解码，之后由大到小依次缩放，
+    每个尺寸从上一个尺寸缩放而来。
+
+    Args:
+        src_path: 源图路径
+        output_dir: 输出目录
+        sizes: 版本名 -> 最长边像素
+        quality: WebP 压缩质量
+
+    Returns:
+        版本名 -> 生成的文件路径
+    """
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    prefix = uuid.uuid4().hex
+    results: Dict[str, str] = {}
+    with Image.open(src_path) as img:
+        largest = max(sizes.values())
+        img.draft("RGB", (largest, largest))
+        img = ImageOps.exif_transpose(img)
+        has_alpha = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+        img = img.convert("RGBA" if has_alpha else "RGB")
+        for name, edge in sorted(sizes.items(), key=lambda item: -item[1]):
+            if max(img.size) > edge:
+                img.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+            path = os.path.join(output_dir, f"{prefix}_{name}.webp")
+            img.save(path, format="WEBP", quality=quality, method=4)
+            results[name] = path
+    return results
+
+
+class ImageDerivativeService:
+    """衍生图生成器：进程池负责缩放编码，主进程负责存储和索引"""
+
+    def __init__(
+        self,
+        store: BlobStore,
+        index_path: str,
+        sizes: Dict[str, int],
+        quality: int,
+        pool: LazyProcessPool,
+        output_dir: str,
+    ):
+        """
+        Args:
+            store: 内容寻址存储（源图和衍生图都存放在这里）
+            index_path: 衍生图索引 SQLite 文件路径
+            sizes: 版本名 -> 最长边像素
+            quality: WebP 压缩质量
+            pool: 执行缩放编码的进程池
+            output_dir: 生成文件的临时目录（存入存储后删除）
+        """
+        self.store = store
+        self.index_path = index_path
+        self.sizes = sizes
+        self.quality = quality
+        self.pool = pool
+        # 子进程按绝对路径写入，不依赖其工作目录
+        self.output_dir = str(Path(output_dir).resolve())
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+
+        Path(index_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS image_derivatives (
+                    source_key TEXT NOT NULL,
+                    rendition TEXT NOT NULL,
+                    max_edge INTEGER NOT NULL,
+                    blob_key TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (source_key, rendition, max_edge)
+                )
+                """
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def lookup(self, source_key: str) -> Dict[str, str]:
+        """已生成的衍生图：版本名 -> 存储键（只返回当前尺寸配置下的版本）"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT rendition, max_edge, blob_key FROM image_derivatives WHERE source_key = ?",
+                (source_key,),
+            ).fetchall()
+        return {name: blob_key for name, edge, blob_key in rows if self.sizes.get(name) == edge}
+
+    def submit(self, source_key: str) -> Optional[Future]:
+        """
+        在进程池中生成缺失的衍生图，不等待结果
+
+        同一源图同时只有一个生成任务；全部版本都已存在时返回 None。
+        """
+        if not is_derivable(source_key):
+            return None
+        with self._lock:
+            pending = self._pending.get(source_key)
+            if pending is not None:
+                return pending
+        missing = {name: edge for name, edge in self.sizes.items() if name not in self.lookup(source_key)}
+        if not missing:
+            return None
+
+        src_path = self.store.local_path(source_key)
+        with self._lock:
+            pending = self._pending.get(source_key)
+            if pending is not None:
+                return pending
+            rendered = self.pool.submit(
+                render_derivatives, src_path, self.output_dir, missing, self.quality
+            )
+            # 衍生图存入存储并写入索引后才完成（等待方随后即可查询索引）
+            stored: Future = Future()
+            self._pending[source_key] = stored
+        rendered.add_done_callback(lambda done: self._store_results(source_key, missing, done, stored))
+        return stored
+
+    def submit_many(self, source_refs: Iterable[str]) -> int:
+        """为一批源图引用提交生成任务（导入时调用），返回提交的任务数"""
+        submitted = 0
+        for ref in set(source_refs):
+            try:
+                source_key = parse_blob_ref(ref)
+                if source_key and self.submit(source_key) is not None:
+                    submitted += 1
+            except Exception as e:
+                logger.warning(f"Failed to schedule derivatives for {ref}: {e}")
+        return submitted
+
+    def _store_results(self, source_key: str, sizes: Dict[str, int], rendered: Future, stored: Future) -> None:
+        try:
+            paths = rendered.result()
+            now = time.time()
+            rows = [
+                (source_key, name, sizes[name], self.store.put_file(path, move=True), now)
+                for name, path in paths.items()
+            ]
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO image_derivatives VALUES (?, ?, ?, ?, ?)", rows
+                )
+        except BaseException as e:
+            logger.error(f"Failed to generate derivatives for {source_key}: {e!r}")
+            stored.set_exception(e)
+        else:
+            stored.set_result({name: blob_key for _, name, _, blob_key, _ in rows})
+        finally:
+            with self._lock:
+                self._pending.pop(source_key, None)
+
+    def get(self, source_key: str, rendition: str) -> Optional[str]:
+        """
+        获取衍生图的存储键，尚未生成时同步生成（阻塞调用线程）
+
+        Returns:
+            存储键；版本名未配置、源图不是图片时返回 None
+
+        Raises:
+            BlobNotFoundError: 源图不存在
+        """
+        if rendition not in self.sizes or not is_derivable(source_key):
+            return None
+        existing = self.lookup(source_key).get(rendition)
+        if existing and self.store.exists(existing):
+            return existing
+        if existing:
+            # 索引记录的衍生图已被删除：清除记录后重新生成
+            with self._connect() as conn:
+                conn.execute("DELETE FROM image_derivatives WHERE source_key = ?", (source_key,))
+        future = self.submit(source_key)
+        if future is not None:
+            future.result()
+        return self.lookup(source_key).get(rendition)
+
+
+def schedule_derivatives(source_refs: Iterable[str]) -> None:
+    """导入时为源图预生成衍生图（未启用时不做任何事）"""
+    if settings.IMAGE_DERIVATIVES_ENABLED:
+        get_image_derivative_service().submit_many(source_refs)
+
+
+# 全局单例
+_derivative_instance: Optional[ImageDerivativeService] = None
+
+
+def get_image_derivative_service() -> ImageDerivativeService:
+    """获取衍生图生成器单例"""
+    global _derivative_instance
+    if _derivative_instance is None:
+        _derivative_instance = ImageDerivativeService(
+            store=get_blob_store(),
+            index_path=settings.IMAGE_DERIVATIVE_INDEX_PATH,
+            sizes=parse_rendition_sizes(settings.IMAGE_DERIVATIVE_SIZES),
+            quality=settings.IMAGE_DERIVATIVE_WEBP_QUALITY,
+            pool=get_process_pool(DERIVATIVES_POOL),
+            output_dir=settings.IMAGE_DERIVATIVE_DIR,
+        )
+    return _derivative_instance
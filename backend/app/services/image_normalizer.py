@@ -0,0 +1,182 @@
+"""
+OCR前图片规范化 - 纠正EXIF方向、限制最长边、可选灰度、统一转为JPEG
+
+手机拍摄的原图通常为 4000×3000 或 WebP/TIFF/BMP 等格式，直接发送给模型会增加
+上传字节数、图片 token 和延迟。规范化在导入进程池中执行，不阻塞事件循环和 OCR 线程。
+"""
+import asyncio
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from PIL import Image, ImageOps
+
+from app.config import settings
+from app.services.process_pool import INGEST_POOL, LazyProcessPool, get_process_pool
+
+logger = logging.getLogger(__name__)
+
+# 不需要转换即可直接发送的格式（在不缩放、不灰度化时保留原文件）
+_PASSTHROUGH_FORMATS = {"JPEG", "PNG"}
+
+
+def has_alpha(img: Image.Image) -> bool:
+    """图片是否带透明通道"""
+    return img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+
+
+def flatten_to_rgb(img: Image.Image) -> Image.Image:
+    """
+    转为 RGB，带透明通道的图片先铺到白底上
+
+    直接 convert("RGB") 会丢弃 alpha，透明截图的背景变成黑色，深色文字无法识别。
+    """
+    if not has_alpha(img):
+        return img if img.mode == "RGB" else img.convert("RGB")
+    rgba = img.convert("RGBA")
+    background = Image.new("RGB", rgba.size, (255, 255, 255))
+    background.paste(rgba, mask=rgba.getchannel("A"))
+    return background
+
+
+def normalize_image_file(
+    src_path: str,
+    dest_path: str,
+    max_long_edge: int,
+    grayscale: bool,
+    jpeg_quality: int,
+) -> Dict[str, Any]:
+    """
+    规范化单张图片（在子进程中执行）
+
+    Args:
+        src_path: 原图路径
+        dest_path: 规范化后 JPEG 的输出路径
+        max_long_edge: 最长边像素上限
+        grayscale: 是否转为灰度图
+        jpeg_quality: JPEG 压缩质量
+
+    Returns:
+        包含 path, original_bytes, normalized_bytes, original_size, size 的字典；
+        若规范化不能减小体积，path 为原图路径
+    """
+    original_bytes = os.path.getsize(src_path)
+    with Image.open(src_path) as img:
+        source_format = img.format
+        original_size = img.size
+        # 0x0112: EXIF Orientation，1 表示无需旋转
+        needs_rotate = img.getexif().get(0x0112, 1) != 1
+        needs_resize = max(original_size) > max_long_edge
+        transparent = has_alpha(img)
+        needs_convert = grayscale or transparent or source_format not in _PASSTHROUGH_FORMATS
+        if not (needs_resize or needs_convert or needs_rotate):
+            return {
+                "path": src_path,
+                "original_bytes": original_bytes,
+                "normalized_bytes": original_bytes,
+                "original_size": original_size,
+                "size": original_size,
+            }
+
+        img = ImageOps.exif_transpose(img)
+        if needs_resize:
+            img.thumbnail((max_long_edge, max_long_edge), Image.Resampling.LANCZOS)
+        img = flatten_to_rgb(img)
+        if grayscale:
+            img = img.convert("L")
+        img.save(dest_path, format="JPEG", quality=jpeg_quality, optimize=True)
+        size = img.size
+
+    normalized_bytes = os.path.getsize(dest_path)
+    # 仅因灰度化而重新编码却反而变大时，保留原图（透明图片必须使用铺白底后的结果）
+    if (
+        normalized_bytes >= original_bytes
+        and not (needs_resize or needs_rotate or transparent)
+        and source_format in _PASSTHROUGH_FORMATS
+    ):
+        os.remove(dest_path)
+        dest_path = src_path
+        normalized_bytes = original_bytes
+        size = original_size
+
+    return {
+        "path": dest_path,
+        "original_bytes": original_bytes,
+        "normalized_bytes": normalized_bytes,
+        "original_size": original_size,
+        "size": size,
+    }
+
+
+class ImageNormalizer:
+    """图片规范化器，在共享的导入进程池中执行"""
+
+    def __init__(
+        self,
+        max_long_edge: int,
+        grayscale: bool,
+        jpeg_quality: int,
+        pool: LazyProcessPool,
+        output_dir: str,
+    ):
+        self.max_long_edge = max_long_edge
+        self.grayscale = grayscale
+        self.jpeg_quality = jpeg_quality
+        self.pool = pool
+        self.output_dir = Path(output_dir)
+
+    @property
+    def signature(self) -> str:
+        """规范化参数签名，参与 OCR 缓存键（参数变化时结果可能不同）"""
+        mode = "gray" if self.grayscale else "rgb"
+        return f"norm-{self.max_long_edge}-{mode}-q{self.jpeg_quality}"
+
+    def _submit(self, image_path: str):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        dest_path = str(self.output_dir / f"{uuid.uuid4()}.jpg")
+        return self.pool.submit(
+            normalize_image_file,
+            image_path,
+            dest_path,
+            self.max_long_edge,
+            self.grayscale,
+            self.jpeg_quality,
+        )
+
+    def normalize(self, image_path: str) -> Dict[str, Any]:
+        """在进程池中规范化图片并等待结果（供 OCR 线程调用）"""
+        return self._submit(image_path).result()
+
+    async def normalize_async(self, image_path: str) -> Dict[str, Any]:
+        """在进程池中规范化图片，不阻塞事件循环"""
+        return await asyncio.wrap_future(self._submit(image_path))
+
+    @staticmethod
+    def release(result: Dict[str, Any], image_path: str) -> None:
+        """删除规范化产生的临时文件（原图不删除）"""
+        normalized_path = result.get("path")
+        if normalized_path and normalized_path != image_path:
+            try:
+                os.remove(normalized_path)
+            except OSError as exc:
+                logger.warning(f"Failed to remove normalized image {normalized_path}: {exc}")
+
+
+# 全局单例
+_normalizer_instance: Optional[ImageNormalizer] = None
+
+
+def get_image_normalizer() -> ImageNormalizer:
+    """获取图片规范化器单例"""
+    global _normalizer_instance
+    if _normalizer_instance is None:
+        _normalizer_instance = ImageNormalizer(
+            max_long_edge=settings.OCR_NORMALIZE_MAX_LONG_EDGE,
+            grayscale=settings.OCR_NORMALIZE_GRAYSCALE,
+            jpeg_quality=settings.OCR_NORMALIZE_JPEG_QUALITY,
+            pool=get_process_pool(INGEST_POOL),
+            output_dir=settings.OCR_NORMALIZE_DIR,
+        )
+    return _normalizer_instance
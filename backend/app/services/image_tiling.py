@@ -0,0 +1,305 @@
+"""
+超长图片分块识别 - 把长截图 / 拼接扫描件切成互相重叠的横向条带，并行识别后合并
+
+长截图（高宽比远大于 A4）直接发送给模型时，要么被压缩到无法辨认，要么识别耗时很长。
+分块后每个条带接近一页 A4 的比例，条带并行识别，整页延迟约等于单个条带的延迟。
+相邻条带有重叠，跨越分界线的题目会被两个条带同时识别，合并时按题号和文本重叠去重。
+"""
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 只在相邻条带首尾的若干道题之间查找重复（重叠区域内的题目数有限）
+_BOUNDARY_WINDOW = 3
+
+
+def plan_tiles(height: int, tile_height: int, overlap: int) -> List[Tuple[int, int]]:
+    """
+    计算条带的 (top, bottom) 像素范围
+
+    条带高度固定为 tile_height，相邻条带重叠 overlap 像素；最后一个条带与底边对齐，
+    因此不会出现很矮的尾条带。
+
+    Args:
+        height: 图片高度
+        tile_height: 条带高度
+        overlap: 相邻条带的重叠高度（小于 tile_height）
+
+    Returns:
+        自上而下的条带范围列表；图片不高于 tile_height 时只有一个条带
+    """
+    if height <= tile_height:
+        return [(0, height)]
+    step = max(1, tile_height - overlap)
+    count = -(-(height - overlap) // step)  # ceil((height - overlap) / step)
+    return [
+        (top, top + tile_height)
+        for top in (min(index * step, height - tile_height) for index in range(count))
+    ]
+
+
+def merge_tile_questions(tile_questions: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    按条带顺序合并识别结果，去掉重叠区域内被重复识别的题目
+
+    相邻条带中，上一条带末尾的题目与下一条带开头的题目若题号相同、
+    或（任一方无题号时）文本高度重叠，视为同一道题：保留内容更完整的版本，并补全缺失的选项。
+
+    Args:
+        tile_questions: 每个条带的题目列表，自上而下排列
+
+    Returns:
+        合并后的题目列表
+    """
+    merged: List[Dict[str, Any]] = []
+    previous_start = 0  # 上一个有题目的条带在 merged 中的起始位置
+    for questions in tile_questions:
+        if not questions:
+            continue
+        tile_start = len(merged)
+        candidates = range(max(previous_start, tile_start - _BOUNDARY_WINDOW), tile_start)
+        for position, question in enumerate(questions):
+            index = _find_duplicate(question, merged, candidates) if position < _BOUNDARY_WINDOW else None
+            if index is None:
+                merged.append(question)
+            else:
+                merged[index] = _merge_duplicate(merged[index], question)
+        previous_start = tile_start
+    return merged
+
+
+def _offset_positions(questions: List[Dict[str, Any]], top: int) -> None:
+    """把条带内的题目坐标换算为原图坐标（条带只在纵向偏移）"""
+    for question in questions:
+        position = question.get("position")
+        if isinstance(position, dict) and top:
+            question["position"] = {
+                **position,
+                **{key: position[key] + top for key in ("y_min", "y_max", "center_y") if key in position},
+            }
+
+
+def _find_duplicate(question: Dict[str, Any], merged: List[Dict[str, Any]], candidates: range) -> Optional[int]:
+    """在上一条带末尾的题目中查找与 question 相同的题目，返回其在 merged 中的位置"""
+    number = question.get("number")
+    for index in reversed(candidates):
+        candidate = merged[index]
+        candidate_number = candidate.get("number")
+        if number is not None and candidate_number is not None:
+            # 题号相同仍要求文本有一定重叠，避免分节重新编号（"二、1."）被误合并
+            if number == candidate_number and _text_overlap(question, candidate) >= 0.5:
+                return index
+        elif _text_overlap(question, candidate) >= 0.8:
+            return index
+    return None
+
+
+def _text_overlap(first: Dict[str, Any], second: Dict[str, Any]) -> float:
+    """两道题干最长公共片段占较短题干的比例（条带切断的题干是完整题干的前缀或后缀）"""
+    a = "".join(str(first.get("content") or "").split())
+    b = "".join(str(second.get("content") or "").split())
+    if not a or not b:
+        return 1.0 if a == b else 0.0
+    block = SequenceMatcher(None, a, b, autojunk=False).find_longest_match(0, len(a), 0, len(b))
+    return block.size / min(len(a), len(b))
+
+
+def _merge_duplicate(kept: Dict[str, Any], other: Dict[str, Any]) -> Dict[str, Any]:
+    """保留题干更长的版本，按选项标签补全另一版本独有的选项"""
+    if len(str(other.get("content") or "")) > len(str(kept.get("content") or "")):
+        kept, other = other, kept
+    result = dict(kept)
+    if result.get("number") is None and other.get("number") is not None:
+        result["number"] = other["number"]
+    labels = {option.get("label") for option in result.get("options") or []}
+    extra = [option for option in other.get("options") or [] if option.get("label") not in labels]
+    if extra:
+        result["options"] = sorted(
+            list(result.get("options") or []) + extra, key=lambda option: str(option.get("label", ""))
+        )
+    return result
+
+
+class TallImageTiler:
+    """超长图片分块识别器，持有条带识别线程池"""
+
+    def __init__(
+        self,
+        min_aspect: float,
+        tile_aspect: float,
+        overlap: float,
+        workers: int,
+        output_dir: str,
+    ):
+        """
+        Args:
+            min_aspect: 高宽比超过该值的图片才分块
+            tile_aspect: 条带的高宽比（1.41 约为 A4 纵向）
+            overlap: 相邻条带重叠高度占条带高度的比例
+            workers: 同时识别的条带数
+            output_dir: 条带图片的临时目录
+        """
+        self.min_aspect = min_aspect
+        self.tile_aspect = tile_aspect
+        self.overlap = min(max(overlap, 0.0), 0.5)
+        self.workers = max(1, workers)
+        self.output_dir = Path(output_dir)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ocr-tile")
+        return self._executor
+
+    def needs_tiling(self, image_path: str) -> bool:
+        """图片（按 EXIF 方向纠正后）的高宽比是否超过阈值；无法读取时返回 False"""
+        try:
+            with Image.open(image_path) as img:
+                width, height = img.size
+                # 5-8 表示旋转 90 度，宽高互换
+                if img.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+                    width, height = height, width
+        except Exception:
+            return False
+        return width > 0 and height / width > self.min_aspect
+
+    def iter_tiles(self, image_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        把图片切成重叠条带并逐个保存到临时目录（保存一个产出一个，调用方可以边切边识别）
+
+        Yields:
+            条带信息，包含 path, top, bottom
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        prefix = uuid.uuid4().hex
+        with Image.open(image_path) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            width, height = img.size
+            tile_height = max(1, int(width * self.tile_aspect))
+            overlap = int(tile_height * self.overlap)
+            for index, (top, bottom) in enumerate(plan_tiles(height, tile_height, overlap)):
+                path = str(self.output_dir / f"{prefix}_{index:03d}.png")
+                # 条带只是临时文件：低压缩级别换取切分速度
+                img.crop((0, top, width, bottom)).save(path, format="PNG", compress_level=1)
+                yield {"path": path, "top": top, "bottom": bottom}
+
+    def extract_questions_with_report(
+        self, backend: Any, image_path: str
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        分块并行识别并合并结果
+
+        Args:
+            backend: OCR 后端（OCRBackend）
+            image_path: 原图路径
+
+        Returns:
+            (questions, report) - 合并后的题目；任一条带部分解析或识别失败时 report 汇总各条带的恢复报告，
+            识别失败的条带记录在 report["failed_tiles"]（top, bottom, error），其中的题目已丢失
+
+        Raises:
+            所有条带都识别失败时抛出第一个条带的异常
+        """
+        tiles: List[Dict[str, Any]] = []
+        futures = []
+        try:
+            for tile in self.iter_tiles(image_path):
+                tiles.append(tile)
+                futures.append(self._get_executor().submit(backend.extract_questions_with_report, tile["path"]))
+
+            tile_questions: List[List[Dict[str, Any]]] = []
+            reports: List[Dict[str, Any]] = []
+            errors: List[Exception] = []
+            failed_tiles: List[Dict[str, Any]] = []
+            for tile, future in zip(tiles, futures):
+                try:
+                    questions, report = future.result()
+                    _offset_positions(questions, tile["top"])
+                except Exception as exc:
+                    logger.error(f"OCR failed for tile {tile['top']}-{tile['bottom']} of {image_path}: {exc}")
+                    errors.append(exc)
+                    failed_tiles.append({"top": tile["top"], "bottom": tile["bottom"], "error": str(exc)})
+                    questions, report = [], None
+                tile_questions.append(questions)
+                if report:
+                    reports.append(report)
+            if errors and len(errors) == len(tiles):
+                raise errors[0]
+        finally:
+            # 切分中途失败时取消未开始的条带，等已开始的条带识别结束再删除文件
+            for future in futures:
+                future.cancel()
+            wait(futures)
+            for tile in tiles:
+                try:
+                    os.remove(tile["path"])
+                except OSError as exc:
+                    logger.warning(f"Failed to remove tile {tile['path']}: {exc}")
+
+        questions = merge_tile_questions(tile_questions)
+        logger.info(
+            f"Tiled OCR of {image_path}: {len(tiles)} tiles, "
+            f"{sum(len(q) for q in tile_questions)} raw -> {len(questions)} merged questions"
+        )
+        return questions, self._combine_reports(reports, failed_tiles)
+
+    @staticmethod
+    def _combine_reports(
+        reports: List[Dict[str, Any]], failed_tiles: List[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        if not reports and not failed_tiles:
+            return None
+        return {
+            "recovered": sum(report.get("recovered", 0) for report in reports),
+            "lost": [item for report in reports for item in report.get("lost") or []],
+            "lost_numbers": [number for report in reports for number in report.get("lost_numbers") or []],
+            "truncated": any(report.get("truncated") for report in reports),
+            "raw_key": next((report.get("raw_key") for report in reports if report.get("raw_key")), None),
+            "failed_tiles": failed_tiles,
+        }
+
+    def shutdown(self) -> None:
+        """关闭线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 全局单例
+_tiler_instance: Optional[TallImageTiler] = None
+
+
+def get_image_tiler() -> TallImageTiler:
+    """获取超长图片分块识别器单例"""
+    global _tiler_instance
+    if _tiler_instance is None:
+        _tiler_instance = TallImageTiler(
+            min_aspect=settings.OCR_TILING_MIN_ASPECT,
+            tile_aspect=settings.OCR_TILE_ASPECT,
+            overlap=settings.OCR_TILE_OVERLAP,
+            workers=settings.OCR_TILE_WORKERS,
+            output_dir=settings.OCR_TILE_DIR,
+        )
+    return _tiler_instance
+
+
+def shutdown_image_tiler() -> None:
+    """应用关闭时释放线程池"""
+    if _tiler_instance is not None:
+        _tiler_instance.shutdown()
@@ -0,0 +1,447 @@
+"""
+异步文档导入任务 - 基于数据库表的持久化任务队列和后台worker池
+
+上传接口只创建 Document 和 IngestJob 后立即返回 202，
+worker 线程从 ingest_jobs 表领取任务，逐页OCR并增量更新文档进度。
+队列保存在数据库中，API 重启后未完成的任务会被重新领取。
+"""
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.ingest_job import IngestJob
+from app.models.question import Document
+from app.services.blob_store import get_blob_store
+from app.services.docx_parser import is_docx_file
+from app.services.ocr_integration import get_ocr_integration_service
+from app.services.pdf_ingest import count_pdf_pages
+
+logger = logging.getLogger(__name__)
+
+
+class IngestJobLostError(RuntimeError):
+    """任务已不属于当前 worker（心跳超时被回收后由其他 worker 领取）"""
+
+
+class JobHeartbeat:
+    """
+    任务执行期间由后台线程定期刷新心跳
+
+    单页耗时（重试、分块、大页渲染）超过 INGEST_JOB_STALE_SECONDS 时，任务也不会被当作超时回收。
+    心跳只在任务仍由当前 worker 持有时写入，任务被回收后线程退出。
+    """
+
+    def __init__(self, job_id: uuid.UUID, worker_id: str, interval: float):
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.interval = max(1.0, interval)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "JobHeartbeat":
+        self._thread = threading.Thread(target=self._run, name=f"ingest-heartbeat-{self.job_id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            db = SessionLocal()
+            try:
+                updated = (
+                    db.query(IngestJob)
+                    .filter(
+                        IngestJob.id == self.job_id,
+                        IngestJob.worker_id == self.worker_id,
+                        IngestJob.status == 'running',
+                    )
+                    .update({IngestJob.heartbeat_at: datetime.utcnow()}, synchronize_session=False)
+                )
+                db.commit()
+                if updated != 1:
+                    logger.warning(f"Ingest job {self.job_id} is no longer owned by {self.worker_id}")
+                    return
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Failed to write heartbeat for ingest job {self.job_id}: {e}")
+            finally:
+                db.close()
+
+
+class IngestJobService:
+    """导入任务的入队、领取、执行和进度查询"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def enqueue(
+        self,
+        document_id: str,
+        image_paths: List[str],
+        created_by: str,
+        max_concurrency: int = None,
+        document_path: str = None,
+        ocr_backend: str = None,
+    ) -> IngestJob:
+        """
+        创建待处理的导入任务
+
+        Args:
+            document_id: 已创建的文档ID
+            image_paths: 需要识别的图片路径列表
+            created_by: 提交用户ID
+            max_concurrency: 同时识别的最大页数
+            document_path: PDF / Word 文件路径（按文档处理，忽略 image_paths）
+            ocr_backend: 题目识别后端名称，为空时由 worker 按 OCR_BACKEND 配置选择
+
+        Returns:
+            创建的任务对象
+        """
+        try:
+            if not document_path:
+                pages_total = len(image_paths)
+            elif is_docx_file(document_path):
+                pages_total = 1
+            else:
+                # document_path 可能是 blob 引用，计数前解析为本地文件
+                pages_total = count_pdf_pages(get_blob_store().resolve(document_path))
+            job = IngestJob(
+                document_id=uuid.UUID(str(document_id)),
+                created_by=uuid.UUID(str(created_by)),
+                status='pending',
+                payload={
+                    "image_paths": list(image_paths),
+                    "max_concurrency": max_concurrency,
+                    "document_path": document_path,
+                    "ocr_backend": ocr_backend,
+                },
+                pages_total=pages_total,
+                pages_done=0,
+                completed_pages=[],
+                attempts=0,
+            )
+            self.db.add(job)
+            self.db.commit()
+            self.db.refresh(job)
+
+            logger.info(f"Enqueued ingest job {job.id} for document {document_id}")
+            return job
+
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Failed to enqueue ingest job: {e}")
+            raise
+
+    def get_latest_job(self, document_id: str) -> Optional[IngestJob]:
+        """获取文档最近一次的导入任务"""
+        return (
+            self.db.query(IngestJob)
+            .filter(IngestJob.document_id == uuid.UUID(str(document_id)))
+            .order_by(IngestJob.created_at.desc())
+            .first()
+        )
+
+    def claim_next(self, worker_id: str) -> Optional[IngestJob]:
+        """
+        领取最早的待处理任务
+
+        通过带状态条件的 UPDATE 保证同一任务只会被一个 worker（包括其他进程中的 worker）领取。
+        """
+        try:
+            candidate = (
+                self.db.query(IngestJob.id)
+                .filter(IngestJob.status == 'pending')
+                .order_by(IngestJob.created_at)
+                .first()
+            )
+            if not candidate:
+                return None
+
+            now = datetime.utcnow()
+            claimed = (
+                self.db.query(IngestJob)
+                .filter(IngestJob.id == candidate.id, IngestJob.status == 'pending')
+                .update(
+                    {
+                        IngestJob.status: 'running',
+                        IngestJob.worker_id: worker_id,
+                        IngestJob.heartbeat_at: now,
+                        IngestJob.started_at: func.coalesce(IngestJob.started_at, now),
+                        IngestJob.attempts: IngestJob.attempts + 1,
+                    },
+                    synchronize_session=False,
+                )
+            )
+            self.db.commit()
+            if claimed != 1:
+                return None
+            return self.db.query(IngestJob).filter(IngestJob.id == candidate.id).first()
+
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Failed to claim ingest job: {e}")
+            raise
+
+    def requeue_stale_jobs(self) -> int:
+        """
+        回收心跳超时的运行中任务（worker 崩溃或 API 重启）
+
+        未超过最大重试次数的任务重新置为 pending，否则标记为失败。
+
+        Returns:
+            被回收的任务数量
+        """
+        try:
+            deadline = datetime.utcnow() - timedelta(seconds=settings.INGEST_JOB_STALE_SECONDS)
+            stale_jobs = (
+                self.db.query(IngestJob)
+                .filter(IngestJob.status == 'running', IngestJob.heartbeat_at < deadline)
+                .all()
+            )
+            for job in stale_jobs:
+                if (job.attempts or 0) >= settings.INGEST_JOB_MAX_ATTEMPTS:
+                    self._mark_failed(job, "Job exceeded max attempts after worker timeout")
+                else:
+                    job.status = 'pending'
+                    job.worker_id = None
+                logger.warning(f"Recovered stale ingest job {job.id} -> {job.status}")
+            self.db.commit()
+            return len(stale_jobs)
+
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Failed to requeue stale ingest jobs: {e}")
+            raise
+
+    def _owned(self, job: IngestJob, worker_id: str):
+        """仍由 worker_id 持有的运行中任务"""
+        return self.db.query(IngestJob).filter(
+            IngestJob.id == job.id,
+            IngestJob.worker_id == worker_id,
+            IngestJob.status == 'running',
+        )
+
+    def run_job(self, job: IngestJob) -> None:
+        """
+        执行已领取的任务，逐页记录进度以便中断后续跑
+
+        每页的任务进度与该页题目在同一事务中提交（见 process_document_pages），
+        写入前确认任务仍由当前 worker 持有，被回收的任务不再提交任何结果。
+        """
+        payload = job.payload or {}
+        worker_id = job.worker_id
+        completed_pages = set(job.completed_pages or [])
+
+        def on_page(page: Dict) -> None:
+            completed_pages.add(page["image_index"])
+            updated = self._owned(job, worker_id).update(
+                {
+                    IngestJob.completed_pages: sorted(completed_pages),
+                    IngestJob.pages_done: len(completed_pages),
+                    IngestJob.heartbeat_at: datetime.utcnow(),
+                },
+                synchronize_session=False,
+            )
+            if updated != 1:
+                raise IngestJobLostError(f"Ingest job {job.id} is no longer owned by {worker_id}")
+
+        heartbeat = JobHeartbeat(job.id, worker_id, settings.INGEST_JOB_STALE_SECONDS / 3)
+        try:
+            with heartbeat:
+                ocr_service = get_ocr_integration_service(self.db, ocr_backend=payload.get("ocr_backend"))
+                ocr_service.process_document_pages(
+                    document_id=str(job.document_id),
+                    image_paths=payload.get("image_paths", []),
+                    uploaded_by=str(job.created_by),
+                    max_concurrency=payload.get("max_concurrency"),
+                    skip_indexes=completed_pages,
+                    on_page=on_page,
+                    document_path=payload.get("document_path"),
+                )
+            finished = self._owned(job, worker_id).update(
+                {IngestJob.status: 'completed', IngestJob.finished_at: datetime.utcnow()},
+                synchronize_session=False,
+            )
+            self.db.commit()
+            if finished != 1:
+                raise IngestJobLostError(f"Ingest job {job.id} is no longer owned by {worker_id}")
+            logger.info(f"Ingest job {job.id} completed")
+
+        except IngestJobLostError as e:
+            self.db.rollback()
+            logger.warning(f"{e}; abandoning")
+
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Ingest job {job.id} failed: {e}", exc_info=True)
+            # rollback 后重新加载任务，已被其他 worker 接管时不再改动
+            self.db.refresh(job)
+            if job.worker_id != worker_id or job.status != 'running':
+                logger.warning(f"Ingest job {job.id} is no longer owned by {worker_id}; abandoning")
+                return
+            if (job.attempts or 0) >= settings.INGEST_JOB_MAX_ATTEMPTS:
+                self._mark_failed(job, str(e))
+            else:
+                job.status = 'pending'
+                job.worker_id = None
+                job.error = str(e)
+            self.db.commit()
+
+    def _mark_failed(self, job: IngestJob, error: str) -> None:
+        job.status = 'failed'
+        job.error = error
+        job.finished_at = datetime.utcnow()
+        document = self.db.query(Document).filter(Document.id == job.document_id).first()
+        if document:
+            document.processing_status = 'failed'
+            document.extraction_errors = list(document.extraction_errors or []) + [
+                {"error": error, "timestamp": datetime.utcnow().isoformat()}
+            ]
+
+    def get_document_progress(self, document: Document) -> Dict:
+        """
+        获取文档处理进度和预计剩余时间
+
+        Args:
+            document: 文档对象
+
+        Returns:
+            进度信息字典
+        """
+        job = self.get_latest_job(str(document.id))
+        pages_total = job.pages_total if job else 0
+        pages_done = job.pages_done if job else 0
+
+        if document.processing_status == 'completed':
+            progress = 1.0
+        elif pages_total:
+            progress = round(pages_done / pages_total, 4)
+        else:
+            progress = 0.0
+
+        eta_seconds = None
+        if job and job.status == 'running' and job.started_at and pages_done:
+            elapsed = (datetime.utcnow() - job.started_at).total_seconds()
+            eta_seconds = round(elapsed / pages_done * (pages_total - pages_done), 1)
+
+        return {
+            "document_id": str(document.id),
+            "processing_status": document.processing_status,
+            "total_questions": document.total_questions or 0,
+            "processed_questions": document.processed_questions or 0,
+            "job_id": str(job.id) if job else None,
+            "job_status": job.status if job else None,
+            "pages_total": pages_total,
+            "pages_done": pages_done,
+            "progress": progress,
+            "eta_seconds": eta_seconds,
+            "error": job.error if job else None,
+            "updated_at": document.updated_at,
+        }
+
+
+class IngestWorkerPool:
+    """后台导入worker池，每个线程循环领取并执行 ingest_jobs 中的任务"""
+
+    def __init__(self, worker_count: int, poll_interval: float):
+        self.worker_count = max(1, worker_count)
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self) -> None:
+        """启动worker线程，并回收上次运行遗留的超时任务"""
+        if self._threads:
+            return
+        self._recover_stale_jobs()
+        self._stop.clear()
+        for index in range(self.worker_count):
+            thread = threading.Thread(
+                target=self._run,
+                args=(f"{self._worker_prefix}:{index}",),
+                name=f"ingest-worker-{index}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {self.worker_count} ingest workers")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """通知worker线程退出；仍在执行的任务会在心跳超时后被重新领取"""
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        logger.info("Ingest workers stopped")
+
+    def notify(self) -> None:
+        """有新任务入队时唤醒空闲worker，避免等待轮询间隔"""
+        self._wakeup.set()
+
+    def _recover_stale_jobs(self) -> None:
+        db = SessionLocal()
+        try:
+            IngestJobService(db).requeue_stale_jobs()
+        except Exception as e:
+            logger.warning(f"Could not recover stale ingest jobs: {e}")
+        finally:
+            db.close()
+
+    def _run(self, worker_id: str) -> None:
+        last_recovery = datetime.utcnow()
+        while not self._stop.is_set():
+            if (datetime.utcnow() - last_recovery).total_seconds() > settings.INGEST_JOB_STALE_SECONDS:
+                self._recover_stale_jobs()
+                last_recovery = datetime.utcnow()
+
+            db = SessionLocal()
+            try:
+                job_service = IngestJobService(db)
+                job = job_service.claim_next(worker_id)
+                if job:
+                    logger.info(f"Worker {worker_id} picked up ingest job {job.id}")
+                    job_service.run_job(job)
+                    continue
+            except Exception as e:
+                logger.error(f"Ingest worker {worker_id} error: {e}", exc_info=True)
+            finally:
+                db.close()
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+
+def get_ingest_job_service(db: Session) -> IngestJobService:
+    """获取导入任务服务实例"""
+    return IngestJobService(db)
+
+
+# 全局单例
+_worker_pool_instance: Optional[IngestWorkerPool] = None
+
+
+def get_ingest_worker_pool() -> IngestWorkerPool:
+    """获取导入worker池单例"""
+    global _worker_pool_instance
+    if _worker_pool_instance is None:
+        _worker_pool_instance = IngestWorkerPool(
+            worker_count=settings.INGEST_WORKER_COUNT,
+            poll_interval=settings.INGEST_POLL_INTERVAL_SECONDS,
+        )
+    return _worker_pool_instance
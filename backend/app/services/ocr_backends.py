@@ -0,0 +1,226 @@
+"""
+OCR 后端注册表 - 题目识别后端的统一接口，可按配置或按请求切换
+
+内置后端:
+- qwen:   通义千问-VL 视觉模型（默认）
+- paddle: PaddleOCR 布局解析 API + 本地题号/选项规则切分
+- replay: 回放录制的识别结果，附加可配置的合成延迟，无需网络（压测 / 基准测试）
+- hedged: 组合后端，主后端超过其 p95 延迟时向备用后端发出对冲请求，带熔断（见 ocr_hedging）
+
+新后端通过 register_ocr_backend 注册，OCR_BACKEND 配置默认后端。
+"""
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OCRBackend(ABC):
+    """
+    题目识别后端接口
+
+    子类必须实现 extract_questions_with_report（抽象方法）；其余方法有基于它的默认实现。
+    """
+
+    name = "base"
+    # 一次模型调用可以识别的最大页数；大于 1 时导入流水线按批提交 extract_questions_batch_with_report
+    max_batch_pages = 1
+
+    @abstractmethod
+    def extract_questions_with_report(
+        self, image_path: str
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        识别单张图片中的题目，并返回部分题目丢失时的恢复报告
+
+        Returns:
+            (questions, report) - report 为 None 表示结果完整
+        """
+
+    def extract_questions_batch_with_report(
+        self, image_paths: List[str]
+    ) -> List[Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]]:
+        """
+        识别一批页面，默认逐页调用 extract_questions_with_report
+
+        Returns:
+            与 image_paths 一一对应的 (questions, report) 列表
+
+        Raises:
+            任一页面识别失败时抛出该页的异常
+        """
+        return [self.extract_questions_with_report(image_path) for image_path in image_paths]
+
+    def is_cached(self, image_path: str) -> bool:
+        """结果是否已缓存（命中缓存的调用不计入延迟统计，也不需要对冲）"""
+        return False
+
+    def extract_questions(self, image_path: str) -> List[Dict[str, Any]]:
+        """
+        从单张图片中识别并解析题目。
+
+        Args:
+            image_path (str): 图片文件的路径。
+
+        Returns:
+            List[Dict]: 解析后的题目列表。每个题目包含：
+                - number: 题号
+                - type: 题目类型
+                - content: 题干内容
+                - options: 选项列表（选择题）
+                - full_content: 完整内容（与content相同，为了兼容）
+                - images: 图片字典
+        """
+        questions, _ = self.extract_questions_with_report(image_path)
+        return questions
+
+    def extract_questions_stream(self, image_path: str) -> Iterator[Dict[str, Any]]:
+        """逐题产出识别结果；不支持增量输出的后端整页识别后依次产出"""
+        yield from self.extract_questions(image_path)
+
+    def batch_extract_questions(self, image_paths: List[str]) -> List[Dict[str, Any]]:
+        """
+        批量处理多张图片。
+
+        Args:
+            image_paths (List[str]): 图片路径列表。
+
+        Returns:
+            List[Dict]: 所有图片识别出的题目列表。
+        """
+        all_questions: List[Dict[str, Any]] = []
+        for index, image_path in enumerate(image_paths):
+            try:
+                questions = self.extract_questions(image_path)
+                for question in questions:
+                    question["source_image"] = image_path
+                    question["image_index"] = index
+                all_questions.extend(questions)
+            except Exception as exc:
+                logger.error(f"Failed to process image {image_path}: {exc}")
+        return all_questions
+
+    def extract_text_from_image(self, image_path: str) -> List[Dict[str, Any]]:
+        """
+        从图片中提取纯文本内容（为了兼容旧接口）。
+
+        默认由识别出的题干和选项拼成文本区域；能返回原始文本行的后端应覆盖。
+
+        Args:
+            image_path (str): 图片文件路径。
+
+        Returns:
+            List[Dict]: 文本区域列表。
+        """
+        text_regions = []
+        for question in self.extract_questions(image_path):
+            text_regions.append({
+                "text": question.get("content", ""),
+                "bbox": [],
+                "confidence": question.get("confidence", 0.95),
+                "position": None
+            })
+            for option in question.get("options", []):
+                text_regions.append({
+                    "text": f"{option.get('label', '')}: {option.get('content', '')}",
+                    "bbox": [],
+                    "confidence": question.get("confidence", 0.95),
+                    "position": None
+                })
+        return text_regions
+
+
+class UnknownOCRBackendError(ValueError):
+    """请求了未注册的 OCR 后端"""
+
+
+_backend_factories: Dict[str, Callable[[], OCRBackend]] = {}
+_backend_instances: Dict[str, OCRBackend] = {}
+# 可重入：组合后端（hedged）的工厂函数会获取其他后端
+_backend_lock = threading.RLock()
+
+
+def register_ocr_backend(name: str, factory: Callable[[], OCRBackend]) -> None:
+    """
+    注册 OCR 后端
+
+    Args:
+        name: 后端名称（不区分大小写）
+        factory: 创建后端实例的函数，首次使用时调用一次
+    """
+    key = name.strip().lower()
+    with _backend_lock:
+        _backend_factories[key] = factory
+        _backend_instances.pop(key, None)
+
+
+def available_ocr_backends() -> List[str]:
+    """已注册的后端名称"""
+    return sorted(_backend_factories)
+
+
+def resolve_ocr_backend_name(name: Optional[str] = None) -> str:
+    """
+    规范化后端名称，为空时使用 OCR_BACKEND 配置
+
+    Raises:
+        UnknownOCRBackendError: 后端未注册
+    """
+    key = (name or settings.OCR_BACKEND).strip().lower()
+    if key not in _backend_factories:
+        raise UnknownOCRBackendError(
+            f"Unknown OCR backend '{key}'. Available backends: {', '.join(available_ocr_backends())}"
+        )
+    return key
+
+
+def get_ocr_backend(name: Optional[str] = None) -> OCRBackend:
+    """
+    获取 OCR 后端单例
+
+    Args:
+        name: 后端名称，为空时使用 OCR_BACKEND 配置
+
+    Raises:
+        UnknownOCRBackendError: 后端未注册
+    """
+    key = resolve_ocr_backend_name(name)
+    backend = _backend_instances.get(key)
+    if backend is None:
+        with _backend_lock:
+            backend = _backend_instances.get(key)
+            if backend is None:
+                backend = _backend_factories[key]()
+                _backend_instances[key] = backend
+                logger.info(f"OCR backend '{key}' initialized: {type(backend).__name__}")
+    return backend
+
+
+def _create_qwen_backend() -> OCRBackend:
+    from app.services.qwen_ocr import get_ocr_service
+    return get_ocr_service()
+
+
+def _create_paddle_backend() -> OCRBackend:
+    from app.services.paddle_ocr import get_ocr_service
+    return get_ocr_service()
+
+
+def _create_replay_backend() -> OCRBackend:
+    from app.services.replay_ocr import get_replay_ocr_service
+    return get_replay_ocr_service()
+
+
+def _create_hedged_backend() -> OCRBackend:
+    from app.services.ocr_hedging import get_hedged_ocr_service
+    return get_hedged_ocr_service()
+
+
+register_ocr_backend("qwen", _create_qwen_backend)
+register_ocr_backend("paddle", _create_paddle_backend)
+register_ocr_backend("replay", _create_replay_backend)
+register_ocr_backend("hedged", _create_hedged_backend)
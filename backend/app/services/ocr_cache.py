@@ -0,0 +1,390 @@
+"""
+OCR结果缓存 - 以图片内容哈希为键的本地持久化缓存
+
+同一张图片（字节完全相同）在相同模型、相同 Prompt 版本下只调用一次付费模型，
+并发的相同请求会等待同一个进行中的调用，而不是各自调用模型。
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path: str) -> str:
+    """分块计算文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OCRResultCache:
+    """
+    基于 SQLite 的 OCR 结果缓存
+
+    - 键: 图片内容哈希 + 模型名称 + Prompt 版本
+    - 值: 序列化后的识别结果（字符串）
+    - 淘汰: 超过 TTL 的条目直接删除；总条数或总字节数超限时按最近访问时间淘汰
+    - 合并: 相同键的并发请求只有一个真正执行 compute，其余等待其结果
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_entries: int = 10000,
+        max_bytes: int = 200 * 1024 * 1024,
+        ttl_seconds: int = 30 * 24 * 3600,
+    ):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "stores": 0, "evictions": 0, "errors": 0}
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ocr_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_ocr_cache_last_accessed ON ocr_cache (last_accessed_at)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(image_path: str, model: str, prompt_version: str) -> str:
+        """根据图片内容、模型和 Prompt 版本生成缓存键"""
+        return f"{model}:{prompt_version}:{hash_file(image_path)}"
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，过期条目视为未命中"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT payload, created_at FROM ocr_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if not row:
+                return None
+            payload, created_at = row
+            if now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM ocr_cache WHERE cache_key = ?", (key,))
+                return None
+            conn.execute(
+                "UPDATE ocr_cache SET last_accessed_at = ? WHERE cache_key = ?", (now, key)
+            )
+            return payload
+
+    def contains(self, key: str) -> bool:
+        """是否存在未过期的缓存条目（不更新访问时间）"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT created_at FROM ocr_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+        return bool(row) and time.time() - row[0] <= self.ttl_seconds
+
+    def put(self, key: str, payload: str) -> None:
+        """写入缓存并按需淘汰"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO ocr_cache (cache_key, payload, size, created_at, last_accessed_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (key, payload, len(payload.encode("utf-8")), now, now),
+            )
+            evicted = self._evict(conn, now)
+        with self._lock:
+            self._stats["stores"] += 1
+            self._stats["evictions"] += evicted
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> int:
+        """删除过期条目，再按 LRU 淘汰至条数和字节数上限以内"""
+        evicted = conn.execute(
+            "DELETE FROM ocr_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+
+        count, total_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_cache"
+        ).fetchone()
+        if count <= self.max_entries and total_bytes <= self.max_bytes:
+            return evicted
+
+        rows = conn.execute(
+            "SELECT cache_key, size FROM ocr_cache ORDER BY last_accessed_at ASC"
+        ).fetchall()
+        doomed = []
+        for cache_key, size in rows:
+            if count <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            doomed.append((cache_key,))
+            count -= 1
+            total_bytes -= size
+        conn.executemany("DELETE FROM ocr_cache WHERE cache_key = ?", doomed)
+        return evicted + len(doomed)
+
+    def get_or_compute(
+        self, key: str, compute: Callable[[], Optional[str]]
+    ) -> Tuple[Optional[str], bool]:
+        """
+        读取缓存，未命中时执行 compute 并缓存其结果
+
+        compute 返回 None 表示结果不可缓存（如调用失败），此时不写入缓存。
+        相同 key 的并发调用只会执行一次 compute。
+
+        Returns:
+            (payload, hit) - hit 为 True 表示未调用 compute（命中缓存或等待了进行中的调用）
+        """
+        payload = self._safe_get(key)
+        if payload is not None:
+            with self._lock:
+                self._stats["hits"] += 1
+            return payload, True
+
+        with self._lock:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                inflight = Future()
+                self._inflight[key] = inflight
+                leader = True
+                self._stats["misses"] += 1
+            else:
+                leader = False
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            return inflight.result(), True
+
+        try:
+            # 上一个进行中的调用可能恰好在本线程查缓存之后完成
+            payload = self._safe_get(key)
+            if payload is not None:
+                with self._lock:
+                    self._stats["misses"] -= 1
+                    self._stats["hits"] += 1
+                inflight.set_result(payload)
+                return payload, True
+            payload = compute()
+            if payload is not None:
+                try:
+                    self.put(key, payload)
+                except sqlite3.Error as exc:
+                    logger.warning("OCR cache write failed for %s: %s", key, exc)
+                    with self._lock:
+                        self._stats["errors"] += 1
+            inflight.set_result(payload)
+            return payload, False
+        except BaseException as exc:
+            inflight.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _safe_get(self, key: str) -> Optional[str]:
+        """读取缓存，缓存库异常时按未命中处理"""
+        try:
+            return self.get(key)
+        except sqlite3.Error as exc:
+            logger.warning("OCR cache read failed for %s: %s", key, exc)
+            with self._lock:
+                self._stats["errors"] += 1
+            return None
+
+    def stats(self) -> Dict:
+        """返回命中/未命中计数和当前缓存占用"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["inflight"] = len(self._inflight)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        try:
+            with self._connect() as conn:
+                entries, total_bytes = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_cache"
+                ).fetchone()
+            stats["entries"] = entries
+            stats["bytes"] = total_bytes
+        except sqlite3.Error as exc:
+            logger.warning("Failed to read OCR cache size: %s", exc)
+        stats["max_entries"] = self.max_entries
+        stats["max_bytes"] = self.max_bytes
+        stats["ttl_seconds"] = self.ttl_seconds
+        return stats
+
+
+class OCRRawOutputStore:
+    """
+    模型原始输出存储
+
+    只保存严格 JSON 解析失败、经过容错恢复的页面，键与 OCR 结果缓存相同。
+    解析逻辑改进后可以用原始输出重新解析，而不必再次调用付费模型。
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: int = 30 * 24 * 3600):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ocr_raw_outputs (
+                    cache_key TEXT PRIMARY KEY,
+                    image_path TEXT,
+                    raw_text TEXT NOT NULL,
+                    report TEXT NOT NULL,
+                    partial INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    reparsed_at REAL
+                )
+                """
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def put(self, key: str, image_path: str, raw_text: str, report: Dict[str, Any]) -> None:
+        """保存原始输出和恢复报告，同时清理过期条目"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO ocr_raw_outputs
+                    (cache_key, image_path, raw_text, report, partial, created_at, reparsed_at)
+                VALUES (?, ?, ?, ?, ?, ?, NULL)
+                """,
+                (key, image_path, raw_text, json.dumps(report, ensure_ascii=False),
+                 self._is_partial(report), now),
+            )
+            conn.execute(
+                "DELETE FROM ocr_raw_outputs WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取原始输出，返回 {cache_key, image_path, raw_text, report, created_at, reparsed_at}"""
+        with self._connect() as conn:
+            row = conn.execute(
+                """
+                SELECT cache_key, image_path, raw_text, report, created_at, reparsed_at
+                FROM ocr_raw_outputs WHERE cache_key = ?
+                """,
+                (key,),
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "cache_key": row[0],
+            "image_path": row[1],
+            "raw_text": row[2],
+            "report": json.loads(row[3]),
+            "created_at": row[4],
+            "reparsed_at": row[5],
+        }
+
+    def get_report(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取恢复报告，没有记录时返回 None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT report FROM ocr_raw_outputs WHERE cache_key = ?", (key,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update_report(self, key: str, report: Dict[str, Any]) -> None:
+        """重新解析后更新恢复报告"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE ocr_raw_outputs SET report = ?, partial = ?, reparsed_at = ? WHERE cache_key = ?",
+                (json.dumps(report, ensure_ascii=False), self._is_partial(report), time.time(), key),
+            )
+
+    @staticmethod
+    def _is_partial(report: Dict[str, Any]) -> int:
+        return int(bool(report.get("lost")) or bool(report.get("truncated")))
+
+    def discard(self, key: str) -> None:
+        """删除记录（同一键后来被完整解析时）"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM ocr_raw_outputs WHERE cache_key = ?", (key,))
+
+    def list_keys(self, only_lossy: bool = True) -> List[str]:
+        """列出已保存的键，默认只列出仍有题目丢失的记录"""
+        query = "SELECT cache_key FROM ocr_raw_outputs"
+        if only_lossy:
+            query += " WHERE partial = 1"
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute(query + " ORDER BY created_at")]
+
+
+# 全局单例
+_ocr_cache_instance: Optional[OCRResultCache] = None
+_ocr_cache_lock = threading.Lock()
+
+
+def get_ocr_cache() -> OCRResultCache:
+    """获取 OCR 结果缓存单例"""
+    global _ocr_cache_instance
+    if _ocr_cache_instance is None:
+        with _ocr_cache_lock:
+            if _ocr_cache_instance is None:
+                _ocr_cache_instance = OCRResultCache(
+                    db_path=settings.OCR_CACHE_PATH,
+                    max_entries=settings.OCR_CACHE_MAX_ENTRIES,
+                    max_bytes=settings.OCR_CACHE_MAX_BYTES,
+                    ttl_seconds=settings.OCR_CACHE_TTL_SECONDS,
+                )
+    return _ocr_cache_instance
+
+
+_raw_store_instance: Optional[OCRRawOutputStore] = None
+
+
+def get_ocr_raw_store() -> OCRRawOutputStore:
+    """获取模型原始输出存储单例"""
+    global _raw_store_instance
+    if _raw_store_instance is None:
+        with _ocr_cache_lock:
+            if _raw_store_instance is None:
+                _raw_store_instance = OCRRawOutputStore(
+                    db_path=settings.OCR_RAW_OUTPUT_PATH,
+                    ttl_seconds=settings.OCR_CACHE_TTL_SECONDS,
+                )
+    return _raw_store_instance
@@ -0,0 +1,427 @@
+"""
+OCR 请求对冲与熔断
+
+- 每个后端记录最近调用的延迟窗口，按分位数估计尾延迟
+- 主后端从开始执行起超过其观测到的 p95（样本不足时使用默认阈值）仍未返回，或很快失败/返回空结果时，
+  向备用后端发出对冲请求，先返回非空结果的一方胜出，另一方被取消
+  （尚未开始的请求直接取消；已在进行的同步 SDK 调用无法中断，其结果被丢弃）
+- 每个后端一个熔断器：连续失败（含超时）达到阈值后熔断，冷却期内请求绕开该后端，
+  冷却结束后放行一个探测请求（半开），成功则恢复。
+  只有真正开始执行的请求才计入熔断：线程池排队中被取消的请求不算该后端的失败
+命中缓存的调用不对冲，也不计入延迟统计。
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.ocr_backends import OCRBackend, get_ocr_backend
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """所有可用后端都处于熔断状态"""
+
+
+class LatencyTracker:
+    """最近 N 次成功调用的延迟（秒），线程安全"""
+
+    def __init__(self, window: int = 500):
+        self._samples: deque = deque(maxlen=max(1, window))
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    @property
+    def count(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """分位数（p 取 0-1），没有样本时返回 None"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        def ms(value: Optional[float]) -> Optional[int]:
+            return None if value is None else int(value * 1000)
+
+        return {
+            "samples": self.count,
+            "p50_ms": ms(self.percentile(0.5)),
+            "p95_ms": ms(self.percentile(0.95)),
+            "p99_ms": ms(self.percentile(0.99)),
+        }
+
+
+class CircuitBreaker:
+    """连续失败计数熔断器: closed -> open -> half_open -> closed"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._opened_count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        """是否放行请求；半开状态只放行一个探测请求"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def release_probe(self) -> None:
+        """放行的请求没有真正发出（排队中被取消）时归还半开状态的探测名额"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit for OCR backend '{self.name}' closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    self._opened_count += 1
+                    logger.warning(
+                        f"Circuit for OCR backend '{self.name}' opened after {self._failures} failures"
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._failures,
+                "opened_count": self._opened_count,
+            }
+
+
+_latency_trackers: Dict[str, LatencyTracker] = {}
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+_health_lock = threading.Lock()
+
+
+def get_backend_latency(name: str) -> LatencyTracker:
+    """获取后端的延迟统计（进程内）"""
+    with _health_lock:
+        if name not in _latency_trackers:
+            _latency_trackers[name] = LatencyTracker(settings.OCR_LATENCY_WINDOW)
+        return _latency_trackers[name]
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """获取后端的熔断器（进程内）"""
+    with _health_lock:
+        if name not in _circuit_breakers:
+            _circuit_breakers[name] = CircuitBreaker(
+                name,
+                failure_threshold=settings.OCR_BREAKER_FAILURE_THRESHOLD,
+                reset_seconds=settings.OCR_BREAKER_RESET_SECONDS,
+            )
+        return _circuit_breakers[name]
+
+
+class _Attempt:
+    """
+    一次后端调用
+
+    started 在线程池真正开始执行时完成（对冲阈值从此刻计时）；
+    超时放弃后不再更新熔断状态，尚未开始的调用也不会再执行。
+    """
+
+    def __init__(self, backend_name: str):
+        self.backend_name = backend_name
+        self.started: Future = Future()
+        self.started_at: Optional[float] = None
+        self.timed_out = False
+        self._lock = threading.Lock()
+
+    def start(self) -> bool:
+        """标记开始执行；已被放弃时返回 False"""
+        with self._lock:
+            if self.timed_out:
+                return False
+            self.started_at = time.monotonic()
+        self.started.set_result(self.started_at)
+        return True
+
+    def expire(self) -> bool:
+        """超时放弃，返回调用是否已经开始（只有已开始的才计入熔断失败）"""
+        with self._lock:
+            self.timed_out = True
+            return self.started_at is not None
+
+
+class HedgedOCRBackend(OCRBackend):
+    """主/备后端对冲调用的组合后端"""
+
+    name = "hedged"
+
+    def __init__(
+        self,
+        primary: str,
+        secondary: Optional[str],
+        hedge_percentile: float = 0.95,
+        min_hedge_delay: float = 2.0,
+        default_hedge_delay: float = 20.0,
+        min_samples: int = 20,
+        timeout: float = 90.0,
+        max_workers: int = 16,
+    ):
+        if self.name in (primary, secondary):
+            raise ValueError("Hedged OCR backend cannot hedge itself")
+        self.primary = primary
+        self.secondary = secondary if secondary and secondary != primary else None
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.default_hedge_delay = default_hedge_delay
+        self.min_samples = min_samples
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max(2, max_workers), thread_name_prefix="ocr-hedge")
+        self._counters = {"calls": 0, "hedged": 0, "hedge_wins": 0, "timeouts": 0, "rerouted": 0}
+        self._counter_lock = threading.Lock()
+
+    def hedge_delay(self, backend_name: str) -> float:
+        """对冲阈值：该后端观测到的延迟分位数，样本不足时使用默认值"""
+        tracker = get_backend_latency(backend_name)
+        observed = tracker.percentile(self.hedge_percentile) if tracker.count >= self.min_samples else None
+        return max(self.min_hedge_delay, observed if observed is not None else self.default_hedge_delay)
+
+    def is_cached(self, image_path: str) -> bool:
+        return get_ocr_backend(self.primary).is_cached(image_path)
+
+    def extract_questions_with_report(
+        self, image_path: str
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        对冲识别：先调用主后端（熔断时直接使用备用后端），超过对冲阈值后并发调用另一个后端
+
+        Raises:
+            CircuitOpenError: 主备后端均已熔断
+            TimeoutError: 超过 OCR_HEDGE_TIMEOUT_SECONDS 仍没有结果
+        """
+        self._increment("calls")
+        if get_ocr_backend(self.primary).is_cached(image_path):
+            return get_ocr_backend(self.primary).extract_questions_with_report(image_path)
+
+        first, hedge = self.primary, self.secondary
+        if not get_circuit_breaker(self.primary).allow():
+            if not self.secondary or not get_circuit_breaker(self.secondary).allow():
+                raise CircuitOpenError(f"All OCR backends are unavailable: {self.primary}, {self.secondary}")
+            first, hedge = self.secondary, self.primary
+            self._increment("rerouted")
+
+        started = time.monotonic()
+        deadline = started + self.timeout
+        hedge_delay = self.hedge_delay(first)
+        attempts: Dict[Future, _Attempt] = {}
+        primary_attempt = self._submit(attempts, first, image_path)
+
+        def hedge_at() -> Optional[float]:
+            # 对冲阈值从主请求开始执行时计时，线程池排队的时间不算主后端慢
+            if primary_attempt.started_at is None:
+                return None
+            return primary_attempt.started_at + hedge_delay
+
+        empty_result: Optional[Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]] = None
+        last_error: Optional[BaseException] = None
+        while attempts:
+            waitables: List[Future] = list(attempts)
+            wait_until = deadline
+            if hedge:
+                if hedge_at() is None:
+                    # 主请求仍在排队：等它开始执行后再计算对冲时刻
+                    waitables.append(primary_attempt.started)
+                else:
+                    wait_until = min(deadline, hedge_at())
+            done, _ = wait(
+                waitables, timeout=max(0.0, wait_until - time.monotonic()), return_when=FIRST_COMPLETED
+            )
+
+            for future in done:
+                if future not in attempts:
+                    continue
+                attempt = attempts.pop(future)
+                try:
+                    questions, report = future.result()
+                except Exception as exc:
+                    last_error = exc
+                    continue
+                if questions:
+                    self._abandon(attempts)
+                    if attempt.backend_name != first:
+                        self._increment("hedge_wins")
+                    logger.info(
+                        f"OCR for {image_path} answered by '{attempt.backend_name}' "
+                        f"in {int((time.monotonic() - started) * 1000)} ms"
+                    )
+                    return questions, report
+                empty_result = empty_result or (questions, report)
+
+            if time.monotonic() >= deadline:
+                break
+            # 主请求超过阈值仍未返回，或已经失败/返回空结果：发出对冲请求
+            if hedge and (not attempts or (hedge_at() is not None and time.monotonic() >= hedge_at())):
+                if get_circuit_breaker(hedge).allow():
+                    self._increment("hedged")
+                    logger.info(f"Hedging OCR for {image_path}: '{first}' -> '{hedge}'")
+                    self._submit(attempts, hedge, image_path)
+                hedge = None
+
+        if attempts:
+            self._increment("timeouts")
+            for future, attempt in attempts.items():
+                breaker = get_circuit_breaker(attempt.backend_name)
+                future.cancel()
+                if attempt.expire():
+                    breaker.record_failure()
+                else:
+                    # 一直在线程池排队，后端没有收到请求：取消，不计失败
+                    breaker.release_probe()
+            attempts.clear()
+            if empty_result is None:
+                raise TimeoutError(f"OCR timed out after {self.timeout:.0f}s for {image_path}")
+        if empty_result is not None:
+            return empty_result
+        raise last_error or RuntimeError(f"OCR failed for {image_path}")
+
+    def _submit(self, attempts: Dict[Future, _Attempt], backend_name: str, image_path: str) -> _Attempt:
+        attempt = _Attempt(backend_name)
+        attempts[self._executor.submit(self._call, attempt, image_path)] = attempt
+        return attempt
+
+    @staticmethod
+    def _call(attempt: _Attempt, image_path: str):
+        """在对冲线程池中调用单个后端，记录延迟和熔断状态"""
+        breaker = get_circuit_breaker(attempt.backend_name)
+        if not attempt.start():
+            # 排队期间已超时放弃，结果不会被读取
+            return [], None
+        started = attempt.started_at
+        try:
+            result = get_ocr_backend(attempt.backend_name).extract_questions_with_report(image_path)
+        except Exception:
+            if not attempt.timed_out:
+                breaker.record_failure()
+            raise
+        # 对冲中落败的请求也记录真实延迟，尾延迟估计才不会偏低
+        get_backend_latency(attempt.backend_name).record(time.monotonic() - started)
+        if not attempt.timed_out:
+            breaker.record_success()
+        return result
+
+    @staticmethod
+    def _abandon(attempts: Dict[Future, _Attempt]) -> None:
+        """取消落败的请求；仍在排队的直接取消并归还探测名额，已开始的照常记录结果"""
+        for future, attempt in attempts.items():
+            if future.cancel():
+                get_circuit_breaker(attempt.backend_name).release_probe()
+        attempts.clear()
+
+    def _increment(self, counter: str) -> None:
+        with self._counter_lock:
+            self._counters[counter] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counter_lock:
+            counters = dict(self._counters)
+        return {
+            "primary": self.primary,
+            "secondary": self.secondary,
+            "hedge_percentile": self.hedge_percentile,
+            "hedge_delay_ms": {
+                name: int(self.hedge_delay(name) * 1000)
+                for name in (self.primary, self.secondary) if name
+            },
+            **counters,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def backend_health_stats() -> Dict[str, Any]:
+    """各后端的延迟分位数和熔断状态，以及对冲计数（进程内）"""
+    with _health_lock:
+        names = sorted(set(_latency_trackers) | set(_circuit_breakers))
+    backends = {
+        name: {
+            "latency": get_backend_latency(name).snapshot(),
+            "circuit": get_circuit_breaker(name).snapshot(),
+        }
+        for name in names
+    }
+    return {
+        "backends": backends,
+        "hedging": _hedged_instance.stats() if _hedged_instance is not None else None,
+    }
+
+
+# 全局单例
+_hedged_instance: Optional[HedgedOCRBackend] = None
+
+
+def get_hedged_ocr_service() -> HedgedOCRBackend:
+    """获取对冲组合后端单例"""
+    global _hedged_instance
+    if _hedged_instance is None:
+        _hedged_instance = HedgedOCRBackend(
+            primary=settings.OCR_HEDGE_PRIMARY,
+            secondary=settings.OCR_HEDGE_SECONDARY or None,
+            hedge_percentile=settings.OCR_HEDGE_PERCENTILE,
+            min_hedge_delay=settings.OCR_HEDGE_MIN_DELAY_SECONDS,
+            default_hedge_delay=settings.OCR_HEDGE_DEFAULT_DELAY_SECONDS,
+            min_samples=settings.OCR_HEDGE_MIN_SAMPLES,
+            timeout=settings.OCR_HEDGE_TIMEOUT_SECONDS,
+            max_workers=settings.OCR_HEDGE_WORKERS,
+        )
+    return _hedged_instance
+
+
+def shutdown_hedged_ocr_service() -> None:
+    """关闭对冲线程池（应用退出时调用）"""
+    if _hedged_instance is not None:
+        _hedged_instance.shutdown()
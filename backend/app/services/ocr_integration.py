@@ -1,13 +1,24 @@
 """
 OCR集成服务 - 整合OCR识别和数据库存储
 """
-from typing import Dict, List
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 import logging
+import os
+import shutil
+import time
+import uuid
 from datetime import datetime
 
 from sqlalchemy.orm import Session
 
-from app.services.qwen_ocr import get_ocr_service
+from app.config import settings
+from app.services.blob_store import BlobNotFoundError, get_blob_store, to_blob_ref
+from app.services.docx_parser import is_docx_file, parse_docx_questions
+from app.services.image_tiling import get_image_tiler
+from app.services.pdf_ingest import iter_rendered_pages, plan_pdf_pages
+from app.services.ocr_backends import get_ocr_backend
+from app.services.question_crops import get_question_cropper
 from app.services.question_service import get_question_service
 
 logger = logging.getLogger(__name__)
@@ -16,9 +27,14 @@ logger = logging.getLogger(__name__)
 class OCRIntegrationService:
     """OCR集成服务 - 处理从OCR识别到数据库存储的完整流程"""
 
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, ocr_backend: Optional[str] = None):
+        """
+        Args:
+            db: 数据库会话
+            ocr_backend: 题目识别后端名称（qwen / paddle / replay），默认使用 OCR_BACKEND 配置
+        """
         self.db = db
-        self.ocr_service = get_ocr_service()
+        self.ocr_service = get_ocr_backend(ocr_backend)
         self.question_service = get_question_service(db)
 
     def process_document_images(
@@ -31,10 +47,17 @@ class OCRIntegrationService:
         file_url: str = None,
         file_size: int = None,
         file_type: str = None,
+        max_concurrency: int = None,
+        document_path: str = None,
     ) -> Dict:
         """
         处理文档图片的完整流程: OCR识别 -> 数据库存储
+
+        多页文档按 max_concurrency 并发识别（默认取 settings.OCR_MAX_CONCURRENT_PAGES），
+        识别结果仍按 image_index 顺序入库。
+        传入 document_path（PDF / Word）时忽略 image_paths，按 extract_document_pages 处理。
         """
+        started = time.perf_counter()
         try:
             document = self.question_service.create_document(
                 title=document_title,
@@ -46,99 +69,79 @@ class OCRIntegrationService:
                 uploaded_by=uploaded_by,
             )
 
-            logger.info("Starting OCR processing for document %s", document.id)
+            document_id = str(document.id)
+            logger.info("Starting OCR processing for document %s", document_id)
+            page_results = self.extract_document_pages(
+                image_paths, document_path=document_path, max_concurrency=max_concurrency
+            )
+
             ocr_questions: List[Dict] = []
             extraction_errors: List[Dict] = []
-
-            for index, image_path in enumerate(image_paths):
-                try:
-                    questions = self.ocr_service.extract_questions(image_path)
-                    if questions:
-                        for question in questions:
-                            question["source_image"] = image_path
-                            question["image_index"] = index
-                        ocr_questions.extend(questions)
-                    else:
-                        extraction_errors.append(
-                            {
-                                "image_index": index,
-                                "error": "No questions detected",
-                                "timestamp": datetime.utcnow().isoformat(),
-                            }
-                        )
-                except Exception as exc:
-                    logger.error(
-                        "OCR failed for %s: %s", image_path, exc, exc_info=True
-                    )
-                    extraction_errors.append(
-                        {
-                            "image_index": index,
-                            "error": str(exc),
-                            "timestamp": datetime.utcnow().isoformat(),
-                        }
-                    )
-
-            self.question_service.update_document_status(
-                document_id=str(document.id),
-                status="processing",
-                total_questions=len(ocr_questions),
-                processed_questions=0,
-                extraction_errors=extraction_errors or None,
-            )
+            for page in page_results:
+                ocr_questions.extend(page["questions"])
+                extraction_errors.extend(self._page_errors(page))
+            page_timings = [self._page_timing(page) for page in page_results]
 
             if not ocr_questions:
                 self.question_service.update_document_status(
-                    document_id=str(document.id),
+                    document_id=document_id,
                     status="completed",
                     total_questions=0,
                     processed_questions=0,
                     extraction_errors=extraction_errors or None,
                 )
-                logger.warning("No questions detected in document %s", document.id)
+                logger.warning("No questions detected in document %s", document_id)
                 return {
                     "success": False,
-                    "document_id": str(document.id),
+                    "document_id": document_id,
                     "questions_created": 0,
                     "total_questions": 0,
                     "extraction_errors": len(extraction_errors),
                     "message": "No questions detected in the provided images",
+                    "page_timings": page_timings,
+                    "elapsed_ms": self._elapsed_ms(started),
                 }
 
+            # 题目写入和文档状态更新在同一事务中提交
             created_questions = self.question_service.create_questions_from_ocr(
                 ocr_questions=ocr_questions,
-                document_id=str(document.id),
+                document_id=document_id,
                 created_by=uploaded_by,
+                commit=False,
             )
-
             self.question_service.update_document_status(
-                document_id=str(document.id),
+                document_id=document_id,
                 status="completed",
                 total_questions=len(ocr_questions),
                 processed_questions=len(created_questions),
                 extraction_errors=extraction_errors or None,
+                commit=False,
             )
+            self.question_service.commit()
 
             logger.info(
                 "Successfully processed document %s: %d questions created",
-                document.id,
+                document_id,
                 len(created_questions),
             )
 
             return {
                 "success": True,
-                "document_id": str(document.id),
+                "document_id": document_id,
                 "questions_created": len(created_questions),
                 "total_questions": len(ocr_questions),
                 "extraction_errors": len(extraction_errors),
                 "questions": [q.to_dict() for q in created_questions],
+                "page_timings": page_timings,
+                "elapsed_ms": self._elapsed_ms(started),
             }
 
         except Exception as exc:
             logger.error("Failed to process document images: %s", exc, exc_info=True)
             try:
-                if "document" in locals():
+                if "document_id" in locals():
                     self.question_service.update_document_status(
-                        document_id=str(document.id),
+                        document_id=document_id,
                         status="failed",
                         extraction_errors=[
                             {"error": str(exc), "timestamp": datetime.utcnow().isoformat()}
@@ -153,6 +156,472 @@ class OCRIntegrationService:
                 "message": "Failed to process document",
             }
 
+    def process_document_pages(
+        self,
+        document_id: str,
+        image_paths: List[str],
+        uploaded_by: str,
+        max_concurrency: int = None,
+        skip_indexes: Iterable[int] = None,
+        on_page: Optional[Callable[[Dict], None]] = None,
+        document_path: str = None,
+    ) -> Dict:
+        """
+        为已创建的文档逐页识别并入库（异步导入任务使用）
+
+        每页识别完成后立即写入该页题目，并增量更新文档的
+        processing_status / total_questions / processed_questions。
+        on_page 在提交前调用，调用方写入的任务进度与该页题目、文档进度在同一事务中提交，
+        中途崩溃不会出现题目已入库而该页未记为完成（重试时重复入库）的情况；
+        on_page 抛出异常时该页不提交。
+
+        Args:
+            document_id: 文档ID
+            image_paths: 文档全部页面的图片路径
+            uploaded_by: 上传用户ID
+            max_concurrency: 同时识别的最大页数
+            skip_indexes: 已完成的页索引（任务重试时跳过）
+            on_page: 每页提交前回调（只写入不提交），参数为该页结果
+            document_path: PDF / Word 文件路径，传入时忽略 image_paths
+        """
+        document = self.question_service.get_document_by_id(document_id)
+        if not document:
+            raise ValueError(f"Document not found: {document_id}")
+
+        total_questions = document.total_questions or 0
+        processed_questions = document.processed_questions or 0
+        extraction_errors: List[Dict] = list(document.extraction_errors or [])
+        self.question_service.update_document_status(document_id=document_id, status="processing")
+
+        def handle_page(page: Dict) -> None:
+            nonlocal total_questions, processed_questions
+            # 每页的题目、文档进度和任务进度（on_page）在同一事务中提交
+            if page["questions"]:
+                created = self.question_service.create_questions_from_ocr(
+                    ocr_questions=page["questions"],
+                    document_id=document_id,
+                    created_by=uploaded_by,
+                    commit=False,
+                )
+                total_questions += len(page["questions"])
+                processed_questions += len(created)
+            extraction_errors.extend(self._page_errors(page))
+            self.question_service.update_document_status(
+                document_id=document_id,
+                status="processing",
+                total_questions=total_questions,
+                processed_questions=processed_questions,
+                extraction_errors=extraction_errors or None,
+                commit=False,
+            )
+            if on_page:
+                on_page(page)
+            self.question_service.commit()
+
+        page_results = self.extract_document_pages(
+            image_paths,
+            document_path=document_path,
+            max_concurrency=max_concurrency,
+            skip_indexes=skip_indexes,
+            on_page=handle_page,
+        )
+
+        self.question_service.update_document_status(
+            document_id=document_id,
+            status="completed",
+            total_questions=total_questions,
+            processed_questions=processed_questions,
+            extraction_errors=extraction_errors or None,
+        )
+        logger.info(
+            "Processed document %s: %d questions created", document_id, processed_questions
+        )
+        return {
+            "success": processed_questions > 0,
+            "document_id": document_id,
+            "questions_created": processed_questions,
+            "total_questions": total_questions,
+            "extraction_errors": len(extraction_errors),
+            "page_timings": [self._page_timing(page) for page in page_results],
+        }
+
+    def extract_document_pages(
+        self,
+        image_paths: Iterable[str],
+        document_path: str = None,
+        max_concurrency: int = None,
+        skip_indexes: Iterable[int] = None,
+        on_page: Optional[Callable[[Dict], None]] = None,
+    ) -> List[Dict]:
+        """
+        按源文件类型分发：PDF 逐页处理，Word 本地解析，否则按图片识别
+
+        document_path / image_paths 可以是 blob 引用，处理前解析为本地文件（远程存储按需下载）。
+        """
+        if document_path:
+            document_path = self._resolve_source(document_path)
+        image_paths = (self._resolve_source(image_path) for image_path in image_paths)
+        if document_path and is_docx_file(document_path):
+            return self.extract_docx_pages(document_path, skip_indexes=skip_indexes, on_page=on_page)
+        if document_path:
+            return self.extract_pdf_pages(
+                document_path,
+                max_concurrency=max_concurrency,
+                skip_indexes=skip_indexes,
+                on_page=on_page,
+            )
+        return self.extract_pages(
+            image_paths,
+            max_concurrency=max_concurrency,
+            skip_indexes=skip_indexes,
+            on_page=on_page,
+        )
+
+    @staticmethod
+    def _resolve_source(path_or_ref: str) -> str:
+        """blob 引用 -> 本地路径；内容缺失时原样返回，由该页的识别失败记录错误"""
+        try:
+            return get_blob_store().resolve(path_or_ref)
+        except BlobNotFoundError:
+            logger.error("Source file missing from blob store: %s", path_or_ref)
+            return path_or_ref
+
+    def extract_docx_pages(
+        self,
+        docx_path: str,
+        skip_indexes: Iterable[int] = None,
+        on_page: Optional[Callable[[Dict], None]] = None,
+    ) -> List[Dict]:
+        """
+        本地解析 Word 文档，整个文档作为 image_index=0 的一页返回，不调用视觉模型
+        """
+        if 0 in set(skip_indexes or ()):
+            return []
+        started = time.perf_counter()
+        questions: List[Dict] = []
+        error = None
+        try:
+            questions = parse_docx_questions(docx_path)
+            for question in questions:
+                question["source_image"] = docx_path
+                question["image_index"] = 0
+        except Exception as exc:
+            logger.error("Failed to parse Word document %s: %s", docx_path, exc, exc_info=True)
+            error = str(exc)
+
+        page = self._page_result(0, docx_path, questions, error, self._elapsed_ms(started))
+        if on_page:
+            on_page(page)
+        return [page]
+
+    def extract_pages(
+        self,
+        image_paths: Iterable[str],
+        max_concurrency: int = None,
+        skip_indexes: Iterable[int] = None,
+        on_page: Optional[Callable[[Dict], None]] = None,
+    ) -> List[Dict]:
+        """
+        并发识别多页图片，返回按 image_index 排序的逐页结果
+
+        Args:
+            image_paths: 图片路径序列（可以是逐页产出的生成器）
+            max_concurrency: 同时识别的最大页数，默认取 settings.OCR_MAX_CONCURRENT_PAGES
+            skip_indexes: 需要跳过的页索引（不识别、不出现在结果中）
+            on_page: 每页完成时在调用线程中回调，参数为该页结果
+
+        Returns:
+            页结果列表，每项包含 image_index, image_path, questions, error,
+            elapsed_ms, finished_at
+        """
+        skipped = set(skip_indexes or ())
+        indexed_paths = (
+            (index, image_path)
+            for index, image_path in enumerate(image_paths)
+            if index not in skipped
+        )
+        results = self._extract_indexed_pages(indexed_paths, max_concurrency, on_page)
+        results.sort(key=lambda page: page["image_index"])
+        return results
+
+    def extract_pdf_pages(
+        self,
+        pdf_path: str,
+        max_concurrency: int = None,
+        skip_indexes: Iterable[int] = None,
+        on_page: Optional[Callable[[Dict], None]] = None,
+    ) -> List[Dict]:
+        """
+        逐页处理 PDF：文本层页本地切分，扫描页并行栅格化后 OCR
+
+        文本层页不调用视觉模型；扫描页在渲染进程池中渲染，渲染完成一页即提交 OCR，
+        渲染与识别流水线并行。
+
+        Args:
+            pdf_path: PDF 文件路径
+            max_concurrency: 同时识别的最大页数
+            skip_indexes: 需要跳过的页索引
+            on_page: 每页完成时在调用线程中回调，参数为该页结果
+
+        Returns:
+            与 extract_pages 相同结构、按 image_index 排序的页结果列表
+        """
+        plan_started = time.perf_counter()
+        plan = plan_pdf_pages(pdf_path, set(skip_indexes or ()))
+        plan_ms = self._elapsed_ms(plan_started)
+
+        results: List[Dict] = []
+
+        def emit(page: Dict) -> None:
+            results.append(page)
+            if on_page:
+                on_page(page)
+
+        for index, questions in sorted(plan.text_pages.items()):
+            for question in questions:
+                question["source_image"] = pdf_path
+                question["image_index"] = index
+            emit(self._page_result(index, pdf_path, questions, None, plan_ms))
+
+        output_dir = os.path.join(settings.PDF_PAGE_DIR, uuid.uuid4().hex)
+
+        def rendered_pages():
+            for index, image_path in iter_rendered_pages(pdf_path, plan.scanned_pages, output_dir):
+                if image_path is None:
+                    emit(self._page_result(index, pdf_path, [], "Failed to render PDF page", 0))
+                    continue
+                yield index, image_path
+
+        def store_page(page: Dict) -> None:
+            self._store_rendered_page(page)
+            if on_page:
+                on_page(page)
+
+        try:
+            results.extend(self._extract_indexed_pages(rendered_pages(), max_concurrency, store_page))
+        finally:
+            # 有题目的页面已移入 blob 存储，其余（无题目、识别失败、中途异常）随目录删除
+            shutil.rmtree(output_dir, ignore_errors=True)
+        results.sort(key=lambda page: page["image_index"])
+        return results
+
+    @staticmethod
+    def _store_rendered_page(page: Dict) -> None:
+        """
+        渲染出的页面图片移入 blob 存储（不复制），页结果和题目中的路径替换为 blob 引用
+
+        没有题目的页面不需要保留，直接删除。存储失败时保留本地路径（入库时再尝试存储）。
+        """
+        image_path = page["image_path"]
+        if not page["questions"]:
+            try:
+                os.remove(image_path)
+            except OSError:
+                pass
+            return
+        try:
+            ref = to_blob_ref(get_blob_store().put_file(image_path, move=True))
+        except Exception as exc:
+            logger.warning("Failed to store rendered PDF page %s: %s", image_path, exc)
+            return
+        page["image_path"] = ref
+        for question in page["questions"]:
+            if question.get("source_image") == image_path:
+                question["source_image"] = ref
+
+    def _extract_indexed_pages(
+        self,
+        indexed_paths: Iterable[Tuple[int, str]],
+        max_concurrency: int = None,
+        on_page: Optional[Callable[[Dict], None]] = None,
+    ) -> List[Dict]:
+        """
+        按 (页索引, 图片路径) 惰性提交识别任务，按完成顺序收集页结果
+
+        后端支持多页合并调用（max_batch_pages > 1）时，连续的页面按批提交，
+        max_concurrency 限制同时进行的批数；达到上限时等待一批完成后才继续从 indexed_paths 取页，
+        逐页产出的生成器（PDF 渲染）随识别进度推进。
+        """
+        limit = max(1, max_concurrency or settings.OCR_MAX_CONCURRENT_PAGES)
+        batch_size = max(1, self.ocr_service.max_batch_pages)
+        results: List[Dict] = []
+
+        def collect(futures) -> None:
+            for future in futures:
+                for page in future.result():
+                    results.append(page)
+                    if on_page:
+                        on_page(page)
+
+        with ThreadPoolExecutor(max_workers=limit, thread_name_prefix="ocr-page") as executor:
+            pending = set()
+            batch: List[Tuple[int, str]] = []
+            for item in indexed_paths:
+                batch.append(item)
+                if len(batch) < batch_size:
+                    continue
+                pending.add(executor.submit(self._extract_page_batch, batch))
+                batch = []
+                done = {future for future in pending if future.done()}
+                pending -= done
+                collect(done)
+                while len(pending) >= limit:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+            if batch:
+                pending.add(executor.submit(self._extract_page_batch, batch))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        return results
+
+    def _extract_page_batch(self, batch: List[Tuple[int, str]]) -> List[Dict]:
+        """
+        一次后端调用识别一批页面；单页批次、超长图片（分块识别）和合并调用失败时逐页识别
+        """
+        pages: List[Dict] = []
+        tiler = get_image_tiler() if settings.OCR_TILING_ENABLED and len(batch) > 1 else None
+        if tiler is not None:
+            tall = [item for item in batch if tiler.needs_tiling(item[1])]
+            pages.extend(self._extract_page(index, image_path) for index, image_path in tall)
+            batch = [item for item in batch if item not in tall]
+        if len(batch) <= 1:
+            return pages + [self._extract_page(index, image_path) for index, image_path in batch]
+
+        batch_started = time.perf_counter()
+        try:
+            reports = self.ocr_service.extract_questions_batch_with_report(
+                [image_path for _, image_path in batch]
+            )
+        except Exception as exc:
+            logger.warning(
+                "Batch OCR failed for pages %s, retrying per page: %s", [index for index, _ in batch], exc
+            )
+            return pages + [self._extract_page(index, image_path) for index, image_path in batch]
+
+        # 合并调用的页面共享一次调用的耗时
+        elapsed_ms = self._elapsed_ms(batch_started)
+        for (index, image_path), (questions, salvage) in zip(batch, reports):
+            for question in questions:
+                question["source_image"] = image_path
+                question["image_index"] = index
+            self._crop_questions(image_path, questions)
+            pages.append(self._page_result(index, image_path, questions, None, elapsed_ms, salvage))
+        logger.info(
+            "Pages %s OCR finished in %d ms with %d questions",
+            [index for index, _ in batch], elapsed_ms, sum(len(page["questions"]) for page in pages),
+        )
+        return pages
+
+    def _extract_page(self, index: int, image_path: str) -> Dict:
+        """
+        识别单页图片，异常被捕获并记录到页结果中
+
+        启用 OCR_TILING_ENABLED 时，超长图片切成重叠条带并行识别后合并。
+        """
+        page_started = time.perf_counter()
+        questions: List[Dict] = []
+        error = None
+        salvage = None
+        try:
+            tiler = get_image_tiler() if settings.OCR_TILING_ENABLED else None
+            if tiler is not None and tiler.needs_tiling(image_path):
+                questions, salvage = tiler.extract_questions_with_report(self.ocr_service, image_path)
+            else:
+                questions, salvage = self.ocr_service.extract_questions_with_report(image_path)
+            for question in questions:
+                question["source_image"] = image_path
+                question["image_index"] = index
+            self._crop_questions(image_path, questions)
+        except Exception as exc:
+            logger.error("OCR failed for %s: %s", image_path, exc, exc_info=True)
+            error = str(exc)
+
+        elapsed_ms = self._elapsed_ms(page_started)
+        logger.info(
+            "Page %d OCR finished in %d ms with %d questions", index, elapsed_ms, len(questions)
+        )
+        return self._page_result(index, image_path, questions, error, elapsed_ms, salvage)
+
+    @staticmethod
+    def _crop_questions(image_path: str, questions: List[Dict]) -> None:
+        """为带坐标的题目裁出区域图（QUESTION_CROPS_ENABLED），失败不影响识别结果"""
+        if settings.QUESTION_CROPS_ENABLED and questions:
+            get_question_cropper().crop_questions(image_path, questions)
+
+    @staticmethod
+    def _page_result(
+        index: int,
+        image_path: str,
+        questions: List[Dict],
+        error: Optional[str],
+        elapsed_ms: int,
+        salvage: Optional[Dict] = None,
+    ) -> Dict:
+        return {
+            "image_index": index,
+            "image_path": image_path,
+            "questions": questions,
+            "error": error,
+            "elapsed_ms": elapsed_ms,
+            "finished_at": datetime.utcnow().isoformat(),
+            "salvage": salvage,
+        }
+
+    @staticmethod
+    def _page_errors(page: Dict) -> List[Dict]:
+        """页结果 -> 写入文档 extraction_errors 的错误记录"""
+        if not page["questions"]:
+            return [
+                {
+                    "image_index": page["image_index"],
+                    "error": page["error"] or "No questions detected",
+                    "timestamp": page["finished_at"],
+                }
+            ]
+        salvage = page.get("salvage")
+        if not salvage:
+            return []
+        # 模型输出只被部分解析或部分条带识别失败：已恢复的题目正常入库，记录丢失的题目、失败的条带和原始输出的键
+        errors = []
+        if salvage["lost"] or salvage["truncated"]:
+            errors.append({
+                "image_index": page["image_index"],
+                "error": "Model output partially parsed; some questions were lost",
+                "recovered": salvage["recovered"],
+                "lost_numbers": salvage["lost_numbers"],
+                "lost_count": len(salvage["lost"]),
+                "truncated": salvage["truncated"],
+                "raw_key": salvage.get("raw_key"),
+                "timestamp": page["finished_at"],
+            })
+        failed_tiles = salvage.get("failed_tiles") or []
+        if failed_tiles:
+            errors.append({
+                "image_index": page["image_index"],
+                "error": "OCR failed for part of the page; questions in these bands were lost",
+                "failed_tiles": failed_tiles,
+                "timestamp": page["finished_at"],
+            })
+        return errors
+
+    @staticmethod
+    def _page_timing(page: Dict) -> Dict:
+        """页结果 -> 对外暴露的单页耗时信息"""
+        return {
+            "image_index": page["image_index"],
+            "elapsed_ms": page["elapsed_ms"],
+            "questions": len(page["questions"]),
+            "success": bool(page["questions"]),
+            "lost_questions": len(page["salvage"]["lost"]) if page.get("salvage") else 0,
+            "failed_tiles": len(page["salvage"].get("failed_tiles") or []) if page.get("salvage") else 0,
+        }
+
+    @staticmethod
+    def _elapsed_ms(started: float) -> int:
+        return int((time.perf_counter() - started) * 1000)
+
     def process_single_image(self, image_path: str, document_id: str, uploaded_by: str) -> Dict:
         """
         处理单张图片的OCR识别和存储
@@ -202,11 +671,7 @@ class OCRIntegrationService:
             if not document:
                 return {"error": "Document not found"}
 
-            questions = self.question_service.get_questions_by_document(document_id)
-            type_stats: Dict[str, int] = {}
-            for question in questions:
-                q_type = question.question_type
-                type_stats[q_type] = type_stats.get(q_type, 0) + 1
+            type_stats = self.question_service.get_question_type_counts(document_id)
 
             return {
                 "document_id": document_id,
@@ -229,6 +694,6 @@ class OCRIntegrationService:
             return {"error": str(exc)}
 
 
-def get_ocr_integration_service(db: Session) -> OCRIntegrationService:
+def get_ocr_integration_service(db: Session, ocr_backend: Optional[str] = None) -> OCRIntegrationService:
     """获取OCR集成服务实例"""
-    return OCRIntegrationService(db)
+    return OCRIntegrationService(db, ocr_backend=ocr_backend)
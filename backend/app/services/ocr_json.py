@@ -0,0 +1,313 @@
+"""
+模型输出的 JSON 解析 - 流式增量解析与容错恢复
+
+模型按 Prompt 要求返回一个题目对象数组。增量解析器逐段接收模型输出，
+每当数组中的一个顶层对象闭合就立即解析并产出，无需等待整个数组生成完毕。
+整页解析失败时，salvage_question_array 修复 LaTeX 转义并逐个恢复完整的题目对象，
+报告丢失的题目，而不是丢弃整页结果。
+"""
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 与 JSON 转义 \b \f \n \r \t 冲突的常见 LaTeX 命令（模型漏写了一个反斜杠时按 LaTeX 处理）
+_LATEX_COMMANDS = {
+    "backslash", "bar", "because", "begin", "beta", "bf", "big", "bigcap", "bigcup",
+    "bigg", "binom", "bmod", "boldsymbol", "bot", "boxed", "bullet",
+    "fbox", "flat", "forall", "frac", "frown",
+    "nabla", "ne", "neg", "neq", "newline", "ngeq", "ngeqslant", "ni", "nleq",
+    "nleqslant", "nmid", "noindent", "not", "notin", "nparallel", "nsubseteq", "nu",
+    "rangle", "rceil", "rfloor", "rho", "right", "rightarrow", "rm",
+    "tan", "tau", "text", "textbf", "textit", "textrm", "tfrac", "therefore", "theta",
+    "tilde", "times", "to", "top", "triangle", "triangleq", "tt",
+}
+_LETTERS = re.compile(r'[A-Za-z]+')
+_HEX4 = re.compile(r'[0-9a-fA-F]{4}')
+_CONTROL_ESCAPES = {'\n': '\\n', '\r': '\\r', '\t': '\\t'}
+_NUMBER_FIELD = re.compile(r'"number"\s*:\s*"?(\d+)')
+
+
+def repair_latex_escapes(text: str) -> str:
+    """
+    修复 JSON 字符串中的非法转义（模型常把 LaTeX 命令写成单反斜杠）
+
+    - 非法转义（如 \\{ \\in \\sqrt）补成双反斜杠
+    - 与合法转义冲突的 LaTeX 命令（如 \\frac \\theta \\neq）按 LaTeX 处理
+    - 字符串内的原始换行/制表符转为转义序列
+    对已经合法的 JSON 不做任何修改。
+    """
+    out: List[str] = []
+    in_string = False
+    i = 0
+    length = len(text)
+    while i < length:
+        char = text[i]
+        if not in_string:
+            if char == '"':
+                in_string = True
+            out.append(char)
+            i += 1
+            continue
+
+        if char == '"':
+            in_string = False
+        elif char == '\\':
+            nxt = text[i + 1] if i + 1 < length else ''
+            if nxt in ('"', '\\', '/'):
+                out.append(char + nxt)
+                i += 2
+                continue
+            if nxt == 'u' and _HEX4.match(text, i + 2):
+                out.append(char)
+                i += 1
+                continue
+            if nxt and nxt in 'bfnrt':
+                word = _LETTERS.match(text, i + 1).group(0)
+                if word not in _LATEX_COMMANDS:
+                    out.append(char)
+                    i += 1
+                    continue
+            # LaTeX 命令或非法转义：保留为字面反斜杠
+            out.append('\\\\')
+            i += 1
+            continue
+        elif char in _CONTROL_ESCAPES:
+            out.append(_CONTROL_ESCAPES[char])
+            i += 1
+            continue
+        out.append(char)
+        i += 1
+    return ''.join(out)
+
+
+def strip_code_fence(text: str) -> str:
+    """去掉模型输出前后的 markdown 代码块标记"""
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return text.strip()
+
+
+def loads_question_object(text: str) -> Optional[Dict[str, Any]]:
+    """
+    解析单个题目对象，失败时修复 LaTeX 转义后重试
+
+    Returns:
+        题目字典，无法解析时返回 None
+    """
+    try:
+        value = json.loads(text)
+    except json.JSONDecodeError:
+        try:
+            value = json.loads(repair_latex_escapes(text), strict=False)
+        except json.JSONDecodeError:
+            logger.warning(f"Failed to parse question object: {text[:200]}")
+            return None
+    return value if isinstance(value, dict) else None
+
+
+@dataclass
+class SalvageResult:
+    """容错解析结果"""
+    questions: List[Dict[str, Any]]
+    raw_text: str
+    # 丢失的题目: {"number": 题号或 None, "reason": "unparseable" | "truncated" | "no_array", "snippet": ...}
+    lost: List[Dict[str, Any]] = field(default_factory=list)
+    truncated: bool = False
+    repaired: bool = False
+
+    @property
+    def partial(self) -> bool:
+        """是否有题目丢失（或输出被截断，截断点之后可能还有题目）"""
+        return bool(self.lost) or self.truncated
+
+    def report(self) -> Dict[str, Any]:
+        """对外暴露的恢复报告"""
+        return {
+            "recovered": len(self.questions),
+            "lost": self.lost,
+            "lost_numbers": [item["number"] for item in self.lost if item["number"] is not None],
+            "truncated": self.truncated,
+        }
+
+
+def _lost_entry(text: str, reason: str) -> Dict[str, Any]:
+    match = _NUMBER_FIELD.search(text)
+    return {
+        "number": int(match.group(1)) if match else None,
+        "reason": reason,
+        "snippet": text.strip()[:200],
+    }
+
+
+def salvage_question_array(text: str) -> SalvageResult:
+    """
+    容错解析模型返回的题目数组
+
+    先按严格 JSON 解析；失败时修复 LaTeX 转义后重试；仍失败（如输出被截断）时
+    逐个恢复所有完整的题目对象，并记录无法解析和被截断的题目。
+
+    Args:
+        text: 模型原始输出
+
+    Returns:
+        SalvageResult
+    """
+    cleaned = strip_code_fence(text)
+    try:
+        value = json.loads(cleaned)
+        if isinstance(value, list):
+            return SalvageResult(questions=[q for q in value if isinstance(q, dict)], raw_text=text)
+    except json.JSONDecodeError:
+        pass
+
+    repaired = repair_latex_escapes(cleaned)
+    try:
+        value = json.loads(repaired, strict=False)
+        if isinstance(value, list):
+            return SalvageResult(
+                questions=[q for q in value if isinstance(q, dict)], raw_text=text, repaired=True
+            )
+    except json.JSONDecodeError:
+        pass
+
+    parser = IncrementalJSONArrayParser()
+    questions = parser.feed(repaired)
+    lost = [_lost_entry(obj_text, "unparseable") for obj_text in parser.failed_objects]
+    if not parser.array_started:
+        lost.append(_lost_entry(cleaned, "no_array"))
+    elif not parser.complete and parser.pending_text.strip():
+        lost.append(_lost_entry(parser.pending_text, "truncated"))
+
+    result = SalvageResult(
+        questions=questions,
+        raw_text=text,
+        lost=lost,
+        truncated=parser.array_started and not parser.complete,
+        repaired=True,
+    )
+    logger.warning(
+        f"Salvaged {len(questions)} questions from malformed output, "
+        f"lost {len(lost)}, truncated={result.truncated}"
+    )
+    return result
+
+
+class IncrementalJSONArrayParser:
+    """
+    增量解析 JSON 对象数组
+
+    只跟踪字符串/转义状态和括号深度，每个字符只扫描一次；
+    数组之前的 markdown 代码块标记等前缀文本会被忽略。
+
+    用法:
+        parser = IncrementalJSONArrayParser()
+        for chunk in chunks:
+            for obj in parser.feed(chunk):
+                ...
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._object_start: Optional[int] = None
+        self._array_started = False
+        self._array_closed = False
+        self.objects_emitted = 0
+        self.failed_objects: List[str] = []
+
+    @property
+    def text(self) -> str:
+        """目前为止接收到的全部文本"""
+        return self._text
+
+    @property
+    def complete(self) -> bool:
+        """顶层数组是否已经闭合"""
+        return self._array_closed
+
+    @property
+    def array_started(self) -> bool:
+        """是否已经遇到顶层数组的起始 '['"""
+        return self._array_started
+
+    @property
+    def objects_failed(self) -> int:
+        return len(self.failed_objects)
+
+    @property
+    def pending_text(self) -> str:
+        """尚未闭合的顶层对象文本（输出被截断时即丢失的题目）"""
+        if self._object_start is None:
+            return ""
+        return self._text[self._object_start:]
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        追加一段模型输出
+
+        Args:
+            chunk: 新增的文本片段
+
+        Returns:
+            本次新闭合的题目对象列表（可能为空）
+        """
+        if not chunk or self._array_closed:
+            self._text += chunk or ""
+            return []
+        self._text += chunk
+        emitted: List[Dict[str, Any]] = []
+        text = self._text
+
+        for pos in range(self._pos, len(text)):
+            char = text[pos]
+            if not self._array_started:
+                if char == '[':
+                    self._array_started = True
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                if self._depth == 0 and char == '{':
+                    self._object_start = pos
+                self._depth += 1
+            elif char in '}]':
+                if self._depth == 0:
+                    # 顶层数组结束
+                    self._array_closed = True
+                    self._pos = len(text)
+                    return emitted
+                self._depth -= 1
+                if self._depth == 0 and self._object_start is not None:
+                    obj_text = text[self._object_start:pos + 1]
+                    obj = loads_question_object(obj_text)
+                    self._object_start = None
+                    if obj is None:
+                        self.failed_objects.append(obj_text)
+                    else:
+                        self.objects_emitted += 1
+                        emitted.append(obj)
+
+        self._pos = len(text)
+        return emitted
@@ -4,11 +4,12 @@ OCR服务模块 - 调用 PaddleOCR 布局解析 API 并输出结构化题目信
 import base64
 import time
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import requests
 
 from app.config import settings
+from app.services.ocr_backends import OCRBackend
 from app.services.paddle_parser import parse_paddle_layout_result
 
 import logging
@@ -81,8 +82,14 @@ class PaddleOCRClient:
         return base64.b64encode(path.read_bytes()).decode("ascii")
 
 
-class QuestionOCR:
-    """封装 OCR 客户端并输出题目 JSON"""
+# paddle_parser 的题型 -> OCR Prompt 使用的题型（计算/证明归入解答题）
+_TYPE_ALIASES = {"calculation": "essay"}
+
+
+class PaddleQuestionExtractor(OCRBackend):
+    """封装 PaddleOCR 客户端，本地切分题目并输出题目 JSON"""
+
+    name = "paddle"
 
     def __init__(self, client: Optional[PaddleOCRClient] = None):
         self.client = client or PaddleOCRClient()
@@ -92,66 +99,62 @@ class QuestionOCR:
         response = self.client.analyze_layout(image_path)
         return self._format_text_regions(response)
 
-    def extract_questions(self, image_path: str) -> List[Dict[str, Any]]:
-        """直接返回结构化题目数组"""
+    def extract_questions_with_report(
+        self, image_path: str
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """识别题目；本地规则切分不存在部分解析，report 始终为 None"""
         response = self.client.analyze_layout(image_path)
         parsed = parse_paddle_layout_result(response)
         images = parsed.get("images") or {}
         questions = parsed.get("questions") or []
 
         for question in questions:
+            question["type"] = _TYPE_ALIASES.get(question["type"], question["type"])
             question["images"] = images
             question.setdefault("full_content", question.get("content", ""))
             question.setdefault("options", [])
 
         logger.info("Identified %d questions from image", len(questions))
-        return questions
-
-    def batch_extract_questions(self, image_paths: List[str]) -> List[Dict[str, Any]]:
-        """批量处理多张图片"""
-        all_questions: List[Dict[str, Any]] = []
-        for index, image_path in enumerate(image_paths):
-            try:
-                questions = self.extract_questions(image_path)
-                for question in questions:
-                    question["source_image"] = image_path
-                    question["image_index"] = index
-                all_questions.extend(questions)
-            except Exception as exc:
-                logger.error("Failed to process image %s: %s", image_path, exc)
-        return all_questions
+        return questions, None
 
     def _format_text_regions(self, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
         layout_results = payload.get("layoutParsingResults") or []
         if not layout_results:
             return []
 
-        ocr_data = layout_results[0].get("overall_ocr_res") or {}
-        texts = ocr_data.get("rec_texts") or []
-        boxes = ocr_data.get("rec_boxes") or []
-        scores = ocr_data.get("rec_scores") or []
-
         formatted = []
-        for idx, text in enumerate(texts):
-            bbox = boxes[idx] if idx < len(boxes) else []
-            formatted.append(
-                {
-                    "text": text.strip(),
-                    "bbox": bbox,
-                    "confidence": scores[idx] if idx < len(scores) else None,
-                    "position": self._convert_bbox_to_position(bbox),
-                }
-            )
+        for page_index, layout_result in enumerate(layout_results):
+            ocr_data = layout_result.get("overall_ocr_res") or {}
+            texts = ocr_data.get("rec_texts") or []
+            boxes = ocr_data.get("rec_boxes") or []
+            scores = ocr_data.get("rec_scores") or []
+
+            for idx, text in enumerate(texts):
+                bbox = boxes[idx] if idx < len(boxes) else []
+                formatted.append(
+                    {
+                        "text": text.strip(),
+                        "bbox": bbox,
+                        "confidence": scores[idx] if idx < len(scores) else None,
+                        "position": self._convert_bbox_to_position(bbox),
+                        "page_index": page_index,
+                    }
+                )
         return formatted
 
     @staticmethod
-    def _convert_bbox_to_position(bbox: List[List[float]]) -> Optional[Dict[str, float]]:
+    def _convert_bbox_to_position(bbox: List[Any]) -> Optional[Dict[str, float]]:
         if not bbox:
             return None
 
         try:
-            x_coords = [point[0] for point in bbox]
-            y_coords = [point[1] for point in bbox]
+            if len(bbox) == 4 and not hasattr(bbox[0], "__len__"):
+                # rec_boxes 的 [x1, y1, x2, y2] 格式
+                x_coords = [bbox[0], bbox[2]]
+                y_coords = [bbox[1], bbox[3]]
+            else:
+                x_coords = [point[0] for point in bbox]
+                y_coords = [point[1] for point in bbox]
         except (TypeError, IndexError):
             return None
 
@@ -167,12 +170,13 @@ class QuestionOCR:
         }
 
 
-_ocr_instance: Optional[QuestionOCR] = None
+# 全局单例
+_paddle_ocr_instance: Optional[PaddleQuestionExtractor] = None
 
 
-def get_ocr_service() -> QuestionOCR:
-    """获取 OCR 服务单例"""
-    global _ocr_instance
-    if _ocr_instance is None:
-        _ocr_instance = QuestionOCR()
-    return _ocr_instance
+def get_ocr_service() -> PaddleQuestionExtractor:
+    """获取 PaddleOCR 后端单例"""
+    global _paddle_ocr_instance
+    if _paddle_ocr_instance is None:
+        _paddle_ocr_instance = PaddleQuestionExtractor()
+    return _paddle_ocr_instance
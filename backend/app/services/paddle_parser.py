@@ -1,21 +1,71 @@
 """
 PaddleOCR Layout Result Parser
 解析 PaddleOCR 布局识别结果，提取题目和图片信息
+
+多页结果（PDF）在一次遍历中解析，跨页的题目会被合并；
+题号/选项使用预编译正则，题型关键词由一个共享的关键词自动机一次扫描完成，
+题目位置由 NumPy 按题目分段批量聚合文本行的 bbox。
 """
 import re
-from typing import Any, Dict, List, Optional
+from itertools import chain
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 import logging
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
+_QUESTION_NUMBER = re.compile(r'^(\d+)[.、)]')
+_OPTION_LABEL = re.compile(r'^([A-Z])[.、)]')
+
+# 题型关键词（按优先级从高到低判断，匹配前文本统一小写）
+_TYPE_KEYWORDS = {
+    "multiple_choice": ["多选", "多项", "选出所有", "全部正确"],
+    "fill_blank": ["____", "（）", "()", "【】", "[]"],
+    "true_false": ["正确", "错误", "是否", "对错", "t/f", "true/false"],
+    "essay": ["简述", "论述", "分析", "解释", "说明", "阐述"],
+    "calculation": ["计算", "求", "解", "证明"],
+}
+
+
+def _build_keyword_automaton() -> Tuple["re.Pattern", Dict[str, frozenset]]:
+    """
+    把所有题型关键词编译为一个正则自动机，对小写化的文本一次扫描得到命中的全部题型
+
+    交替分支按长度降序，同一位置优先匹配最长关键词并消耗之；被消耗掉的较短关键词
+    由映射表补回：每个关键词映射到自身及其包含的所有关键词的题型（如 "解释" -> essay + calculation）。
+    首尾相接的关键词（如 "对错" / "错误"）会互相遮挡，构建时校验它们属于同一题型。
+    """
+    categories: Dict[str, set] = {}
+    for category, keywords in _TYPE_KEYWORDS.items():
+        for keyword in keywords:
+            categories.setdefault(keyword.lower(), set()).add(category)
+
+    for first in categories:
+        for second in categories:
+            if first != second and categories[first] != categories[second] and any(
+                first.endswith(second[:size]) for size in range(1, min(len(first), len(second)))
+            ):
+                raise ValueError(f"keywords {first!r} and {second!r} overlap across question types")
+
+    keyword_categories = {
+        keyword: frozenset().union(*(cats for other, cats in categories.items() if other in keyword))
+        for keyword in categories
+    }
+    alternation = "|".join(re.escape(keyword) for keyword in sorted(categories, key=len, reverse=True))
+    return re.compile(alternation), keyword_categories
+
+
+_KEYWORD_PATTERN, _KEYWORD_CATEGORIES = _build_keyword_automaton()
+
 
 def parse_paddle_layout_result(result: Dict[str, Any]) -> Dict[str, Any]:
     """
     解析 PaddleOCR 布局识别结果
-    
+
     Args:
-        result: PaddleOCR API 返回的 result 字段
-        
+        result: PaddleOCR API 返回的 result 字段，layoutParsingResults 中每项为一页
+
     Returns:
         包含 questions 和 images 的字典:
         {
@@ -25,6 +75,7 @@ def parse_paddle_layout_result(result: Dict[str, Any]) -> Dict[str, Any]:
                     "type": "choice|blank|essay|...",
                     "options": [...],
                     "position": {...},
+                    "page_index": 题目起始页,
                     ...
                 }
             ],
@@ -38,31 +89,66 @@ def parse_paddle_layout_result(result: Dict[str, Any]) -> Dict[str, Any]:
     if not layout_results:
         logger.warning("No layoutParsingResults found in PaddleOCR response")
         return {"questions": [], "images": {}}
-    
-    # 提取 OCR 文本结果
-    ocr_data = layout_results[0].get("overall_ocr_res", {})
-    texts = ocr_data.get("rec_texts", [])
-    boxes = ocr_data.get("rec_boxes", [])
-    scores = ocr_data.get("rec_scores", [])
-    
-    # 提取图片信息
-    images = _extract_images(layout_results[0])
-    
+
+    texts: List[str] = []
+    boxes: List[Any] = []
+    scores: List[float] = []
+    pages: List[int] = []
+    images: Dict[str, str] = {}
+
+    for page_index, layout_result in enumerate(layout_results):
+        # 提取 OCR 文本结果
+        ocr_data = layout_result.get("overall_ocr_res") or {}
+        page_texts = ocr_data.get("rec_texts") or []
+        page_boxes = list(ocr_data.get("rec_boxes") or [])
+        page_scores = list(ocr_data.get("rec_scores") or [])
+        count = len(page_texts)
+        texts.extend(page_texts)
+        # 每页按文本行数对齐，缺失的 bbox / 置信度分别补空和 0
+        boxes.extend(page_boxes[:count] + [[]] * (count - len(page_boxes)))
+        scores.extend(page_scores[:count] + [0.0] * (count - len(page_scores)))
+        pages.extend([page_index] * count)
+
+        # 提取图片信息
+        images.update(_extract_images(layout_result, page_index))
+
     # 解析题目
-    questions = _parse_questions(texts, boxes, scores)
-    
-    logger.info(f"Parsed {len(questions)} questions and {len(images)} images")
-    
+    questions = _parse_questions(texts, boxes, scores, pages)
+
+    logger.info(
+        f"Parsed {len(questions)} questions and {len(images)} images from {len(layout_results)} pages"
+    )
+
     return {
         "questions": questions,
         "images": images
     }
 
 
-def _extract_images(layout_result: Dict[str, Any]) -> Dict[str, str]:
-    """从布局结果中提取图片"""
+def parse_questions_from_lines(
+    lines: List[str],
+    line_numbers: Optional[List[int]] = None
+) -> List[Dict[str, Any]]:
+    """
+    从纯文本行中解析题目（无位置信息，如 PDF 文本层、Word 段落）
+
+    Args:
+        lines: 按阅读顺序排列的文本行
+        line_numbers: 每行在源文档中的序号（可选），作为伪坐标写入 position，
+            此时 position 的 y_min / y_max 为题目首行 / 末行的序号
+
+    Returns:
+        题目列表，结构与 parse_paddle_layout_result 的 questions 相同
+    """
+    boxes = [[[0, number], [0, number]] for number in line_numbers] if line_numbers else []
+    return _parse_questions(lines, boxes, [])
+
+
+def _extract_images(layout_result: Dict[str, Any], page_index: int = 0) -> Dict[str, str]:
+    """从布局结果中提取图片（第一页之后的图片键带页码前缀，避免重名）"""
     images = {}
-    
+    prefix = f"page{page_index}_" if page_index else ""
+
     # 检查是否有图片区域
     regions = layout_result.get("regions", [])
     for idx, region in enumerate(regions):
@@ -70,167 +156,218 @@ def _extract_images(layout_result: Dict[str, Any]) -> Dict[str, str]:
             # 如果有 base64 编码的图片
             image_data = region.get("image_base64") or region.get("image")
             if image_data:
-                images[f"image_{idx}"] = image_data
-    
+                images[f"{prefix}image_{idx}"] = image_data
+
     return images
 
 
 def _parse_questions(
-    texts: List[str], 
-    boxes: List[List[List[float]]], 
-    scores: List[float]
+    texts: List[str],
+    boxes: Sequence[Any],
+    scores: Sequence[float],
+    pages: Optional[Sequence[int]] = None
 ) -> List[Dict[str, Any]]:
     """
     从 OCR 识别的文本中解析题目
-    
+
     策略：
     1. 查找题号模式 (1. 2. 或 1、2、等)
-    2. 将题号到下一个题号之间的文本合并为一道题
+    2. 将题号到下一个题号之间的文本合并为一道题（可以跨页）
     3. 识别题型和选项
+    4. 按题目起始页的文本行批量计算位置和平均置信度
     """
     if not texts:
         return []
-    
-    questions = []
+
+    questions: List[Dict[str, Any]] = []
+    # 每行所属的题目序号（-1 表示不属于任何题目），以及是否为非空行
+    line_question = [-1] * len(texts)
     current_question = None
-    
+
     for idx, text in enumerate(texts):
         text = text.strip()
         if not text:
             continue
-            
-        bbox = boxes[idx] if idx < len(boxes) else []
-        score = scores[idx] if idx < len(scores) else 0.0
-        
+
         # 检查是否是题号开头
-        question_match = re.match(r'^(\d+)[.、)]', text)
-        
+        question_match = _QUESTION_NUMBER.match(text)
+
         if question_match:
-            # 保存上一道题
-            if current_question:
-                questions.append(_finalize_question(current_question))
-            
             # 开始新题
-            question_num = question_match.group(1)
-            question_text = text[len(question_match.group(0)):].strip()
-            
             current_question = {
-                "number": int(question_num),
-                "content": question_text,
+                "number": int(question_match.group(1)),
+                "content_parts": [text[question_match.end():].strip()],
                 "raw_texts": [text],
-                "bboxes": [bbox],
-                "scores": [score],
-                "options": []
+                "options": [],
+                "page_index": pages[idx] if pages is not None else 0,
             }
+            questions.append(current_question)
         elif current_question:
             # 继续当前题目
             current_question["raw_texts"].append(text)
-            current_question["bboxes"].append(bbox)
-            current_question["scores"].append(score)
-            
+
             # 检查是否是选项 (A. B. C. D. 或 A、B、C、D、)
-            option_match = re.match(r'^([A-Z])[.、)]', text)
+            option_match = _OPTION_LABEL.match(text)
             if option_match:
-                option_label = option_match.group(1)
-                option_text = text[len(option_match.group(0)):].strip()
                 current_question["options"].append({
-                    "label": option_label,
-                    "content": option_text
+                    "label": option_match.group(1),
+                    "content": text[option_match.end():].strip()
                 })
             else:
                 # 将文本添加到题目内容
-                if current_question["content"]:
-                    current_question["content"] += " " + text
-                else:
-                    current_question["content"] = text
-    
-    # 保存最后一道题
-    if current_question:
-        questions.append(_finalize_question(current_question))
-    
-    return questions
-
-
-def _finalize_question(question: Dict[str, Any]) -> Dict[str, Any]:
+                current_question["content_parts"].append(text)
+        else:
+            continue
+        line_question[idx] = len(questions) - 1
+
+    if not questions:
+        return []
+
+    line_question = np.array(line_question, dtype=np.int64)
+    positions = _question_positions(boxes, line_question, pages, questions)
+    confidences = _question_confidences(scores, line_question, len(questions))
+
+    return [
+        _finalize_question(question, position, confidence)
+        for question, position, confidence in zip(questions, positions, confidences)
+    ]
+
+
+def _finalize_question(
+    question: Dict[str, Any],
+    position: Optional[Dict[str, float]],
+    confidence: float
+) -> Dict[str, Any]:
     """完善题目信息"""
-    # 推断题型
-    question_type = _infer_question_type(
-        question["content"], 
-        question.get("options", [])
-    )
-    
-    # 计算位置信息
-    position = _calculate_position(question.get("bboxes", []))
-    
-    # 计算平均置信度
-    scores = question.get("scores", [])
-    avg_confidence = sum(scores) / len(scores) if scores else 0.0
-    
+    content = " ".join(part for part in question["content_parts"] if part).strip()
+    options = question.get("options", [])
+
     return {
         "number": question.get("number"),
-        "content": question["content"].strip(),
-        "type": question_type,
-        "options": question.get("options", []),
+        "content": content,
+        "type": _infer_question_type(content, options),
+        "options": options,
         "position": position,
-        "confidence": avg_confidence,
+        "confidence": confidence,
         "full_content": " ".join(question.get("raw_texts", [])),
+        "page_index": question.get("page_index", 0),
     }
 
 
 def _infer_question_type(content: str, options: List[Dict[str, str]]) -> str:
-    """根据题目内容和选项推断题型"""
-    content_lower = content.lower()
-    
-    # 有选项且有多个 -> 选择题
+    """根据题目内容和选项推断题型（关键词自动机一次扫描得到所有命中的题型）"""
+    found = set()
+    for keyword in set(_KEYWORD_PATTERN.findall(content.lower())):
+        found |= _KEYWORD_CATEGORIES[keyword]
+
+    # 有选项且有多个 -> 选择题（判断单选还是多选）
     if options and len(options) >= 2:
-        # 判断单选还是多选
-        if any(keyword in content_lower for keyword in ["多选", "多项", "选出所有", "全部正确"]):
-            return "multiple_choice"
-        return "single_choice"
-    
-    # 填空题特征
-    if any(pattern in content for pattern in ["____", "（）", "()", "【】", "[]"]):
-        return "fill_blank"
-    
-    # 判断题特征
-    if any(keyword in content_lower for keyword in ["正确", "错误", "是否", "对错", "t/f", "true/false"]):
-        return "true_false"
-    
-    # 简答题/论述题特征
-    if any(keyword in content_lower for keyword in ["简述", "论述", "分析", "解释", "说明", "阐述"]):
-        return "essay"
-    
-    # 计算题特征
-    if any(keyword in content_lower for keyword in ["计算", "求", "解", "证明"]):
-        return "calculation"
-    
+        return "multiple_choice" if "multiple_choice" in found else "single_choice"
+
+    # 填空题 / 判断题 / 简答题（论述题） / 计算题 特征
+    for question_type in ("fill_blank", "true_false", "essay", "calculation"):
+        if question_type in found:
+            return question_type
+
     # 默认为简答题
     return "short_answer"
 
 
-def _calculate_position(bboxes: List[List[List[float]]]) -> Optional[Dict[str, float]]:
-    """计算题目在页面中的位置"""
-    if not bboxes:
-        return None
-    
+def _line_extents(boxes: Sequence[Any], count: int) -> np.ndarray:
+    """
+    每行 bbox 的 [x_min, y_min, x_max, y_max]，形状 (count, 4)，缺失或无效的行为 NaN
+
+    支持 rec_boxes 的 [x1, y1, x2, y2] 格式和多边形点列表 [[x, y], ...] 格式；
+    整页格式一致时一次展平转换，否则逐行转换。
+    """
+    extents = np.full((count, 4), np.nan)
+    if not len(boxes):
+        return extents
+    n = min(len(boxes), count)
+
+    stacked = _stack_uniform_boxes(boxes[:n])
+    if stacked is not None and stacked.ndim == 2:
+        extents[:n, 0] = np.minimum(stacked[:, 0], stacked[:, 2])
+        extents[:n, 1] = np.minimum(stacked[:, 1], stacked[:, 3])
+        extents[:n, 2] = np.maximum(stacked[:, 0], stacked[:, 2])
+        extents[:n, 3] = np.maximum(stacked[:, 1], stacked[:, 3])
+        return extents
+    if stacked is not None:
+        # 逐个顶点做逐元素 min/max，比沿 axis=1 的小轴归约快
+        points = [stacked[:, k] for k in range(stacked.shape[1])]
+        extents[:n, :2] = np.minimum.reduce(points)
+        extents[:n, 2:] = np.maximum.reduce(points)
+        return extents
+
+    # 行格式不一致（含空 bbox）：逐行转换
+    for idx in range(n):
+        extents[idx] = _single_line_extent(boxes[idx])
+    return extents
+
+
+def _stack_uniform_boxes(boxes: Sequence[Any]) -> Optional[np.ndarray]:
+    """
+    整页 bbox 格式一致时展平为数组：(n, 4) 的 [x1, y1, x2, y2] 或 (n, K, 2) 的多边形点
+
+    np.fromiter 直接消费展平的数字序列，比 np.asarray 逐层检查嵌套列表快约一倍；
+    格式不一致（空 bbox、点数不同、混用两种格式）时返回 None。
+    """
+    first = boxes[0]
     try:
-        all_x_coords = []
-        all_y_coords = []
-        
-        for bbox in bboxes:
-            if bbox:
-                for point in bbox:
-                    if len(point) >= 2:
-                        all_x_coords.append(point[0])
-                        all_y_coords.append(point[1])
-        
-        if not all_x_coords or not all_y_coords:
+        width = len(first)
+        if any(len(bbox) != width for bbox in boxes):
             return None
-        
-        x_min, x_max = min(all_x_coords), max(all_x_coords)
-        y_min, y_max = min(all_y_coords), max(all_y_coords)
-        
-        return {
+        if width == 4 and not hasattr(first[0], "__len__"):
+            flat = np.fromiter(chain.from_iterable(boxes), dtype=float)
+            return flat.reshape(len(boxes), 4)
+        if width and len(first[0]) == 2:
+            flat = np.fromiter(chain.from_iterable(chain.from_iterable(boxes)), dtype=float)
+            # 总数不符说明有点不是 (x, y)，reshape 抛 ValueError 后回退逐行转换
+            return flat.reshape(len(boxes), width, 2)
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def _single_line_extent(bbox: Any) -> Tuple[float, float, float, float]:
+    try:
+        arr = np.asarray(bbox, dtype=float)
+    except (TypeError, ValueError):
+        return (np.nan,) * 4
+    if arr.ndim == 1 and arr.size == 4:
+        return (min(arr[0], arr[2]), min(arr[1], arr[3]), max(arr[0], arr[2]), max(arr[1], arr[3]))
+    if arr.ndim == 2 and arr.shape[0] > 0 and arr.shape[1] >= 2:
+        return (arr[:, 0].min(), arr[:, 1].min(), arr[:, 0].max(), arr[:, 1].max())
+    return (np.nan,) * 4
+
+
+def _question_positions(
+    boxes: Sequence[Any],
+    line_question: np.ndarray,
+    pages: Optional[Sequence[int]],
+    questions: List[Dict[str, Any]]
+) -> List[Optional[Dict[str, float]]]:
+    """计算每道题在起始页中的位置（跨页题目只统计起始页上的文本行）"""
+    positions: List[Optional[Dict[str, float]]] = [None] * len(questions)
+    extents = _line_extents(boxes, len(line_question))
+
+    valid = (line_question >= 0) & ~np.isnan(extents).any(axis=1)
+    if pages is not None:
+        question_pages = np.array([question["page_index"] for question in questions])
+        line_pages = np.asarray(pages)
+        valid &= line_pages == question_pages[np.maximum(line_question, 0)]
+    if not valid.any():
+        return positions
+
+    # 有效行按题目序号有序排列，reduceat 按题目分段一次聚合
+    owners = line_question[valid]
+    segment_starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+    kept = extents[valid]
+    mins = np.minimum.reduceat(kept[:, :2], segment_starts, axis=0)
+    maxs = np.maximum.reduceat(kept[:, 2:], segment_starts, axis=0)
+
+    for owner, (x_min, y_min), (x_max, y_max) in zip(owners[segment_starts], mins.tolist(), maxs.tolist()):
+        positions[owner] = {
             "x_min": x_min,
             "x_max": x_max,
             "y_min": y_min,
@@ -240,8 +377,21 @@ def _calculate_position(bboxes: List[List[List[float]]]) -> Optional[Dict[str, f
             "width": x_max - x_min,
             "height": y_max - y_min,
         }
-    except (TypeError, IndexError, ValueError) as e:
-        logger.warning(f"Failed to calculate position: {e}")
-        return None
+    return positions
+
 
+def _question_confidences(
+    scores: Sequence[float],
+    line_question: np.ndarray,
+    question_count: int
+) -> List[float]:
+    """每道题所有文本行的平均识别置信度（缺失的置信度按 0 计）"""
+    line_scores = np.zeros(len(line_question))
+    if len(scores):
+        n = min(len(scores), len(line_question))
+        line_scores[:n] = np.asarray(scores[:n], dtype=float)
 
+    owned = line_question >= 0
+    totals = np.bincount(line_question[owned], weights=line_scores[owned], minlength=question_count)
+    counts = np.bincount(line_question[owned], minlength=question_count)
+    return (totals / np.maximum(counts, 1)).tolist()
@@ -0,0 +1,166 @@
+"""
+题目列表的游标分页（keyset pagination）与总数缓存
+
+按 (created_at, id) 倒序分页：游标记录上一页最后一条的排序键，下一页用
+(created_at, id) < (游标时间, 游标ID) 的范围条件定位，借助复合索引直接跳到起点，
+深页与第一页的代价相同（OFFSET 需要先扫描并丢弃前面所有行）。
+总数用 COUNT 查询，结果按查询条件短时缓存，翻页时不重复计数。
+全文检索结果按相关度排序，没有可比较的排序键，使用记录偏移量的游标。
+"""
+import base64
+import json
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from sqlalchemy import func, literal, tuple_
+from sqlalchemy.orm import Query
+
+
+class InvalidCursorError(ValueError):
+    """游标无法解析（被篡改或来自不兼容的版本）"""
+
+
+@dataclass
+class Page:
+    """一页结果"""
+
+    items: List[Any]
+    total: int
+    next_cursor: Optional[str] = None  # 为 None 表示没有下一页
+    # 全文检索结果：题目ID -> SearchHit（分数和高亮片段），普通列表为空
+    hits: Dict[Any, Any] = field(default_factory=dict)
+
+
+def encode_cursor(created_at: datetime, item_id: uuid.UUID) -> str:
+    """排序键 -> 不透明的游标字符串"""
+    raw = json.dumps({"t": created_at.isoformat(), "id": str(item_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """
+    游标字符串 -> (created_at, id)
+
+    Raises:
+        InvalidCursorError: 游标格式错误
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(data["t"]), uuid.UUID(data["id"])
+    except (ValueError, KeyError, TypeError, UnicodeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor!r}") from e
+
+
+def encode_offset_cursor(offset: int) -> str:
+    """按相关度排序的结果没有稳定的排序键，游标记录下一页的偏移量"""
+    raw = json.dumps({"o": offset}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_offset_cursor(cursor: str) -> int:
+    """
+    偏移量游标 -> 偏移量
+
+    Raises:
+        InvalidCursorError: 游标格式错误
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        offset = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))["o"]
+    except (ValueError, KeyError, TypeError, UnicodeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(offset, int) or offset < 0:
+        raise InvalidCursorError(f"Invalid cursor: {cursor!r}")
+    return offset
+
+
+def keyset_paginate(
+    query: Query,
+    model: Any,
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    按 (created_at, id) 倒序取一页
+
+    Args:
+        query: 已附加过滤条件、未排序的查询
+        model: 含 created_at / id 列的模型
+        limit: 每页条数
+        cursor: 上一页返回的 next_cursor；为空时从第一条开始
+        skip: 兼容旧的 OFFSET 分页（仅在没有游标时生效）
+
+    Returns:
+        (本页记录, 下一页游标)；没有更多记录时游标为 None
+
+    Raises:
+        InvalidCursorError: 游标格式错误
+    """
+    query = query.order_by(model.created_at.desc(), model.id.desc())
+    if cursor:
+        created_at, item_id = decode_cursor(cursor)
+        # 行值比较 (a, b) < (x, y) 可以直接使用 (过滤列, created_at, id) 复合索引定位
+        query = query.filter(
+            tuple_(model.created_at, model.id)
+            < tuple_(literal(created_at, model.created_at.type), literal(item_id, model.id.type))
+        )
+    elif skip:
+        query = query.offset(skip)
+
+    # 多取一条判断是否还有下一页，不需要额外查询
+    rows = query.limit(limit + 1).all()
+    items = rows[:limit]
+    if len(rows) <= limit or not items:
+        return items, None
+    last = items[-1]
+    return items, encode_cursor(last.created_at, last.id)
+
+
+class TotalCountCache:
+    """查询条件 -> 总数 的短时缓存（进程内），翻页时复用第一页的 COUNT 结果"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 4096):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            return entry[1]
+
+    def set(self, key: Hashable, total: int) -> None:
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                now = time.monotonic()
+                self._entries = {k: v for k, v in self._entries.items() if v[0] >= now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, total)
+
+    def count(self, key: Hashable, query: Query, model: Any, refresh: bool = False) -> int:
+        """
+        返回 query 的总数，命中缓存时不查询
+
+        Args:
+            key: 查询条件签名
+            query: 未分页、未排序的查询
+            model: 查询的模型（COUNT 其主键，不取整行）
+            refresh: 为 True 时忽略缓存重新计数（第一页请求）
+        """
+        if not refresh:
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+        total = query.order_by(None).with_entities(func.count(model.id)).scalar() or 0
+        self.set(key, total)
+        return total
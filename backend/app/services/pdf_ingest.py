@@ -0,0 +1,153 @@
+"""
+PDF导入 - 文本层快速路径 + 扫描页并行栅格化
+
+有可提取文本层的页面直接在本地切分题目，完全不调用视觉模型；
+扫描页在进程池中渲染为图片，渲染完成一页就交给 OCR 阶段，不等待整份 PDF 渲染结束；
+同时在渲染中的页数有上限，渲染不会远远领先于识别。
+"""
+import logging
+from concurrent.futures import FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pdfplumber
+
+from app.config import settings
+from app.services.paddle_parser import parse_questions_from_lines
+from app.services.process_pool import INGEST_POOL, get_process_pool
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PDFPagePlan:
+    """PDF 各页的处理方式"""
+    page_count: int
+    # 文本层页: page_index -> 本地切分出的题目
+    text_pages: Dict[int, List[Dict[str, Any]]] = field(default_factory=dict)
+    # 需要栅格化后 OCR 的页索引
+    scanned_pages: List[int] = field(default_factory=list)
+
+
+def count_pdf_pages(pdf_path: str) -> int:
+    """返回 PDF 页数"""
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def plan_pdf_pages(pdf_path: str, skip_indexes: Optional[set] = None) -> PDFPagePlan:
+    """
+    逐页检查文本层，决定每页走本地切分还是视觉模型
+
+    文本层字符数不足 PDF_TEXT_LAYER_MIN_CHARS，或文本层中切分不出题目的页面按扫描页处理。
+
+    Args:
+        pdf_path: PDF 文件路径
+        skip_indexes: 需要跳过的页索引
+
+    Returns:
+        PDFPagePlan
+    """
+    skipped = skip_indexes or set()
+    with pdfplumber.open(pdf_path) as pdf:
+        plan = PDFPagePlan(page_count=len(pdf.pages))
+        for index, page in enumerate(pdf.pages):
+            if index in skipped:
+                continue
+            text = page.extract_text() or ""
+            questions: List[Dict[str, Any]] = []
+            if len(text.strip()) >= settings.PDF_TEXT_LAYER_MIN_CHARS:
+                questions = split_text_layer_questions(text)
+            if questions:
+                plan.text_pages[index] = questions
+            else:
+                plan.scanned_pages.append(index)
+
+    logger.info(
+        "PDF %s: %d pages, %d with text layer, %d to rasterize",
+        pdf_path, plan.page_count, len(plan.text_pages), len(plan.scanned_pages),
+    )
+    return plan
+
+
+def split_text_layer_questions(text: str) -> List[Dict[str, Any]]:
+    """使用本地题号/选项规则切分文本层中的题目"""
+    lines = [line for line in text.splitlines() if line.strip()]
+    questions = parse_questions_from_lines(lines)
+    for question in questions:
+        # 文本层内容是精确的，不存在识别误差
+        question["confidence"] = 1.0
+        question.setdefault("images", {})
+        question["source"] = "text_layer"
+    return questions
+
+
+def render_pdf_page(pdf_path: str, page_index: int, dest_path: str, resolution: int) -> str:
+    """
+    将单页渲染为 JPEG（在子进程中执行）
+
+    Returns:
+        渲染后的图片路径
+    """
+    with pdfplumber.open(pdf_path) as pdf:
+        page_image = pdf.pages[page_index].to_image(resolution=resolution)
+        page_image.original.convert("RGB").save(dest_path, format="JPEG", quality=90)
+    return dest_path
+
+
+def iter_rendered_pages(
+    pdf_path: str, page_indexes: List[int], output_dir: str, window: Optional[int] = None
+) -> Iterator[Tuple[int, str]]:
+    """
+    在进程池中并行渲染指定页面，按完成顺序逐页产出 (page_index, image_path)
+
+    最多同时提交 window 页，调用方取走一页后才提交下一页：调用方处理较慢时渲染随之暂停，
+    不会一次把整份 PDF 渲染到磁盘。渲染失败的页面产出 (page_index, None)，由调用方记录为该页的错误。
+
+    Args:
+        pdf_path: PDF 文件路径
+        page_indexes: 需要渲染的页索引
+        output_dir: 渲染图片的输出目录
+        window: 同时渲染的最大页数，默认 settings.PDF_RENDER_WINDOW
+    """
+    if not page_indexes:
+        return
+    out_dir = Path(output_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    window = max(1, window or settings.PDF_RENDER_WINDOW)
+
+    pool = get_process_pool(INGEST_POOL)
+    remaining = iter(page_indexes)
+    pending: Dict[Any, int] = {}
+
+    def fill() -> None:
+        while len(pending) < window:
+            index = next(remaining, None)
+            if index is None:
+                return
+            future = pool.submit(
+                render_pdf_page,
+                pdf_path,
+                index,
+                str(out_dir / f"page-{index + 1:04d}.jpg"),
+                settings.PDF_RENDER_DPI,
+            )
+            pending[future] = index
+
+    try:
+        fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    image_path = future.result()
+                except Exception as exc:
+                    logger.error("Failed to render page %d of %s: %s", index, pdf_path, exc)
+                    image_path = None
+                yield index, image_path
+                fill()
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,75 @@
+"""
+共享的 CPU 进程池 - 图片规范化、PDF 渲染、题目裁剪和衍生图生成
+
+子进程以 spawn 方式启动（应用进程中有多个线程，fork 不安全），每个子进程都要重新导入应用模块。
+按负载类型只维护两个池：
+- ingest: 导入流水线上需要等待结果的任务（规范化、PDF 渲染、题目裁剪），共用 INGEST_PROCESS_WORKERS 个进程
+- derivatives: 导入后在后台预生成的缩略图，单独一个池，大批量生成时不会排在导入任务前面
+"""
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.config import settings
+
+INGEST_POOL = "ingest"
+DERIVATIVES_POOL = "derivatives"
+
+
+class LazyProcessPool:
+    """首次提交任务时才创建的 spawn 进程池"""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = max(1, workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+        return self._executor
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """提交任务（函数和参数必须可以被 pickle）"""
+        return self._get_executor().submit(fn, *args)
+
+    def shutdown(self) -> None:
+        """关闭进程池，取消尚未开始的任务；之后再提交任务会重新创建"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pools: Dict[str, LazyProcessPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_workers(name: str) -> int:
+    if name == DERIVATIVES_POOL:
+        return settings.IMAGE_DERIVATIVE_WORKERS
+    return settings.INGEST_PROCESS_WORKERS
+
+
+def get_process_pool(name: str = INGEST_POOL) -> LazyProcessPool:
+    """获取共享进程池单例"""
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = LazyProcessPool(name, _pool_workers(name))
+        return pool
+
+
+def shutdown_process_pools() -> None:
+    """应用关闭时释放所有进程池"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.shutdown()
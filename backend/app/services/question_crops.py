@@ -0,0 +1,171 @@
+"""
+题目区域裁剪 - 按识别结果中的 position（像素坐标）从整页图片裁出每道题
+
+带坐标的后端（PaddleOCR）为每道题返回其文本行的外接框。裁剪图（含少量边距）存入内容寻址存储，
+以 question_images["crop"] 引用，题目列表只需下载题目所在的一小块区域而不是整页。
+裁剪在导入进程池中执行，整页图片只解码一次。
+"""
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image, ImageOps
+
+from app.config import settings
+from app.services.blob_store import BlobStore, get_blob_store, to_blob_ref
+from app.services.image_derivatives import derivative_urls
+from app.services.image_normalizer import flatten_to_rgb
+from app.services.process_pool import INGEST_POOL, LazyProcessPool, get_process_pool
+
+logger = logging.getLogger(__name__)
+
+# 裁剪区域超过整页面积的该比例时不再裁剪（直接使用整页图片）
+_MAX_PAGE_FRACTION = 0.9
+
+Box = Tuple[float, float, float, float]
+
+
+def crop_image_regions(
+    src_path: str,
+    output_dir: str,
+    boxes: Sequence[Box],
+    padding: int,
+    quality: int,
+) -> List[Optional[str]]:
+    """
+    从图片中裁出多个区域并保存为 WebP（在子进程中执行）
+
+    Args:
+        src_path: 整页图片路径
+        output_dir: 输出目录
+        boxes: (x_min, y_min, x_max, y_max) 像素坐标列表
+        padding: 四周额外保留的像素
+        quality: WebP 压缩质量
+
+    Returns:
+        与 boxes 一一对应的文件路径；区域为空或接近整页时为 None
+    """
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    prefix = uuid.uuid4().hex
+    results: List[Optional[str]] = []
+    with Image.open(src_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "L":
+            img = flatten_to_rgb(img)
+        width, height = img.size
+        for index, (x_min, y_min, x_max, y_max) in enumerate(boxes):
+            left = max(0, int(x_min) - padding)
+            top = max(0, int(y_min) - padding)
+            right = min(width, int(x_max + 0.999) + padding)
+            bottom = min(height, int(y_max + 0.999) + padding)
+            if right <= left or bottom <= top or (right - left) * (bottom - top) > width * height * _MAX_PAGE_FRACTION:
+                results.append(None)
+                continue
+            path = os.path.join(output_dir, f"{prefix}_{index:03d}.webp")
+            img.crop((left, top, right, bottom)).save(path, format="WEBP", quality=quality, method=4)
+            results.append(path)
+    return results
+
+
+def question_box(question: Dict[str, Any]) -> Optional[Box]:
+    """题目 position 中的像素外接框；缺失或无效时返回 None"""
+    position = question.get("position")
+    if not isinstance(position, dict):
+        return None
+    try:
+        box = tuple(float(position[key]) for key in ("x_min", "y_min", "x_max", "y_max"))
+    except (KeyError, TypeError, ValueError):
+        return None
+    if box[2] <= box[0] or box[3] <= box[1]:
+        return None
+    return box
+
+
+def crop_image_urls(question_images: Any) -> Optional[Dict[str, str]]:
+    """question_images 中裁剪图的访问地址（原图及缩略图版本），没有裁剪图时返回 None"""
+    if not isinstance(question_images, dict):
+        return None
+    return derivative_urls(question_images.get("crop"))
+
+
+class QuestionCropper:
+    """题目裁剪器，在共享的导入进程池中执行"""
+
+    def __init__(self, store: BlobStore, padding: int, quality: int, pool: LazyProcessPool, output_dir: str):
+        """
+        Args:
+            store: 内容寻址存储
+            padding: 裁剪框四周额外保留的像素
+            quality: WebP 压缩质量
+            pool: 执行裁剪的进程池
+            output_dir: 裁剪图的临时目录（存入存储后删除）
+        """
+        self.store = store
+        self.padding = max(0, padding)
+        self.quality = quality
+        self.pool = pool
+        self.output_dir = str(Path(output_dir).resolve())
+
+    def crop_questions(self, image_path: str, questions: List[Dict[str, Any]]) -> int:
+        """
+        为带坐标的题目裁剪区域图，写入 question["images"]["crop"]
+
+        裁剪失败只记录日志，不影响题目本身。
+
+        Args:
+            image_path: 整页图片路径（题目坐标所在的图片）
+            questions: 同一页的题目列表（原地修改）
+
+        Returns:
+            生成的裁剪图数量
+        """
+        targets = [(question, box) for question in questions if (box := question_box(question)) is not None]
+        if not targets:
+            return 0
+        try:
+            paths = self.pool.submit(
+                crop_image_regions,
+                os.path.abspath(image_path),
+                self.output_dir,
+                [box for _, box in targets],
+                self.padding,
+                self.quality,
+            ).result()
+        except Exception as e:
+            logger.warning(f"Failed to crop questions from {image_path}: {e}")
+            return 0
+
+        cropped = 0
+        for (question, _), path in zip(targets, paths):
+            if path is None:
+                continue
+            try:
+                key = self.store.put_file(path, move=True)
+            except Exception as e:
+                logger.warning(f"Failed to store question crop {path}: {e}")
+                continue
+            images = question.get("images")
+            # 同一页的题目可能共用同一个 images 字典，复制后再写入
+            question["images"] = {**(images if isinstance(images, dict) else {}), "crop": to_blob_ref(key)}
+            cropped += 1
+        return cropped
+
+
+# 全局单例
+_cropper_instance: Optional[QuestionCropper] = None
+
+
+def get_question_cropper() -> QuestionCropper:
+    """获取题目裁剪器单例"""
+    global _cropper_instance
+    if _cropper_instance is None:
+        _cropper_instance = QuestionCropper(
+            store=get_blob_store(),
+            padding=settings.QUESTION_CROP_PADDING,
+            quality=settings.QUESTION_CROP_WEBP_QUALITY,
+            pool=get_process_pool(INGEST_POOL),
+            output_dir=settings.QUESTION_CROP_DIR,
+        )
+    return _cropper_instance
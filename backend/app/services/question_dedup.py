@@ -0,0 +1,318 @@
+"""
+近似重复题检测 - 归一化文本 shingle -> MinHash 签名 -> 按用户分桶的 LSH 索引
+
+同一道教材题会从不同的练习卷中被反复识别，题号、空白、LaTeX 写法和 OCR 细节略有差异。
+导入时对题干 + 选项做归一化（去题号、LaTeX 命令统一、去空白和标点），取字符 k-gram 集合，
+计算 MinHash 签名；签名切成若干 band，每个 band 的哈希作为桶存入 question_lsh_buckets。
+查重只查询同一用户、同桶的题目（索引查找，不随题库规模线性增长），
+再用签名估计的 Jaccard 相似度确认，超过阈值的新题以 duplicate_of_id 关联到原题。
+"""
+import hashlib
+import logging
+import re
+import unicodedata
+import uuid
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import delete, event, inspect as sa_inspect, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.question import Question
+from app.models.question_fingerprint import QuestionFingerprint, QuestionLSHBucket
+from app.services.question_search import question_texts
+
+logger = logging.getLogger(__name__)
+
+# 签名长度和分桶方式决定已存指纹的含义，修改后需要重新计算全部指纹
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 32  # 每个 band 4 行：相似度 0.8 的题目几乎必然同桶，0.3 以下很少同桶
+SHINGLE_SIZE = 3
+_SEED = 20261018
+
+# 影响指纹的字段
+FINGERPRINT_FIELDS = ("content", "full_content", "options")
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+# 题号前缀：1. / 1、/ (1) / （1）/ 第1题
+_NUMBER_PREFIX_RE = re.compile(r"^\s*(?:第\s*\d+\s*题|[(（]\s*\d+\s*[)）]|\d+\s*[.．、:：)）])\s*")
+# 不影响题意的 LaTeX 写法差异
+_LATEX_REPLACEMENTS = (
+    (re.compile(r"\\[dt]frac"), r"\\frac"),
+    (re.compile(r"\\(?:left|right|displaystyle|mathrm|text|quad|qquad|,|;|!)"), ""),
+    (re.compile(r"\\(?:cdot|times)"), "*"),
+    (re.compile(r"\\div"), "/"),
+    (re.compile(r"\\(?:leq|le)\b"), "≤"),
+    (re.compile(r"\\(?:geq|ge)\b"), "≥"),
+    (re.compile(r"\\neq?\b"), "≠"),
+    (re.compile(r"\$|\\[()\[\]]|[{}]"), ""),
+)
+
+
+def normalize_question_text(value: str) -> str:
+    """题目文本归一化：去题号、统一 LaTeX 写法、去空白和标点、全角转半角、小写"""
+    value = _NUMBER_PREFIX_RE.sub("", value or "")
+    for pattern, replacement in _LATEX_REPLACEMENTS:
+        value = pattern.sub(replacement, value)
+    value = unicodedata.normalize("NFKC", value).lower()
+    return "".join(
+        char for char in value
+        if not char.isspace() and not unicodedata.category(char).startswith("P")
+    )
+
+
+def shingles(value: str, size: int = SHINGLE_SIZE) -> set:
+    """字符 k-gram 集合"""
+    if len(value) <= size:
+        return {value} if value else set()
+    return {value[i:i + size] for i in range(len(value) - size + 1)}
+
+
+class MinHasher:
+    """MinHash 签名：shingle 的 32 位哈希经 NUM_PERMUTATIONS 个随机线性变换后取最小值"""
+
+    def __init__(self, num_perm: int = NUM_PERMUTATIONS, seed: int = _SEED):
+        generator = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self._a = generator.randint(1, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = generator.randint(0, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+
+    def signature(self, items: Iterable[str]) -> Optional[np.ndarray]:
+        """shingle 集合 -> uint32 签名；集合为空时返回 None"""
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=4).digest(), "little") for item in items),
+            dtype=np.uint64,
+        )
+        if hashes.size == 0:
+            return None
+        # uint64 乘法允许溢出回绕（与 datasketch 的做法相同），仍是有效的哈希族
+        with np.errstate(over="ignore"):
+            permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """签名估计的 Jaccard 相似度"""
+    return float(np.count_nonzero(a == b)) / len(a)
+
+
+def band_buckets(signature: np.ndarray, bands: int = LSH_BANDS) -> List[int]:
+    """签名切成 bands 段，每段（连同段序号）哈希为有符号 64 位整数"""
+    rows = len(signature) // bands
+    buckets = []
+    for band in range(bands):
+        chunk = signature[band * rows:(band + 1) * rows].tobytes()
+        digest = hashlib.blake2b(band.to_bytes(2, "little") + chunk, digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, "little", signed=True))
+    return buckets
+
+
+# (题目, 签名, 各 band 的桶哈希)
+Fingerprint = Tuple[Question, np.ndarray, List[int]]
+
+
+def _decode_signature(raw: bytes) -> np.ndarray:
+    return np.frombuffer(raw, dtype=np.uint32)
+
+
+class DuplicateDetector:
+    """导入时的近似重复检测器"""
+
+    def __init__(self, threshold: float, min_length: int = 10):
+        """
+        Args:
+            threshold: 判定为重复的最低估计相似度
+            min_length: 归一化后短于该长度的题目不做检测（过短的文本容易误判）
+        """
+        self.threshold = threshold
+        self.min_length = min_length
+        self.hasher = MinHasher()
+
+    def fingerprint(self, question: Question) -> Optional[np.ndarray]:
+        """题目的 MinHash 签名（题干 + 选项）；文本过短时返回 None"""
+        primary, _ = question_texts(question)
+        normalized = normalize_question_text(primary)
+        if len(normalized) < self.min_length:
+            return None
+        return self.hasher.signature(shingles(normalized))
+
+    def _candidates(
+        self, db: Session, created_by: uuid.UUID, buckets: Sequence[int]
+    ) -> Tuple[Dict[int, List[uuid.UUID]], Dict[uuid.UUID, Tuple[np.ndarray, Optional[uuid.UUID]]]]:
+        """
+        同用户、同桶的已有题目
+
+        Returns:
+            (桶 -> 题目ID列表, 题目ID -> (签名, 该题关联的原题ID))
+        """
+        if not buckets:
+            return {}, {}
+        bucket_rows = (
+            db.query(QuestionLSHBucket.bucket, QuestionLSHBucket.question_id)
+            .filter(QuestionLSHBucket.created_by == created_by, QuestionLSHBucket.bucket.in_(list(set(buckets))))
+            .all()
+        )
+        members: Dict[int, List[uuid.UUID]] = {}
+        for bucket, question_id in bucket_rows:
+            members.setdefault(bucket, []).append(question_id)
+        if not members:
+            return {}, {}
+        rows = (
+            db.query(QuestionFingerprint.question_id, QuestionFingerprint.signature, Question.duplicate_of_id)
+            .join(Question, Question.id == QuestionFingerprint.question_id)
+            .filter(QuestionFingerprint.question_id.in_(list({qid for _, qid in bucket_rows})))
+            .all()
+        )
+        return members, {qid: (_decode_signature(raw), duplicate_of) for qid, raw, duplicate_of in rows}
+
+    def link_duplicates(self, db: Session, created_by: uuid.UUID, questions: Sequence[Question]) -> List[Fingerprint]:
+        """
+        为一批新题目计算指纹，并把疑似重复的题目关联到原题（设置 duplicate_of_id / duplicate_similarity）
+
+        题目须已设置 id，可以是尚未写入的临时对象；同一批内的重复题同样会被关联。
+        不写入数据库：题目写入后用 save_fingerprints 保存返回的指纹。
+
+        Returns:
+            本批题目的指纹（文本过短的题目没有指纹）
+        """
+        signatures: List[Fingerprint] = []
+        for question in questions:
+            signature = self.fingerprint(question)
+            if signature is not None:
+                signatures.append((question, signature, band_buckets(signature)))
+        if not signatures:
+            return []
+
+        # 已有题目与本批已处理的题目共用一张 桶 -> 题目 表，批内重复也能找到
+        bucket_members, known = self._candidates(
+            db, created_by, [bucket for _, _, buckets in signatures for bucket in buckets]
+        )
+
+        for question, signature, buckets in signatures:
+            candidate_ids = {
+                candidate_id for bucket in buckets for candidate_id in bucket_members.get(bucket, ())
+            }
+            best_id, best_score = None, 0.0
+            for candidate_id in candidate_ids:
+                if candidate_id not in known:
+                    continue
+                candidate_signature, _ = known[candidate_id]
+                score = similarity(signature, candidate_signature)
+                if score > best_score:
+                    best_id, best_score = candidate_id, score
+
+            if best_id is not None and best_score >= self.threshold:
+                _, canonical = known[best_id]
+                # 关联到簇的原题（候选本身也是重复题时取其原题），簇只有一层
+                question.duplicate_of_id = canonical or best_id
+                question.duplicate_similarity = round(best_score, 4)
+
+            known[question.id] = (signature, question.duplicate_of_id)
+            for bucket in buckets:
+                bucket_members.setdefault(bucket, []).append(question.id)
+
+        return signatures
+
+    @staticmethod
+    def save_fingerprints(db: Session, created_by: uuid.UUID, fingerprints: Sequence[Fingerprint]) -> None:
+        """
+        写入指纹和 LSH 分桶（题目须已写入数据库）
+
+        分桶行数是题目数的 LSH_BANDS 倍，不经过 ORM 对象，各用一条多行 INSERT 写入。
+        """
+        if not fingerprints:
+            return
+        db.execute(QuestionFingerprint.__table__.insert(), [
+            {"question_id": question.id, "created_by": created_by, "signature": signature.tobytes()}
+            for question, signature, _ in fingerprints
+        ])
+        db.execute(QuestionLSHBucket.__table__.insert(), [
+            {"question_id": question.id, "band": band, "created_by": created_by, "bucket": bucket}
+            for question, _, buckets in fingerprints
+            for band, bucket in enumerate(buckets)
+        ])
+
+
+# 全局单例
+_detector_instance: Optional[DuplicateDetector] = None
+
+
+def get_duplicate_detector() -> DuplicateDetector:
+    """获取重复检测器单例"""
+    global _detector_instance
+    if _detector_instance is None:
+        _detector_instance = DuplicateDetector(threshold=settings.QUESTION_DEDUP_THRESHOLD)
+    return _detector_instance
+
+
+@event.listens_for(Session, "before_flush")
+def _release_deleted_questions(session: Session, flush_context, instances) -> None:
+    """
+    删除题目前清理其指纹，并把关联到它的重复题改为关联到簇中最早的一道（该题成为新的原题）
+    """
+    deleted = {obj.id for obj in session.deleted if isinstance(obj, Question) and obj.id is not None}
+    if not deleted:
+        return
+    session.execute(delete(QuestionLSHBucket).where(QuestionLSHBucket.question_id.in_(deleted)))
+    session.execute(delete(QuestionFingerprint).where(QuestionFingerprint.question_id.in_(deleted)))
+
+    table = Question.__table__
+    members = session.execute(
+        select(table.c.id, table.c.duplicate_of_id)
+        .where(table.c.duplicate_of_id.in_(deleted), table.c.id.notin_(deleted))
+        .order_by(table.c.created_at, table.c.id)
+    ).all()
+    promoted: Dict[uuid.UUID, uuid.UUID] = {}
+    for member_id, canonical_id in members:
+        if canonical_id not in promoted:
+            promoted[canonical_id] = member_id
+            session.execute(
+                update(table).where(table.c.id == member_id).values(duplicate_of_id=None, duplicate_similarity=None)
+            )
+        else:
+            session.execute(
+                update(table).where(table.c.id == member_id).values(duplicate_of_id=promoted[canonical_id])
+            )
+    if members:
+        # 会话中已加载的簇成员属性已过期
+        for obj in list(session.identity_map.values()):
+            if isinstance(obj, Question) and obj.id not in deleted and obj.duplicate_of_id in deleted:
+                session.expire(obj, ["duplicate_of_id", "duplicate_similarity"])
+
+
+@event.listens_for(Session, "after_flush")
+def _refresh_fingerprints(session: Session, flush_context) -> None:
+    """已有指纹的题目修改题干 / 选项后重新计算指纹（重复关联不变）"""
+    changed = [
+        obj for obj in session.dirty
+        if isinstance(obj, Question)
+        and any(sa_inspect(obj).attrs[field].history.has_changes() for field in FINGERPRINT_FIELDS)
+    ]
+    if not changed:
+        return
+    conn = session.connection()
+    ids = [obj.id for obj in changed]
+    indexed = set(conn.execute(
+        select(QuestionFingerprint.question_id).where(QuestionFingerprint.question_id.in_(ids))
+    ).scalars())
+    detector = get_duplicate_detector()
+    for question in changed:
+        if question.id not in indexed:
+            continue
+        conn.execute(delete(QuestionLSHBucket).where(QuestionLSHBucket.question_id == question.id))
+        signature = detector.fingerprint(question)
+        if signature is None:
+            conn.execute(delete(QuestionFingerprint).where(QuestionFingerprint.question_id == question.id))
+            continue
+        conn.execute(
+            update(QuestionFingerprint)
+            .where(QuestionFingerprint.question_id == question.id)
+            .values(signature=signature.tobytes())
+        )
+        conn.execute(QuestionLSHBucket.__table__.insert(), [
+            {"question_id": question.id, "band": band, "created_by": question.created_by, "bucket": bucket}
+            for band, bucket in enumerate(band_buckets(signature))
+        ])
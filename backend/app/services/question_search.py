@@ -0,0 +1,521 @@
+"""
+题目全文检索索引（PostgreSQL tsvector + GIN / SQLite FTS5）
+
+中文没有空格分词，索引和查询统一在 Python 中切词：连续的汉字切成相邻二元组（bigram），
+每段末尾再补一个单字，英文 / 数字按词切分并转小写。这样数据库侧不依赖中文分词扩展：
+- PostgreSQL：直接构造带位置和权重的 tsvector 字面量（不经过文本解析器），GIN 索引
+- SQLite：FTS5 虚表，词之间以空格分隔
+
+题干 / 选项权重高于解析 / 标签；多字查询按短语匹配（二元组位置相邻），单字查询按前缀匹配。
+索引按用户隔离（查询总是带 created_by 条件），由 Session 的 after_flush 钩子在增删改时同步维护。
+"""
+import html
+import json
+import logging
+import re
+import unicodedata
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, event, inspect as sa_inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from app.models.question import Question
+
+logger = logging.getLogger(__name__)
+
+# 切词规则或索引结构变化时递增，启动时检测到版本不一致会重建索引
+INDEX_VERSION = "1"
+
+SUPPORTED_DIALECTS = ("postgresql", "sqlite")
+
+# 影响索引内容的字段；只改状态字段（is_verified 等）时不重建该题的索引
+INDEXED_FIELDS = ("content", "full_content", "options", "explanation", "topic_tags", "created_by")
+
+_CJK = "㐀-䶿一-鿿豈-﫿"
+_TOKEN_RE = re.compile(rf"[{_CJK}]+|[0-9a-z]+")
+_CJK_RE = re.compile(rf"[{_CJK}]")
+
+# tsvector 的位置上限和每个词的位置数上限
+_PG_MAX_POSITION = 16383
+_PG_MAX_POSITIONS_PER_LEXEME = 256
+
+_SNIPPET_CONTEXT = 30
+_SNIPPET_LENGTH = 120
+
+
+def _normalize(value: str) -> str:
+    # 全角字母数字转半角后统一小写
+    return unicodedata.normalize("NFKC", value).lower()
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    """
+    索引切词：汉字段切成二元组并在段尾补单字，英文 / 数字按词切分
+
+    每个汉字都是某个二元组的首字或段尾单字，单字查询用前缀匹配即可命中所有出现位置。
+    """
+    tokens: List[str] = []
+    if not value:
+        return tokens
+    for run in _TOKEN_RE.findall(_normalize(value)):
+        if _CJK_RE.match(run):
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            tokens.append(run[-1])
+        else:
+            tokens.append(run)
+    return tokens
+
+
+@dataclass
+class QueryTerm:
+    """查询中的一个词组：多个 token 位置相邻（短语），prefix 表示单字前缀匹配"""
+
+    text: str
+    tokens: List[str]
+    prefix: bool = False
+
+
+def parse_query(keyword: Optional[str]) -> List[QueryTerm]:
+    """把搜索关键词切分为词组（各词组之间为 AND 关系）"""
+    terms: List[QueryTerm] = []
+    for run in _TOKEN_RE.findall(_normalize(keyword or "")):
+        if not _CJK_RE.match(run):
+            terms.append(QueryTerm(run, [run]))
+        elif len(run) == 1:
+            terms.append(QueryTerm(run, [run], prefix=True))
+        else:
+            terms.append(QueryTerm(run, [run[i:i + 2] for i in range(len(run) - 1)]))
+    return terms
+
+
+def _strings(value: Any) -> Iterable[str]:
+    """JSON 值中的全部字符串（题干 / 选项可能是嵌套结构）"""
+    if isinstance(value, str):
+        if value.lstrip()[:1] in ("{", "["):
+            try:
+                yield from _strings(json.loads(value))
+                return
+            except ValueError:
+                pass
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _strings(item)
+
+
+def question_texts(question: Question) -> Tuple[str, str]:
+    """
+    题目的可检索文本
+
+    Returns:
+        (主要文本: 题干 + 选项, 次要文本: 解析 + 标签)
+    """
+    content = "\n".join(_strings(question.content))
+    primary = [content]
+    if question.full_content and question.full_content.strip() not in content:
+        primary.append(question.full_content)
+    primary.extend(_strings(question.options))
+    secondary = [question.explanation or "", *_strings(question.topic_tags)]
+    return "\n".join(part for part in primary if part), "\n".join(part for part in secondary if part)
+
+
+def _pg_tsvector(primary: str, secondary: str) -> str:
+    """构造 tsvector 字面量：'词':位置权重,...（主要文本权重 A，次要文本权重 B）"""
+    positions: Dict[str, List[str]] = {}
+    position = 0
+    for value, weight in ((primary, "A"), (secondary, "B")):
+        for token in tokenize(value):
+            position += 1
+            entries = positions.setdefault(token, [])
+            if len(entries) < _PG_MAX_POSITIONS_PER_LEXEME:
+                entries.append(f"{min(position, _PG_MAX_POSITION)}{weight}")
+        # 两段文本之间留出间隔，短语不会跨段匹配
+        position += 1
+    return " ".join(f"'{token}':{','.join(entries)}" for token, entries in positions.items())
+
+
+def _pg_tsquery(terms: Sequence[QueryTerm]) -> str:
+    parts = []
+    for term in terms:
+        if term.prefix:
+            parts.append(f"'{term.text}':*")
+        else:
+            parts.append("(" + " <-> ".join(f"'{token}'" for token in term.tokens) + ")")
+    return " & ".join(parts)
+
+
+def _fts5_query(created_by: uuid.UUID, terms: Sequence[QueryTerm]) -> str:
+    parts = []
+    for term in terms:
+        if term.prefix:
+            parts.append(f'"{term.text}"*')
+        else:
+            parts.append('"' + " ".join(term.tokens) + '"')
+    return f'created_by : "{created_by.hex}" AND {{primary_text secondary_text}} : ({" AND ".join(parts)})'
+
+
+def highlight_snippet(texts: Sequence[str], terms: Sequence[QueryTerm]) -> Optional[str]:
+    """
+    截取第一处命中附近的片段，命中的词用 <mark> 包裹（其余文本做 HTML 转义）
+
+    Args:
+        texts: 依次尝试的文本（主要文本优先）
+        terms: 查询词组
+    """
+    words = sorted({term.text for term in terms}, key=len, reverse=True)
+    if not words:
+        return None
+    pattern = re.compile("|".join(re.escape(word) for word in words), re.IGNORECASE)
+    for value in texts:
+        if not value:
+            continue
+        # 优先在原文中定位（保留原始标点）；全角字母数字等只在归一化后才能匹配
+        source = value
+        match = pattern.search(source)
+        if match is None:
+            source = unicodedata.normalize("NFKC", value)
+            match = pattern.search(source)
+        if match is None:
+            continue
+        start = max(0, match.start() - _SNIPPET_CONTEXT)
+        end = min(len(source), start + _SNIPPET_LENGTH)
+        window = source[start:end]
+        pieces, cursor = [], 0
+        for hit in pattern.finditer(window):
+            pieces.append(html.escape(window[cursor:hit.start()]))
+            pieces.append(f"<mark>{html.escape(hit.group())}</mark>")
+            cursor = hit.end()
+        pieces.append(html.escape(window[cursor:]))
+        snippet = " ".join("".join(pieces).split())
+        return ("…" if start > 0 else "") + snippet + ("…" if end < len(source) else "")
+    return None
+
+
+@dataclass
+class SearchHit:
+    """一条检索结果的排序分数（越大越相关）和高亮片段"""
+
+    score: float
+    snippet: Optional[str] = None
+
+
+_PG_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS question_search (
+        question_id UUID PRIMARY KEY REFERENCES questions(id) ON DELETE CASCADE,
+        created_by UUID NOT NULL,
+        document TSVECTOR NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_question_search_document ON question_search USING GIN (document)",
+    "CREATE INDEX IF NOT EXISTS ix_question_search_created_by ON question_search (created_by)",
+    "CREATE TABLE IF NOT EXISTS question_search_meta (key VARCHAR(50) PRIMARY KEY, value VARCHAR(200) NOT NULL)",
+)
+
+_SQLITE_SCHEMA = (
+    # FTS5 按 rowid 删除 / 替换，题目ID -> rowid 的映射单独存放（FTS5 的非索引列无法高效按值查找）
+    "CREATE TABLE IF NOT EXISTS question_search_rows (rowid INTEGER PRIMARY KEY, question_id TEXT NOT NULL UNIQUE)",
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS question_search USING fts5(
+        question_id UNINDEXED, created_by, primary_text, secondary_text
+    )
+    """,
+    "CREATE TABLE IF NOT EXISTS question_search_meta (key VARCHAR(50) PRIMARY KEY, value VARCHAR(200) NOT NULL)",
+)
+
+# bm25 各列权重（与 FTS5 列顺序一致），用户列只用于过滤，不参与打分
+_SQLITE_BM25 = "bm25(question_search, 0.0, 0.0, 10.0, 3.0)"
+
+
+class QuestionSearchIndex:
+    """题目检索索引：建表、写入、删除、查询和重建，按连接的方言选择实现"""
+
+    def __init__(self):
+        # 已建表 / 已完成全量构建的数据库（以连接地址区分）
+        self._schema_ready: set = set()
+        self._index_ready: set = set()
+
+    @staticmethod
+    def _key(conn: Connection) -> str:
+        return str(conn.engine.url)
+
+    @staticmethod
+    def supports(conn: Connection) -> bool:
+        return conn.dialect.name in SUPPORTED_DIALECTS
+
+    def ensure_schema(self, conn: Connection) -> None:
+        """创建索引表（已存在时跳过）"""
+        key = self._key(conn)
+        if key in self._schema_ready or not self.supports(conn):
+            return
+        schema = _PG_SCHEMA if conn.dialect.name == "postgresql" else _SQLITE_SCHEMA
+        for statement in schema:
+            conn.execute(text(statement))
+        self._schema_ready.add(key)
+
+    def is_ready(self, conn: Connection) -> bool:
+        """索引是否已按当前版本完整构建（未构建时检索回退到模糊匹配）"""
+        key = self._key(conn)
+        if key in self._index_ready:
+            return True
+        if not self.supports(conn):
+            return False
+        self.ensure_schema(conn)
+        version = conn.execute(
+            text("SELECT value FROM question_search_meta WHERE key = 'version'")
+        ).scalar()
+        if version == INDEX_VERSION:
+            self._index_ready.add(key)
+            return True
+        return False
+
+    def index_questions(self, conn: Connection, questions: Iterable[Question]) -> int:
+        """写入 / 覆盖题目的索引行，返回写入条数"""
+        if not self.supports(conn):
+            return 0
+        self.ensure_schema(conn)
+        rows = []
+        for question in questions:
+            if question.id is None or question.created_by is None:
+                continue
+            primary, secondary = question_texts(question)
+            rows.append((question.id, question.created_by, primary, secondary))
+        if not rows:
+            return 0
+
+        if conn.dialect.name == "postgresql":
+            # 整批以数组参数传入，一条 INSERT ... SELECT unnest 写入
+            conn.execute(
+                text(
+                    """
+                    INSERT INTO question_search (question_id, created_by, document)
+                    SELECT * FROM unnest(
+                        CAST(:question_ids AS uuid[]), CAST(:owners AS uuid[]), CAST(:documents AS tsvector[])
+                    )
+                    ON CONFLICT (question_id) DO UPDATE
+                    SET created_by = EXCLUDED.created_by, document = EXCLUDED.document
+                    """
+                ),
+                {
+                    "question_ids": [str(qid) for qid, _, _, _ in rows],
+                    "owners": [str(owner) for _, owner, _, _ in rows],
+                    "documents": [_pg_tsvector(primary, secondary) for _, _, primary, secondary in rows],
+                },
+            )
+        else:
+            conn.execute(
+                text("INSERT OR IGNORE INTO question_search_rows (question_id) VALUES (:question_id)"),
+                [{"question_id": qid.hex} for qid, _, _, _ in rows],
+            )
+            conn.execute(
+                text(
+                    """
+                    INSERT OR REPLACE INTO question_search
+                        (rowid, question_id, created_by, primary_text, secondary_text)
+                    SELECT rowid, :question_id, :created_by, :primary_text, :secondary_text
+                    FROM question_search_rows WHERE question_id = :question_id
+                    """
+                ),
+                [
+                    {
+                        "question_id": qid.hex,
+                        "created_by": owner.hex,
+                        "primary_text": " ".join(tokenize(primary)),
+                        "secondary_text": " ".join(tokenize(secondary)),
+                    }
+                    for qid, owner, primary, secondary in rows
+                ],
+            )
+        return len(rows)
+
+    def remove_questions(self, conn: Connection, question_ids: Iterable[uuid.UUID]) -> None:
+        """删除题目的索引行"""
+        ids = [qid for qid in question_ids if qid is not None]
+        if not ids or not self.supports(conn):
+            return
+        self.ensure_schema(conn)
+        if conn.dialect.name == "postgresql":
+            conn.execute(
+                text("DELETE FROM question_search WHERE question_id = ANY(CAST(:question_ids AS uuid[]))"),
+                {"question_ids": [str(qid) for qid in ids]},
+            )
+        else:
+            params = [{"question_id": qid.hex} for qid in ids]
+            conn.execute(
+                text(
+                    "DELETE FROM question_search WHERE rowid = "
+                    "(SELECT rowid FROM question_search_rows WHERE question_id = :question_id)"
+                ),
+                params,
+            )
+            conn.execute(text("DELETE FROM question_search_rows WHERE question_id = :question_id"), params)
+
+    def rebuild(self, session: Session, batch_size: int = 500) -> int:
+        """
+        清空并重建全部索引（首次启用或切词规则变更时），调用方负责提交
+
+        Returns:
+            索引的题目数
+        """
+        conn = session.connection()
+        if not self.supports(conn):
+            return 0
+        self.ensure_schema(conn)
+        conn.execute(text("DELETE FROM question_search"))
+        if conn.dialect.name == "sqlite":
+            conn.execute(text("DELETE FROM question_search_rows"))
+
+        total = 0
+        batch: List[Question] = []
+        for question in session.query(Question).yield_per(batch_size):
+            batch.append(question)
+            if len(batch) >= batch_size:
+                total += self.index_questions(conn, batch)
+                batch = []
+        total += self.index_questions(conn, batch)
+
+        conn.execute(text("DELETE FROM question_search_meta WHERE key = 'version'"))
+        conn.execute(text("INSERT INTO question_search_meta (key, value) VALUES ('version', :version)"),
+                     {"version": INDEX_VERSION})
+        self._index_ready.add(self._key(conn))
+        return total
+
+    def _filters(self, question_type: Optional[str], subject: Optional[str]) -> Tuple[str, Dict[str, Any]]:
+        clauses, params = ["q.is_active = :is_active"], {"is_active": True}
+        if question_type:
+            clauses.append("q.question_type = :question_type")
+            params["question_type"] = question_type
+        if subject:
+            clauses.append("q.subject = :subject")
+            params["subject"] = subject
+        return " AND ".join(clauses), params
+
+    def search(
+        self,
+        conn: Connection,
+        created_by: uuid.UUID,
+        terms: Sequence[QueryTerm],
+        limit: int,
+        offset: int = 0,
+        question_type: Optional[str] = None,
+        subject: Optional[str] = None,
+    ) -> List[Tuple[uuid.UUID, float]]:
+        """
+        按相关度取一页命中的题目
+
+        Returns:
+            [(题目ID, 分数)]，分数越大越相关；同分按创建时间倒序
+        """
+        where, params = self._filters(question_type, subject)
+        params.update(limit=limit, offset=offset)
+        if conn.dialect.name == "postgresql":
+            statement = text(
+                f"""
+                SELECT s.question_id, ts_rank(s.document, CAST(:query AS tsquery)) AS score
+                FROM question_search s JOIN questions q ON q.id = s.question_id
+                WHERE s.created_by = :created_by AND s.document @@ CAST(:query AS tsquery) AND {where}
+                ORDER BY score DESC, q.created_at DESC, q.id DESC
+                LIMIT :limit OFFSET :offset
+                """
+            ).bindparams(bindparam("created_by", type_=Question.created_by.type))
+            params.update(created_by=created_by, query=_pg_tsquery(terms))
+        else:
+            statement = text(
+                f"""
+                SELECT q.id, -{_SQLITE_BM25} AS score
+                FROM question_search JOIN questions q ON q.id = question_search.question_id
+                WHERE question_search MATCH :query AND {where}
+                ORDER BY score DESC, q.created_at DESC, q.id DESC
+                LIMIT :limit OFFSET :offset
+                """
+            )
+            params.update(query=_fts5_query(created_by, terms))
+        rows = conn.execute(statement, params).all()
+        return [(row[0] if isinstance(row[0], uuid.UUID) else uuid.UUID(str(row[0])), float(row[1])) for row in rows]
+
+    def count(
+        self,
+        conn: Connection,
+        created_by: uuid.UUID,
+        terms: Sequence[QueryTerm],
+        question_type: Optional[str] = None,
+        subject: Optional[str] = None,
+    ) -> int:
+        """命中的题目总数"""
+        where, params = self._filters(question_type, subject)
+        if conn.dialect.name == "postgresql":
+            statement = text(
+                f"""
+                SELECT count(*) FROM question_search s JOIN questions q ON q.id = s.question_id
+                WHERE s.created_by = :created_by AND s.document @@ CAST(:query AS tsquery) AND {where}
+                """
+            ).bindparams(bindparam("created_by", type_=Question.created_by.type))
+            params.update(created_by=created_by, query=_pg_tsquery(terms))
+        else:
+            statement = text(
+                f"""
+                SELECT count(*) FROM question_search JOIN questions q ON q.id = question_search.question_id
+                WHERE question_search MATCH :query AND {where}
+                """
+            )
+            params.update(query=_fts5_query(created_by, terms))
+        return conn.execute(statement, params).scalar() or 0
+
+
+# 全局单例
+_index_instance: Optional[QuestionSearchIndex] = None
+
+
+def get_question_search_index() -> QuestionSearchIndex:
+    """获取检索索引单例"""
+    global _index_instance
+    if _index_instance is None:
+        _index_instance = QuestionSearchIndex()
+    return _index_instance
+
+
+def init_question_search(engine: Engine) -> None:
+    """
+    应用启动时建表；索引尚未构建或版本不一致时全量重建
+
+    失败只记录日志，检索回退到模糊匹配。
+    """
+    index = get_question_search_index()
+    try:
+        with Session(bind=engine) as session:
+            conn = session.connection()
+            if not index.supports(conn) or index.is_ready(conn):
+                session.commit()
+                return
+            total = index.rebuild(session)
+            session.commit()
+            logger.info(f"Built question search index: {total} questions")
+    except Exception as e:
+        logger.warning(f"Could not initialize question search index: {e}")
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_search_index(session: Session, flush_context) -> None:
+    """题目新增 / 修改 / 删除随同一事务更新索引行"""
+    changed = [
+        obj for obj in session.new if isinstance(obj, Question)
+    ] + [
+        obj for obj in session.dirty
+        if isinstance(obj, Question)
+        and any(sa_inspect(obj).attrs[field].history.has_changes() for field in INDEXED_FIELDS)
+    ]
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, Question)]
+    if not changed and not deleted:
+        return
+    conn = session.connection()
+    if not QuestionSearchIndex.supports(conn):
+        return
+    index = get_question_search_index()
+    index.remove_questions(conn, deleted)
+    index.index_questions(conn, changed)
@@ -1,23 +1,73 @@
 """
 题目服务模块 - 处理题目的数据库操作
 """
-from typing import List, Optional, Dict, Any
+import json
+from typing import List, Optional, Dict, Any, Sequence, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, func, insert, or_, select, update
 import logging
 from datetime import datetime
 import uuid
 
+from app.config import settings
 from app.models.question import Question, Document
 from app.database import get_db
+from app.services.blob_store import get_blob_store
+from app.services.image_derivatives import schedule_derivatives
+from app.services.question_dedup import get_duplicate_detector
+from app.services.pagination import (
+    InvalidCursorError,
+    Page,
+    TotalCountCache,
+    decode_offset_cursor,
+    encode_offset_cursor,
+    keyset_paginate,
+)
+from app.services.question_search import (
+    INDEXED_FIELDS,
+    SearchHit,
+    get_question_search_index,
+    highlight_snippet,
+    parse_query,
+    question_texts,
+)
 
 logger = logging.getLogger(__name__)
 
+# 分页总数缓存（按查询条件），所有会话共享
+_total_cache = TotalCountCache(settings.QUESTION_COUNT_CACHE_SECONDS)
+
+# 批量修改（PATCH /questions/bulk）允许的元数据字段
+BULK_PATCH_FIELDS = ("subject", "difficulty_level", "topic_tags", "question_type", "is_verified")
+
+
+def _as_uuid(value) -> uuid.UUID:
+    """str/UUID 统一转换为 UUID，避免 SQLite 方言在 bind 时对 str 调用 .hex"""
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+
+
 class QuestionService:
     """题目数据库服务"""
     
     def __init__(self, db: Session):
         self.db = db
+
+    def commit(self) -> None:
+        """
+        提交当前事务，会话中的对象不过期
+
+        刚写入的对象的值已全部在应用端（或由 RETURNING 取回），提交后访问属性无需逐行 SELECT 重新加载。
+        失败时回滚。
+        """
+        expire_on_commit = self.db.expire_on_commit
+        self.db.expire_on_commit = False
+        try:
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        finally:
+            self.db.expire_on_commit = expire_on_commit
     
     def create_document(self, title: str, filename: str, file_path: str = None, 
                      file_url: str = None, file_size: int = None, 
@@ -57,8 +107,8 @@ class QuestionService:
             )
             
             self.db.add(document)
-            self.db.commit()
-            self.db.refresh(document)
+            # 字段都在应用端生成，提交后无需 refresh
+            self.commit()
             
             logger.info(f"Created document: {document.id}")
             return document
@@ -71,7 +121,8 @@ class QuestionService:
     def update_document_status(self, document_id: str, status: str, 
                            total_questions: int = None, processed_questions: int = None,
                            ocr_confidence_avg: str = None, 
-                           extraction_errors: List[Dict] = None) -> Optional[Document]:
+                           extraction_errors: List[Dict] = None,
+                           commit: bool = True) -> Optional[Document]:
         """
         更新文档处理状态
         
@@ -82,12 +133,14 @@ class QuestionService:
             processed_questions: 已处理题目数
             ocr_confidence_avg: 平均OCR置信度
             extraction_errors: 提取错误信息
+            commit: 为 False 时只修改会话中的对象，与题目写入在同一事务中由调用方提交
             
         Returns:
             更新后的文档对象
         """
         try:
-            document = self.db.query(Document).filter(Document.id == document_id).first()
+            # 会话中已有该文档时直接使用，不再查询
+            document = self.db.get(Document, _as_uuid(document_id))
             if not document:
                 logger.warning(f"Document not found: {document_id}")
                 return None
@@ -107,8 +160,9 @@ class QuestionService:
             
             document.updated_at = datetime.utcnow()
             
-            self.db.commit()
-            self.db.refresh(document)
+            if commit:
+                # 不再 refresh：调用方只用到刚写入的字段，需要时访问属性会按需重新加载
+                self.db.commit()
             
             logger.info(f"Updated document status: {document_id} -> {status}")
             return document
@@ -118,60 +172,100 @@ class QuestionService:
             logger.error(f"Failed to update document status: {e}")
             raise
     
+    def get_document_by_id(self, document_id: str) -> Optional[Document]:
+        """
+        根据ID获取文档
+        
+        Args:
+            document_id: 文档ID
+            
+        Returns:
+            文档对象
+        """
+        try:
+            return self.db.query(Document).filter(Document.id == _as_uuid(document_id)).first()
+            
+        except Exception as e:
+            logger.error(f"Failed to get document by ID: {e}")
+            raise
+    
     def create_questions_from_ocr(self, ocr_questions: List[Dict], document_id: str, 
-                               created_by: str) -> List[Question]:
+                               created_by: str, commit: bool = True) -> List[Question]:
         """
         从OCR结果创建题目记录
 
+        题目以多行 INSERT ... RETURNING 批量写入（每批 QUESTION_INSERT_BATCH_SIZE 行），
+        返回的对象已包含数据库中的全部字段，不再逐行 refresh。
+
         Args:
             ocr_questions: OCR识别的题目列表
             document_id: 文档ID
             created_by: 创建用户ID
+            commit: 为 False 时不提交，由调用方与文档状态更新一起提交
 
         Returns:
             创建的题目列表
         """
         try:
-            created_questions = []
+            # 同一页的题目共用一张源图，每个路径只转换一次
+            source_refs: Dict[str, str] = {}
 
             created_by_uuid = created_by if isinstance(created_by, uuid.UUID) else uuid.UUID(str(created_by))
             document_id_uuid = None
             if document_id:
                 document_id_uuid = document_id if isinstance(document_id, uuid.UUID) else uuid.UUID(str(document_id))
 
+            rows = []
             for ocr_q in ocr_questions:
                 options = ocr_q.get('options') or []
                 images = ocr_q.get('images') or {}
                 source_image_url = images.get('input') if isinstance(images, dict) else None
-                has_images = bool(images)
-
-                question = Question(
-                    number=ocr_q.get('number', 0),
-                    content=ocr_q.get('content', ''),
-                    full_content=ocr_q.get('full_content') or ocr_q.get('content', ''),
-                    question_type=ocr_q.get('type', 'essay'),
-                    options=options,
-                    source_image_path=ocr_q.get('source_image', ''),
-                    source_image_url=source_image_url,
-                    question_images=images,
-                    has_images=has_images,
-                    source_document_id=document_id_uuid,
-                    ocr_confidence=str(ocr_q.get('confidence', 0)),
-                    processing_status='completed',
-                    created_by=created_by_uuid,
-                    # TODO: 图片相关字段待实现
-                    # question_images=ocr_q.get('images', []),
-                    # has_images=bool(ocr_q.get('images', []))
-                )
+                # 题目区域裁剪图不算作题目自带的图片
+                has_images = bool(images) and (not isinstance(images, dict) or any(key != 'crop' for key in images))
 
-                self.db.add(question)
-                created_questions.append(question)
+                rows.append({
+                    # 预先生成ID，重复检测在写入前即可确定关联
+                    'id': uuid.uuid4(),
+                    'number': ocr_q.get('number', 0),
+                    'content': ocr_q.get('content', ''),
+                    'full_content': ocr_q.get('full_content') or ocr_q.get('content', ''),
+                    'question_type': ocr_q.get('type', 'essay'),
+                    'options': options,
+                    'source_image_path': self._source_image_ref(ocr_q.get('source_image') or '', source_refs),
+                    'source_image_url': source_image_url,
+                    'question_images': images,
+                    'has_images': has_images,
+                    'source_document_id': document_id_uuid,
+                    'ocr_confidence': str(ocr_q.get('confidence', 0)),
+                    'processing_status': 'completed',
+                    'created_by': created_by_uuid,
+                    'duplicate_of_id': None,
+                    'duplicate_similarity': None,
+                })
 
-            self.db.commit()
+            fingerprints = []
+            if settings.QUESTION_DEDUP_ENABLED and rows:
+                # 重复检测只读取文本字段，用未加入会话的临时对象承载
+                drafts = [Question(**row) for row in rows]
+                fingerprints = get_duplicate_detector().link_duplicates(self.db, created_by_uuid, drafts)
+                for row, draft in zip(rows, drafts):
+                    row['duplicate_of_id'] = draft.duplicate_of_id
+                    row['duplicate_similarity'] = draft.duplicate_similarity
+                duplicates = sum(1 for row in rows if row['duplicate_of_id'] is not None)
+                if duplicates:
+                    logger.info(f"Linked {duplicates} near-duplicate questions to existing ones")
+
+            created_questions = self._insert_questions(rows)
 
-            # 刷新所有题目以获取ID
-            for question in created_questions:
-                self.db.refresh(question)
+            # 批量 INSERT 不经过 flush，检索索引和指纹在同一事务中显式写入
+            get_question_search_index().index_questions(self.db.connection(), created_questions)
+            get_duplicate_detector().save_fingerprints(self.db, created_by_uuid, fingerprints)
+
+            if commit:
+                self.commit()
+
+            # 在后台为源图预生成缩略图 / 中等尺寸版本，列表页首次加载即可命中
+            schedule_derivatives(source_refs.values())
 
             logger.info(f"Created {len(created_questions)} questions for document {document_id}")
             return created_questions
@@ -180,34 +274,98 @@ class QuestionService:
             self.db.rollback()
             logger.error(f"Failed to create questions from OCR: {e}")
             raise
+
+    def _insert_questions(self, rows: List[Dict[str, Any]]) -> List[Question]:
+        """
+        多行 INSERT ... RETURNING 写入题目，按 QUESTION_INSERT_BATCH_SIZE 分批
+
+        Returns:
+            与 rows 顺序一致的题目对象（已加入会话）
+        """
+        created: List[Question] = []
+        batch_size = max(1, settings.QUESTION_INSERT_BATCH_SIZE)
+        statement = insert(Question).returning(Question, sort_by_parameter_order=True)
+        for start in range(0, len(rows), batch_size):
+            created.extend(self.db.scalars(statement, rows[start:start + batch_size]).all())
+        return created
     
-    def get_questions_by_document(self, document_id: str, skip: int = 0, 
-                              limit: int = 50, question_type: str = None) -> List[Question]:
+    def get_questions_by_document(self, document_id: str, skip: int = 0,
+                              limit: int = 50, question_type: str = None,
+                              cursor: str = None) -> Page:
         """
-        根据文档ID获取题目列表
-        
+        根据文档ID分页获取题目列表
+
         Args:
             document_id: 文档ID
-            skip: 跳过的记录数
+            skip: 跳过的记录数（兼容旧的 OFFSET 分页，传入 cursor 时忽略）
             limit: 返回记录数限制
             question_type: 题目类型过滤
-            
+            cursor: 上一页返回的 next_cursor
+
         Returns:
-            题目列表
+            Page（items 为题目列表）
+
+        Raises:
+            InvalidCursorError: 游标格式错误
         """
         try:
-            query = self.db.query(Question).filter(Question.source_document_id == document_id)
+            document_uuid = _as_uuid(document_id)
+            query = self.db.query(Question).filter(Question.source_document_id == document_uuid)
             
             if question_type:
                 query = query.filter(Question.question_type == question_type)
             
-            questions = query.offset(skip).limit(limit).all()
-            return questions
+            return self._paginate(query, ("document", document_uuid, question_type), limit, cursor, skip)
             
+        except InvalidCursorError:
+            raise
         except Exception as e:
             logger.error(f"Failed to get questions by document: {e}")
             raise
+
+    def get_question_type_counts(self, document_id: str) -> Dict[str, int]:
+        """按题型统计文档中的题目数（GROUP BY，不加载题目）"""
+        document_uuid = _as_uuid(document_id)
+        rows = (
+            self.db.query(Question.question_type, func.count(Question.id))
+            .filter(Question.source_document_id == document_uuid)
+            .group_by(Question.question_type)
+            .all()
+        )
+        return {question_type: count for question_type, count in rows}
+
+    def _paginate(self, query, count_key: tuple, limit: int, cursor: Optional[str], skip: int) -> Page:
+        """
+        游标分页取一页并计算总数
+
+        第一页（无游标）重新 COUNT；后续页复用缓存的总数。
+        第一页已包含全部记录时直接由本页条数得到总数，不再 COUNT。
+        """
+        items, next_cursor = keyset_paginate(query, Question, limit, cursor=cursor, skip=skip)
+        if not cursor and next_cursor is None and (items or not skip):
+            total = skip + len(items)
+            _total_cache.set(count_key, total)
+        else:
+            total = _total_cache.count(count_key, query, Question, refresh=not cursor)
+        return Page(items=items, total=total, next_cursor=next_cursor)
     
+    @staticmethod
+    def _source_image_ref(path: str, cache: Dict[str, str]) -> str:
+        """
+        把识别时使用的本地源图路径转换为 blob 引用（存入内容寻址存储，相同图片只存一份）
+
+        存储失败时保留原路径，不影响题目入库。
+        """
+        if not path:
+            return path
+        if path not in cache:
+            try:
+                cache[path] = get_blob_store().ref_for(path)
+            except Exception as e:
+                logger.warning(f"Failed to store source image {path}: {e}")
+                cache[path] = path
+        return cache[path]
+
     def get_question_by_id(self, question_id: str) -> Optional[Question]:
         """
         根据ID获取题目
@@ -216,11 +374,14 @@ class QuestionService:
             question_id: 题目ID
             
         Returns:
-            题目对象
+            题目对象；ID 格式错误或不存在时返回 None
         """
         try:
-            question = self.db.query(Question).filter(Question.id == question_id).first()
-            return question
+            key = _as_uuid(question_id)
+        except ValueError:
+            return None
+        try:
+            return self.db.get(Question, key)
             
         except Exception as e:
             logger.error(f"Failed to get question by ID: {e}")
@@ -267,6 +428,86 @@ class QuestionService:
             logger.error(f"Failed to update question: {e}")
             raise
     
+    def bulk_patch_questions(
+        self,
+        created_by: str,
+        patches: Sequence[Tuple[Sequence[str], Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """
+        批量修改题目元数据（一个事务）
+
+        同一题目出现多次时按顺序合并；修改内容相同的题目合为一组，每组一条
+        UPDATE ... WHERE id IN (...)，只作用于当前用户的题目。
+        批量 UPDATE 不经过 ORM 刷新事件，改动了检索字段（知识点标签）时在同一事务内显式重建索引行；
+        近似重复指纹只取决于题干和选项，不受这些字段影响。
+
+        Args:
+            created_by: 当前用户ID
+            patches: (题目ID列表, 修改内容) 列表，修改内容中不在 BULK_PATCH_FIELDS 内的字段被忽略
+
+        Returns:
+            {"question_ids": 已修改的题目ID, "not_found": 不存在或不属于当前用户的ID}
+        """
+        owner = _as_uuid(created_by)
+        merged: Dict[uuid.UUID, Dict[str, Any]] = {}
+        not_found: List[str] = []
+        for question_ids, patch in patches:
+            fields = {k: v for k, v in patch.items() if k in BULK_PATCH_FIELDS}
+            for question_id in question_ids:
+                try:
+                    key = _as_uuid(question_id)
+                except ValueError:
+                    not_found.append(str(question_id))
+                    continue
+                merged.setdefault(key, {}).update(fields)
+
+        try:
+            owned = set()
+            if merged:
+                owned = set(self.db.scalars(
+                    select(Question.id).where(Question.created_by == owner, Question.id.in_(list(merged)))
+                ))
+            not_found.extend(str(key) for key in merged if key not in owned)
+
+            groups: Dict[str, Tuple[Dict[str, Any], List[uuid.UUID]]] = {}
+            for key, fields in merged.items():
+                if key in owned and fields:
+                    signature = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+                    groups.setdefault(signature, (fields, []))[1].append(key)
+
+            now = datetime.utcnow()
+            reindex: List[uuid.UUID] = []
+            for fields, ids in groups.values():
+                values = dict(fields, updated_at=now)
+                if fields.get("is_verified"):
+                    values.update(verified_by=owner, verified_at=now)
+                self.db.execute(
+                    update(Question)
+                    .where(Question.created_by == owner, Question.id.in_(ids))
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+                if any(field in INDEXED_FIELDS for field in fields):
+                    reindex.extend(ids)
+
+            if reindex:
+                questions = self.db.scalars(
+                    select(Question)
+                    .where(Question.id.in_(reindex))
+                    .execution_options(populate_existing=True)
+                ).all()
+                get_question_search_index().index_questions(self.db.connection(), questions)
+
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Failed to bulk patch questions: {e}")
+            raise
+
+        updated = [str(key) for fields, ids in groups.values() for key in ids]
+        logger.info(f"Bulk patched {len(updated)} questions in {len(groups)} statements")
+        return {"question_ids": updated, "not_found": not_found}
+
     def delete_question(self, question_id: str) -> bool:
         """
         删除题目
@@ -295,22 +536,43 @@ class QuestionService:
             raise
     
     def search_questions(self, keyword: str, skip: int = 0, limit: int = 50,
-                      question_type: str = None, subject: str = None) -> List[Question]:
+                      question_type: str = None, subject: str = None,
+                      cursor: str = None, created_by: str = None) -> Page:
         """
         搜索题目
+
+        有关键词时使用全文检索索引，按相关度排序并返回高亮片段（Page.hits）；
+        索引不可用（不支持的数据库、尚未构建）时回退到模糊匹配。
         
         Args:
             keyword: 搜索关键词
-            skip: 跳过的记录数
+            skip: 跳过的记录数（兼容旧的 OFFSET 分页，传入 cursor 时忽略）
             limit: 返回记录数限制
             question_type: 题目类型过滤
             subject: 学科过滤
+            cursor: 上一页返回的 next_cursor
+            created_by: 只搜索该用户的题目
             
         Returns:
-            题目列表
+            Page（items 为题目列表）
+
+        Raises:
+            InvalidCursorError: 游标格式错误
         """
         try:
+            created_by_uuid = _as_uuid(created_by) if created_by else None
+            terms = parse_query(keyword)
+            if terms and created_by_uuid is not None:
+                index = get_question_search_index()
+                conn = self.db.connection()
+                if index.is_ready(conn):
+                    return self._search_indexed(
+                        index, conn, created_by_uuid, terms, skip, limit, question_type, subject, cursor
+                    )
+
             query = self.db.query(Question).filter(Question.is_active == True)
+            if created_by_uuid is not None:
+                query = query.filter(Question.created_by == created_by_uuid)
             
             # 关键词搜索
             if keyword:
@@ -328,20 +590,57 @@ class QuestionService:
             if subject:
                 query = query.filter(Question.subject == subject)
             
-            questions = query.offset(skip).limit(limit).all()
-            return questions
+            count_key = ("search", created_by_uuid, keyword, question_type, subject)
+            return self._paginate(query, count_key, limit, cursor, skip)
             
+        except InvalidCursorError:
+            raise
         except Exception as e:
             logger.error(f"Failed to search questions: {e}")
             raise
 
+    def _search_indexed(self, index, conn, created_by: uuid.UUID, terms, skip: int, limit: int,
+                        question_type: Optional[str], subject: Optional[str], cursor: Optional[str]) -> Page:
+        """全文检索取一页：按相关度排序，偏移量游标"""
+        offset = decode_offset_cursor(cursor) if cursor else skip
+        ranked = index.search(conn, created_by, terms, limit + 1, offset, question_type, subject)
+        has_more = len(ranked) > limit
+        ranked = ranked[:limit]
+
+        count_key = ("fulltext", created_by, tuple(term.text for term in terms), question_type, subject)
+        if not cursor and not has_more and (ranked or not offset):
+            total = offset + len(ranked)
+            _total_cache.set(count_key, total)
+        else:
+            total = None if not cursor else _total_cache.get(count_key)
+            if total is None:
+                total = index.count(conn, created_by, terms, question_type, subject)
+                _total_cache.set(count_key, total)
+
+        by_id = {}
+        if ranked:
+            rows = self.db.query(Question).filter(Question.id.in_([qid for qid, _ in ranked])).all()
+            by_id = {question.id: question for question in rows}
+        items, hits = [], {}
+        for qid, score in ranked:
+            question = by_id.get(qid)
+            if question is None:
+                continue
+            items.append(question)
+            primary, secondary = question_texts(question)
+            hits[qid] = SearchHit(score=score, snippet=highlight_snippet([primary, secondary], terms))
+
+        next_cursor = encode_offset_cursor(offset + limit) if has_more else None
+        return Page(items=items, total=total, next_cursor=next_cursor, hits=hits)
+
     def get_all_questions(
         self,
         created_by: str,
         skip: int = 0,
         limit: int = 50,
-    ) -> List[Question]:
-        """Return latest active questions created by the given user."""
+        cursor: str = None,
+    ) -> Page:
+        """Return latest active questions created by the given user, one keyset page at a time."""
         try:
             created_by_uuid = created_by if isinstance(created_by, uuid.UUID) else uuid.UUID(str(created_by))
 
@@ -351,15 +650,66 @@ class QuestionService:
                     Question.created_by == created_by_uuid,
                     Question.is_active == True,
                 )
-                .order_by(Question.created_at.desc())
             )
 
-            return query.offset(skip).limit(limit).all()
+            return self._paginate(query, ("user", created_by_uuid), limit, cursor, skip)
 
+        except InvalidCursorError:
+            raise
         except Exception as e:
             logger.error(f"Failed to get all questions: {e}")
             raise
 
+    def get_duplicate_clusters(self, created_by: str, skip: int = 0, limit: int = 20) -> Dict[str, Any]:
+        """
+        获取用户的近似重复题簇（原题 + 关联到它的重复题），按簇大小倒序
+
+        Args:
+            created_by: 用户ID
+            skip: 跳过的簇数
+            limit: 返回的簇数
+
+        Returns:
+            {"clusters": [{"canonical": Question, "duplicates": [Question]}], "total": 簇总数}
+        """
+        created_by_uuid = _as_uuid(created_by)
+        size = func.count(Question.id)
+        groups = (
+            self.db.query(Question.duplicate_of_id, size)
+            .filter(
+                Question.created_by == created_by_uuid,
+                Question.duplicate_of_id.isnot(None),
+                Question.is_active == True,
+            )
+            .group_by(Question.duplicate_of_id)
+        )
+        total = groups.count()
+        rows = groups.order_by(size.desc(), Question.duplicate_of_id).offset(skip).limit(limit).all()
+        canonical_ids = [canonical_id for canonical_id, _ in rows]
+        if not canonical_ids:
+            return {"clusters": [], "total": total}
+
+        canonicals = {
+            question.id: question
+            for question in self.db.query(Question).filter(Question.id.in_(canonical_ids)).all()
+        }
+        members: Dict[uuid.UUID, List[Question]] = {canonical_id: [] for canonical_id in canonical_ids}
+        duplicates = (
+            self.db.query(Question)
+            .filter(Question.duplicate_of_id.in_(canonical_ids), Question.is_active == True)
+            .order_by(Question.duplicate_similarity.desc(), Question.created_at)
+            .all()
+        )
+        for question in duplicates:
+            members[question.duplicate_of_id].append(question)
+
+        clusters = [
+            {"canonical": canonicals[canonical_id], "duplicates": members[canonical_id]}
+            for canonical_id in canonical_ids
+            if canonical_id in canonicals
+        ]
+        return {"clusters": clusters, "total": total}
+
 
 def get_question_service(db: Session) -> QuestionService:
     """获取题目服务实例"""
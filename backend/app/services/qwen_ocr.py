@@ -4,21 +4,34 @@
 import os
 import json
 import logging
-import re
-from typing import List, Dict, Any, Optional
+from contextlib import nullcontext
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from http import HTTPStatus
 import dashscope
 
 from app.config import settings
+from app.services.ocr_backends import OCRBackend
+from app.services.ocr_cache import OCRResultCache, get_ocr_cache, get_ocr_raw_store
+from app.services.image_normalizer import ImageNormalizer, get_image_normalizer
+from app.services.rate_limiter import (
+    OUTCOME_ERROR, OUTCOME_OK, OUTCOME_THROTTLED, ModelCallError, get_model_rate_limiter
+)
+from app.services.ocr_json import IncrementalJSONArrayParser, SalvageResult, salvage_question_array
 
 logger = logging.getLogger(__name__)
 
+# Prompt 版本号：修改 _build_prompt() 或结果后处理逻辑时需递增，使旧缓存失效
+PROMPT_VERSION = "v1"
 
-class QwenQuestionExtractor:
+
+class QwenQuestionExtractor(OCRBackend):
     """
     使用 通义千问-VL 模型从图片中提取和解析题目。
     """
 
+    name = "qwen"
+    max_batch_pages = max(1, settings.QWEN_BATCH_PAGES)
+
     def __init__(self, api_key: str = None, model: str = None):
         """
         初始化通义千问题目提取器。
@@ -36,6 +49,9 @@ class QwenQuestionExtractor:
 
             dashscope.api_key = self.api_key
             self.model = model or settings.QWEN_MODEL
+            self.normalizer: Optional[ImageNormalizer] = (
+                get_image_normalizer() if settings.OCR_NORMALIZE_ENABLED else None
+            )
             logger.info(f"QwenQuestionExtractor initialized successfully with model: {self.model}.")
         except Exception as e:
             logger.error(f"Failed to initialize QwenQuestionExtractor: {e}")
@@ -81,175 +97,431 @@ class QwenQuestionExtractor:
 
 请确保你的输出是严格的、可以直接被Python的json.loads解析的JSON格式。"""
 
-    def extract_questions(self, image_path: str) -> List[Dict[str, Any]]:
+    def _build_batch_prompt(self, page_count: int) -> str:
+        """多页合并请求的指令：共享单页指令，并要求每道题标注所在图片的序号"""
+        return self._build_prompt() + f"""
+
+本次请求包含 {page_count} 张图片，是同一份试卷按顺序排列的连续页面，依次为第 0 张到第 {page_count - 1} 张。
+请识别所有图片中的题目，全部放在同一个JSON数组中返回，并为每个题目对象额外添加字段：
+   - "page": (整数) 该题所在图片的序号（从 0 开始）。
+跨越两张图片的题目只输出一次，page 取题目开始的那张图片。"""
+
+    def extract_questions_with_report(
+        self, image_path: str
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
         """
-        从单张图片中识别并解析题目。
+        识别题目，并返回模型输出无法完整解析时的恢复报告。
 
         Args:
             image_path (str): 图片文件的路径。
 
         Returns:
-            List[Dict]: 解析后的题目列表。每个题目包含：
-                - number: 题号
-                - type: 题目类型
-                - content: 题干内容
-                - options: 选项列表（选择题）
-                - full_content: 完整内容（与content相同，为了兼容）
-                - images: 图片字典（空字典，为了兼容）
+            (questions, report) - report 为 None 表示输出被完整解析；否则包含
+            recovered, lost, lost_numbers, truncated 和 raw_key（原始输出的存储键）
         """
         if not os.path.exists(image_path):
             logger.error(f"Image file not found at: {image_path}")
-            return []
+            return [], None
 
-        # DashScope 需要本地文件路径以 'file://' 开头
-        local_file_path = f'file://{os.path.abspath(image_path)}'
-        logger.info(f"Processing image: {local_file_path}")
+        result_key = None
+        if settings.OCR_CACHE_ENABLED or settings.OCR_RAW_OUTPUT_ENABLED:
+            result_key = self._result_key(image_path)
 
-        try:
-            prompt = self._build_prompt()
-            messages = [{
-                'role': 'user',
-                'content': [
-                    {'image': local_file_path},
-                    {'text': prompt}
-                ]
-            }]
-
-            response = dashscope.MultiModalConversation.call(
-                model=self.model,
-                messages=messages
+        if not settings.OCR_CACHE_ENABLED:
+            questions = self._extract_questions_uncached(image_path, result_key)
+        else:
+            payload, hit = get_ocr_cache().get_or_compute(
+                result_key, lambda: self._extract_questions_payload(image_path, result_key)
             )
+            if hit and payload is not None:
+                logger.info(f"OCR cache hit for image: {image_path}")
+            # 每次都反序列化出独立副本，调用方可以安全地修改题目字典
+            questions = json.loads(payload) if payload is not None else []
+
+        report = None
+        if result_key and settings.OCR_RAW_OUTPUT_ENABLED:
+            stored = get_ocr_raw_store().get_report(result_key)
+            # 只修复了转义、没有题目丢失的输出不需要报告
+            if stored and (stored["lost"] or stored["truncated"]):
+                report = dict(stored, raw_key=result_key)
+        return questions, report
+
+    def extract_questions_batch_with_report(
+        self, image_paths: List[str]
+    ) -> List[Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]]:
+        """
+        把未命中缓存的页面合并为一次模型调用识别（共享一份指令，减少指令 token 和请求次数）。
 
-            if response.status_code == HTTPStatus.OK:
-                # 正确处理content列表
-                content_list = response.output.choices[0].message.content
-
-                # 提取所有文本内容并合并
-                response_text = ""
-                for item in content_list:
-                    if isinstance(item, dict) and 'text' in item:
-                        response_text += item['text']
-
-                # 清理并解析模型的返回结果
-                response_text = response_text.strip()
-
-                # 移除可能的markdown代码块标记
-                if response_text.startswith("```json"):
-                    response_text = response_text[7:]
-                if response_text.startswith("```"):
-                    response_text = response_text[3:]
-                if response_text.endswith("```"):
-                    response_text = response_text[:-3]
-
-                response_text = response_text.strip()
-
-                # 尝试解析JSON
-                try:
-                    questions = json.loads(response_text)
-                    
-                    # 为每个题目添加兼容字段
-                    for question in questions:
-                        question.setdefault("full_content", question.get("content", ""))
-                        question.setdefault("images", {})
-                        question.setdefault("options", [])
-                    
-                    logger.info(f"Successfully extracted {len(questions)} questions")
-                    return questions
-                except json.JSONDecodeError as e:
-                    logger.error(f"JSON解析失败: {e}")
-                    logger.error(f"原始内容: {response_text}")
-
-                    # 尝试修复常见的JSON格式问题
-                    fixed_text = re.sub(r'\n\s*', '', response_text)
-
-                    # 修复常见的LaTeX符号转义问题
-                    fixed_text = fixed_text.replace('\\\\', '\\')
-                    try:
-                        questions = json.loads(fixed_text)
-                        
-                        # 为每个题目添加兼容字段
-                        for question in questions:
-                            question.setdefault("full_content", question.get("content", ""))
-                            question.setdefault("images", {})
-                            question.setdefault("options", [])
-                        
-                        logger.info(f"修复后成功解析 {len(questions)} questions")
-                        return questions
-                    except json.JSONDecodeError:
-                        logger.error(f"修复后仍然无法解析JSON")
-                        return []
-            else:
-                logger.error(
-                    f"API call failed for image {image_path}. Status: {response.status_code}, Message: {response.message}"
+        模型按 "page" 字段标注每道题所在的图片。合并调用失败、输出不完整或页码无效时，
+        整批回退为逐页调用；合并调用中没有识别出题目的页面也单独重试一次。
+        识别结果按页写入 OCR 缓存，与逐页调用共用。
+
+        Args:
+            image_paths (List[str]): 页面图片路径，最多 max_batch_pages 张。
+
+        Returns:
+            与 image_paths 一一对应的 (questions, report) 列表。
+        """
+        results: List[Optional[Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]]] = [None] * len(image_paths)
+        pending = [
+            index for index, image_path in enumerate(image_paths)
+            if os.path.exists(image_path) and not self.is_cached(image_path)
+        ]
+
+        batched: Dict[int, List[Dict[str, Any]]] = {}
+        if len(pending) > 1:
+            batched = self._extract_batch_uncached([image_paths[index] for index in pending]) or {}
+        for position, index in enumerate(pending):
+            questions = batched.get(position)
+            if not questions:
+                continue
+            if settings.OCR_CACHE_ENABLED:
+                get_ocr_cache().put(
+                    self._result_key(image_paths[index]), json.dumps(questions, ensure_ascii=False)
                 )
-                return []
+            results[index] = (questions, None)
 
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON response from Qwen-VL for image {image_path}. Error: {e}")
-            # 尝试在日志中记录原始返回，便于调试
-            if 'response' in locals() and hasattr(response, 'output'):
-                logger.error(f"Raw response was: {response.output.choices[0].message.content}")
-            return []
-        except Exception as e:
-            logger.error(f"An error occurred while processing {image_path}: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
-            return []
+        # 缓存命中、单页批次和合并调用未覆盖的页面逐页识别
+        return [
+            result if result is not None else self.extract_questions_with_report(image_path)
+            for image_path, result in zip(image_paths, results)
+        ]
 
-    def batch_extract_questions(self, image_paths: List[str]) -> List[Dict[str, Any]]:
+    def is_cached(self, image_path: str) -> bool:
+        """识别结果是否已在 OCR 缓存中"""
+        if not settings.OCR_CACHE_ENABLED or not os.path.exists(image_path):
+            return False
+        return get_ocr_cache().contains(self._result_key(image_path))
+
+    def reparse_raw_output(self, raw_key: str) -> Optional[Dict[str, Any]]:
         """
-        批量处理多张图片。
+        用保存的模型原始输出重新解析（不调用模型），并更新缓存和恢复报告。
 
         Args:
-            image_paths (List[str]): 图片路径列表。
+            raw_key (str): 原始输出的存储键（即 OCR 缓存键）
 
         Returns:
-            List[Dict]: 所有图片识别出的题目列表。
+            新的恢复报告，找不到原始输出时返回 None
         """
-        all_questions: List[Dict[str, Any]] = []
-        for index, image_path in enumerate(image_paths):
-            try:
-                questions = self.extract_questions(image_path)
-                for question in questions:
-                    question["source_image"] = image_path
-                    question["image_index"] = index
-                all_questions.extend(questions)
-            except Exception as exc:
-                logger.error(f"Failed to process image {image_path}: {exc}")
-        return all_questions
-
-    def extract_text_from_image(self, image_path: str) -> List[Dict[str, Any]]:
+        store = get_ocr_raw_store()
+        entry = store.get(raw_key)
+        if entry is None:
+            return None
+        result = salvage_question_array(entry["raw_text"])
+        for question in result.questions:
+            self._add_compat_fields(question)
+        report = result.report()
+        store.update_report(raw_key, report)
+        if settings.OCR_CACHE_ENABLED and result.questions:
+            get_ocr_cache().put(raw_key, json.dumps(result.questions, ensure_ascii=False))
+        logger.info(f"Reparsed raw output {raw_key}: {report['recovered']} questions, {len(report['lost'])} lost")
+        return report
+
+    def extract_questions_stream(self, image_path: str) -> Iterator[Dict[str, Any]]:
         """
-        从图片中提取纯文本内容（为了兼容旧接口）。
-        
+        流式识别单张图片中的题目，每道题的 JSON 对象生成完毕即产出。
+
+        使用 DashScope 增量输出，边接收边增量解析 JSON 数组；命中缓存时直接产出缓存结果。
+        调用方提前关闭生成器（如客户端断开）时会关闭模型流，停止继续生成。
+        完整接收且识别出题目时，结果写入缓存，与 extract_questions 共用。
+
         Args:
-            image_path (str): 图片文件路径。
-            
+            image_path (str): 图片文件的路径。
+
+        Yields:
+            Dict: 题目字典，字段与 extract_questions 的返回值相同。
+
+        Raises:
+            ModelCallError: 模型返回非 200 响应（已产出的题目保留，调用方应报告错误而不是"没有题目"）
+        """
+        if not os.path.exists(image_path):
+            logger.error(f"Image file not found at: {image_path}")
+            return
+
+        cache = get_ocr_cache() if settings.OCR_CACHE_ENABLED else None
+        cache_key = None
+        if cache is not None or settings.OCR_RAW_OUTPUT_ENABLED:
+            cache_key = self._result_key(image_path)
+        if cache is not None:
+            payload = cache.get(cache_key)
+            if payload is not None:
+                logger.info(f"OCR cache hit for image: {image_path}")
+                yield from json.loads(payload)
+                return
+
+        normalized = self._normalize_image(image_path)
+        model_image_path = normalized["path"] if normalized else image_path
+        local_file_path = f'file://{os.path.abspath(model_image_path)}'
+        logger.info(f"Streaming image: {local_file_path}")
+
+        limiter_slot = get_model_rate_limiter().slot() if settings.OCR_RATE_LIMIT_ENABLED else nullcontext({})
+        responses = None
+        failure: Optional[ModelCallError] = None
+        try:
+            with limiter_slot as call:
+                responses = dashscope.MultiModalConversation.call(
+                    model=self.model,
+                    messages=self._build_messages(local_file_path),
+                    stream=True,
+                    incremental_output=True
+                )
+                parser = IncrementalJSONArrayParser()
+                serialized: List[str] = []
+                for response in responses:
+                    if response.status_code != HTTPStatus.OK:
+                        call["outcome"] = self._classify_response(response)[0]
+                        logger.error(
+                            f"Streaming API call failed for image {image_path}. "
+                            f"Status: {response.status_code}, Message: {response.message}"
+                        )
+                        failure = ModelCallError(
+                            f"Model call failed with status {response.status_code}: {response.message}"
+                        )
+                        break
+                    for question in parser.feed(self._response_text(response)):
+                        self._add_compat_fields(question)
+                        # 产出前先序列化，调用方修改题目字典不会影响缓存内容
+                        serialized.append(json.dumps(question, ensure_ascii=False))
+                        yield question
+
+            # 离开槽位后再抛出，限流器按上面记录的 outcome（限流 / 错误）调整速率
+            if failure is not None:
+                raise failure
+            logger.info(
+                f"Streamed {len(serialized)} questions "
+                f"({parser.objects_failed} unparseable, complete={parser.complete})"
+            )
+            if parser.complete and not parser.failed_objects:
+                if cache is not None and serialized:
+                    cache.put(cache_key, "[" + ",".join(serialized) + "]")
+            elif cache_key and settings.OCR_RAW_OUTPUT_ENABLED:
+                self._record_salvage(cache_key, image_path, salvage_question_array(parser.text))
+        finally:
+            if responses is not None and hasattr(responses, "close"):
+                responses.close()
+            if normalized:
+                ImageNormalizer.release(normalized, image_path)
+
+    def _build_messages(self, local_file_path: str) -> List[Dict[str, Any]]:
+        """构建模型请求消息"""
+        return [{
+            'role': 'user',
+            'content': [
+                {'image': local_file_path},
+                {'text': self._build_prompt()}
+            ]
+        }]
+
+    def _call_model(self, messages: List[Dict[str, Any]]):
+        """
+        调用模型；启用准入控制时经过共享限流器，限流/服务端错误按退避策略重试
+
+        Raises:
+            ModelCallError: 重试次数用尽或超过截止时间
+        """
+        def call():
+            return dashscope.MultiModalConversation.call(model=self.model, messages=messages)
+
+        if not settings.OCR_RATE_LIMIT_ENABLED:
+            return call()
+        return get_model_rate_limiter().call(call, self._classify_response)
+
+    @staticmethod
+    def _classify_response(response) -> Tuple[str, bool]:
+        """DashScope 响应 -> (outcome, 是否可重试)"""
+        status = response.status_code
+        if status == HTTPStatus.OK:
+            return OUTCOME_OK, False
+        code = str(getattr(response, "code", "") or "")
+        if status == HTTPStatus.TOO_MANY_REQUESTS or code.startswith("Throttling"):
+            return OUTCOME_THROTTLED, True
+        if isinstance(status, int) and status >= 500:
+            return OUTCOME_ERROR, True
+        return OUTCOME_ERROR, False
+
+    @staticmethod
+    def _response_text(response) -> str:
+        """提取模型响应中的全部文本内容"""
+        content_list = response.output.choices[0].message.content
+        return "".join(
+            item['text'] for item in content_list if isinstance(item, dict) and 'text' in item
+        )
+
+    @staticmethod
+    def _add_compat_fields(question: Dict[str, Any]) -> None:
+        """为题目添加兼容字段"""
+        question.setdefault("full_content", question.get("content", ""))
+        question.setdefault("images", {})
+        question.setdefault("options", [])
+
+    def _cache_version(self) -> str:
+        """缓存版本：Prompt 版本 + 图片规范化参数"""
+        if self.normalizer is None:
+            return PROMPT_VERSION
+        return f"{PROMPT_VERSION}+{self.normalizer.signature}"
+
+    def _result_key(self, image_path: str) -> str:
+        """识别结果的键（OCR 缓存和原始输出存储共用）"""
+        return OCRResultCache.make_key(image_path, self.model, self._cache_version())
+
+    def _record_salvage(self, result_key: Optional[str], image_path: str, result: SalvageResult) -> None:
+        """保存需要容错恢复的原始输出；输出被完整解析时清除该键的旧记录"""
+        if not result_key or not settings.OCR_RAW_OUTPUT_ENABLED:
+            return
+        try:
+            store = get_ocr_raw_store()
+            if result.repaired:
+                store.put(result_key, image_path, result.raw_text, result.report())
+            else:
+                store.discard(result_key)
+        except Exception as e:
+            logger.warning(f"Failed to record raw OCR output for {image_path}: {e}")
+
+    def _normalize_image(self, image_path: str) -> Optional[Dict[str, Any]]:
+        """规范化图片，失败时返回 None 并使用原图"""
+        if self.normalizer is None:
+            return None
+        try:
+            result = self.normalizer.normalize(image_path)
+            logger.info(
+                f"Normalized image {image_path}: {result['original_bytes']} -> "
+                f"{result['normalized_bytes']} bytes, {result['original_size']} -> {result['size']}"
+            )
+            return result
+        except Exception as e:
+            logger.warning(f"Image normalization failed for {image_path}, sending original: {e}")
+            return None
+
+    def _extract_questions_payload(self, image_path: str, result_key: str = None) -> Optional[str]:
+        """调用模型识别题目并序列化为缓存值，未识别出题目时返回 None（不缓存）"""
+        questions = self._extract_questions_uncached(image_path, result_key)
+        if not questions:
+            return None
+        return json.dumps(questions, ensure_ascii=False)
+
+    def _extract_batch_uncached(self, image_paths: List[str]) -> Optional[Dict[int, List[Dict[str, Any]]]]:
+        """
+        一次模型调用识别多张图片（不经过缓存）。
+
         Returns:
-            List[Dict]: 文本区域列表。
+            {图片序号: 题目列表}；调用失败、输出不完整或页码无效时返回 None（由调用方逐页回退）
         """
-        questions = self.extract_questions(image_path)
-        
-        # 将题目转换为文本区域格式
-        text_regions = []
-        for question in questions:
-            text_regions.append({
-                "text": question.get("content", ""),
-                "bbox": [],
-                "confidence": 0.95,  # Qwen-VL 没有提供置信度，使用默认值
-                "position": None
-            })
-            
-            # 如果有选项，也加入文本区域
-            for option in question.get("options", []):
-                text_regions.append({
-                    "text": f"{option.get('label', '')}: {option.get('content', '')}",
-                    "bbox": [],
-                    "confidence": 0.95,
-                    "position": None
-                })
-        
-        return text_regions
+        normalized = [self._normalize_image(image_path) for image_path in image_paths]
+        content: List[Dict[str, Any]] = [
+            {'image': f'file://{os.path.abspath(result["path"] if result else image_path)}'}
+            for image_path, result in zip(image_paths, normalized)
+        ]
+        content.append({'text': self._build_batch_prompt(len(image_paths))})
+        logger.info(f"Processing {len(image_paths)} images in one request")
+
+        try:
+            response = self._call_model([{'role': 'user', 'content': content}])
+            if response.status_code != HTTPStatus.OK:
+                logger.error(
+                    f"Batch API call failed for {len(image_paths)} images. "
+                    f"Status: {response.status_code}, Message: {response.message}"
+                )
+                return None
+
+            result = salvage_question_array(self._response_text(response))
+            if result.partial:
+                logger.warning(
+                    f"Batch output partially parsed (lost {len(result.lost)}, truncated={result.truncated}), "
+                    "falling back to per-page calls"
+                )
+                return None
+
+            pages: Dict[int, List[Dict[str, Any]]] = {}
+            for question in result.questions:
+                page = question.pop("page", None)
+                if isinstance(page, str) and page.strip().isdigit():
+                    page = int(page)
+                if not isinstance(page, int) or isinstance(page, bool) or not 0 <= page < len(image_paths):
+                    logger.warning(f"Batch output has invalid page index {page!r}, falling back to per-page calls")
+                    return None
+                self._add_compat_fields(question)
+                pages.setdefault(page, []).append(question)
+
+            logger.info(
+                f"Batch extracted {len(result.questions)} questions from {len(image_paths)} images "
+                f"({len(pages)} pages with questions)"
+            )
+            return pages
+
+        except Exception as e:
+            # 包括重试用尽的 ModelCallError：逐页回退时每页各自重试并记录错误
+            logger.error(f"Batch request for {len(image_paths)} images failed: {e}")
+            return None
+        finally:
+            for image_path, result in zip(image_paths, normalized):
+                if result:
+                    ImageNormalizer.release(result, image_path)
+
+    def _extract_questions_uncached(self, image_path: str, result_key: str = None) -> List[Dict[str, Any]]:
+        """
+        直接调用 通义千问-VL 模型识别单张图片中的题目（不经过缓存）。
+
+        输出不是合法 JSON 时容错恢复所有完整的题目，原始输出和丢失情况保存到原始输出存储。
+
+        Args:
+            image_path (str): 图片文件的路径。
+            result_key (str, optional): 原始输出的存储键，为空时不保存原始输出。
+
+        Returns:
+            List[Dict]: 解析后的题目列表。
+
+        Raises:
+            ModelCallError: 模型返回非 200 响应、重试用尽或处理响应时出错。失败不能以空列表返回，
+                否则对冲后端的熔断器会把持续失败的后端记为成功，页结果也不会记录错误。
+        """
+        if not os.path.exists(image_path):
+            logger.error(f"Image file not found at: {image_path}")
+            return []
+
+        normalized = self._normalize_image(image_path)
+        model_image_path = normalized["path"] if normalized else image_path
+
+        # DashScope 需要本地文件路径以 'file://' 开头
+        local_file_path = f'file://{os.path.abspath(model_image_path)}'
+        logger.info(f"Processing image: {local_file_path}")
+
+        try:
+            response = self._call_model(self._build_messages(local_file_path))
+
+            if response.status_code != HTTPStatus.OK:
+                logger.error(
+                    f"API call failed for image {image_path}. Status: {response.status_code}, Message: {response.message}"
+                )
+                raise ModelCallError(
+                    f"Model call failed with status {response.status_code}: {response.message}"
+                )
+
+            result = salvage_question_array(self._response_text(response))
+            self._record_salvage(result_key, image_path, result)
+            if result.partial:
+                logger.error(
+                    f"Partially parsed output for {image_path}: recovered {len(result.questions)}, "
+                    f"lost {len(result.lost)}, truncated={result.truncated}"
+                )
+
+            # 为每个题目添加兼容字段
+            for question in result.questions:
+                self._add_compat_fields(question)
+
+            logger.info(f"Successfully extracted {len(result.questions)} questions")
+            return result.questions
+
+        except ModelCallError:
+            # 调用失败：向上抛出，由调用方记录为该页的错误（不会写入缓存）
+            raise
+        except Exception as e:
+            logger.error(f"An error occurred while processing {image_path}: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            raise ModelCallError(f"Failed to process model output for {image_path}: {e}") from e
+        finally:
+            if normalized:
+                ImageNormalizer.release(normalized, image_path)
 
 
 # 全局单例
@@ -257,7 +529,7 @@ _qwen_ocr_instance: Optional[QwenQuestionExtractor] = None
 
 
 def get_ocr_service() -> QwenQuestionExtractor:
-    """获取 OCR 服务单例"""
+    """获取 通义千问-VL 后端单例（按配置选择后端请使用 ocr_backends.get_ocr_backend）"""
     global _qwen_ocr_instance
     if _qwen_ocr_instance is None:
         _qwen_ocr_instance = QwenQuestionExtractor()
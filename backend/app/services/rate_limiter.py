@@ -0,0 +1,433 @@
+"""
+模型调用准入控制 - 令牌桶 + AIMD 自适应并发 + 带截止时间的抖动指数退避重试
+
+状态保存在本地 SQLite 中，同一台机器上的多个 uvicorn worker 进程共享同一个令牌桶、
+并发上限和统计数据：
+- 令牌桶限制请求速率，允许 burst 大小的突发
+- 并发上限按 AIMD 调整：成功且延迟正常时加性增加，限流（429）或延迟超标时乘性减少
+- 正在进行的调用以带过期时间的租约记录，进程崩溃遗留的租约过期后自动失效
+"""
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 调用结果分类
+OUTCOME_OK = "ok"
+OUTCOME_THROTTLED = "throttled"
+OUTCOME_ERROR = "error"
+
+# 分类函数: 调用结果 -> (outcome, 是否可重试)
+Classifier = Callable[[Any], Tuple[str, bool]]
+
+
+class ModelCallError(Exception):
+    """模型调用在重试次数或截止时间内没有成功"""
+
+
+class RateLimitTimeout(ModelCallError):
+    """在截止时间前没有获得调用许可"""
+
+
+class AdaptiveRateLimiter:
+    """跨进程共享的自适应限流器"""
+
+    # 两次乘性减少之间的最短间隔，避免同一波限流响应把并发上限连续减半
+    DECREASE_COOLDOWN_SECONDS = 5.0
+    THROTTLE_BACKOFF = 0.5
+    LATENCY_BACKOFF = 0.8
+    MAX_POLL_INTERVAL = 0.5
+
+    def __init__(
+        self,
+        name: str,
+        db_path: str,
+        rate: float,
+        burst: int,
+        min_concurrency: int,
+        max_concurrency: int,
+        initial_concurrency: int,
+        latency_target: float,
+        lease_seconds: float = 300.0,
+        retry_max_attempts: int = 5,
+        retry_base_delay: float = 1.0,
+        retry_max_delay: float = 20.0,
+        call_deadline: float = 120.0,
+    ):
+        self.name = name
+        self.db_path = db_path
+        self.rate = max(rate, 0.001)
+        self.burst = max(1, burst)
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.initial_concurrency = min(max(initial_concurrency, self.min_concurrency), self.max_concurrency)
+        self.latency_target = latency_target
+        self.lease_seconds = lease_seconds
+        self.retry_max_attempts = max(1, retry_max_attempts)
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.call_deadline = call_deadline
+
+        # 进程内最近的排队耗时，用于计算分位数
+        self._recent_waits: deque = deque(maxlen=1000)
+        self._lock = threading.Lock()
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS rate_limit_state (
+                    name TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    refilled_at REAL NOT NULL,
+                    concurrency_limit REAL NOT NULL,
+                    last_decrease_at REAL NOT NULL DEFAULT 0,
+                    acquired INTEGER NOT NULL DEFAULT 0,
+                    wait_ms_total REAL NOT NULL DEFAULT 0,
+                    wait_ms_max REAL NOT NULL DEFAULT 0,
+                    retries INTEGER NOT NULL DEFAULT 0,
+                    throttled INTEGER NOT NULL DEFAULT 0,
+                    errors INTEGER NOT NULL DEFAULT 0,
+                    timeouts INTEGER NOT NULL DEFAULT 0,
+                    failures INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS rate_limit_leases (
+                    lease_id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    acquired_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_rate_limit_leases_name ON rate_limit_leases (name, expires_at)"
+            )
+            conn.execute(
+                """
+                INSERT OR IGNORE INTO rate_limit_state (name, tokens, refilled_at, concurrency_limit)
+                VALUES (?, ?, ?, ?)
+                """,
+                (name, float(self.burst), time.time(), float(self.initial_concurrency)),
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """写事务（BEGIN IMMEDIATE 在多进程间串行化状态读写）"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def acquire(self, deadline: float) -> str:
+        """
+        等待令牌和并发槽位
+
+        Args:
+            deadline: time.monotonic() 截止时间
+
+        Returns:
+            租约ID，调用结束后传给 release
+
+        Raises:
+            RateLimitTimeout: 截止时间前没有获得许可
+        """
+        started = time.monotonic()
+        while True:
+            now = time.time()
+            with self._transaction() as conn:
+                tokens, refilled_at, limit = conn.execute(
+                    "SELECT tokens, refilled_at, concurrency_limit FROM rate_limit_state WHERE name = ?",
+                    (self.name,),
+                ).fetchone()
+                conn.execute("DELETE FROM rate_limit_leases WHERE expires_at < ?", (now,))
+                in_flight = conn.execute(
+                    "SELECT COUNT(*) FROM rate_limit_leases WHERE name = ?", (self.name,)
+                ).fetchone()[0]
+                tokens = min(float(self.burst), tokens + max(0.0, now - refilled_at) * self.rate)
+
+                if tokens >= 1 and in_flight < int(limit):
+                    wait_ms = (time.monotonic() - started) * 1000
+                    lease_id = uuid.uuid4().hex
+                    conn.execute(
+                        "INSERT INTO rate_limit_leases (lease_id, name, acquired_at, expires_at) VALUES (?, ?, ?, ?)",
+                        (lease_id, self.name, now, now + self.lease_seconds),
+                    )
+                    conn.execute(
+                        """
+                        UPDATE rate_limit_state
+                        SET tokens = ?, refilled_at = ?, acquired = acquired + 1,
+                            wait_ms_total = wait_ms_total + ?, wait_ms_max = MAX(wait_ms_max, ?)
+                        WHERE name = ?
+                        """,
+                        (tokens - 1, now, wait_ms, wait_ms, self.name),
+                    )
+                    with self._lock:
+                        self._recent_waits.append(wait_ms)
+                    return lease_id
+
+                conn.execute(
+                    "UPDATE rate_limit_state SET tokens = ?, refilled_at = ? WHERE name = ?",
+                    (tokens, now, self.name),
+                )
+
+            # 缺令牌时等到下一个令牌生成；缺并发槽位时短轮询
+            wait = (1 - tokens) / self.rate if tokens < 1 else 0.05
+            wait = min(max(wait, 0.01), self.MAX_POLL_INTERVAL) * random.uniform(0.8, 1.2)
+            if time.monotonic() + wait > deadline:
+                self._increment("timeouts")
+                raise RateLimitTimeout(f"No {self.name} call slot available before deadline")
+            time.sleep(wait)
+
+    def release(self, lease_id: str, outcome: str, latency: float) -> None:
+        """
+        归还槽位并按调用结果调整并发上限（AIMD）
+
+        Args:
+            lease_id: acquire 返回的租约ID
+            outcome: ok / throttled / error
+            latency: 调用耗时（秒）
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM rate_limit_leases WHERE lease_id = ?", (lease_id,))
+            limit, last_decrease_at = conn.execute(
+                "SELECT concurrency_limit, last_decrease_at FROM rate_limit_state WHERE name = ?",
+                (self.name,),
+            ).fetchone()
+
+            can_decrease = now - last_decrease_at >= self.DECREASE_COOLDOWN_SECONDS
+            if outcome == OUTCOME_THROTTLED:
+                if can_decrease:
+                    limit = max(float(self.min_concurrency), limit * self.THROTTLE_BACKOFF)
+                    last_decrease_at = now
+            elif outcome == OUTCOME_OK:
+                if latency > self.latency_target:
+                    if can_decrease:
+                        limit = max(float(self.min_concurrency), limit * self.LATENCY_BACKOFF)
+                        last_decrease_at = now
+                else:
+                    # 每个并发窗口大约增加 1
+                    limit = min(float(self.max_concurrency), limit + 1.0 / max(limit, 1.0))
+
+            conn.execute(
+                """
+                UPDATE rate_limit_state
+                SET concurrency_limit = ?, last_decrease_at = ?,
+                    throttled = throttled + ?, errors = errors + ?
+                WHERE name = ?
+                """,
+                (
+                    limit,
+                    last_decrease_at,
+                    int(outcome == OUTCOME_THROTTLED),
+                    int(outcome == OUTCOME_ERROR),
+                    self.name,
+                ),
+            )
+
+    @contextmanager
+    def slot(self, deadline: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        获取一个调用槽位（不重试），调用方通过 yield 的字典设置 outcome
+
+        用法:
+            with limiter.slot() as call:
+                ...
+                call["outcome"] = OUTCOME_THROTTLED
+        """
+        deadline = deadline or time.monotonic() + self.call_deadline
+        lease_id = self.acquire(deadline)
+        call = {"outcome": OUTCOME_OK}
+        started = time.monotonic()
+        try:
+            yield call
+        except GeneratorExit:
+            # 流式调用被调用方提前关闭，不算调用失败
+            raise
+        except BaseException:
+            call["outcome"] = OUTCOME_ERROR
+            raise
+        finally:
+            self.release(lease_id, call["outcome"], time.monotonic() - started)
+
+    def call(
+        self,
+        fn: Callable[[], Any],
+        classify: Classifier,
+        deadline_seconds: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+    ) -> Any:
+        """
+        在准入控制下执行调用，可重试的失败按抖动指数退避重试
+
+        Args:
+            fn: 实际调用
+            classify: 结果分类函数，返回 (outcome, retryable)
+            deadline_seconds: 整体截止时间（含排队和重试），默认 call_deadline
+            max_attempts: 最大尝试次数，默认 retry_max_attempts
+
+        Returns:
+            成功或不可重试的调用结果
+
+        Raises:
+            ModelCallError: 重试次数用尽或超过截止时间
+        """
+        deadline = time.monotonic() + (deadline_seconds or self.call_deadline)
+        attempts = max_attempts or self.retry_max_attempts
+        last_failure = None
+
+        for attempt in range(1, attempts + 1):
+            lease_id = self.acquire(deadline)
+            started = time.monotonic()
+            outcome, retryable, result, error = OUTCOME_ERROR, True, None, None
+            try:
+                result = fn()
+                outcome, retryable = classify(result)
+            except Exception as exc:
+                error = exc
+            finally:
+                self.release(lease_id, outcome, time.monotonic() - started)
+
+            if error is None and (outcome == OUTCOME_OK or not retryable):
+                return result
+            last_failure = error or self._describe(result)
+
+            if attempt == attempts:
+                break
+            delay = self._backoff_delay(attempt, outcome)
+            if time.monotonic() + delay >= deadline:
+                break
+            self._increment("retries")
+            logger.warning(
+                f"{self.name} call attempt {attempt} failed ({outcome}: {last_failure}), "
+                f"retrying in {delay:.2f}s"
+            )
+            time.sleep(delay)
+
+        self._increment("failures")
+        raise ModelCallError(f"{self.name} call failed after {attempt} attempts: {last_failure}")
+
+    def _backoff_delay(self, attempt: int, outcome: str) -> float:
+        """Full jitter 指数退避；被限流时退避基数加倍"""
+        base = self.retry_base_delay * (2 if outcome == OUTCOME_THROTTLED else 1)
+        return random.uniform(0, min(self.retry_max_delay, base * (2 ** (attempt - 1))))
+
+    @staticmethod
+    def _describe(result: Any) -> str:
+        status = getattr(result, "status_code", None)
+        message = getattr(result, "message", None)
+        return f"status={status} message={message}" if status is not None else repr(result)
+
+    def _increment(self, column: str) -> None:
+        try:
+            with self._transaction() as conn:
+                conn.execute(
+                    f"UPDATE rate_limit_state SET {column} = {column} + 1 WHERE name = ?",
+                    (self.name,),
+                )
+        except sqlite3.Error as exc:
+            logger.warning(f"Failed to update rate limiter metric {column}: {exc}")
+
+    def stats(self) -> Dict[str, Any]:
+        """共享状态和计数（所有 worker 进程汇总）及本进程排队耗时分位数"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                """
+                SELECT tokens, refilled_at, concurrency_limit, acquired, wait_ms_total, wait_ms_max,
+                       retries, throttled, errors, timeouts, failures
+                FROM rate_limit_state WHERE name = ?
+                """,
+                (self.name,),
+            ).fetchone()
+            in_flight = conn.execute(
+                "SELECT COUNT(*) FROM rate_limit_leases WHERE name = ? AND expires_at >= ?",
+                (self.name, now),
+            ).fetchone()[0]
+
+        (tokens, refilled_at, limit, acquired, wait_total, wait_max,
+         retries, throttled, errors, timeouts, failures) = row
+        with self._lock:
+            waits = sorted(self._recent_waits)
+
+        def percentile(p: float) -> Optional[float]:
+            if not waits:
+                return None
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))], 1)
+
+        return {
+            "name": self.name,
+            "tokens": round(min(float(self.burst), tokens + max(0.0, now - refilled_at) * self.rate), 2),
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "concurrency_limit": round(limit, 2),
+            "min_concurrency": self.min_concurrency,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": in_flight,
+            "acquired": acquired,
+            "queue_wait_ms_avg": round(wait_total / acquired, 1) if acquired else 0.0,
+            "queue_wait_ms_max": round(wait_max, 1),
+            "queue_wait_ms_p50": percentile(0.5),
+            "queue_wait_ms_p95": percentile(0.95),
+            "retries": retries,
+            "throttled": throttled,
+            "errors": errors,
+            "timeouts": timeouts,
+            "failures": failures,
+        }
+
+
+# 全局单例
+_model_limiter_instance: Optional[AdaptiveRateLimiter] = None
+_model_limiter_lock = threading.Lock()
+
+
+def get_model_rate_limiter() -> AdaptiveRateLimiter:
+    """获取 DashScope 模型调用限流器单例"""
+    global _model_limiter_instance
+    if _model_limiter_instance is None:
+        with _model_limiter_lock:
+            if _model_limiter_instance is None:
+                _model_limiter_instance = AdaptiveRateLimiter(
+                    name="dashscope",
+                    db_path=settings.OCR_RATE_LIMIT_PATH,
+                    rate=settings.OCR_RATE_LIMIT_RPS,
+                    burst=settings.OCR_RATE_LIMIT_BURST,
+                    min_concurrency=settings.OCR_CONCURRENCY_MIN,
+                    max_concurrency=settings.OCR_CONCURRENCY_MAX,
+                    initial_concurrency=settings.OCR_CONCURRENCY_INITIAL,
+                    latency_target=settings.OCR_LATENCY_TARGET_SECONDS,
+                    lease_seconds=settings.OCR_RATE_LIMIT_LEASE_SECONDS,
+                    retry_max_attempts=settings.OCR_RETRY_MAX_ATTEMPTS,
+                    retry_base_delay=settings.OCR_RETRY_BASE_DELAY,
+                    retry_max_delay=settings.OCR_RETRY_MAX_DELAY,
+                    call_deadline=settings.OCR_CALL_DEADLINE_SECONDS,
+                )
+    return _model_limiter_instance
@@ -0,0 +1,211 @@
+"""
+回放 OCR 后端 - 用录制的识别结果代替模型调用，附加可配置的合成延迟
+
+录制文件按图片内容的 SHA-256 命名（<sha256>.json），内容为:
+    {"image_sha256": ..., "raw_text": "模型原始输出"} 或 {"image_sha256": ..., "questions": [...]}
+    可选 "latency_ms": 录制时的实际耗时
+raw_text 与真实模型输出走同一套容错解析，回放可以复现截断、转义错误等问题。
+
+找不到录制时按 OCR_REPLAY_MISSING 处理:
+- synthetic: 由图片哈希确定性地生成合成题目（任意图片都能用于压测）
+- empty:     返回空结果
+- error:     抛出异常，该页记录为识别失败
+"""
+import copy
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.config import settings
+from app.services.ocr_backends import OCRBackend
+from app.services.ocr_json import salvage_question_array
+
+logger = logging.getLogger(__name__)
+
+MISSING_SYNTHETIC = "synthetic"
+MISSING_EMPTY = "empty"
+MISSING_ERROR = "error"
+
+_SYNTHETIC_TYPES = ["single_choice", "fill_blank", "essay", "true_false", "multiple_choice"]
+
+
+class ReplayOCRBackend(OCRBackend):
+    """回放录制结果的 OCR 后端，同一图片和种子下的结果与延迟完全确定"""
+
+    name = "replay"
+
+    def __init__(
+        self,
+        recordings_dir: str,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        use_recorded_latency: bool = False,
+        missing: str = MISSING_SYNTHETIC,
+        seed: int = 0,
+    ):
+        if missing not in (MISSING_SYNTHETIC, MISSING_EMPTY, MISSING_ERROR):
+            raise ValueError(f"Invalid replay missing-recording policy: {missing}")
+        self.recordings_dir = Path(recordings_dir)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.use_recorded_latency = use_recorded_latency
+        self.missing = missing
+        self.seed = seed
+        self._recordings: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def image_digest(image_path: str) -> str:
+        """图片内容的 SHA-256（录制文件名）"""
+        digest = hashlib.sha256()
+        with open(image_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def record(
+        self,
+        image_path: str,
+        raw_text: Optional[str] = None,
+        questions: Optional[List[Dict[str, Any]]] = None,
+        latency_ms: Optional[float] = None,
+    ) -> str:
+        """
+        保存一张图片的识别结果供回放
+
+        Args:
+            image_path: 图片路径
+            raw_text: 模型原始输出（优先，回放时重新解析）
+            questions: 已解析的题目列表
+            latency_ms: 录制时的实际耗时
+
+        Returns:
+            录制文件路径
+        """
+        if raw_text is None and questions is None:
+            raise ValueError("Either raw_text or questions is required")
+        digest = self.image_digest(image_path)
+        recording: Dict[str, Any] = {"image_sha256": digest, "source_image": Path(image_path).name}
+        if raw_text is not None:
+            recording["raw_text"] = raw_text
+        else:
+            recording["questions"] = questions
+        if latency_ms is not None:
+            recording["latency_ms"] = round(latency_ms, 1)
+
+        self.recordings_dir.mkdir(parents=True, exist_ok=True)
+        path = self.recordings_dir / f"{digest}.json"
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(recording, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp_path.replace(path)
+        with self._lock:
+            self._recordings[digest] = recording
+        return str(path)
+
+    def extract_questions_with_report(
+        self, image_path: str
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """回放识别结果；录制的原始输出只被部分解析时返回恢复报告"""
+        questions, report, delay = self._replay(image_path)
+        if delay > 0:
+            time.sleep(delay)
+        return questions, report
+
+    def extract_questions_stream(self, image_path: str) -> Iterator[Dict[str, Any]]:
+        """把合成延迟均摊到每道题之前，模拟模型逐题输出"""
+        questions, _, delay = self._replay(image_path)
+        step = delay / max(len(questions), 1)
+        if not questions and delay > 0:
+            time.sleep(delay)
+        for question in questions:
+            if step > 0:
+                time.sleep(step)
+            yield question
+
+    def _replay(self, image_path: str) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]], float]:
+        """返回 (题目列表, 恢复报告, 延迟秒数)"""
+        digest = self.image_digest(image_path)
+        rng = random.Random(f"{self.seed}:{digest}")
+        recording = self._load_recording(digest)
+
+        report = None
+        if recording is None:
+            if self.missing == MISSING_ERROR:
+                raise FileNotFoundError(f"No replay recording for image {image_path} ({digest})")
+            questions = self._synthetic_questions(digest, rng) if self.missing == MISSING_SYNTHETIC else []
+        elif "raw_text" in recording:
+            result = salvage_question_array(recording["raw_text"])
+            questions = result.questions
+            if result.partial:
+                report = dict(result.report(), raw_key=None)
+        else:
+            questions = copy.deepcopy(recording.get("questions") or [])
+
+        for question in questions:
+            question.setdefault("full_content", question.get("content", ""))
+            question.setdefault("images", {})
+            question.setdefault("options", [])
+
+        latency_ms = self.latency_ms
+        if self.use_recorded_latency and recording and recording.get("latency_ms") is not None:
+            latency_ms = recording["latency_ms"]
+        if self.jitter_ms:
+            latency_ms += rng.uniform(-self.jitter_ms, self.jitter_ms)
+        return questions, report, max(0.0, latency_ms) / 1000
+
+    def _load_recording(self, digest: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if digest in self._recordings:
+                return self._recordings[digest]
+        path = self.recordings_dir / f"{digest}.json"
+        recording = None
+        if path.exists():
+            try:
+                recording = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError) as exc:
+                logger.warning(f"Invalid replay recording {path}: {exc}")
+        with self._lock:
+            self._recordings[digest] = recording
+        return recording
+
+    @staticmethod
+    def _synthetic_questions(digest: str, rng: random.Random) -> List[Dict[str, Any]]:
+        """由图片哈希确定性地生成 3-8 道题"""
+        questions = []
+        for number in range(1, rng.randint(3, 8) + 1):
+            question_type = rng.choice(_SYNTHETIC_TYPES)
+            content = f"[replay {digest[:8]}] 第{number}题：已知 x + {rng.randint(1, 99)} = {rng.randint(100, 199)}，求 x"
+            options = []
+            if question_type in ("single_choice", "multiple_choice"):
+                options = [{"label": label, "content": f"{rng.randint(1, 199)}"} for label in "ABCD"]
+            questions.append({
+                "number": number,
+                "type": question_type,
+                "content": content,
+                "options": options,
+            })
+        return questions
+
+
+# 全局单例
+_replay_ocr_instance: Optional[ReplayOCRBackend] = None
+
+
+def get_replay_ocr_service() -> ReplayOCRBackend:
+    """获取回放后端单例"""
+    global _replay_ocr_instance
+    if _replay_ocr_instance is None:
+        _replay_ocr_instance = ReplayOCRBackend(
+            recordings_dir=settings.OCR_REPLAY_DIR,
+            latency_ms=settings.OCR_REPLAY_LATENCY_MS,
+            jitter_ms=settings.OCR_REPLAY_JITTER_MS,
+            use_recorded_latency=settings.OCR_REPLAY_USE_RECORDED_LATENCY,
+            missing=settings.OCR_REPLAY_MISSING,
+            seed=settings.OCR_REPLAY_SEED,
+        )
+    return _replay_ocr_instance
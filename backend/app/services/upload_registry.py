@@ -0,0 +1,272 @@
+"""
+OCR 上传临时文件登记表 - file_id -> 路径 / 大小 / 哈希 / 过期时间
+
+上传文件按 file_id 前缀分散到两级子目录（ab/cd/<file_id>.jpg），单个目录不会无限增长；
+按 file_id 查找走 SQLite 主键，不再扫描上传目录。
+处理完成后的删除仍是尽力而为，进程崩溃遗留的文件由定期清扫线程按过期时间回收，
+目录中没有登记的孤儿文件（写入后、登记前崩溃）同样会被回收。
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from itertools import chain
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from app.config import settings
+from app.services.upload_sink import SavedUpload, UploadRejectedError
+
+logger = logging.getLogger(__name__)
+
+
+class UploadStorageFullError(UploadRejectedError):
+    """临时上传目录已达到容量上限"""
+
+
+class UploadRegistry:
+    """基于 SQLite 的上传临时文件登记表，附带 TTL 清扫线程"""
+
+    def __init__(self, db_path: str, root_dir: str, ttl_seconds: int, max_bytes: int):
+        """
+        Args:
+            db_path: 登记表 SQLite 文件路径
+            root_dir: 上传文件根目录
+            ttl_seconds: 文件登记后的保留时间，过期后由清扫线程删除
+            max_bytes: 登记文件的总字节数上限，超过时拒绝新上传
+        """
+        self.db_path = db_path
+        self.root_dir = Path(root_dir)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+        self._stats = {"registered": 0, "released": 0, "expired": 0, "orphans": 0, "rejected": 0, "sweeps": 0}
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS temp_uploads (
+                    file_id TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    filename TEXT,
+                    size INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    content_type TEXT,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_temp_uploads_expires ON temp_uploads (expires_at)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def shard_dir(self, file_id: str) -> str:
+        """file_id 对应的分片目录：<root>/<前两位>/<三四位>"""
+        return str(self.root_dir / file_id[:2] / file_id[2:4])
+
+    def register(self, upload: SavedUpload, ttl_seconds: Optional[int] = None) -> Dict[str, Any]:
+        """
+        登记已落盘的上传文件
+
+        Raises:
+            UploadStorageFullError: 清理过期文件后总大小仍超过上限（文件会被删除）
+        """
+        now = time.time()
+        expires_at = now + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        with self._connect() as conn:
+            # 容量检查和登记在同一个写事务中（BEGIN IMMEDIATE 先取得写锁），
+            # 并发上传依次执行，不会都通过检查后一起超过上限
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM temp_uploads").fetchone()[0]
+                if total + upload.size > self.max_bytes:
+                    self._sweep_expired(conn, now)
+                    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM temp_uploads").fetchone()[0]
+                full = total + upload.size > self.max_bytes
+                if not full:
+                    conn.execute(
+                        """
+                        INSERT OR REPLACE INTO temp_uploads
+                            (file_id, path, filename, size, sha256, content_type, created_at, expires_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        """,
+                        (upload.file_id, upload.path, upload.filename, upload.size, upload.sha256,
+                         upload.content_type, now, expires_at),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if full:
+            self._remove_file(upload.path)
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise UploadStorageFullError("上传临时存储已满，请稍后重试")
+        with self._lock:
+            self._stats["registered"] += 1
+        return self._entry(upload.file_id, upload.path, upload.filename, upload.size, upload.sha256,
+                           upload.content_type, now, expires_at)
+
+    def get(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """按 file_id 查找未过期且文件仍存在的上传"""
+        with self._connect() as conn:
+            row = conn.execute(
+                """
+                SELECT file_id, path, filename, size, sha256, content_type, created_at, expires_at
+                FROM temp_uploads WHERE file_id = ?
+                """,
+                (file_id,),
+            ).fetchone()
+        if not row:
+            return None
+        entry = self._entry(*row)
+        if entry["expires_at"] < time.time() or not os.path.exists(entry["path"]):
+            return None
+        return entry
+
+    def release(self, file_id: str) -> None:
+        """删除文件及其登记"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT path FROM temp_uploads WHERE file_id = ?", (file_id,)).fetchone()
+            conn.execute("DELETE FROM temp_uploads WHERE file_id = ?", (file_id,))
+        if row:
+            self._remove_file(row[0])
+            with self._lock:
+                self._stats["released"] += 1
+
+    def sweep(self) -> Dict[str, int]:
+        """
+        删除过期文件，以及目录中超过 TTL 仍未登记的孤儿文件（含未写完的 .part 文件）
+
+        Returns:
+            {"expired": 删除的过期文件数, "orphans": 删除的孤儿文件数}
+        """
+        now = time.time()
+        with self._connect() as conn:
+            expired = self._sweep_expired(conn, now)
+            known = {row[0] for row in conn.execute("SELECT path FROM temp_uploads")}
+
+        orphans = 0
+        cutoff = now - self.ttl_seconds
+        if self.root_dir.exists():
+            # 分片目录中的文件，以及改为分片存储之前遗留在根目录的文件
+            for path in chain(self.root_dir.glob("*/*/*"), self.root_dir.glob("*")):
+                try:
+                    if str(path) in known or not path.is_file() or path.stat().st_mtime > cutoff:
+                        continue
+                except OSError:
+                    continue
+                self._remove_file(str(path))
+                orphans += 1
+
+        with self._lock:
+            self._stats["expired"] += expired
+            self._stats["orphans"] += orphans
+            self._stats["sweeps"] += 1
+        if expired or orphans:
+            logger.info(f"Upload sweep removed {expired} expired and {orphans} orphaned files")
+        return {"expired": expired, "orphans": orphans}
+
+    def _sweep_expired(self, conn: sqlite3.Connection, now: float) -> int:
+        rows = conn.execute("SELECT file_id, path FROM temp_uploads WHERE expires_at < ?", (now,)).fetchall()
+        for _, path in rows:
+            self._remove_file(path)
+        conn.executemany("DELETE FROM temp_uploads WHERE file_id = ?", [(file_id,) for file_id, _ in rows])
+        return len(rows)
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            logger.warning(f"Failed to remove upload {path}: {exc}")
+
+    @staticmethod
+    def _entry(file_id, path, filename, size, sha256, content_type, created_at, expires_at) -> Dict[str, Any]:
+        return {
+            "file_id": file_id,
+            "path": path,
+            "filename": filename,
+            "size": size,
+            "sha256": sha256,
+            "content_type": content_type,
+            "created_at": created_at,
+            "expires_at": expires_at,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """当前登记的文件数、总字节数和累计计数"""
+        with self._connect() as conn:
+            count, total_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM temp_uploads"
+            ).fetchone()
+        with self._lock:
+            counters = dict(self._stats)
+        return {
+            "files": count,
+            "bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            **counters,
+        }
+
+    def start_sweeper(self, interval_seconds: float) -> None:
+        """启动定期清扫线程（启动时先清扫一次，回收上次运行遗留的文件）"""
+        if self._sweeper is not None:
+            return
+        self._stop.clear()
+        self._sweeper = threading.Thread(
+            target=self._run_sweeper, args=(interval_seconds,), name="upload-sweeper", daemon=True
+        )
+        self._sweeper.start()
+
+    def stop_sweeper(self, timeout: float = 5.0) -> None:
+        """停止清扫线程"""
+        self._stop.set()
+        if self._sweeper is not None:
+            self._sweeper.join(timeout=timeout)
+            self._sweeper = None
+
+    def _run_sweeper(self, interval_seconds: float) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Upload sweep failed: {e}", exc_info=True)
+            self._stop.wait(interval_seconds)
+
+
+# 全局单例
+_registry_instance: Optional[UploadRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_upload_registry() -> UploadRegistry:
+    """获取 OCR 上传登记表单例"""
+    global _registry_instance
+    if _registry_instance is None:
+        with _registry_lock:
+            if _registry_instance is None:
+                _registry_instance = UploadRegistry(
+                    db_path=settings.OCR_UPLOAD_REGISTRY_PATH,
+                    root_dir=settings.OCR_UPLOAD_DIR,
+                    ttl_seconds=settings.OCR_UPLOAD_TTL_SECONDS,
+                    max_bytes=settings.OCR_UPLOAD_MAX_BYTES,
+                )
+    return _registry_instance
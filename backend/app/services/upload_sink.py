@@ -0,0 +1,182 @@
+"""
+上传文件落盘 - 分块流式写入磁盘，边写边计算 SHA-256 并按文件头识别真实类型
+
+await file.read() 会把整个上传文件读入内存，并发上传时进程内存按文件大小成倍增长。
+这里每次只读取一个分块，超过大小限制立即中止并删除已写入的部分，内存占用与文件大小无关。
+"""
+import hashlib
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Collection, Optional
+
+import aiofiles
+from fastapi import UploadFile
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 识别文件类型需要的文件头长度
+_SNIFF_BYTES = 16
+
+# 类型 -> 保存时使用的扩展名（客户端文件名没有扩展名时）
+_DEFAULT_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/bmp": ".bmp",
+    "image/tiff": ".tiff",
+    "image/webp": ".webp",
+    "application/pdf": ".pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": ".docx",
+    "application/zip": ".zip",
+}
+
+
+class UploadRejectedError(ValueError):
+    """上传文件被拒绝（超过大小限制或类型不受支持）"""
+
+
+class UploadTooLargeError(UploadRejectedError):
+    """上传文件超过大小限制"""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"文件大小超过限制 ({max_bytes // (1024 * 1024)}MB)")
+        self.max_bytes = max_bytes
+
+
+class UnsupportedUploadTypeError(UploadRejectedError):
+    """文件内容不是允许的类型"""
+
+    def __init__(self, content_type: Optional[str], allowed_types: Collection[str]):
+        super().__init__(
+            f"不支持的文件类型: {content_type or 'unknown'}。支持的格式: {', '.join(sorted(allowed_types))}"
+        )
+        self.content_type = content_type
+
+
+@dataclass
+class SavedUpload:
+    """已落盘的上传文件"""
+
+    file_id: str
+    path: str
+    filename: str
+    size: int
+    sha256: str
+    content_type: Optional[str]  # 按文件头识别的类型，无法识别时为 None
+
+
+def sniff_content_type(head: bytes, filename: Optional[str] = None) -> Optional[str]:
+    """
+    按文件头（magic bytes）识别文件类型
+
+    Args:
+        head: 文件开头的字节（至少 12 字节才能识别 WebP）
+        filename: 原始文件名，用于区分 ZIP 容器格式（.docx）
+
+    Returns:
+        MIME 类型，无法识别时返回 None
+    """
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if head.startswith(b"BM"):
+        return "image/bmp"
+    if head.startswith((b"II*\x00", b"MM\x00*")):
+        return "image/tiff"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith(b"%PDF-"):
+        return "application/pdf"
+    if head.startswith(b"PK\x03\x04"):
+        if (filename or "").lower().endswith(".docx"):
+            return "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        return "application/zip"
+    return None
+
+
+async def save_upload(
+    file: UploadFile,
+    dest_dir: str,
+    max_bytes: int,
+    allowed_types: Optional[Collection[str]] = None,
+    chunk_size: Optional[int] = None,
+    file_id: Optional[str] = None,
+) -> SavedUpload:
+    """
+    把上传文件分块写入 dest_dir，文件名为 <file_id><扩展名>
+
+    先写入 .part 临时文件，完整写入后再重命名，中途失败不会留下看似完整的文件。
+
+    Args:
+        file: FastAPI 上传文件
+        dest_dir: 目标目录（不存在时创建）
+        max_bytes: 文件大小上限，超过时立即中止
+        allowed_types: 允许的类型（按文件头识别），为空时不限制
+        chunk_size: 每次读取的字节数，默认取 settings.UPLOAD_CHUNK_SIZE
+        file_id: 文件 ID，为空时生成 UUID（调用方需要先按 ID 确定目录时传入）
+
+    Returns:
+        SavedUpload
+
+    Raises:
+        UploadTooLargeError: 超过大小限制
+        UnsupportedUploadTypeError: 文件头不属于 allowed_types
+    """
+    # 请求体已声明大小时无需读取即可拒绝
+    if file.size is not None and file.size > max_bytes:
+        raise UploadTooLargeError(max_bytes)
+
+    chunk_size = max(_SNIFF_BYTES, chunk_size or settings.UPLOAD_CHUNK_SIZE)
+    directory = Path(dest_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    file_id = file_id or str(uuid.uuid4())
+    part_path = directory / f"{file_id}.part"
+
+    digest = hashlib.sha256()
+    size = 0
+    content_type = None
+    try:
+        async with aiofiles.open(part_path, "wb") as out:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                if size == 0:
+                    content_type = sniff_content_type(chunk[:_SNIFF_BYTES], file.filename)
+                    if allowed_types is not None and content_type not in allowed_types:
+                        raise UnsupportedUploadTypeError(content_type, allowed_types)
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(max_bytes)
+                digest.update(chunk)
+                await out.write(chunk)
+        if size == 0 and allowed_types is not None:
+            raise UnsupportedUploadTypeError(None, allowed_types)
+
+        extension = Path(file.filename or "").suffix or _DEFAULT_EXTENSIONS.get(content_type, "")
+        final_path = directory / f"{file_id}{extension}"
+        os.replace(part_path, final_path)
+    except BaseException:
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+        raise
+
+    logger.info(f"Upload saved: {final_path} ({size} bytes, {content_type})")
+    return SavedUpload(
+        file_id=file_id,
+        path=str(final_path),
+        filename=file.filename or final_path.name,
+        size=size,
+        sha256=digest.hexdigest(),
+        content_type=content_type,
+    )
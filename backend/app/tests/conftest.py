@@ -0,0 +1,63 @@
+"""
+测试公共夹具 - 每个测试使用独立的 SQLite 数据库文件
+"""
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import app.models  # noqa: F401  注册全部模型
+from app.database import Base
+from app.models import User
+from app.models.question import Question
+from app.services.question_search import init_question_search
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # 检索索引按数据库地址记录是否已建表，每个测试使用独立的数据库文件
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    init_question_search(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def make_user(db):
+    def make(email=None):
+        user = User(email=email or f"{uuid.uuid4().hex[:8]}@example.com", password_hash="x")
+        db.add(user)
+        db.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def make_question(db):
+    def make(user, content, number=1, **fields):
+        question = Question(
+            id=uuid.uuid4(),
+            number=number,
+            content={"text": content},
+            question_type=fields.pop("question_type", "essay"),
+            created_by=user.id,
+            **fields,
+        )
+        db.add(question)
+        db.commit()
+        return question
+    return make
@@ -0,0 +1,74 @@
+"""
+超长图片分块测试 - 条带规划与重叠区域去重
+"""
+from app.services.image_tiling import merge_tile_questions, plan_tiles
+
+
+def _question(number, content, options=None):
+    return {"number": number, "content": content, "options": options or []}
+
+
+def test_plan_tiles_single_tile_for_short_image():
+    assert plan_tiles(1000, 1400, 200) == [(0, 1000)]
+    assert plan_tiles(1400, 1400, 200) == [(0, 1400)]
+
+
+def test_plan_tiles_covers_image_with_overlap():
+    tiles = plan_tiles(5000, 1400, 200)
+
+    assert tiles[0][0] == 0
+    assert tiles[-1][1] == 5000
+    assert all(bottom - top == 1400 for top, bottom in tiles)
+    for (_, previous_bottom), (top, _) in zip(tiles, tiles[1:]):
+        assert previous_bottom - top >= 200
+
+
+def test_plan_tiles_aligns_last_tile_to_bottom():
+    # 按步长切分会剩下很矮的尾条带，最后一个条带改为与底边对齐
+    assert plan_tiles(2700, 1400, 200) == [(0, 1400), (1200, 2600), (1300, 2700)]
+
+
+def test_merge_keeps_distinct_questions_in_order():
+    merged = merge_tile_questions([
+        [_question(1, "求函数的定义域"), _question(2, "计算三角形的面积")],
+        [],
+        [_question(3, "解下列不等式组")],
+    ])
+
+    assert [q["number"] for q in merged] == [1, 2, 3]
+
+
+def test_merge_drops_question_repeated_across_boundary():
+    cut = _question(2, "已知数列的前n项和为Sn，求通项", [{"label": "A", "content": "1"}])
+    full = _question(2, "已知数列的前n项和为Sn，求通项公式及前十项之和", [{"label": "B", "content": "2"}])
+
+    merged = merge_tile_questions([
+        [_question(1, "求函数的定义域"), cut],
+        [full, _question(3, "解下列不等式组")],
+    ])
+
+    assert [q["number"] for q in merged] == [1, 2, 3]
+    # 保留题干更完整的版本，并补全另一版本独有的选项
+    assert merged[1]["content"] == full["content"]
+    assert [option["label"] for option in merged[1]["options"]] == ["A", "B"]
+
+
+def test_merge_matches_unnumbered_question_by_text():
+    merged = merge_tile_questions([
+        [_question(5, "如图所示，在直角坐标系中，抛物线经过点A")],
+        [_question(None, "如图所示，在直角坐标系中，抛物线经过点A和点B，求解析式")],
+    ])
+
+    assert len(merged) == 1
+    assert merged[0]["number"] == 5
+    assert merged[0]["content"].endswith("求解析式")
+
+
+def test_merge_keeps_renumbered_sections_apart():
+    # 分节后题号重新从 1 开始，题号相同但题干不同时不能合并
+    merged = merge_tile_questions([
+        [_question(1, "选择题：下列说法正确的是")],
+        [_question(1, "解答题：已知圆的方程，求圆心坐标")],
+    ])
+
+    assert len(merged) == 2
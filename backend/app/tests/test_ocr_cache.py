@@ -0,0 +1,173 @@
+"""
+OCR 结果缓存测试 - 并发请求合并、异常传播与 TTL/LRU 淘汰
+"""
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import ocr_cache
+from app.services.ocr_cache import OCRResultCache
+
+THREADS = 8
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return OCRResultCache(db_path=str(tmp_path / "ocr_cache.db"))
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+def _run_concurrently(cache, key, compute):
+    """THREADS 个线程同时请求同一个 key，返回各线程的 (结果, 异常)"""
+    results = [None] * THREADS
+    barrier = threading.Barrier(THREADS)
+
+    def worker(index):
+        barrier.wait()
+        try:
+            results[index] = (cache.get_or_compute(key, compute), None)
+        except Exception as exc:
+            results[index] = (None, exc)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_concurrent_requests_compute_once(cache):
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        # 等其余线程都挂到进行中的 Future 上再返回
+        release.wait(5)
+        return '[{"number": 1}]'
+
+    threads, results = _run_concurrently(cache, "page", compute)
+    _wait_until(lambda: cache.stats()["coalesced"] == THREADS - 1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(error is None for _, error in results)
+    assert {payload for (payload, _), _ in results} == {'[{"number": 1}]'}
+    # 只有执行 compute 的线程 hit 为 False
+    assert sorted(hit for (_, hit), _ in results) == [False] + [True] * (THREADS - 1)
+    stats = cache.stats()
+    assert (stats["misses"], stats["stores"], stats["inflight"]) == (1, 1, 0)
+
+    assert cache.get_or_compute("page", compute) == ('[{"number": 1}]', True)
+    assert len(calls) == 1
+
+
+def test_compute_error_reaches_all_waiters_and_is_not_cached(cache):
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        raise RuntimeError("model unavailable")
+
+    threads, results = _run_concurrently(cache, "page", compute)
+    _wait_until(lambda: cache.stats()["coalesced"] == THREADS - 1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    errors = [error for _, error in results]
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert all(str(error) == "model unavailable" for error in errors)
+    assert not cache.contains("page")
+    assert cache.stats()["inflight"] == 0
+
+    # 失败不被缓存，下一次请求重新调用
+    assert cache.get_or_compute("page", lambda: "[]") == ("[]", False)
+
+
+def test_none_result_is_not_cached(cache):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return None
+
+    assert cache.get_or_compute("page", compute) == (None, False)
+    assert cache.get_or_compute("page", compute) == (None, False)
+    assert len(calls) == 2
+    assert cache.stats()["entries"] == 0
+
+
+class Clock:
+    """可手动拨动的 time.time"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ocr_cache, "time", SimpleNamespace(time=clock))
+    return clock
+
+
+def test_evicts_least_recently_used_over_max_entries(tmp_path, clock):
+    cache = OCRResultCache(db_path=str(tmp_path / "ocr_cache.db"), max_entries=3)
+    for key in ("a", "b", "c"):
+        cache.put(key, key)
+        clock.now += 1
+    # 访问 a 使其成为最近使用，b 变为最久未使用
+    assert cache.get("a") == "a"
+    clock.now += 1
+
+    cache.put("d", "d")
+
+    assert [key for key in "abcd" if cache.contains(key)] == ["a", "c", "d"]
+    stats = cache.stats()
+    assert (stats["entries"], stats["evictions"]) == (3, 1)
+
+
+def test_evicts_over_max_bytes(tmp_path, clock):
+    cache = OCRResultCache(db_path=str(tmp_path / "ocr_cache.db"), max_bytes=25)
+    for key in ("a", "b", "c"):
+        cache.put(key, key * 10)
+        clock.now += 1
+
+    # 中文按 UTF-8 字节计算大小
+    cache.put("d", "题" * 5)
+
+    assert [key for key in "abcd" if cache.contains(key)] == ["c", "d"]
+    assert cache.stats()["bytes"] == 25
+
+
+def test_expired_entries_are_misses_and_evicted(tmp_path, clock):
+    cache = OCRResultCache(db_path=str(tmp_path / "ocr_cache.db"), ttl_seconds=60)
+    cache.put("old", "old")
+    clock.now += 30
+    cache.put("new", "new")
+    clock.now += 31
+
+    assert cache.get("old") is None
+    assert cache.get("new") == "new"
+    assert cache.get_or_compute("old", lambda: "fresh") == ("fresh", False)
+
+    clock.now += 61
+    cache.put("other", "other")
+
+    assert cache.stats()["entries"] == 1
@@ -0,0 +1,257 @@
+"""
+OCR 对冲与熔断测试 - 熔断器状态转换、对冲胜出与超时计数
+"""
+import threading
+import time
+
+import pytest
+
+from app.services import ocr_hedging
+from app.services.ocr_backends import OCRBackend
+from app.services.ocr_hedging import CircuitBreaker, HedgedOCRBackend
+
+
+class FakeBackend(OCRBackend):
+    """按预设延迟返回结果或抛出异常的后端"""
+
+    def __init__(self, name, delay=0.0, questions=None, error=None):
+        self.name = name
+        self.delay = delay
+        self.questions = questions if questions is not None else [{"number": 1, "content": name}]
+        self.error = error
+        self.calls = 0
+
+    def extract_questions_with_report(self, image_path):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return list(self.questions), None
+
+
+class Clock:
+    """可手动拨动的 time.monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ocr_hedging.time, "monotonic", clock)
+    return clock
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_seconds=30)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()  # 成功清零连续失败计数
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.snapshot() == {"state": "open", "consecutive_failures": 3, "opened_count": 1}
+
+
+def test_breaker_half_open_allows_single_probe(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_breaker_probe_success_closes(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+
+    breaker.record_success()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+    assert breaker.snapshot()["consecutive_failures"] == 0
+
+
+def test_breaker_probe_failure_reopens(clock):
+    breaker = CircuitBreaker("test", failure_threshold=5, reset_seconds=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+
+    # 半开状态下一次失败即重新熔断，冷却期重新计时
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 29
+    assert not breaker.allow()
+    assert breaker.snapshot()["opened_count"] == 2
+
+
+def test_breaker_release_probe_returns_probe_slot(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+
+    breaker.release_probe()
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    """注册假后端，并隔离进程内的熔断器和延迟统计"""
+    registry = {}
+    monkeypatch.setattr(ocr_hedging, "_latency_trackers", {})
+    monkeypatch.setattr(ocr_hedging, "_circuit_breakers", {})
+    monkeypatch.setattr(ocr_hedging, "get_ocr_backend", lambda name=None: registry[name])
+
+    def register(*fakes):
+        for fake in fakes:
+            registry[fake.name] = fake
+    return register
+
+
+def _hedged(**kwargs):
+    options = dict(min_hedge_delay=0.1, default_hedge_delay=0.1, min_samples=1000, timeout=2.0, max_workers=4)
+    options.update(kwargs)
+    return HedgedOCRBackend("primary", "secondary", **options)
+
+
+def _failures(name):
+    return ocr_hedging.get_circuit_breaker(name).snapshot()["consecutive_failures"]
+
+
+def test_fast_primary_is_not_hedged(backends):
+    primary, secondary = FakeBackend("primary"), FakeBackend("secondary")
+    backends(primary, secondary)
+    hedged = _hedged()
+
+    questions, _ = hedged.extract_questions_with_report("page.png")
+
+    assert questions[0]["content"] == "primary"
+    assert secondary.calls == 0
+    stats = hedged.stats()
+    assert (stats["calls"], stats["hedged"], stats["hedge_wins"]) == (1, 0, 0)
+    assert ocr_hedging.get_backend_latency("primary").count == 1
+    hedged.shutdown()
+
+
+def test_slow_primary_is_hedged_and_secondary_wins(backends):
+    backends(FakeBackend("primary", delay=1.0), FakeBackend("secondary", delay=0.0))
+    hedged = _hedged()
+
+    questions, _ = hedged.extract_questions_with_report("page.png")
+
+    assert questions[0]["content"] == "secondary"
+    stats = hedged.stats()
+    assert (stats["hedged"], stats["hedge_wins"], stats["timeouts"]) == (1, 1, 0)
+    # 落败的主请求不算失败
+    assert _failures("primary") == 0
+    hedged.shutdown()
+
+
+def test_failed_primary_hedges_immediately(backends):
+    backends(FakeBackend("primary", error=RuntimeError("boom")), FakeBackend("secondary"))
+    hedged = _hedged(min_hedge_delay=10, default_hedge_delay=10)
+
+    started = time.monotonic()
+    questions, _ = hedged.extract_questions_with_report("page.png")
+
+    assert questions[0]["content"] == "secondary"
+    assert time.monotonic() - started < 1
+    assert _failures("primary") == 1
+    assert _failures("secondary") == 0
+    hedged.shutdown()
+
+
+def test_open_primary_reroutes_to_secondary(backends):
+    primary, secondary = FakeBackend("primary"), FakeBackend("secondary")
+    backends(primary, secondary)
+    hedged = _hedged()
+    for _ in range(ocr_hedging.get_circuit_breaker("primary").failure_threshold):
+        ocr_hedging.get_circuit_breaker("primary").record_failure()
+
+    questions, _ = hedged.extract_questions_with_report("page.png")
+
+    assert questions[0]["content"] == "secondary"
+    assert primary.calls == 0
+    assert hedged.stats()["rerouted"] == 1
+    hedged.shutdown()
+
+
+def test_timeout_counts_started_attempts_as_failures(backends):
+    backends(FakeBackend("primary", delay=1.0), FakeBackend("secondary", delay=1.0))
+    hedged = _hedged(timeout=0.4)
+
+    with pytest.raises(TimeoutError):
+        hedged.extract_questions_with_report("page.png")
+
+    assert hedged.stats()["timeouts"] == 1
+    assert _failures("primary") == 1
+    assert _failures("secondary") == 1
+    hedged.shutdown()
+
+
+def test_queued_attempts_are_cancelled_without_penalty(backends):
+    primary, secondary = FakeBackend("primary"), FakeBackend("secondary")
+    backends(primary, secondary)
+    hedged = _hedged(timeout=0.3, max_workers=2)
+    # 占满对冲线程池：主备请求都只能排队
+    release = threading.Event()
+    blockers = [hedged._executor.submit(release.wait) for _ in range(2)]
+
+    try:
+        with pytest.raises(TimeoutError):
+            hedged.extract_questions_with_report("page.png")
+    finally:
+        release.set()
+        for blocker in blockers:
+            blocker.result()
+
+    assert hedged.stats()["timeouts"] == 1
+    assert _failures("primary") == 0
+    assert _failures("secondary") == 0
+    assert ocr_hedging.get_circuit_breaker("primary").state == CircuitBreaker.CLOSED
+    hedged._executor.shutdown(wait=True)
+    assert primary.calls == 0 and secondary.calls == 0
+
+
+def test_hedge_delay_starts_when_primary_starts(backends):
+    primary, secondary = FakeBackend("primary", delay=0.1), FakeBackend("secondary")
+    backends(primary, secondary)
+    hedged = _hedged(min_hedge_delay=0.3, default_hedge_delay=0.3, max_workers=2)
+    # 主请求先排队 0.5 秒，执行 0.1 秒；对冲阈值若从提交时计时会在排队期间发出对冲
+    release = threading.Event()
+    blocker = hedged._executor.submit(release.wait)
+    other = hedged._executor.submit(time.sleep, 0.5)
+    threading.Timer(0.5, release.set).start()
+
+    questions, _ = hedged.extract_questions_with_report("page.png")
+
+    assert questions[0]["content"] == "primary"
+    assert hedged.stats()["hedged"] == 0
+    assert secondary.calls == 0
+    blocker.result()
+    other.result()
+    hedged.shutdown()
@@ -0,0 +1,143 @@
+"""
+模型输出 JSON 解析测试 - 增量解析与容错恢复
+"""
+import json
+
+from app.services.ocr_json import (
+    IncrementalJSONArrayParser,
+    repair_latex_escapes,
+    salvage_question_array,
+)
+
+
+def _question(number, content="题目"):
+    return {"number": number, "type": "essay", "content": content}
+
+
+def test_incremental_parser_emits_objects_as_they_close():
+    text = json.dumps([_question(1), _question(2, "含 } 和 ] 的字符串"), _question(3)], ensure_ascii=False)
+    parser = IncrementalJSONArrayParser()
+
+    emitted = []
+    for i in range(0, len(text), 7):
+        emitted.extend(parser.feed(text[i:i + 7]))
+
+    assert [q["number"] for q in emitted] == [1, 2, 3]
+    assert emitted[1]["content"] == "含 } 和 ] 的字符串"
+    assert parser.complete
+    assert parser.objects_emitted == 3
+    assert parser.pending_text == ""
+
+
+def test_incremental_parser_emits_each_object_once():
+    parser = IncrementalJSONArrayParser()
+
+    first = parser.feed('[{"number": 1, "content": "a"}, {"number": 2,')
+    second = parser.feed(' "content": "b"}]')
+
+    assert [q["number"] for q in first] == [1]
+    assert [q["number"] for q in second] == [2]
+
+
+def test_incremental_parser_ignores_prefix_and_nested_values():
+    parser = IncrementalJSONArrayParser()
+
+    emitted = parser.feed('```json\n[{"number": 1, "options": [{"label": "A"}], "images": {"a": [1, 2]}}]\n```')
+
+    assert emitted == [{"number": 1, "options": [{"label": "A"}], "images": {"a": [1, 2]}}]
+    assert parser.complete
+    # 数组闭合后的内容不再解析
+    assert parser.feed('[{"number": 2}]') == []
+
+
+def test_incremental_parser_handles_escaped_quotes():
+    parser = IncrementalJSONArrayParser()
+
+    emitted = parser.feed(r'[{"number": 1, "content": "他说：\"}\""}]')
+
+    assert emitted[0]["content"] == '他说："}"'
+
+
+def test_incremental_parser_keeps_unclosed_object_pending():
+    parser = IncrementalJSONArrayParser()
+
+    emitted = parser.feed('[{"number": 1}, {"number": 2, "content": "被截')
+
+    assert [q["number"] for q in emitted] == [1]
+    assert not parser.complete
+    assert parser.pending_text.startswith('{"number": 2')
+
+
+def test_incremental_parser_records_unparseable_objects():
+    parser = IncrementalJSONArrayParser()
+
+    emitted = parser.feed('[{"number": 1}, {"number": 2, "content": oops}, {"number": 3}]')
+
+    assert [q["number"] for q in emitted] == [1, 3]
+    assert parser.objects_failed == 1
+    assert "oops" in parser.failed_objects[0]
+
+
+def test_repair_latex_escapes_keeps_valid_json_unchanged():
+    text = json.dumps([{"content": "第一行\n\"引号\"\\反斜杠 é"}])
+
+    assert repair_latex_escapes(text) == text
+
+
+def test_repair_latex_escapes_fixes_latex_commands():
+    # \f \t \n 开头的 LaTeX 命令和非法转义 \s 都应按字面反斜杠处理
+    text = r'[{"content": "$\frac{1}{2} + \theta \neq \sqrt{x}$"}]'
+
+    value = json.loads(repair_latex_escapes(text))
+
+    assert value[0]["content"] == r"$\frac{1}{2} + \theta \neq \sqrt{x}$"
+
+
+def test_salvage_returns_strict_json_as_is():
+    text = "```json\n" + json.dumps([_question(1), _question(2)]) + "\n```"
+
+    result = salvage_question_array(text)
+
+    assert [q["number"] for q in result.questions] == [1, 2]
+    assert not result.partial
+    assert not result.repaired
+
+
+def test_salvage_repairs_latex_escapes():
+    # \in 是非法转义，严格解析失败后才会进入修复
+    result = salvage_question_array(r'[{"number": 1, "content": "$x \in \frac{a}{b}$"}]')
+
+    assert result.questions == [{"number": 1, "content": r"$x \in \frac{a}{b}$"}]
+    assert result.repaired
+    assert not result.partial
+
+
+def test_salvage_recovers_objects_before_truncation():
+    text = '[{"number": 1, "content": "a"}, {"number": 2, "content": "b"}, {"number": 3, "content": "被截'
+
+    result = salvage_question_array(text)
+
+    assert [q["number"] for q in result.questions] == [1, 2]
+    assert result.truncated
+    assert result.partial
+    assert result.report()["lost_numbers"] == [3]
+    assert result.lost[0]["reason"] == "truncated"
+
+
+def test_salvage_reports_unparseable_objects():
+    text = '[{"number": 1}, {"number": "7", "content": oops}, {"number": 3}]'
+
+    result = salvage_question_array(text)
+
+    assert [q["number"] for q in result.questions] == [1, 3]
+    assert not result.truncated
+    assert result.lost == [{"number": 7, "reason": "unparseable", "snippet": '{"number": "7", "content": oops}'}]
+    assert result.report()["recovered"] == 2
+
+
+def test_salvage_reports_missing_array():
+    result = salvage_question_array("抱歉，无法识别图片中的题目。")
+
+    assert result.questions == []
+    assert result.lost[0]["reason"] == "no_array"
+    assert result.partial
@@ -0,0 +1,137 @@
+"""
+游标分页测试 - 游标编解码与 (created_at, id) 倒序翻页
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, create_engine
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from app.services.pagination import (
+    InvalidCursorError,
+    decode_cursor,
+    decode_offset_cursor,
+    encode_cursor,
+    encode_offset_cursor,
+    keyset_paginate,
+)
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = "items"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    created_at = Column(DateTime, nullable=False)
+    group = Column(Integer, nullable=False)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    start = datetime(2024, 1, 1, 8, 0, 0)
+    # 每三条共用一个创建时间，验证同一时间的记录按 id 排序、不会跨页重复或遗漏
+    session.add_all(
+        Item(id=uuid.uuid4(), created_at=start + timedelta(seconds=index // 3), group=index % 2)
+        for index in range(25)
+    )
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _expected(db, group=None):
+    query = db.query(Item)
+    if group is not None:
+        query = query.filter(Item.group == group)
+    return sorted(query.all(), key=lambda item: (item.created_at, item.id), reverse=True)
+
+
+def _walk(db, limit, group=None):
+    pages = []
+    cursor = None
+    while True:
+        query = db.query(Item)
+        if group is not None:
+            query = query.filter(Item.group == group)
+        items, cursor = keyset_paginate(query, Item, limit, cursor=cursor)
+        pages.append(items)
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    item_id = uuid.uuid4()
+
+    cursor = encode_cursor(created_at, item_id)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, item_id)
+
+
+def test_offset_cursor_round_trip():
+    assert decode_offset_cursor(encode_offset_cursor(0)) == 0
+    assert decode_offset_cursor(encode_offset_cursor(140)) == 140
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "e30", encode_offset_cursor(20)])
+def test_decode_cursor_rejects_malformed_input(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    ["", "not-a-cursor", encode_cursor(datetime(2024, 1, 1), uuid.uuid4()), "eyJvIjotMX0", "eyJvIjoiMSJ9"],
+)
+def test_decode_offset_cursor_rejects_malformed_input(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_offset_cursor(cursor)
+
+
+@pytest.mark.parametrize("limit", [1, 4, 7, 25, 30])
+def test_keyset_paginate_returns_every_row_once_in_order(db, limit):
+    pages = _walk(db, limit)
+
+    walked = [item.id for page in pages for item in page]
+    assert walked == [item.id for item in _expected(db)]
+    assert all(len(page) == limit for page in pages[:-1])
+    assert 0 < len(pages[-1]) <= limit
+
+
+def test_keyset_paginate_keeps_filters(db):
+    walked = [item.id for page in _walk(db, 4, group=1) for item in page]
+
+    assert walked == [item.id for item in _expected(db, group=1)]
+
+
+def test_keyset_paginate_skips_rows_inserted_before_cursor(db):
+    first, cursor = keyset_paginate(db.query(Item), Item, 5)
+    # 第一页之后新插入的记录排在最前面，不会让后续页面重复返回已看过的记录
+    db.add(Item(id=uuid.uuid4(), created_at=datetime(2030, 1, 1), group=0))
+    db.commit()
+
+    second, _ = keyset_paginate(db.query(Item), Item, 5, cursor=cursor)
+
+    assert not {item.id for item in first} & {item.id for item in second}
+    assert [item.id for item in first + second] == [item.id for item in _expected(db)[1:11]]
+
+
+def test_keyset_paginate_supports_legacy_skip(db):
+    items, cursor = keyset_paginate(db.query(Item), Item, 5, skip=10)
+
+    expected = _expected(db)
+    assert [item.id for item in items] == [item.id for item in expected[10:15]]
+    assert decode_cursor(cursor) == (expected[14].created_at, expected[14].id)
+
+
+def test_keyset_paginate_rejects_malformed_cursor(db):
+    with pytest.raises(InvalidCursorError):
+        keyset_paginate(db.query(Item), Item, 5, cursor="not-a-cursor")
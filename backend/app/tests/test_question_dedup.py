@@ -0,0 +1,161 @@
+"""
+近似重复题检测测试 - 归一化、MinHash 签名、LSH 分桶与重复关联
+"""
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import app.models  # noqa: F401  注册全部模型
+from app.database import Base
+from app.models import User
+from app.models.question import Question
+from app.services.question_dedup import (
+    LSH_BANDS,
+    DuplicateDetector,
+    MinHasher,
+    band_buckets,
+    normalize_question_text,
+    shingles,
+    similarity,
+)
+from app.services.question_search import init_question_search
+
+ORIGINAL = "1. 已知函数 $f(x)=\\frac{1}{3}x^3-x^2-3x$，求函数 f(x) 的单调区间和极值。"
+# 题号、LaTeX 写法、标点和空白不同的同一道题
+VARIANT = "（2）已知函数f(x)=\\dfrac{1}{3}x^{3}-x^{2}-3x, 求函数f(x)的单调区间和极值"
+OTHER = "如图，在三角形ABC中，AB=AC，D是BC的中点，求证：AD垂直于BC。"
+
+
+def _signature(text):
+    return MinHasher().signature(shingles(normalize_question_text(text)))
+
+
+def test_normalize_removes_formatting_differences():
+    assert normalize_question_text(ORIGINAL) == normalize_question_text(VARIANT)
+    assert normalize_question_text("第3题 A \\leq B") == "a≤b"
+
+
+def test_shingles():
+    assert shingles("abcde", 3) == {"abc", "bcd", "cde"}
+    assert shingles("ab", 3) == {"ab"}
+    assert shingles("", 3) == set()
+
+
+def test_signature_is_deterministic():
+    first = _signature(ORIGINAL)
+
+    assert first.dtype.name == "uint32"
+    assert (first == _signature(ORIGINAL)).all()
+    assert MinHasher().signature([]) is None
+
+
+def test_similarity_tracks_jaccard():
+    base = normalize_question_text(ORIGINAL + OTHER)
+    near = normalize_question_text(ORIGINAL + OTHER + "并写出证明过程")
+    hasher = MinHasher()
+
+    near_score = similarity(hasher.signature(shingles(base)), hasher.signature(shingles(near)))
+    far_score = similarity(_signature(ORIGINAL), _signature(OTHER))
+
+    assert near_score > 0.7
+    assert far_score < 0.2
+
+
+def test_band_buckets_share_buckets_only_for_similar_signatures():
+    original = band_buckets(_signature(ORIGINAL))
+
+    assert len(original) == LSH_BANDS
+    assert original == band_buckets(_signature(VARIANT))
+    assert not set(original) & set(band_buckets(_signature(OTHER)))
+
+
+def test_band_buckets_include_band_index():
+    # 内容相同的两个 band 落在不同的桶里
+    signature = _signature(ORIGINAL)
+    signature[:] = 7
+
+    assert len(set(band_buckets(signature))) == LSH_BANDS
+
+
+@pytest.fixture
+def db(tmp_path):
+    # 检索索引按数据库地址记录是否已建表，每个测试使用独立的数据库文件
+    engine = create_engine(f"sqlite:///{tmp_path / 'dedup.db'}")
+    Base.metadata.create_all(engine)
+    init_question_search(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def user(db):
+    user = User(email="dedup@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    return user
+
+
+def _question(user, content, number=1):
+    return Question(id=uuid.uuid4(), number=number, content={"text": content}, question_type="essay", created_by=user.id)
+
+
+def _import(db, detector, user, questions):
+    fingerprints = detector.link_duplicates(db, user.id, questions)
+    db.add_all(questions)
+    db.flush()
+    detector.save_fingerprints(db, user.id, fingerprints)
+    db.commit()
+    return fingerprints
+
+
+def test_link_duplicates_within_batch(db, user):
+    detector = DuplicateDetector(threshold=0.8)
+    original, variant, other = _question(user, ORIGINAL), _question(user, VARIANT, 2), _question(user, OTHER, 3)
+
+    fingerprints = detector.link_duplicates(db, user.id, [original, variant, other])
+
+    assert len(fingerprints) == 3
+    assert original.duplicate_of_id is None
+    assert variant.duplicate_of_id == original.id
+    assert variant.duplicate_similarity >= 0.8
+    assert other.duplicate_of_id is None
+
+
+def test_link_duplicates_against_saved_questions(db, user):
+    detector = DuplicateDetector(threshold=0.8)
+    original = _question(user, ORIGINAL)
+    _import(db, detector, user, [original, _question(user, OTHER, 2)])
+
+    variant = _question(user, VARIANT)
+    _import(db, detector, user, [variant])
+    # 再次导入时关联到簇的原题，而不是关联到重复题
+    again = _question(user, VARIANT + "。")
+    detector.link_duplicates(db, user.id, [again])
+
+    assert variant.duplicate_of_id == original.id
+    assert again.duplicate_of_id == original.id
+
+
+def test_link_duplicates_is_scoped_to_user(db, user):
+    detector = DuplicateDetector(threshold=0.8)
+    _import(db, detector, user, [_question(user, ORIGINAL)])
+    stranger = User(email="other@example.com", password_hash="x")
+    db.add(stranger)
+    db.commit()
+
+    question = _question(stranger, VARIANT)
+    detector.link_duplicates(db, stranger.id, [question])
+
+    assert question.duplicate_of_id is None
+
+
+def test_short_questions_are_not_fingerprinted(db, user):
+    detector = DuplicateDetector(threshold=0.8)
+    first, second = _question(user, "1. 计算"), _question(user, "2. 计算", 2)
+
+    assert detector.link_duplicates(db, user.id, [first, second]) == []
+    assert second.duplicate_of_id is None
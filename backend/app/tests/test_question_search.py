@@ -0,0 +1,239 @@
+"""
+全文检索测试 - 切词、查询解析，以及 SQLite FTS5 索引的建表、重建、同步、排序和回退
+"""
+import pytest
+from sqlalchemy import inspect as sa_inspect, text
+
+from app.services.question_search import (
+    INDEX_VERSION,
+    QueryTerm,
+    get_question_search_index,
+    init_question_search,
+    parse_query,
+    tokenize,
+)
+from app.services.question_service import get_question_service
+
+
+def test_tokenize_empty():
+    assert tokenize(None) == []
+    assert tokenize("") == []
+    assert tokenize("，。！？ ") == []
+
+
+def test_tokenize_splits_cjk_into_bigrams_with_trailing_char():
+    assert tokenize("函数单调") == ["函数", "数单", "单调", "调"]
+    assert tokenize("求") == ["求"]
+
+
+def test_tokenize_splits_runs_at_punctuation_and_latin():
+    assert tokenize("已知f(x)=2x，求极值") == ["已知", "知", "f", "x", "2x", "求极", "极值", "值"]
+
+
+def test_tokenize_normalizes_fullwidth_and_case():
+    assert tokenize("ＡＢＣ Sin ３") == ["abc", "sin", "3"]
+
+
+def test_every_cjk_char_starts_a_token():
+    # 单字查询按前缀匹配，要求每个汉字都是某个 token 的首字
+    text = "三角形的面积"
+    starts = {token[0] for token in tokenize(text)}
+
+    assert starts == set(text)
+
+
+def test_parse_query_phrase_terms():
+    assert parse_query("单调区间") == [QueryTerm("单调区间", ["单调", "调区", "区间"])]
+
+
+def test_parse_query_single_char_is_prefix():
+    assert parse_query("圆") == [QueryTerm("圆", ["圆"], prefix=True)]
+
+
+def test_parse_query_mixed_terms_in_order():
+    assert parse_query("  Sin 函数 值 ") == [
+        QueryTerm("sin", ["sin"]),
+        QueryTerm("函数", ["函数"]),
+        QueryTerm("值", ["值"], prefix=True),
+    ]
+
+
+def test_parse_query_phrase_tokens_match_index_tokens():
+    # 查询词组的二元组与索引切词结果一致，位置相邻即可按短语命中
+    terms = parse_query("求函数的极值")
+    indexed = tokenize("已知函数，求函数的极值点")
+
+    tokens = terms[0].tokens
+    assert any(indexed[i:i + len(tokens)] == tokens for i in range(len(indexed)))
+
+
+def test_parse_query_empty():
+    assert parse_query(None) == []
+    assert parse_query("  ，、 ") == []
+
+
+@pytest.fixture
+def users(make_user):
+    return make_user("alice@example.com"), make_user("bob@example.com")
+
+
+def _search(db, keyword, user=None, **kwargs):
+    created_by = str(user.id) if user is not None else None
+    return get_question_service(db).search_questions(keyword, created_by=created_by, **kwargs)
+
+
+def _ids(page):
+    return [question.id for question in page.items]
+
+
+def _indexed_count(db):
+    return db.execute(text("SELECT count(*) FROM question_search")).scalar()
+
+
+def test_init_creates_fts5_tables_and_version(engine):
+    tables = set(sa_inspect(engine).get_table_names())
+
+    assert {"question_search", "question_search_rows", "question_search_meta"} <= tables
+    with engine.connect() as conn:
+        assert conn.execute(
+            text("SELECT value FROM question_search_meta WHERE key = 'version'")
+        ).scalar() == INDEX_VERSION
+        assert "fts5" in conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE name = 'question_search'")
+        ).scalar().lower()
+
+
+def test_init_rebuilds_missing_index(engine, db, users, make_question):
+    alice, _ = users
+    question = make_question(alice, "已知等差数列的前n项和，求公差")
+    # 模拟索引从未构建：清空索引和版本号
+    db.execute(text("DELETE FROM question_search"))
+    db.execute(text("DELETE FROM question_search_rows"))
+    db.execute(text("DELETE FROM question_search_meta"))
+    db.commit()
+    get_question_search_index()._index_ready.discard(str(engine.url))
+
+    init_question_search(engine)
+
+    assert _indexed_count(db) == 1
+    assert _ids(_search(db, "等差数列", alice)) == [question.id]
+
+
+def test_search_is_scoped_to_owner(db, users, make_question):
+    alice, bob = users
+    mine = make_question(alice, "求二次函数的最小值")
+    theirs = make_question(bob, "求二次函数的最小值")
+
+    assert _ids(_search(db, "二次函数", alice)) == [mine.id]
+    assert _ids(_search(db, "二次函数", bob)) == [theirs.id]
+    assert _search(db, "二次函数", alice).total == 1
+
+
+def test_search_ranks_primary_text_above_secondary(db, users, make_question):
+    alice, _ = users
+    in_explanation = make_question(alice, "计算下列各式的值", explanation="本题考查余弦定理的应用")
+    in_content = make_question(alice, "在三角形中，利用余弦定理求边长")
+
+    page = _search(db, "余弦定理", alice)
+
+    assert _ids(page) == [in_content.id, in_explanation.id]
+    assert page.hits[in_content.id].score > page.hits[in_explanation.id].score
+    assert "<mark>余弦定理</mark>" in page.hits[in_content.id].snippet
+    assert "<mark>余弦定理</mark>" in page.hits[in_explanation.id].snippet
+
+
+def test_snippet_escapes_html(db, users, make_question):
+    alice, _ = users
+    question = make_question(alice, "若 a<b，比较 <b>不等式</b> 两边的大小")
+
+    snippet = _search(db, "不等式", alice).hits[question.id].snippet
+
+    assert "&lt;b&gt;<mark>不等式</mark>&lt;/b&gt;" in snippet
+
+
+def test_phrase_and_prefix_matching(db, users, make_question):
+    alice, _ = users
+    phrase = make_question(alice, "解一元二次方程")
+    scattered = make_question(alice, "方程组的二次项系数为一元")
+
+    assert _ids(_search(db, "二次方程", alice)) == [phrase.id]
+    assert set(_ids(_search(db, "元", alice))) == {phrase.id, scattered.id}
+
+
+def test_update_reindexes_question(db, users, make_question):
+    alice, _ = users
+    question = make_question(alice, "求椭圆的离心率")
+
+    get_question_service(db).update_question(question.id, {"content": {"text": "求双曲线的渐近线"}})
+
+    assert _ids(_search(db, "椭圆", alice)) == []
+    assert _ids(_search(db, "双曲线", alice)) == [question.id]
+
+
+def test_delete_removes_index_row(db, users, make_question):
+    alice, _ = users
+    question = make_question(alice, "求抛物线的焦点坐标")
+    kept = make_question(alice, "求抛物线的准线方程", number=2)
+
+    assert get_question_service(db).delete_question(question.id)
+
+    assert _ids(_search(db, "抛物线", alice)) == [kept.id]
+    assert _indexed_count(db) == 1
+
+
+def test_deactivated_question_drops_out(db, users, make_question):
+    alice, _ = users
+    question = make_question(alice, "判断函数的奇偶性")
+
+    get_question_service(db).update_question(question.id, {"is_active": False})
+
+    assert _ids(_search(db, "奇偶性", alice)) == []
+
+
+def test_bulk_patch_reindexes_topic_tags(db, users, make_question):
+    alice, bob = users
+    question = make_question(alice, "计算定积分的值")
+    other = make_question(bob, "计算定积分的值")
+
+    result = get_question_service(db).bulk_patch_questions(
+        str(alice.id), [([str(question.id), str(other.id)], {"topic_tags": ["微积分基本定理"]})]
+    )
+
+    assert result["not_found"] == [str(other.id)]
+    assert _ids(_search(db, "基本定理", alice)) == [question.id]
+    assert _ids(_search(db, "基本定理", bob)) == []
+
+
+def test_search_filters_by_type_and_subject(db, users, make_question):
+    alice, _ = users
+    choice = make_question(alice, "下列关于集合的说法正确的是", question_type="single_choice", subject="数学")
+    make_question(alice, "用集合表示下列元素", question_type="fill_blank", subject="数学")
+
+    assert _ids(_search(db, "集合", alice, question_type="single_choice")) == [choice.id]
+    assert _search(db, "集合", alice, subject="物理").items == []
+
+
+# 模糊匹配回退：SQLite 中 JSON 列按 \u 转义存储中文，由 full_content 命中
+def test_falls_back_to_like_when_index_not_ready(engine, db, users, make_question):
+    alice, bob = users
+    question = make_question(alice, "求直线的斜率", full_content="求直线的斜率")
+    make_question(bob, "求直线的斜率", full_content="求直线的斜率")
+    db.execute(text("DELETE FROM question_search_meta"))
+    db.commit()
+    get_question_search_index()._index_ready.discard(str(engine.url))
+
+    page = _search(db, "斜率", alice)
+
+    assert _ids(page) == [question.id]
+    assert page.hits == {}
+
+
+def test_falls_back_to_like_without_owner(db, users, make_question):
+    alice, bob = users
+    make_question(alice, "求圆的切线方程", full_content="求圆的切线方程")
+    make_question(bob, "求圆的切线方程", full_content="求圆的切线方程")
+
+    page = _search(db, "切线")
+
+    assert len(page.items) == 2
+    assert page.hits == {}
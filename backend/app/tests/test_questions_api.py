@@ -0,0 +1,56 @@
+"""
+题目接口路由测试 - /{question_id} 与静态路由的匹配顺序
+"""
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.database import get_db
+from app.main import app
+from app.utils.auth import get_current_user
+
+
+@pytest.fixture
+def client(session_factory, make_user):
+    user = make_user()
+
+    def override_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = override_db
+    app.dependency_overrides[get_current_user] = lambda: user
+    # 不进入 with 块，不触发应用启动/关闭钩子
+    yield TestClient(app), user
+    app.dependency_overrides.clear()
+
+
+def test_get_question_by_id(client, make_question):
+    http, user = client
+    question = make_question(user, "求函数的单调区间")
+
+    response = http.get(f"/api/v1/questions/{question.id}")
+
+    assert response.status_code == 200
+    assert response.json()["id"] == str(question.id)
+    assert response.json()["content"] == {"text": "求函数的单调区间"}
+
+
+def test_get_missing_question_returns_404(client):
+    http, _ = client
+
+    assert http.get(f"/api/v1/questions/{uuid.uuid4()}").status_code == 404
+    assert http.get("/api/v1/questions/not-a-uuid").status_code == 404
+
+
+def test_static_routes_are_not_shadowed(client):
+    http, _ = client
+
+    response = http.get("/api/v1/questions/duplicates")
+
+    assert response.status_code == 200
+    assert response.json()["clusters"] == []
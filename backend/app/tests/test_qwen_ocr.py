@@ -0,0 +1,113 @@
+"""
+通义千问流式识别测试 - 模型返回非 200 响应时的错误传播
+"""
+import json
+from http import HTTPStatus
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.v1 import ocr as ocr_api
+from app.config import settings
+from app.main import app
+from app.services import qwen_ocr
+from app.services.rate_limiter import AdaptiveRateLimiter, ModelCallError
+
+
+def _chunk(text):
+    return SimpleNamespace(
+        status_code=HTTPStatus.OK,
+        code="",
+        message="",
+        output=SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=[{"text": text}]))]),
+    )
+
+
+def _failure(status_code, code, message):
+    return SimpleNamespace(status_code=status_code, code=code, message=message, output=None)
+
+
+@pytest.fixture
+def limiter(tmp_path):
+    return AdaptiveRateLimiter(
+        name="test",
+        db_path=str(tmp_path / "limiter.db"),
+        rate=100,
+        burst=10,
+        min_concurrency=1,
+        max_concurrency=8,
+        initial_concurrency=4,
+        latency_target=30,
+    )
+
+
+@pytest.fixture
+def extractor(monkeypatch, limiter, tmp_path):
+    monkeypatch.setattr(settings, "OCR_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "OCR_RAW_OUTPUT_ENABLED", False)
+    monkeypatch.setattr(settings, "OCR_NORMALIZE_ENABLED", False)
+    monkeypatch.setattr(settings, "OCR_RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(qwen_ocr, "get_model_rate_limiter", lambda: limiter)
+    image = tmp_path / "page.png"
+    image.write_bytes(b"not-really-a-png")
+    return qwen_ocr.QwenQuestionExtractor(api_key="test-key", model="test-model"), str(image)
+
+
+def _stream(monkeypatch, responses):
+    monkeypatch.setattr(
+        qwen_ocr.dashscope.MultiModalConversation, "call", lambda **kwargs: iter(responses)
+    )
+
+
+def test_stream_yields_questions(monkeypatch, extractor, limiter):
+    service, image = extractor
+    _stream(monkeypatch, [_chunk('[{"number": 1, "content": "a"},'), _chunk(' {"number": 2, "content": "b"}]')])
+
+    questions = list(service.extract_questions_stream(image))
+
+    assert [q["number"] for q in questions] == [1, 2]
+    assert limiter.stats()["errors"] == 0
+
+
+def test_stream_raises_on_non_ok_response(monkeypatch, extractor, limiter):
+    service, image = extractor
+    _stream(monkeypatch, [
+        _chunk('[{"number": 1, "content": "a"},'),
+        _failure(HTTPStatus.TOO_MANY_REQUESTS, "Throttling.RateQuota", "Requests rate limit exceeded"),
+    ])
+
+    received = []
+    with pytest.raises(ModelCallError, match="429"):
+        for question in service.extract_questions_stream(image):
+            received.append(question)
+
+    # 失败前已产出的题目保留；限流器按限流而不是普通错误记录
+    assert [q["number"] for q in received] == [1]
+    stats = limiter.stats()
+    assert stats["throttled"] == 1
+    assert stats["errors"] == 0
+    assert stats["in_flight"] == 0
+
+
+def test_stream_endpoint_emits_error_event(monkeypatch, extractor):
+    service, image = extractor
+    _stream(monkeypatch, [_failure(HTTPStatus.UNAUTHORIZED, "InvalidApiKey", "Invalid API-key provided.")])
+
+    async def save_upload(file):
+        return SimpleNamespace(file_id="upload-1", path=image)
+
+    async def cleanup(file_id):
+        return None
+
+    monkeypatch.setattr(ocr_api, "_get_ocr_backend", lambda name: service)
+    monkeypatch.setattr(ocr_api, "_save_ocr_upload", save_upload)
+    monkeypatch.setattr(ocr_api, "cleanup_ocr_upload", cleanup)
+
+    response = TestClient(app).post(
+        "/api/v1/ocr/upload/stream?format=ndjson", files={"file": ("page.png", b"x", "image/png")}
+    )
+
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [event["event"] for event in events] == ["start", "error"]
+    assert "401" in events[-1]["error"]
@@ -0,0 +1,313 @@
+"""
+模型调用准入控制测试 - 令牌桶、并发租约、AIMD 调整与重试
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import rate_limiter
+from app.services.rate_limiter import (
+    OUTCOME_ERROR,
+    OUTCOME_OK,
+    OUTCOME_THROTTLED,
+    AdaptiveRateLimiter,
+    ModelCallError,
+    RateLimitTimeout,
+)
+
+
+class FakeTime:
+    """替换限流器模块中的 time：sleep 只拨动时钟"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+        self.slept = 0.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept += seconds
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeTime()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    # 退避和轮询的抖动取上限，结果可预期
+    monkeypatch.setattr(rate_limiter, "random", SimpleNamespace(uniform=lambda low, high: high))
+    return clock
+
+
+@pytest.fixture
+def make_limiter(tmp_path, clock):
+    def make(**kwargs):
+        options = dict(
+            name="test",
+            db_path=str(tmp_path / "limiter.db"),
+            rate=100.0,
+            burst=100,
+            min_concurrency=1,
+            max_concurrency=16,
+            initial_concurrency=8,
+            latency_target=10.0,
+            lease_seconds=60.0,
+            retry_max_attempts=3,
+            retry_base_delay=1.0,
+            retry_max_delay=20.0,
+            call_deadline=60.0,
+        )
+        options.update(kwargs)
+        return AdaptiveRateLimiter(**options)
+    return make
+
+
+def _response(status_code):
+    return SimpleNamespace(status_code=status_code, message=f"status {status_code}")
+
+
+def _classify(response):
+    if response.status_code == 200:
+        return OUTCOME_OK, False
+    if response.status_code == 429:
+        return OUTCOME_THROTTLED, True
+    return OUTCOME_ERROR, response.status_code >= 500
+
+
+def test_burst_is_available_immediately_then_refills_at_rate(make_limiter, clock):
+    limiter = make_limiter(rate=2.0, burst=3)
+
+    for _ in range(3):
+        limiter.release(limiter.acquire(clock.now + 10), OUTCOME_OK, 0.1)
+    assert clock.slept == 0
+
+    limiter.release(limiter.acquire(clock.now + 10), OUTCOME_OK, 0.1)
+
+    # 令牌用完后按 rate 补充：第 4 次等待约 1/rate 秒（含抖动上限）
+    assert 0.5 <= clock.slept <= 0.5 * 1.2 + 1e-9
+    assert limiter.stats()["acquired"] == 4
+
+
+def test_tokens_are_capped_at_burst(make_limiter, clock):
+    limiter = make_limiter(rate=5.0, burst=3)
+    limiter.release(limiter.acquire(clock.now + 1), OUTCOME_OK, 0.1)
+
+    clock.now += 3600
+
+    assert limiter.stats()["tokens"] == 3
+
+
+def test_acquire_times_out_without_tokens(make_limiter, clock):
+    limiter = make_limiter(rate=0.1, burst=1)
+    limiter.acquire(clock.now + 1)
+
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(clock.now + 1)
+
+    assert limiter.stats()["timeouts"] == 1
+
+
+def test_concurrency_cap_limits_in_flight_leases(make_limiter, clock):
+    limiter = make_limiter(initial_concurrency=2, max_concurrency=2)
+    first = limiter.acquire(clock.now + 1)
+    limiter.acquire(clock.now + 1)
+    assert limiter.stats()["in_flight"] == 2
+
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(clock.now + 1)
+
+    limiter.release(first, OUTCOME_OK, 0.1)
+    limiter.acquire(clock.now + 1)
+    assert limiter.stats()["in_flight"] == 2
+
+
+def test_abandoned_leases_expire(make_limiter, clock):
+    # 进程崩溃遗留的租约在 lease_seconds 后失效，不会永久占用并发槽位
+    limiter = make_limiter(initial_concurrency=1, max_concurrency=1, lease_seconds=30)
+    limiter.acquire(clock.now + 1)
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(clock.now + 1)
+
+    clock.now += 31
+
+    assert limiter.stats()["in_flight"] == 0
+    limiter.acquire(clock.now + 1)
+
+
+def test_state_is_shared_between_instances(make_limiter, clock):
+    # 同一数据库文件上的两个实例相当于两个 worker 进程
+    first = make_limiter(initial_concurrency=1, max_concurrency=1)
+    second = make_limiter(initial_concurrency=1, max_concurrency=1)
+    first.acquire(clock.now + 1)
+
+    with pytest.raises(RateLimitTimeout):
+        second.acquire(clock.now + 1)
+
+
+def _limit(limiter):
+    return limiter.stats()["concurrency_limit"]
+
+
+def test_throttling_halves_limit_once_per_cooldown(make_limiter, clock):
+    limiter = make_limiter(initial_concurrency=8)
+
+    limiter.release(limiter.acquire(clock.now + 1), OUTCOME_THROTTLED, 0.1)
+    assert _limit(limiter) == 4
+    # 同一波限流响应在冷却期内不再减半
+    limiter.release(limiter.acquire(clock.now + 1), OUTCOME_THROTTLED, 0.1)
+    assert _limit(limiter) == 4
+
+    clock.now += AdaptiveRateLimiter.DECREASE_COOLDOWN_SECONDS
+    limiter.release(limiter.acquire(clock.now + 1), OUTCOME_THROTTLED, 0.1)
+
+    assert _limit(limiter) == 2
+    assert limiter.stats()["throttled"] == 3
+
+
+def test_decrease_stops_at_min_concurrency(make_limiter, clock):
+    limiter = make_limiter(initial_concurrency=3, min_concurrency=2)
+
+    for _ in range(3):
+        limiter.release(limiter.acquire(clock.now + 1), OUTCOME_THROTTLED, 0.1)
+        clock.now += AdaptiveRateLimiter.DECREASE_COOLDOWN_SECONDS
+
+    assert _limit(limiter) == 2
+
+
+def test_slow_success_decreases_limit(make_limiter, clock):
+    limiter = make_limiter(initial_concurrency=10, latency_target=5.0)
+
+    limiter.release(limiter.acquire(clock.now + 1), OUTCOME_OK, 6.0)
+
+    assert _limit(limiter) == 8
+
+
+def test_success_increases_limit_additively(make_limiter, clock):
+    limiter = make_limiter(initial_concurrency=4, max_concurrency=5)
+
+    # 每次成功增加 1/limit：一个并发窗口（约 limit 次成功）增加约 1
+    for _ in range(4):
+        limiter.release(limiter.acquire(clock.now + 1), OUTCOME_OK, 0.1)
+    assert 4.8 < _limit(limiter) < 5.0
+
+    for _ in range(10):
+        limiter.release(limiter.acquire(clock.now + 1), OUTCOME_OK, 0.1)
+    assert _limit(limiter) == 5
+
+
+def test_errors_do_not_change_limit(make_limiter, clock):
+    limiter = make_limiter(initial_concurrency=4)
+
+    limiter.release(limiter.acquire(clock.now + 1), OUTCOME_ERROR, 0.1)
+
+    assert _limit(limiter) == 4
+    assert limiter.stats()["errors"] == 1
+
+
+def test_call_retries_until_success(make_limiter, clock):
+    limiter = make_limiter()
+    responses = iter([_response(429), _response(503), _response(200)])
+
+    result = limiter.call(lambda: next(responses), _classify)
+
+    assert result.status_code == 200
+    stats = limiter.stats()
+    assert (stats["retries"], stats["throttled"], stats["errors"], stats["failures"]) == (2, 1, 1, 0)
+    # 限流退避基数加倍：2 * 2^0 + 1 * 2^1
+    assert clock.slept == pytest.approx(4.0)
+
+
+def test_call_returns_non_retryable_result(make_limiter, clock):
+    limiter = make_limiter()
+    calls = []
+
+    result = limiter.call(lambda: calls.append(1) or _response(400), _classify)
+
+    assert result.status_code == 400
+    assert len(calls) == 1
+    assert limiter.stats()["retries"] == 0
+
+
+def test_call_raises_after_max_attempts(make_limiter, clock):
+    limiter = make_limiter(retry_max_attempts=3)
+    calls = []
+
+    with pytest.raises(ModelCallError, match="after 3 attempts.*status=429"):
+        limiter.call(lambda: calls.append(1) or _response(429), _classify)
+
+    assert len(calls) == 3
+    stats = limiter.stats()
+    assert (stats["retries"], stats["failures"], stats["in_flight"]) == (2, 1, 0)
+
+
+def test_call_stops_retrying_at_deadline(make_limiter, clock):
+    limiter = make_limiter(retry_max_attempts=10, retry_base_delay=4.0)
+    calls = []
+
+    # 第 1 次退避 4 秒，第 2 次 8 秒会超过 10 秒的截止时间
+    with pytest.raises(ModelCallError, match="after 2 attempts"):
+        limiter.call(lambda: calls.append(1) or _response(503), _classify, deadline_seconds=10)
+
+    assert len(calls) == 2
+    assert clock.slept == pytest.approx(4.0)
+
+
+def test_call_retries_exceptions(make_limiter, clock):
+    limiter = make_limiter(retry_max_attempts=2)
+
+    def boom():
+        raise ConnectionError("connection reset")
+
+    with pytest.raises(ModelCallError, match="connection reset"):
+        limiter.call(boom, _classify)
+
+    assert limiter.stats()["errors"] == 2
+
+
+def test_slot_records_outcome(make_limiter, clock):
+    limiter = make_limiter(initial_concurrency=8)
+
+    with limiter.slot() as call:
+        call["outcome"] = OUTCOME_THROTTLED
+
+    assert _limit(limiter) == 4
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_slot_records_exception_as_error(make_limiter, clock):
+    limiter = make_limiter()
+
+    with pytest.raises(ValueError):
+        with limiter.slot():
+            raise ValueError("bad output")
+
+    stats = limiter.stats()
+    assert (stats["errors"], stats["in_flight"]) == (1, 0)
+
+
+def test_slot_leaves_outcome_alone_on_generator_exit(make_limiter, clock):
+    limiter = make_limiter(initial_concurrency=4)
+
+    def stream(outcome):
+        with limiter.slot() as call:
+            call["outcome"] = outcome
+            yield 1
+            yield 2
+
+    # 调用方提前关闭流式生成器：不算失败，按已记录的 outcome 归还槽位
+    closed_ok = stream(OUTCOME_OK)
+    next(closed_ok)
+    closed_ok.close()
+    stats = limiter.stats()
+    assert (stats["errors"], stats["in_flight"]) == (0, 0)
+    assert _limit(limiter) == 4.25
+
+    closed_throttled = stream(OUTCOME_THROTTLED)
+    next(closed_throttled)
+    closed_throttled.close()
+    stats = limiter.stats()
+    assert (stats["errors"], stats["throttled"], stats["in_flight"]) == (0, 1, 0)
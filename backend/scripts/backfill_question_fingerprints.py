@@ -0,0 +1,68 @@
+"""
+为启用近似重复检测之前导入的题目补算指纹并关联重复题
+
+按用户、按导入时间顺序处理没有指纹的题目（与导入时检测的顺序一致，较早的题目成为原题）。
+
+用法（在 backend 目录下执行）:
+    python scripts/backfill_question_fingerprints.py [--batch-size 500] [--database-url URL]
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500, help="每次提交的题目数")
+    parser.add_argument("--database-url", help="数据库地址（默认使用 DATABASE_URL 配置）")
+    args = parser.parse_args()
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    from sqlalchemy import literal, tuple_
+    from sqlalchemy.orm import Session
+
+    from app.database import engine
+    from app.models.question import Question
+    from app.models.question_fingerprint import QuestionFingerprint
+    from app.services.question_dedup import get_duplicate_detector
+
+    detector = get_duplicate_detector()
+    started = time.perf_counter()
+    processed = linked = 0
+    with Session(bind=engine) as session:
+        users = [row[0] for row in session.query(Question.created_by).distinct().all()]
+        for user_id in users:
+            last = None
+            while True:
+                query = (
+                    session.query(Question)
+                    .outerjoin(QuestionFingerprint, QuestionFingerprint.question_id == Question.id)
+                    .filter(Question.created_by == user_id, QuestionFingerprint.question_id.is_(None))
+                )
+                if last is not None:
+                    # 文本过短的题目不会写入指纹，按 (created_at, id) 向后翻页而不是重复查询
+                    query = query.filter(tuple_(Question.created_at, Question.id) > last)
+                batch = query.order_by(Question.created_at, Question.id).limit(args.batch_size).all()
+                if not batch:
+                    break
+                last = tuple_(
+                    literal(batch[-1].created_at, Question.created_at.type),
+                    literal(batch[-1].id, Question.id.type),
+                )
+                unlinked = [question for question in batch if question.duplicate_of_id is None]
+                fingerprints = detector.link_duplicates(session, user_id, batch)
+                detector.save_fingerprints(session, user_id, fingerprints)
+                linked += sum(1 for question in unlinked if question.duplicate_of_id is not None)
+                session.commit()
+                processed += len(batch)
+                print(f"user {user_id}: {processed} processed, {linked} linked")
+    print(f"Backfilled {processed} questions, linked {linked} duplicates in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
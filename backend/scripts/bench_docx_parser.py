@@ -0,0 +1,85 @@
+"""
+Word 题库解析基准测试：本地解析 .docx 的耗时（不调用模型）
+
+用法（在 backend 目录下执行）:
+    python scripts/bench_docx_parser.py [docx路径 ...] [--questions 100]
+
+未提供文件时生成一份含手写题号、自动编号、表格选项和内嵌图片的合成题库。
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from docx import Document  # noqa: E402
+from docx.shared import Inches  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from app.services.docx_parser import parse_docx_questions  # noqa: E402
+
+
+def make_question_bank(path: str, count: int) -> None:
+    """生成合成 Word 题库，每 10 题带一张插图"""
+    buffer = io.BytesIO()
+    Image.new("RGB", (320, 200), (200, 220, 240)).save(buffer, format="PNG")
+
+    document = Document()
+    document.add_heading("期末测试题库", level=1)
+    for index in range(1, count + 1):
+        kind = index % 4
+        if kind == 0:
+            document.add_paragraph(f"{index}. 简述第 {index} 题中函数单调性的判定方法。")
+        elif kind == 1:
+            document.add_paragraph(f"{index}. 下列关于集合 A 的说法正确的是（多选）")
+            for label in "ABCD":
+                document.add_paragraph(f"{label}. 选项 {label}{index}")
+        elif kind == 2:
+            document.add_paragraph(f"{index}. 已知 x + {index} = 2{index}，则 x = ____")
+        else:
+            document.add_paragraph(f"{index}. 计算下列各式的值，并说明理由：")
+            table = document.add_table(rows=2, cols=2)
+            for cell, label in zip(table._cells, "ABCD"):
+                cell.text = f"{label}. {index * ord(label)}"
+        if index % 10 == 0:
+            buffer.seek(0)
+            document.add_picture(buffer, width=Inches(2))
+    document.save(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="待测试的 .docx 文件")
+    parser.add_argument("--questions", type=int, default=100, help="合成题库的题目数")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    files = args.files
+    if not files:
+        synthetic = os.path.join(workdir, f"bank_{args.questions}.docx")
+        make_question_bank(synthetic, args.questions)
+        files = [synthetic]
+
+    print(f"{'file':32} {'questions':>9} {'images':>7} {'median ms':>10} {'max ms':>8}")
+    for path in files:
+        timings = []
+        questions = []
+        for run in range(args.repeat):
+            started = time.perf_counter()
+            questions = parse_docx_questions(path, image_dir=os.path.join(workdir, f"images_{run}"))
+            timings.append((time.perf_counter() - started) * 1000)
+        images = sum(len(question["images"]) for question in questions)
+        print(
+            f"{Path(path).name[:32]:32} {len(questions):9d} {images:7d} "
+            f"{statistics.median(timings):10.1f} {max(timings):8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+图片规范化基准测试：对比规范化前后发送给模型的字节数和模型延迟
+
+用法（在 backend 目录下执行）:
+    python scripts/bench_image_normalization.py [图片路径 ...] [--call-model]
+
+未提供图片时生成一张 4000x3000 的合成手机照片。
+--call-model 会分别以原图和规范化图片调用 Qwen-VL（产生真实费用）。
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.services.image_normalizer import ImageNormalizer, get_image_normalizer  # noqa: E402
+from app.services.process_pool import shutdown_process_pools  # noqa: E402
+
+
+def make_synthetic_photo(path: str) -> None:
+    """生成带噪点和文字行的 4000x3000 JPEG，近似手机拍摄的试卷"""
+    img = Image.effect_noise((4000, 3000), 40).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    for row in range(60):
+        y = 80 + row * 47
+        draw.text((120, y), f"{row + 1}. 已知集合 A={{x|-2<=x<=1}}, 求 A 与 B 的交集 ............", fill=(20, 20, 20))
+    img.save(path, format="JPEG", quality=95)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="待测试的图片路径")
+    parser.add_argument("--call-model", action="store_true", help="实际调用模型对比延迟")
+    parser.add_argument("--repeat", type=int, default=3, help="规范化计时重复次数")
+    args = parser.parse_args()
+
+    images = args.images
+    if not images:
+        synthetic = os.path.join(tempfile.mkdtemp(), "synthetic_4000x3000.jpg")
+        make_synthetic_photo(synthetic)
+        images = [synthetic]
+
+    normalizer = get_image_normalizer()
+    print(
+        f"max_long_edge={settings.OCR_NORMALIZE_MAX_LONG_EDGE} grayscale={settings.OCR_NORMALIZE_GRAYSCALE} "
+        f"quality={settings.OCR_NORMALIZE_JPEG_QUALITY}"
+    )
+    print(f"{'image':40} {'orig KB':>9} {'norm KB':>9} {'ratio':>7} {'norm ms':>9}")
+
+    extractor = None
+    if args.call_model:
+        from app.services.qwen_ocr import QwenQuestionExtractor
+
+        extractor = QwenQuestionExtractor()
+
+    try:
+        for image_path in images:
+            timings = []
+            result = None
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                result = normalizer.normalize(image_path)
+                timings.append((time.perf_counter() - started) * 1000)
+                ImageNormalizer.release(result, image_path)
+            ratio = result["normalized_bytes"] / result["original_bytes"]
+            print(
+                f"{Path(image_path).name[:40]:40} {result['original_bytes'] / 1024:9.1f} "
+                f"{result['normalized_bytes'] / 1024:9.1f} {ratio:7.2%} {statistics.median(timings):9.1f}"
+            )
+
+            if extractor is not None:
+                for label, active in (("original", None), ("normalized", normalizer)):
+                    extractor.normalizer = active
+                    started = time.perf_counter()
+                    questions = extractor._extract_questions_uncached(image_path)
+                    elapsed = time.perf_counter() - started
+                    print(f"    model[{label:10}] {elapsed:7.2f} s, {len(questions)} questions")
+    finally:
+        shutdown_process_pools()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+导入流水线基准测试：OCRIntegrationService -> QuestionService 全流程，默认使用回放后端（无需网络）
+
+用法（在 backend 目录下执行）:
+    python scripts/bench_ingest.py [图片路径 ...] [--pages 20] [--concurrency 1,4,8]
+        [--latency-ms 800] [--jitter-ms 200] [--backend replay] [--database-url URL]
+
+未提供图片时生成合成试卷页面；回放后端对没有录制的页面按图片哈希生成确定性的合成题目，
+有录制时（见 scripts/record_ocr_replays.py）回放录制结果。
+默认写入临时 SQLite 数据库，不影响开发/生产数据库。
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+
+def make_pages(directory: str, count: int) -> list:
+    """生成内容互不相同的合成试卷页面"""
+    paths = []
+    for index in range(count):
+        img = Image.new("L", (800, 1100), 255)
+        draw = ImageDraw.Draw(img)
+        draw.text((40, 30), f"Page {index + 1}", fill=0)
+        for row in range(30):
+            draw.text((40, 70 + row * 34), f"{row + 1}. x + {index * 31 + row} = ____", fill=0)
+        path = os.path.join(directory, f"page_{index + 1:03d}.png")
+        img.save(path)
+        paths.append(path)
+    return paths
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="页面图片路径（按顺序组成一份文档）")
+    parser.add_argument("--pages", type=int, default=20, help="合成页面数")
+    parser.add_argument("--concurrency", default="1,4,8", help="逗号分隔的并发页数列表")
+    parser.add_argument("--backend", default="replay", help="识别后端: replay / qwen / paddle")
+    parser.add_argument("--latency-ms", type=float, default=800, help="回放后端每页的合成延迟")
+    parser.add_argument("--jitter-ms", type=float, default=200, help="回放延迟的随机抖动范围（按页确定）")
+    parser.add_argument("--database-url", help="数据库地址，默认使用临时 SQLite")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_ingest_")
+    # 配置在导入 app 时读取，必须先设置环境变量
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["OCR_BACKEND"] = args.backend
+    os.environ["OCR_REPLAY_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["OCR_REPLAY_JITTER_MS"] = str(args.jitter_ms)
+
+    import app.models  # noqa: F401
+    from app.database import Base, SessionLocal, engine
+    from app.models import User
+    from app.services.ocr_integration import get_ocr_integration_service
+
+    Base.metadata.create_all(bind=engine)
+    images = args.images or make_pages(workdir, args.pages)
+
+    db = SessionLocal()
+    try:
+        user = User(email=f"bench-{int(time.time())}@example.com", password_hash="-")
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+
+        print(f"backend={args.backend} pages={len(images)} latency={args.latency_ms}±{args.jitter_ms}ms")
+        print(
+            f"{'concurrency':>11} {'wall ms':>9} {'pages/s':>8} {'questions':>9} "
+            f"{'q/s':>7} {'page p50':>9} {'page p95':>9} {'errors':>7}"
+        )
+        for concurrency in [int(value) for value in args.concurrency.split(",")]:
+            started = time.perf_counter()
+            result = get_ocr_integration_service(db).process_document_images(
+                image_paths=images,
+                document_title=f"bench c={concurrency}",
+                filename="bench.png",
+                uploaded_by=str(user.id),
+                max_concurrency=concurrency,
+            )
+            wall = time.perf_counter() - started
+            page_ms = [page["elapsed_ms"] for page in result.get("page_timings") or []]
+            created = result.get("questions_created", 0)
+            print(
+                f"{concurrency:11d} {wall * 1000:9.0f} {len(images) / wall:8.2f} {created:9d} "
+                f"{created / wall:7.1f} {percentile(page_ms, 0.5):9.0f} {percentile(page_ms, 0.95):9.0f} "
+                f"{result.get('extraction_errors', 0):7d}"
+            )
+            if page_ms:
+                print(f"{'':11} mean page OCR {statistics.mean(page_ms):.0f} ms")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
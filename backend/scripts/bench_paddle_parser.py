@@ -0,0 +1,74 @@
+"""
+PaddleOCR 布局结果解析基准测试：合成大页面 / 多页布局，测量 parse_paddle_layout_result 的耗时
+
+用法（在 backend 目录下执行）:
+    python scripts/bench_paddle_parser.py [--lines 5000] [--pages 1,10] [--repeat 7]
+
+每种布局分别以多边形点列表和 rec_boxes 的 [x1, y1, x2, y2] 两种 bbox 格式测试，取多次运行的最小值。
+"""
+import argparse
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.paddle_parser import parse_paddle_layout_result  # noqa: E402
+
+STEMS = [
+    "计算下列各式", "简述光合作用的过程", "下列说法是否正确", "x + 1 = ____", "多选：选出所有正确项",
+    "解释下列现象", "Answer T/F", "已知函数 f(x) = 2x + 1", "解方程", "求下列函数的值",
+]
+
+
+def make_layout(lines: int, pages: int, polygon: bool, seed: int = 0) -> dict:
+    """生成合成布局结果：lines 行平均分布到 pages 页，约 20% 为题号行、25% 为选项行"""
+    rng = random.Random(seed)
+    per_page = max(1, lines // pages)
+    number = 1
+    layout_results = []
+    for _ in range(pages):
+        texts, boxes, scores = [], [], []
+        for row in range(per_page):
+            roll = rng.random()
+            if roll < 0.2:
+                text = f"{number}. {rng.choice(STEMS)}"
+                number += 1
+            elif roll < 0.45:
+                text = f"{rng.choice('ABCD')}. 选项 {row}"
+            else:
+                text = f"{rng.choice(STEMS)}（续 {row}）"
+            x, y = rng.randint(0, 800), row * 20
+            if polygon:
+                boxes.append([[x, y], [x + 300, y], [x + 300, y + 18], [x, y + 18]])
+            else:
+                boxes.append([x, y, x + 300, y + 18])
+            texts.append(text)
+            scores.append(round(rng.uniform(0.8, 1.0), 3))
+        layout_results.append({"overall_ocr_res": {"rec_texts": texts, "rec_boxes": boxes, "rec_scores": scores}})
+    return {"layoutParsingResults": layout_results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=5000, help="每个布局的文本行总数")
+    parser.add_argument("--pages", default="1,10", help="逗号分隔的页数列表（行数平均分到各页）")
+    parser.add_argument("--repeat", type=int, default=7, help="重复次数，取最小值")
+    args = parser.parse_args()
+
+    print(f"{'pages':>5} {'bbox':>8} {'lines':>7} {'questions':>9} {'ms':>8} {'lines/s':>10}")
+    for pages in [int(value) for value in args.pages.split(",")]:
+        for polygon in (True, False):
+            layout = make_layout(args.lines, pages, polygon)
+            line_count = sum(len(page["overall_ocr_res"]["rec_texts"]) for page in layout["layoutParsingResults"])
+            questions = parse_paddle_layout_result(layout)["questions"]
+            best = min(timeit.repeat(lambda: parse_paddle_layout_result(layout), number=1, repeat=args.repeat))
+            print(
+                f"{pages:5d} {'polygon' if polygon else 'rect':>8} {line_count:7d} {len(questions):9d} "
+                f"{best * 1000:8.1f} {line_count / best:10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+题目入库写路径基准测试：一份 N 道题的文档经 process_document_images 入库，统计数据库往返次数
+
+识别结果为合成数据（不调用 OCR），只测量入库：创建文档、写入题目、
+重复检测 / 检索索引、更新文档状态，以及返回结果（to_dict）时触发的加载。
+默认写入临时 SQLite 数据库，不影响开发/生产数据库。
+
+用法（在 backend 目录下执行）:
+    python scripts/bench_question_writes.py [--questions 500] [--per-page 25] [--repeat 3] [--database-url URL]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def make_pages(total: int, per_page: int, seed: int) -> list:
+    """合成的页结果（与 OCRIntegrationService._page_result 的结构一致）"""
+    pages = []
+    for start in range(0, total, per_page):
+        questions = []
+        for number in range(start + 1, min(total, start + per_page) + 1):
+            questions.append({
+                "number": number,
+                "content": f"第{number}题 已知函数 f(x) = {seed}x^2 + {number}x + {number * 7 % 13}，求其在区间 [0, {number}] 上的最小值。",
+                "type": "multiple_choice",
+                "options": [
+                    {"label": label, "content": f"{number * (index + 3) % 97 + seed}"}
+                    for index, label in enumerate("ABCD")
+                ],
+                "confidence": 0.95,
+            })
+        pages.append({
+            "image_index": len(pages),
+            "image_path": f"page_{len(pages) + 1:03d}.png",
+            "questions": questions,
+            "error": None,
+            "elapsed_ms": 0,
+            "finished_at": "",
+            "salvage": None,
+        })
+    return pages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=500, help="每份文档的题目数")
+    parser.add_argument("--per-page", type=int, default=25, help="每页题目数")
+    parser.add_argument("--repeat", type=int, default=3, help="导入的文档份数（题目内容各不相同）")
+    parser.add_argument("--database-url", help="数据库地址，默认使用临时 SQLite")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_writes_")
+    # 配置在导入 app 时读取，必须先设置环境变量
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault("OCR_BACKEND", "replay")
+
+    from sqlalchemy import event
+
+    import app.models  # noqa: F401
+    from app.database import Base, SessionLocal, engine
+    from app.models import User
+    from app.services.ocr_integration import OCRIntegrationService
+    from app.services.question_search import init_question_search
+
+    Base.metadata.create_all(bind=engine)
+    init_question_search(engine)
+
+    statements: Counter = Counter()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements[statement.lstrip().split(None, 1)[0].upper()] += 1
+
+    db = SessionLocal()
+    try:
+        user = User(email=f"bench-{int(time.time())}@example.com", password_hash="-")
+        db.add(user)
+        db.commit()
+        user_id = str(user.id)
+
+        print(f"questions={args.questions} per_page={args.per_page} database={engine.url.get_backend_name()}")
+        print(f"{'run':>4} {'wall ms':>9} {'round trips':>12} {'SELECT':>7} {'INSERT':>7} {'UPDATE':>7} {'DELETE':>7} {'other':>6}")
+        walls, trips = [], []
+        for run in range(args.repeat):
+            pages = make_pages(args.questions, args.per_page, seed=run + 1)
+            service = OCRIntegrationService(db)
+            service.extract_document_pages = lambda *a, _pages=pages, **kw: _pages
+            statements.clear()
+            started = time.perf_counter()
+            result = service.process_document_images(
+                image_paths=[page["image_path"] for page in pages],
+                document_title=f"bench {run}",
+                filename="bench.pdf",
+                uploaded_by=user_id,
+            )
+            wall = (time.perf_counter() - started) * 1000
+            if result.get("questions_created") != args.questions:
+                raise SystemExit(f"ingest failed: {result.get('error') or result.get('message')}")
+            total = sum(statements.values())
+            other = total - sum(statements[kind] for kind in ("SELECT", "INSERT", "UPDATE", "DELETE"))
+            print(
+                f"{run + 1:4d} {wall:9.0f} {total:12d} {statements['SELECT']:7d} {statements['INSERT']:7d} "
+                f"{statements['UPDATE']:7d} {statements['DELETE']:7d} {other:6d}"
+            )
+            walls.append(wall)
+            trips.append(total)
+        print(f"mean {statistics.mean(walls):.0f} ms, {statistics.mean(trips):.0f} round trips per document")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
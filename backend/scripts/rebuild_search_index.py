@@ -0,0 +1,36 @@
+"""
+重建题目全文检索索引（切词规则调整后，或索引与题目表不一致时）
+
+用法（在 backend 目录下执行）:
+    python scripts/rebuild_search_index.py [--database-url URL]
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="数据库地址（默认使用 DATABASE_URL 配置）")
+    args = parser.parse_args()
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    from sqlalchemy.orm import Session
+
+    from app.database import engine
+    from app.services.question_search import get_question_search_index
+
+    started = time.perf_counter()
+    with Session(bind=engine) as session:
+        total = get_question_search_index().rebuild(session)
+        session.commit()
+    print(f"Indexed {total} questions in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
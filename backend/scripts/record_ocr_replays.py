@@ -0,0 +1,42 @@
+"""
+录制真实后端的识别结果，供回放后端（OCR_BACKEND=replay）离线使用
+
+用法（在 backend 目录下执行）:
+    python scripts/record_ocr_replays.py 图片路径 [图片路径 ...] [--backend qwen] [--dir data/replay]
+
+每张图片调用一次指定后端（产生真实费用），结果和实际耗时按图片内容哈希保存到录制目录。
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.config import settings  # noqa: E402
+from app.services.ocr_backends import get_ocr_backend  # noqa: E402
+from app.services.replay_ocr import ReplayOCRBackend  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="+", help="待录制的图片路径")
+    parser.add_argument("--backend", default="qwen", help="被录制的后端: qwen / paddle")
+    parser.add_argument("--dir", default=settings.OCR_REPLAY_DIR, help="录制文件目录")
+    args = parser.parse_args()
+
+    if args.backend == "replay":
+        parser.error("cannot record the replay backend")
+    backend = get_ocr_backend(args.backend)
+    recorder = ReplayOCRBackend(recordings_dir=args.dir)
+
+    for image_path in args.images:
+        started = time.perf_counter()
+        questions = backend.extract_questions(image_path)
+        latency_ms = (time.perf_counter() - started) * 1000
+        path = recorder.record(image_path, questions=questions, latency_ms=latency_ms)
+        print(f"{image_path}: {len(questions)} questions in {latency_ms:.0f} ms -> {path}")
+
+
+if __name__ == "__main__":
+    main()
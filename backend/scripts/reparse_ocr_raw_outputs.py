@@ -0,0 +1,50 @@
+"""
+用保存的模型原始输出重新解析部分丢失的页面（不调用模型）
+
+解析逻辑改进后运行，恢复此前因 JSON 格式问题丢失的题目，并更新 OCR 缓存中的结果。
+
+用法（在 backend 目录下执行）:
+    python scripts/reparse_ocr_raw_outputs.py [--all] [--key KEY ...]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.ocr_cache import get_ocr_raw_store  # noqa: E402
+from app.services.qwen_ocr import QwenQuestionExtractor  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--key", action="append", help="只重新解析指定的原始输出键，可重复")
+    parser.add_argument("--all", action="store_true", help="包含已完整恢复的记录")
+    args = parser.parse_args()
+
+    store = get_ocr_raw_store()
+    keys = args.key or store.list_keys(only_lossy=not args.all)
+    # 仅做本地解析，不会发起模型调用
+    extractor = QwenQuestionExtractor(api_key="offline-reparse")
+
+    recovered_total = 0
+    still_lossy = 0
+    for key in keys:
+        before = store.get_report(key) or {"recovered": 0}
+        report = extractor.reparse_raw_output(key)
+        if report is None:
+            print(f"{key}: not found")
+            continue
+        gained = report["recovered"] - before.get("recovered", 0)
+        recovered_total += max(gained, 0)
+        if report["lost"] or report["truncated"]:
+            still_lossy += 1
+        print(
+            f"{key}: recovered {report['recovered']} (+{gained}), lost {len(report['lost'])}, "
+            f"truncated={report['truncated']}"
+        )
+    print(f"{len(keys)} outputs reparsed, {recovered_total} questions regained, {still_lossy} still partial")
+
+
+if __name__ == "__main__":
+    main()